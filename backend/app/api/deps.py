@@ -1,11 +1,14 @@
 """
 API通用依赖项
 """
-from typing import Generator
+from typing import AsyncGenerator, Generator
+from fastapi import Depends
 from sqlalchemy.orm import Session
 
-from app.core.database import get_db as _get_db
+from app.auth.dependencies import get_current_active_user
+from app.core.database import get_db as _get_db, db_router
 from app.core.redis import get_redis as _get_redis, RedisClient
+from app.models.user import User
 
 
 def get_db() -> Generator[Session, None, None]:
@@ -13,6 +16,22 @@ def get_db() -> Generator[Session, None, None]:
     yield from _get_db()
 
 
+async def get_read_db(
+    current_user: User = Depends(get_current_active_user)
+) -> AsyncGenerator[Session, None]:
+    """
+    获取只读数据库会话（只读接口使用）
+    
+    配置了只读副本时路由到副本；当前用户刚提交过写操作或副本不可用时使用主库。
+    会话禁止写入，需要写入的接口使用 get_db。
+    """
+    db = await db_router.read_session(current_user.id)
+    try:
+        yield db
+    finally:
+        db.close()
+
+
 async def get_redis() -> RedisClient:
     """获取Redis客户端（重新导出以便API使用）"""
     return await _get_redis()
@@ -4,7 +4,6 @@
 from typing import List, Optional
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
-from sqlalchemy import or_
 
 from app.api.deps import get_db
 from app.schemas.function_module import (
@@ -14,12 +13,13 @@ from app.schemas.function_module import (
     CustomBatchConfigRequest
 )
 from app.schemas.common import SuccessResponse
-from app.schemas.workflow import WorkflowCreate, WorkflowResponse
+from app.schemas.workflow import WorkflowCreate
 from app.models.function_module import FunctionModule
 from app.models.workflow import Workflow, WorkflowBinding
 from app.models.user import User
 from app.auth.dependencies import get_current_superadmin
 from app.services.workflow_service import WorkflowService
+from app.services.function_config_service import FunctionConfigService
 
 router = APIRouter()
 
@@ -33,112 +33,23 @@ async def get_functions(
 ):
     """
     获取功能模块列表（仅管理员）
+    
+    功能、绑定和工作流一次加载并缓存，搜索和状态过滤在缓存的列表上进行。
     """
     try:
-        query = db.query(FunctionModule)
+        result = await FunctionConfigService.list_functions(db)
         
-        # 搜索过滤
+        # 搜索过滤（名称或功能键，不区分大小写）
         if search:
-            search_filter = or_(
-                FunctionModule.name.ilike(f"%{search}%"),
-                FunctionModule.function_key.ilike(f"%{search}%")
-            )
-            query = query.filter(search_filter)
+            keyword = search.lower()
+            result = [
+                func for func in result
+                if keyword in func["name"].lower() or keyword in func["function_key"].lower()
+            ]
         
         # 状态过滤
         if is_enabled is not None:
-            query = query.filter(FunctionModule.is_enabled == is_enabled)
-        
-        # 排序
-        functions = query.order_by(FunctionModule.sort_order, FunctionModule.id).all()
-        
-        # 获取每个功能的工作流配置
-        result = []
-        for func in functions:
-            # 对于定制化批量分析，获取所有6个工作流配置
-            if func.function_key == "custom_operation_data_analysis":
-                # 获取所有sheet_index的工作流绑定（0-5）
-                bindings = db.query(WorkflowBinding).filter(
-                    WorkflowBinding.function_key == func.function_key,
-                    WorkflowBinding.user_id.is_(None),
-                    WorkflowBinding.sheet_index.isnot(None)
-                ).order_by(WorkflowBinding.sheet_index).all()
-                
-                workflows = []
-                for binding in bindings:
-                    workflow_obj = db.query(Workflow).filter(Workflow.id == binding.workflow_id).first()
-                    if workflow_obj:
-                        workflows.append({
-                            "sheet_index": binding.sheet_index,
-                            "workflow": WorkflowResponse(
-                                id=workflow_obj.id,
-                                name=workflow_obj.name,
-                                category=workflow_obj.category,
-                                platform=workflow_obj.platform,
-                                config=workflow_obj.config,
-                                description=workflow_obj.description,
-                                is_active=workflow_obj.is_active,
-                                created_by=workflow_obj.created_by,
-                                created_at=workflow_obj.created_at,
-                                updated_at=workflow_obj.updated_at
-                            )
-                        })
-                
-                func_dict = {
-                    "id": func.id,
-                    "function_key": func.function_key,
-                    "name": func.name,
-                    "description": func.description,
-                    "route_path": func.route_path,
-                    "icon": func.icon,
-                    "category": func.category,
-                    "is_enabled": func.is_enabled,
-                    "sort_order": func.sort_order,
-                    "created_at": func.created_at,
-                    "updated_at": func.updated_at,
-                    "workflow": None,
-                    "workflows": workflows  # 多个工作流配置
-                }
-            else:
-                # 其他功能，获取单个工作流配置
-                binding = db.query(WorkflowBinding).filter(
-                    WorkflowBinding.function_key == func.function_key,
-                    WorkflowBinding.user_id.is_(None),
-                    WorkflowBinding.sheet_index.is_(None)  # 非定制化批量分析，sheet_index为None
-                ).first()
-                
-                workflow = None
-                if binding:
-                    workflow_obj = db.query(Workflow).filter(Workflow.id == binding.workflow_id).first()
-                    if workflow_obj:
-                        workflow = WorkflowResponse(
-                            id=workflow_obj.id,
-                            name=workflow_obj.name,
-                            category=workflow_obj.category,
-                            platform=workflow_obj.platform,
-                            config=workflow_obj.config,
-                            description=workflow_obj.description,
-                            is_active=workflow_obj.is_active,
-                            created_by=workflow_obj.created_by,
-                            created_at=workflow_obj.created_at,
-                            updated_at=workflow_obj.updated_at
-                        )
-                
-                func_dict = {
-                    "id": func.id,
-                    "function_key": func.function_key,
-                    "name": func.name,
-                    "description": func.description,
-                    "route_path": func.route_path,
-                    "icon": func.icon,
-                    "category": func.category,
-                    "is_enabled": func.is_enabled,
-                    "sort_order": func.sort_order,
-                    "created_at": func.created_at,
-                    "updated_at": func.updated_at,
-                    "workflow": workflow
-                }
-            result.append(func_dict)
+            result = [func for func in result if func["is_enabled"] == is_enabled]
         
         return {
             "success": True,
@@ -162,100 +73,14 @@ async def get_function(
     获取单个功能的配置
     """
     try:
-        func = db.query(FunctionModule).filter(
-            FunctionModule.function_key == function_key
-        ).first()
+        func_dict = await FunctionConfigService.get_function(db, function_key)
         
-        if not func:
+        if not func_dict:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="功能不存在"
             )
         
-        # 对于定制化批量分析，获取所有6个工作流配置
-        if function_key == "custom_operation_data_analysis":
-            # 获取所有sheet_index的工作流绑定（0-5）
-            bindings = db.query(WorkflowBinding).filter(
-                WorkflowBinding.function_key == function_key,
-                WorkflowBinding.user_id.is_(None),
-                WorkflowBinding.sheet_index.isnot(None)
-            ).order_by(WorkflowBinding.sheet_index).all()
-            
-            workflows = []
-            for binding in bindings:
-                workflow_obj = db.query(Workflow).filter(Workflow.id == binding.workflow_id).first()
-                if workflow_obj:
-                    workflows.append({
-                        "sheet_index": binding.sheet_index,
-                        "workflow": WorkflowResponse(
-                            id=workflow_obj.id,
-                            name=workflow_obj.name,
-                            category=workflow_obj.category,
-                            platform=workflow_obj.platform,
-                            config=workflow_obj.config,
-                            description=workflow_obj.description,
-                            is_active=workflow_obj.is_active,
-                            created_by=workflow_obj.created_by,
-                            created_at=workflow_obj.created_at,
-                            updated_at=workflow_obj.updated_at
-                        )
-                    })
-            
-            func_dict = {
-                "id": func.id,
-                "function_key": func.function_key,
-                "name": func.name,
-                "description": func.description,
-                "route_path": func.route_path,
-                "icon": func.icon,
-                "category": func.category,
-                "is_enabled": func.is_enabled,
-                "sort_order": func.sort_order,
-                "created_at": func.created_at,
-                "updated_at": func.updated_at,
-                "workflow": None,
-                "workflows": workflows  # 多个工作流配置
-            }
-        else:
-            # 其他功能，获取单个工作流配置
-            binding = db.query(WorkflowBinding).filter(
-                WorkflowBinding.function_key == function_key,
-                WorkflowBinding.user_id.is_(None),
-                WorkflowBinding.sheet_index.is_(None)  # 非定制化批量分析，sheet_index为None
-            ).first()
-            
-            workflow = None
-            if binding:
-                workflow_obj = db.query(Workflow).filter(Workflow.id == binding.workflow_id).first()
-                if workflow_obj:
-                    workflow = WorkflowResponse(
-                        id=workflow_obj.id,
-                        name=workflow_obj.name,
-                        category=workflow_obj.category,
-                        platform=workflow_obj.platform,
-                        config=workflow_obj.config,
-                        description=workflow_obj.description,
-                        is_active=workflow_obj.is_active,
-                        created_by=workflow_obj.created_by,
-                        created_at=workflow_obj.created_at,
-                        updated_at=workflow_obj.updated_at
-                    )
-            
-            func_dict = {
-                "id": func.id,
-                "function_key": func.function_key,
-                "name": func.name,
-                "description": func.description,
-                "route_path": func.route_path,
-                "icon": func.icon,
-                "category": func.category,
-                "is_enabled": func.is_enabled,
-                "sort_order": func.sort_order,
-                "created_at": func.created_at,
-                "updated_at": func.updated_at,
-                "workflow": workflow
-            }
-        
         return {
             "success": True,
             "data": func_dict,
@@ -359,6 +184,8 @@ async def set_function_config(
             db.add(binding)
             db.commit()
         
+        await FunctionConfigService.invalidate()
+        
         return {
             "success": True,
             "data": {
@@ -492,6 +319,8 @@ async def set_custom_batch_config(
                 db.commit()
                 workflow_ids.append(workflow.id)
         
+        await FunctionConfigService.invalidate()
+        
         return {
             "success": True,
             "data": {
@@ -505,6 +334,8 @@ async def set_custom_batch_config(
         raise
     except Exception as e:
         db.rollback()
+        # 逐个Sheet提交，失败前已提交的部分也需要刷新缓存
+        await FunctionConfigService.invalidate()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"配置API失败: {str(e)}"
@@ -569,6 +400,8 @@ async def update_function_config(
         db.commit()
         db.refresh(workflow)
         
+        await FunctionConfigService.invalidate()
+        
         return {
             "success": True,
             "data": {
@@ -664,6 +497,8 @@ async def delete_function_config(
                 db.delete(binding)
             db.commit()
             
+            await FunctionConfigService.invalidate()
+            
             return {
                 "success": True,
                 "data": {
@@ -689,6 +524,8 @@ async def delete_function_config(
         db.delete(binding)
         db.commit()
         
+        await FunctionConfigService.invalidate()
+        
         return {
             "success": True,
             "data": {
@@ -731,6 +568,8 @@ async def toggle_function(
         db.commit()
         db.refresh(func)
         
+        await FunctionConfigService.invalidate()
+        
         return {
             "success": True,
             "data": {
@@ -748,3 +587,38 @@ async def toggle_function(
             detail=f"更新功能状态失败: {str(e)}"
         )
 
+
+
+@router.get("/metrics", response_model=SuccessResponse[dict])
+async def get_metrics(
+    current_user: User = Depends(get_current_superadmin)
+):
+    """
+    进程内运行指标：按路由的SQL统计（查询数、数据库耗时、疑似N+1）、批量分析各阶段耗时、
+    大模型调度、PDF渲染、产物缓存、报告结构缓存、当前用户缓存、密码哈希线程池和读写分离路由
+    """
+    from app.core.query_stats import query_metrics
+    from app.services.sheet_pipeline import pipeline_metrics
+    from app.services.llm_scheduler import llm_scheduler
+    from app.services.pdf_render_service import pdf_render_service
+    from app.services.artifact_cache_service import artifact_cache
+    from app.services.principal_cache_service import principal_cache
+    from app.services.password_hash_service import password_hasher
+    from app.core.database import db_router
+    from app.utils import report_ast
+    
+    return {
+        "success": True,
+        "data": {
+            "sql": query_metrics.snapshot(),
+            "pipeline": pipeline_metrics.snapshot(),
+            "llm_scheduler": llm_scheduler.snapshot(),
+            "pdf_render": pdf_render_service.snapshot(),
+            "artifact_cache": artifact_cache.snapshot(),
+            "report_ast_cache": report_ast.cache_stats(),
+            "principal_cache": principal_cache.snapshot(),
+            "password_hash": password_hasher.snapshot(),
+            "db_routing": db_router.snapshot(),
+        },
+        "message": "获取运行指标成功"
+    }
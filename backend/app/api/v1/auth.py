@@ -9,8 +9,9 @@ from app.core.redis import RedisClient
 from app.schemas.auth import LoginRequest, LoginResponse, UserInfo, ChangePasswordRequest, RegisterRequest
 from app.schemas.common import SuccessResponse
 from app.services.auth_service import AuthService
+from app.services.password_hash_service import password_hasher
+from app.services.principal_cache_service import principal_cache
 from app.auth.dependencies import get_current_active_user
-from app.core.security import get_password_hash, verify_password
 from app.models.user import User
 
 
@@ -113,7 +114,7 @@ async def register(
     # 创建新用户（普通用户）
     new_user = User(
         username=register_data.username,
-        password_hash=get_password_hash(register_data.password),
+        password_hash=await password_hasher.hash(register_data.password),
         email=register_data.email,
         full_name=register_data.full_name,
         is_active=True,
@@ -210,17 +211,28 @@ async def change_password(
     
     - 验证旧密码
     - 更新为新密码
+    - 已签发的Token和其他会话失效，需要重新登录
     """
+    # current_user 来自缓存，不含密码哈希，从数据库重新查询
+    user = db.query(User).filter(User.id == current_user.id).first()
+    if not user:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="用户不存在"
+        )
+    
     # 验证旧密码
-    if not verify_password(password_data.old_password, current_user.password_hash):
+    if not await password_hasher.verify(password_data.old_password, user.password_hash):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="旧密码错误"
         )
     
     # 更新密码
-    current_user.password_hash = get_password_hash(password_data.new_password)
+    user.password_hash = await password_hasher.hash(password_data.new_password)
+    user.token_version = (user.token_version or 0) + 1
     db.commit()
+    await principal_cache.invalidate(user.id)
     
     return SuccessResponse(message="密码修改成功")
 
@@ -1,8 +1,9 @@
 """
 运营数据分析API（简化版，移除项目依赖）
 """
-from fastapi import APIRouter, Depends, HTTPException, status, Query, UploadFile, File, Form, Path as PathParam
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Header, UploadFile, File, Form, Path as PathParam
 from fastapi.responses import FileResponse, StreamingResponse, Response
+from sqlalchemy import tuple_
 from sqlalchemy.orm import Session
 from typing import Optional, List
 import asyncio
@@ -15,19 +16,28 @@ from datetime import datetime, timedelta
 from pydantic import BaseModel
 from fastapi import Body
 
-from app.api.deps import get_db
+from app.api.deps import get_db, get_read_db
 from app.schemas.common import SuccessResponse
 from app.auth.dependencies import get_current_active_user
 from app.models.user import User
-from app.models.batch_analysis import BatchAnalysisSession, SheetReport
-from app.models.custom_batch_analysis import CustomBatchAnalysisSession, CustomSheetReport
 from app.models.session import AnalysisSession
 from app.models.workflow import Workflow, WorkflowBinding
 from app.services.workflow_service import WorkflowService
+from app.services.session_message_service import SessionMessageService
+from app.services.session_version_service import SessionVersionService
+from app.services.search_service import SearchService, SEARCH_TYPES
 from app.services.dify_service import DifyService
 from app.services.excel_service import ExcelService
-from app.api.v1.operation_batch import process_all_sheets_concurrently
-from app.api.v1.operation_custom_batch import process_all_custom_sheets_concurrently
+from app.services.batch_progress_service import BatchProgressService
+from app.services.sheet_lease_service import SheetLeaseService, BATCH_MODELS
+from app.services.llm_scheduler import set_llm_context, PRIORITY_DIALOG, PRIORITY_REPORT
+from app.api.v1.operation_batch import batch_pipeline
+from app.api.v1.operation_custom_batch import custom_batch_pipeline
+from app.services.sheet_pipeline import SheetAnalysisPipeline
+from app.services.pdf_render_service import pdf_render_service, RenderBusyError, RenderTimeoutError
+from app.services.artifact_cache_service import artifact_cache
+from app.services.content_store_service import content_store, ref_key
+from app.services.batch_export_service import BatchExportService
 from app.utils.echarts_parser import parse_echarts_from_text
 
 router = APIRouter()
@@ -39,7 +49,7 @@ DEFAULT_PROJECT_ID = 1
 # ==================== 数据模型 ====================
 
 class ChartImage(BaseModel):
-    """图表图片数据"""
+    """图表图片数据（仅HTML图表需要上传截图，ECharts图表由服务端按配置渲染）"""
     index: int
     title: str
     image: str  # Base64编码的图片数据
@@ -56,6 +66,48 @@ class DownloadBatchReportRequest(BaseModel):
 
 # ==================== 单文件分析API ====================
 
+
+def _session_status(last_role: Optional[str], last_message_at: Optional[datetime]) -> str:
+    """
+    根据最后一条消息计算会话状态：无消息为draft；最后是用户消息或1小时内的assistant消息为in_progress；否则为completed
+    """
+    if not last_role:
+        return "draft"
+    if last_role != "assistant":
+        return "in_progress"
+    if last_message_at and (datetime.utcnow() - last_message_at) < timedelta(hours=1):
+        return "in_progress"
+    return "completed"
+
+
+def _encode_session_cursor(updated_at: datetime, session_id: int) -> str:
+    """会话列表游标：最后一条记录的 (updated_at, id)"""
+    raw = json.dumps([updated_at.isoformat(), session_id]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def _decode_session_cursor(cursor: str):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        updated_at, session_id = json.loads(raw)
+        return datetime.fromisoformat(updated_at), int(session_id)
+    except Exception:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="无效的分页游标"
+        )
+
+
+def _release_batch_content(db: Session, kind: str, batch_session_id: int) -> None:
+    """释放批量会话下各Sheet报告引用的内容存储对象（删除批量会话前调用，不提交事务）"""
+    _, sheet_model, fk_column = BATCH_MODELS[kind]
+    refs = db.query(sheet_model.report_content[ref_key("html_charts")].astext).filter(
+        getattr(sheet_model, fk_column) == batch_session_id,
+        sheet_model.report_content.has_key(ref_key("html_charts"))
+    ).all()
+    content_store.release(db, [ref for (ref,) in refs])
+
+
 @router.post("/sessions", response_model=SuccessResponse)
 async def create_session(
     request_data: Optional[dict] = Body(default=None),
@@ -83,8 +135,7 @@ async def create_session(
             user_id=current_user.id,
             function_key=function_key,
             workflow_id=workflow_id,
-            title=title,
-            messages=[]
+            title=title
         )
         db.add(conversation)
         db.commit()
@@ -117,18 +168,32 @@ async def get_sessions(
     page: int = Query(1, ge=1),
     page_size: int = Query(20, ge=1, le=100),
     search: Optional[str] = None,
-    db: Session = Depends(get_db),
+    cursor: Optional[str] = Query(None, description="上一页返回的 next_cursor；传入时忽略page"),
+    db: Session = Depends(get_read_db),
     current_user: User = Depends(get_current_active_user)
 ):
     """
     获取会话列表（简化版，移除project_id参数）
+    
+    只查询列表需要的列（消息数、最后一条消息的角色和时间来自会话表上的冗余字段），
+    按 (updated_at, id) 倒序；传 cursor 时使用游标分页，深翻页不再受OFFSET影响。
     """
-    logger.info(f"[运营数据分析] 获取会话列表 - user_id={current_user.id}, page={page}, search={search}")
+    logger.info(f"[运营数据分析] 获取会话列表 - user_id={current_user.id}, page={page}, cursor={cursor}, search={search}")
+    
+    cursor_key = _decode_session_cursor(cursor) if cursor else None
     
     try:
         # 1. 构建查询（单项目系统，不需要project_id过滤）
         function_key = "operation_data_analysis"
-        query = db.query(AnalysisSession).filter(
+        query = db.query(
+            AnalysisSession.id,
+            AnalysisSession.title,
+            AnalysisSession.created_at,
+            AnalysisSession.updated_at,
+            AnalysisSession.message_count,
+            AnalysisSession.last_role,
+            AnalysisSession.last_message_at
+        ).filter(
             AnalysisSession.function_key == function_key,
             AnalysisSession.user_id == current_user.id
         )
@@ -137,62 +202,42 @@ async def get_sessions(
         if search:
             query = query.filter(AnalysisSession.title.ilike(f"%{search}%"))
         
-        # 3. 获取总数
-        total = query.count()
+        # 3. 获取总数（游标翻页时不再重复统计）
+        total = query.count() if cursor_key is None else None
         
-        # 4. 分页查询
-        conversations = query.order_by(AnalysisSession.updated_at.desc()).offset(
-            (page - 1) * page_size
-        ).limit(page_size).all()
+        # 4. 分页查询（多取一条判断是否还有下一页）
+        query = query.order_by(AnalysisSession.updated_at.desc(), AnalysisSession.id.desc())
+        if cursor_key is not None:
+            query = query.filter(tuple_(AnalysisSession.updated_at, AnalysisSession.id) < cursor_key)
+        else:
+            query = query.offset((page - 1) * page_size)
+        rows = query.limit(page_size + 1).all()
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+        next_cursor = _encode_session_cursor(rows[-1].updated_at, rows[-1].id) if has_more else None
         
         # 5. 构建响应数据
-        items = []
-        for conv in conversations:
-            # 计算状态
-            status_val = "draft"
-            if conv.messages:
-                last_msg = conv.messages[-1]
-                if last_msg.get("role") == "assistant":
-                    try:
-                        last_time_str = last_msg.get("timestamp", "")
-                        if last_time_str:
-                            last_time = datetime.fromisoformat(last_time_str.replace('Z', '+00:00'))
-                            if last_time.tzinfo is None:
-                                last_time = last_time.replace(tzinfo=None)
-                                now = datetime.utcnow()
-                            else:
-                                now = datetime.utcnow().replace(tzinfo=None)
-                                last_time = last_time.replace(tzinfo=None)
-                            
-                            if (now - last_time) < timedelta(hours=1):
-                                status_val = "in_progress"
-                            else:
-                                status_val = "completed"
-                        else:
-                            status_val = "completed"
-                    except Exception as e:
-                        logger.warning(f"[运营数据分析] 解析消息时间戳失败 - conversation_id={conv.id}, error={str(e)}")
-                        status_val = "completed"
-                else:
-                    status_val = "in_progress"
-            
-            items.append({
-                "id": conv.id,
-                "title": conv.title,
-                "status": status_val,
-                "created_at": conv.created_at.isoformat(),
-                "updated_at": conv.updated_at.isoformat(),
-                "message_count": len(conv.messages) if conv.messages else 0
-            })
+        items = [
+            {
+                "id": row.id,
+                "title": row.title,
+                "status": _session_status(row.last_role, row.last_message_at),
+                "created_at": row.created_at.isoformat(),
+                "updated_at": row.updated_at.isoformat(),
+                "message_count": row.message_count
+            }
+            for row in rows
+        ]
         
-        logger.info(f"[运营数据分析] 获取会话列表成功 - total={total}, items_count={len(items)}")
+        logger.info(f"[运营数据分析] 获取会话列表成功 - total={total}, items_count={len(items)}, has_more={has_more}")
         
         return SuccessResponse(
             data={
                 "items": items,
                 "total": total,
                 "page": page,
-                "page_size": page_size
+                "page_size": page_size,
+                "next_cursor": next_cursor
             }
         )
     except Exception as e:
@@ -203,11 +248,64 @@ async def get_sessions(
         )
 
 
+@router.get("/search", response_model=SuccessResponse)
+async def search_sessions_and_reports(
+    q: str = Query(..., min_length=2, max_length=100, description="搜索关键词"),
+    types: Optional[str] = Query(None, description=f"逗号分隔的搜索范围：{','.join(SEARCH_TYPES)}，默认全部"),
+    limit: int = Query(20, ge=1, le=50),
+    db: Session = Depends(get_read_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    搜索会话标题、批量分析文件名、Sheet名称和报告正文（按相似度排序，返回摘要和命中位置）
+    """
+    type_list = [t.strip() for t in types.split(",") if t.strip()] if types else None
+    if type_list:
+        invalid = [t for t in type_list if t not in SEARCH_TYPES]
+        if invalid:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"不支持的搜索范围: {','.join(invalid)}"
+            )
+    
+    try:
+        items = SearchService.search(db, current_user.id, q, type_list, limit)
+        return SuccessResponse(data={"query": q, "items": items})
+    except Exception as e:
+        logger.error(f"[运营数据分析] 搜索失败 - user_id={current_user.id}, query={q!r}, error={str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"搜索失败: {str(e)}"
+        )
+
+
+@router.get("/content/{digest}")
+async def get_stored_content(
+    digest: str = PathParam(..., description="内容的SHA-256"),
+    accept_encoding: Optional[str] = Header(default=None, alias="Accept-Encoding"),
+    if_none_match: Optional[str] = Header(default=None, alias="If-None-Match"),
+    db: Session = Depends(get_read_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    按哈希获取内容存储中的对象（HTML图表等），内容不可变，响应可被浏览器永久缓存
+
+    哈希只出现在用户有权访问的会话/报告数据中，这里只校验登录状态。
+    """
+    response = content_store.response(db, digest, accept_encoding, if_none_match)
+    if response is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="内容不存在"
+        )
+    return response
+
+
 @router.get("/sessions/{id}", response_model=SuccessResponse)
 async def get_session_detail(
     id: int = PathParam(..., description="会话ID"),
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """
     获取会话详情（简化版，移除project_id参数）
@@ -229,42 +327,18 @@ async def get_session_detail(
                 detail="会话不存在"
             )
         
-        # 2. 计算状态
-        status_val = "draft"
-        if conversation.messages:
-            last_msg = conversation.messages[-1]
-            if last_msg.get("role") == "assistant":
-                try:
-                    last_time_str = last_msg.get("timestamp", "")
-                    if last_time_str:
-                        last_time = datetime.fromisoformat(last_time_str.replace('Z', '+00:00'))
-                        if last_time.tzinfo is None:
-                            last_time = last_time.replace(tzinfo=None)
-                            now = datetime.utcnow()
-                        else:
-                            now = datetime.utcnow().replace(tzinfo=None)
-                            last_time = last_time.replace(tzinfo=None)
-                        
-                        if (now - last_time) < timedelta(hours=1):
-                            status_val = "in_progress"
-                        else:
-                            status_val = "completed"
-                    else:
-                        status_val = "completed"
-                except Exception as e:
-                    logger.warning(f"[运营数据分析] 解析消息时间戳失败 - conversation_id={conversation.id}, error={str(e)}")
-                    status_val = "completed"
-            else:
-                status_val = "in_progress"
+        # 2. 读取消息并计算状态
+        messages = SessionMessageService.list_messages(db, conversation.id)
+        status_val = _session_status(conversation.last_role, conversation.last_message_at)
         
-        logger.info(f"[运营数据分析] 获取会话详情成功 - conversation_id={id}, messages_count={len(conversation.messages) if conversation.messages else 0}")
+        logger.info(f"[运营数据分析] 获取会话详情成功 - conversation_id={id}, messages_count={len(messages)}")
         
         return SuccessResponse(
             data={
                 "id": conversation.id,
                 "title": conversation.title,
                 "status": status_val,
-                "messages": conversation.messages if conversation.messages else [],
+                "messages": messages,
                 "created_at": conversation.created_at.isoformat(),
                 "updated_at": conversation.updated_at.isoformat()
             }
@@ -308,6 +382,10 @@ async def delete_session(
                 detail="会话不存在"
             )
         
+        # 释放消息和版本引用的内容存储对象（与删除在同一事务中提交）
+        SessionMessageService.release_content(db, id)
+        SessionVersionService.release_content(db, id)
+        
         # 2. 先删除所有关联的对话历史记录
         try:
             dialog_histories = db.query(DialogHistory).filter(
@@ -367,13 +445,11 @@ async def delete_session(
 async def get_session_versions(
     id: int = PathParam(..., description="会话ID"),
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """
     获取会话的所有版本列表
     """
-    from app.models.session_version import AnalysisSessionVersion
-    
     logger.info(f"[版本管理] 获取版本列表 - session_id={id}, user_id={current_user.id}")
     
     try:
@@ -391,24 +467,12 @@ async def get_session_versions(
                 detail="会话不存在或无权限访问"
             )
         
-        # 2. 获取所有版本
-        versions = db.query(AnalysisSessionVersion).filter(
-            AnalysisSessionVersion.session_id == id
-        ).order_by(AnalysisSessionVersion.version_no.desc()).all()
-        
-        # 3. 找到当前版本（最新的）
-        current_version_id = versions[0].id if versions else None
-        
-        # 4. 构建响应数据
-        versions_data = []
-        for v in versions:
-            versions_data.append({
-                "id": v.id,
-                "version_no": v.version_no,
-                "summary": v.summary,
-                "created_at": v.created_at.isoformat() if v.created_at else None,
-                "is_current": v.id == current_version_id
-            })
+        # 2. 获取所有版本（只查询元数据，不读取内容）
+        versions_data = SessionVersionService.list_versions(db, id)
+        
+        # 3. 标记当前版本（最新的）
+        for index, v in enumerate(versions_data):
+            v["is_current"] = index == 0
         
         logger.info(f"[版本管理] 获取版本列表成功 - session_id={id}, count={len(versions_data)}")
         
@@ -431,7 +495,7 @@ async def get_session_version_detail(
     id: int = PathParam(..., description="会话ID"),
     version_id: int = PathParam(..., description="版本ID"),
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """
     获取某个版本的详细内容
@@ -467,14 +531,16 @@ async def get_session_version_detail(
                 detail="版本不存在"
             )
         
-        # 3. 构建响应数据
+        # 3. 还原版本内容并构建响应数据
+        content = SessionVersionService.get_content(db, version)
         version_data = {
             "id": version.id,
             "version_no": version.version_no,
             "summary": version.summary,
-            "report_text": version.report_text,
-            "report_html_charts": version.report_html_charts,
-            "report_charts_json": version.report_charts_json,
+            "report_text": content["report_text"],
+            "report_html_charts": content["report_html_charts"],
+            "report_html_charts_ref": content["report_html_charts_ref"],
+            "report_charts_json": content["report_charts_json"],
             "created_at": version.created_at.isoformat() if version.created_at else None
         }
         
@@ -510,7 +576,6 @@ async def create_session_version(
         report_charts_json?: any  # JSON图表配置
     }
     """
-    from app.models.session_version import AnalysisSessionVersion
     from app.services.dialog_manager import DialogManager
     
     logger.info(f"[版本管理] 创建新版本 - session_id={id}, user_id={current_user.id}")
@@ -530,41 +595,35 @@ async def create_session_version(
                 detail="会话不存在或无权限访问"
             )
         
-        # 2. 获取当前最大版本号
-        max_version = db.query(AnalysisSessionVersion).filter(
-            AnalysisSessionVersion.session_id == id
-        ).order_by(AnalysisSessionVersion.version_no.desc()).first()
-        
-        new_version_no = (max_version.version_no + 1) if max_version else 1
-        
-        # 3. 如果没有提供报告内容，尝试从会话消息中获取
+        # 2. 如果没有提供报告内容，尝试从会话消息中获取
         report_text = payload.get("report_text")
         report_html_charts = payload.get("report_html_charts")
         report_charts_json = payload.get("report_charts_json")
         
-        if not report_text and conversation.messages:
+        if not report_text:
             # 从最后一条 assistant 消息获取
-            for msg in reversed(conversation.messages):
-                if msg.get("role") == "assistant":
-                    report_text = msg.get("content", "")
-                    report_charts_json = msg.get("charts")
-                    break
-        
-        # 4. 创建新版本
-        new_version = AnalysisSessionVersion(
+            last_assistant_msg = SessionMessageService.latest(db, id, role="assistant")
+            if last_assistant_msg:
+                report_text = last_assistant_msg.get("content", "")
+                report_charts_json = last_assistant_msg.get("charts")
+        
+        # 3. 创建新版本（与上一版本相比只保存增量，定期保存完整快照）
+        new_version = SessionVersionService.create_version(
+            db,
             session_id=id,
-            version_no=new_version_no,
-            summary=payload.get("summary", f"版本 {new_version_no}"),
-            report_text=report_text,
-            report_html_charts=report_html_charts,
-            report_charts_json=report_charts_json,
+            summary=payload.get("summary"),
+            content={
+                "report_text": report_text,
+                "report_html_charts": report_html_charts,
+                "report_charts_json": report_charts_json
+            },
             created_by=current_user.id
         )
-        db.add(new_version)
         db.commit()
         db.refresh(new_version)
+        new_version_no = new_version.version_no
         
-        # 5. 在对话历史中添加版本保存点标记
+        # 4. 在对话历史中添加版本保存点标记
         dialog_manager = DialogManager()
         dialog_manager.save_message_to_db(
             db=db,
@@ -703,6 +762,7 @@ async def generate_report(
 
     logger.info(f"[运营数据分析] 生成报告 - session_id={session_id}, file_id={file_id}, user_id={current_user.id}")
     logger.info(f"[运营数据分析] 分析需求: {analysis_request[:100]}...")
+    set_llm_context(current_user.id, PRIORITY_REPORT)
 
     try:
         function_key = "operation_data_analysis"
@@ -833,10 +893,7 @@ async def generate_report(
                 if report_content.get("tables"):
                     assistant_message["tables"] = report_content["tables"]
                 
-                if not conversation.messages:
-                    conversation.messages = []
-                conversation.messages.append(user_message)
-                conversation.messages.append(assistant_message)
+                saved_rows = SessionMessageService.append(db, conversation.id, [user_message, assistant_message])
                 
                 if conversation.title.startswith("数据分析会话_"):
                     if user_message.get("file_name"):
@@ -844,7 +901,7 @@ async def generate_report(
                         conversation.title = file_name_without_ext
                 
                 db.commit()
-                logger.info(f"[运营数据分析] 对话消息已保存到会话 - session_id={session_id}, messages_count={len(conversation.messages)}")
+                logger.info(f"[运营数据分析] 对话消息已保存到会话 - session_id={session_id}, last_seq={saved_rows[-1].seq}")
         except Exception as e:
             logger.error(f"[运营数据分析] 保存对话消息失败 - session_id={session_id}, error={str(e)}")
         
@@ -906,6 +963,7 @@ async def modify_chart(
     
     logger.info(f"[图表修改] 收到修改请求 - session_id={session_id}, user_id={current_user.id}")
     logger.info(f"[图表修改] 修改参数 - color={color}, type={chart_type}, ai={ai_instruction[:50] if ai_instruction else None}")
+    set_llm_context(current_user.id, PRIORITY_DIALOG)
     
     try:
         # 验证会话存在且属于当前用户
@@ -956,6 +1014,64 @@ async def modify_chart(
         )
 
 
+async def _report_pdf_response(log_tag: str, filename: str, **render_kwargs) -> Response:
+    """
+    返回报告PDF：按内容哈希命中产物缓存时直接发送缓存文件，
+    否则由渲染进程写入临时文件，移入缓存后分块发送（Web进程不持有整份PDF）
+    """
+    cache_key = artifact_cache.make_key(
+        "pdf",
+        render_kwargs["title"],
+        render_kwargs["report_content"],
+        render_kwargs.get("chart_images")
+    )
+    cached_path = artifact_cache.get(cache_key, "pdf")
+    if cached_path:
+        logger.info(f"{log_tag} PDF命中产物缓存 - key={cache_key[:16]}")
+        return artifact_cache.file_response(cached_path, filename, "pdf")
+    
+    tmp_path = artifact_cache.temp_path("pdf")
+    try:
+        await _render_report_pdf(log_tag, tmp_path, **render_kwargs)
+    except BaseException:
+        artifact_cache.discard(tmp_path)
+        raise
+    
+    cached_path = await asyncio.to_thread(artifact_cache.commit, cache_key, "pdf", tmp_path)
+    if cached_path:
+        return artifact_cache.file_response(cached_path, filename, "pdf")
+    # 缓存未启用或写入失败：发送临时文件后删除
+    return artifact_cache.temp_file_response(tmp_path, filename, "pdf")
+
+
+async def _render_report_pdf(log_tag: str, output_path: Path, **render_kwargs) -> int:
+    """在PDF渲染进程池中生成报告PDF并写入 output_path，队列已满返回503（附Retry-After），超时返回504"""
+    try:
+        pdf_size = await pdf_render_service.render_pdf(str(output_path), **render_kwargs)
+    except RenderBusyError as e:
+        logger.warning(f"{log_tag} PDF渲染繁忙 - {pdf_render_service.snapshot()}")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="PDF生成繁忙，请稍后重试",
+            headers={"Retry-After": str(e.retry_after)}
+        )
+    except RenderTimeoutError as e:
+        logger.error(f"{log_tag} PDF生成超时: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+            detail="PDF生成超时，请稍后重试"
+        )
+    except Exception as e:
+        logger.error(f"{log_tag} PDF生成失败: {str(e)}", exc_info=True)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"PDF生成失败: {str(e)}"
+        )
+    
+    logger.info(f"{log_tag} PDF生成成功 - 大小: {pdf_size} bytes")
+    return pdf_size
+
+
 @router.post("/reports/{report_id}/download")
 async def download_report_pdf(
     report_id: str = PathParam(..., description="报告ID（实际使用session_id获取报告）"),
@@ -987,21 +1103,12 @@ async def download_report_pdf(
                 detail="会话不存在或无权限访问"
             )
         
-        logger.info(f"[运营数据分析] 找到会话 - conversation_id={conversation.id}, title={conversation.title}, messages_count={len(conversation.messages) if conversation.messages else 0}")
+        logger.info(f"[运营数据分析] 找到会话 - conversation_id={conversation.id}, title={conversation.title}")
         
         # 2. 从最后一条assistant消息中获取报告内容
         report_content = None
         try:
-            if conversation.messages:
-                assistant_messages = [msg for msg in conversation.messages if msg.get("role") == "assistant"]
-                if assistant_messages:
-                    last_assistant_msg = assistant_messages[-1]
-                    report_content = {
-                        "text": str(last_assistant_msg.get("content", "")),
-                        "charts": last_assistant_msg.get("charts", []) or [],
-                        "tables": last_assistant_msg.get("tables", []) or [],
-                        "metrics": last_assistant_msg.get("metrics", {}) or {}
-                    }
+            report_content = SessionMessageService.latest_report_content(db, conversation.id)
         except Exception as e:
             logger.error(f"[运营数据分析] 获取报告内容时出错: {str(e)}", exc_info=True)
             raise HTTPException(
@@ -1032,33 +1139,16 @@ async def download_report_pdf(
                 except Exception as e:
                     logger.error(f"[运营数据分析] ✗ 解析图表图片失败: {str(e)}")
         
-        # 4. 生成PDF
-        try:
-            from app.utils.pdf_generator import generate_report_pdf
-            
-            pdf_bytes = generate_report_pdf(
-                title=str(conversation.title or "数据分析报告"),
-                report_content=report_content,
-                session_id=request_data.session_id,
-                chart_images=chart_images_data
-            )
-            logger.info(f"[运营数据分析] PDF生成成功 - 大小: {len(pdf_bytes)} bytes")
-        except Exception as e:
-            logger.error(f"[运营数据分析] PDF生成失败: {str(e)}", exc_info=True)
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail=f"PDF生成失败: {str(e)}"
-            )
-        
-        # 5. 返回PDF文件
+        # 4. 生成并返回PDF文件（内容未变化时直接返回缓存的产物）
         filename = f"{conversation.title or '数据分析报告'}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
         
-        return Response(
-            content=pdf_bytes,
-            media_type="application/pdf",
-            headers={
-                "Content-Disposition": f'attachment; filename="{filename}"'
-            }
+        return await _report_pdf_response(
+            "[运营数据分析]",
+            filename,
+            title=str(conversation.title or "数据分析报告"),
+            report_content=report_content,
+            session_id=request_data.session_id,
+            chart_images=chart_images_data
         )
         
     except HTTPException:
@@ -1079,11 +1169,15 @@ async def download_report_pdf(
 async def download_report_image(
     report_id: str = PathParam(..., description="报告ID（实际使用session_id获取报告）"),
     session_id: int = Query(..., description="会话ID"),
+    layout: str = Query("long", pattern="^(long|pages)$", description="图片版式：long（一张长图）或pages（按页拆分的PNG，打包为ZIP）"),
+    range_header: Optional[str] = Header(default=None, alias="Range"),
     current_user: User = Depends(get_current_active_user),
     db: Session = Depends(get_db)
 ):
     """
     下载报告图片（PNG格式，避免PDF中文乱码问题）（简化版，移除project_id参数）
+    
+    图片分块绘制并流式编码到磁盘文件，内存占用与报告长度无关；超长报告可选择分页下载
     """
     import traceback
     logger.info(f"[运营数据分析] ====== 开始下载报告图片 ======")
@@ -1107,16 +1201,7 @@ async def download_report_image(
         # 2. 从最后一条assistant消息中获取报告内容
         report_content = None
         try:
-            if conversation.messages:
-                assistant_messages = [msg for msg in conversation.messages if msg.get("role") == "assistant"]
-                if assistant_messages:
-                    last_assistant_msg = assistant_messages[-1]
-                    report_content = {
-                        "text": str(last_assistant_msg.get("content", "")),
-                        "charts": last_assistant_msg.get("charts", []) or [],
-                        "tables": last_assistant_msg.get("tables", []) or [],
-                        "metrics": last_assistant_msg.get("metrics", {}) or {}
-                    }
+            report_content = SessionMessageService.latest_report_content(db, conversation.id)
         except Exception as e:
             logger.error(f"[运营数据分析] 获取报告内容时出错: {str(e)}", exc_info=True)
             raise HTTPException(
@@ -1133,33 +1218,47 @@ async def download_report_image(
         if not report_content.get("text"):
             report_content["text"] = "报告内容为空"
         
-        # 3. 生成图片
+        artifact_type = "zip" if layout == "pages" else "png"
+        filename = f"{conversation.title or '数据分析报告'}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{artifact_type}"
+        report_title = str(conversation.title or "数据分析报告")
+        
+        # 3. 内容未变化时直接返回缓存的产物
+        cache_key = artifact_cache.make_key(artifact_type, report_title, report_content)
+        cached_path = artifact_cache.get(cache_key, artifact_type)
+        if cached_path:
+            logger.info(f"[运营数据分析] 图片命中产物缓存 - key={cache_key[:16]}")
+            return artifact_cache.file_response(cached_path, filename, artifact_type, range_header)
+        
+        # 4. 生成图片（在线程中分块渲染并写入临时文件，不阻塞事件循环）
+        tmp_path = artifact_cache.temp_path(artifact_type)
         try:
-            from app.utils.image_generator import generate_report_image
+            from app.utils.image_generator import write_report_image
             
-            image_bytes = generate_report_image(
-                title=str(conversation.title or "数据分析报告"),
-                report_content=report_content,
-                session_id=session_id
-            )
-            logger.info(f"[运营数据分析] 图片生成成功 - 大小: {len(image_bytes)} bytes")
+            def render_image() -> int:
+                with open(tmp_path, "wb") as output:
+                    return write_report_image(
+                        output,
+                        title=report_title,
+                        report_content=report_content,
+                        session_id=session_id,
+                        paginate=layout == "pages"
+                    )
+            
+            image_size = await asyncio.to_thread(render_image)
+            logger.info(f"[运营数据分析] 图片生成成功 - layout={layout}, 大小: {image_size} bytes")
         except Exception as e:
+            artifact_cache.discard(tmp_path)
             logger.error(f"[运营数据分析] 图片生成失败: {str(e)}", exc_info=True)
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=f"图片生成失败: {str(e)}"
             )
         
-        # 4. 返回图片文件
-        filename = f"{conversation.title or '数据分析报告'}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.png"
-        
-        return Response(
-            content=image_bytes,
-            media_type="image/png",
-            headers={
-                "Content-Disposition": f'attachment; filename="{filename}"'
-            }
-        )
+        # 5. 移入缓存后发送；缓存未启用或写入失败时发送临时文件后删除
+        cached_path = await asyncio.to_thread(artifact_cache.commit, cache_key, artifact_type, tmp_path)
+        if cached_path:
+            return artifact_cache.file_response(cached_path, filename, artifact_type, range_header)
+        return artifact_cache.temp_file_response(tmp_path, filename, artifact_type, range_header)
         
     except HTTPException:
         raise
@@ -1191,162 +1290,25 @@ async def download_template(
     )
 
 
-# ==================== 批量分析相关API ====================
-
-@router.post("/batch/upload", response_model=SuccessResponse)
-async def upload_batch_excel(
-    file: UploadFile = File(...),
-    analysis_request: str = Form("生成数据分析报告"),
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
-):
-    """
-    上传多Sheet Excel文件并拆分（简化版，移除project_id参数）
-    拆分完成后自动开始批量分析
-    """
-    logger.info(f"[批量分析] 上传文件 - filename={file.filename}, user_id={current_user.id}")
-    
-    # 1. 验证文件
-    if not file.filename:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="文件名不能为空"
-        )
-    
-    file_ext = Path(file.filename).suffix.lower()
-    if file_ext not in ['.xlsx']:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="批量分析只支持 .xlsx 格式的文件"
-        )
-    
-    # 验证文件大小（20MB）
-    file_content = await file.read()
-    file_size = len(file_content)
-    max_size = 20 * 1024 * 1024  # 20MB
-    
-    if file_size > max_size:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="文件大小不能超过20MB"
-        )
-    
-    try:
-        # 2. 创建批量会话记录（使用固定项目ID）
-        batch_session = BatchAnalysisSession(
-            user_id=current_user.id,
-            original_file_name=file.filename,
-            original_file_path="",
-            split_files_dir="",
-            sheet_count=0,
-            status="processing"
-        )
-        db.add(batch_session)
-        db.flush()
-        
-        batch_session_id = batch_session.id
-        logger.info(f"[批量分析] 创建批量会话 - batch_session_id={batch_session_id}")
-        
-        # 3. 保存原始文件
-        batch_dir = Path(f"uploads/operation/project_{DEFAULT_PROJECT_ID}/batch/batch_{batch_session_id}")
-        original_dir = batch_dir / "original"
-        sheets_dir = batch_dir / "sheets"
-        
-        original_dir.mkdir(parents=True, exist_ok=True)
-        sheets_dir.mkdir(parents=True, exist_ok=True)
-        
-        original_file_path = original_dir / file.filename
-        with open(original_file_path, "wb") as f:
-            f.write(file_content)
-        
-        logger.info(f"[批量分析] 原始文件已保存 - path={original_file_path}")
-        
-        # 4. 拆分Excel文件
-        logger.info(f"[批量分析] 开始拆分Excel文件...")
-        split_files = ExcelService.split_excel_file(
-            source_file_path=str(original_file_path),
-            output_dir=sheets_dir,
-            batch_session_id=batch_session_id
-        )
-        
-        sheet_count = len(split_files)
-        logger.info(f"[批量分析] 拆分完成 - sheet_count={sheet_count}")
-        
-        # 验证所有拆分文件都存在
-        for sheet_info in split_files:
-            split_path = Path(sheet_info["split_file_path"])
-            if not split_path.exists():
-                logger.error(f"[批量分析] 拆分文件不存在: {split_path}")
-                raise Exception(f"拆分文件不存在: {split_path}")
-        
-        # 5. 更新批量会话记录
-        batch_session.original_file_path = str(original_file_path)
-        batch_session.split_files_dir = str(sheets_dir)
-        batch_session.sheet_count = sheet_count
-        
-        # 6. 为每个Sheet创建报告记录
-        sheet_reports = []
-        for sheet_info in split_files:
-            sheet_report = SheetReport(
-                batch_session_id=batch_session_id,
-                sheet_name=sheet_info["sheet_name"],
-                sheet_index=sheet_info["sheet_index"],
-                split_file_path=sheet_info["split_file_path"],
-                report_status="pending"
-            )
-            db.add(sheet_report)
-            sheet_reports.append(sheet_report)
-        
-        db.commit()
-        logger.info(f"[批量分析] 批量会话和Sheet报告记录已创建")
-        
-        # 7. 返回结果
-        return SuccessResponse(
-            data={
-                "batch_session_id": batch_session_id,
-                "sheet_count": sheet_count,
-                "sheets": [
-                    {
-                        "id": sr.id,
-                        "sheet_name": sr.sheet_name,
-                        "sheet_index": sr.sheet_index,
-                        "split_file_path": sr.split_file_path,
-                        "report_status": sr.report_status
-                    }
-                    for sr in sheet_reports
-                ],
-                "status": batch_session.status
-            },
-            message="文件上传成功，已拆分完成"
-        )
-    
-    except Exception as e:
-        db.rollback()
-        logger.error(f"[批量分析] 上传和拆分失败: {str(e)}", exc_info=True)
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"文件上传和拆分失败: {str(e)}"
-        )
-
+# ==================== 批量分析公共逻辑（批量/定制化批量共用） ====================
 
-@router.post("/batch/analyze", response_model=SuccessResponse)
-async def start_batch_analysis(
-    batch_session_id: int = Form(...),
-    analysis_request: str = Form(...),
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
-):
-    """
-    开始批量分析（异步处理）（简化版，移除project_id参数）
-    复用现有的 generate_report 逻辑，对每个Sheet重复调用
-    """
-    logger.info(f"[批量分析] 开始批量分析 - batch_session_id={batch_session_id}, user_id={current_user.id}")
+async def _start_batch_analysis(
+    pipeline: SheetAnalysisPipeline,
+    batch_session_id: int,
+    analysis_request: str,
+    db: Session,
+    current_user: User
+) -> SuccessResponse:
+    """保存分析需求并启动后台任务处理所有待处理的Sheet"""
+    tag = pipeline.config.log_tag
+    session_model, sheet_model = pipeline.session_model, pipeline.sheet_model
+    logger.info(f"{tag} 开始批量分析 - batch_session_id={batch_session_id}, user_id={current_user.id}")
     
     try:
         # 1. 获取批量会话（使用固定项目ID）
-        batch_session = db.query(BatchAnalysisSession).filter(
-            BatchAnalysisSession.id == batch_session_id,
-            BatchAnalysisSession.user_id == current_user.id
+        batch_session = db.query(session_model).filter(
+            session_model.id == batch_session_id,
+            session_model.user_id == current_user.id
         ).first()
         
         if not batch_session:
@@ -1356,10 +1318,10 @@ async def start_batch_analysis(
             )
         
         # 2. 获取所有待处理的Sheet报告
-        sheet_reports = db.query(SheetReport).filter(
-            SheetReport.batch_session_id == batch_session_id,
-            SheetReport.report_status == "pending"
-        ).order_by(SheetReport.sheet_index).all()
+        sheet_reports = db.query(sheet_model).filter(
+            getattr(sheet_model, pipeline.fk_column) == batch_session_id,
+            sheet_model.report_status == "pending"
+        ).order_by(sheet_model.sheet_index).all()
         
         if not sheet_reports:
             raise HTTPException(
@@ -1367,82 +1329,15 @@ async def start_batch_analysis(
                 detail="没有待处理的Sheet报告"
             )
         
-        logger.info(f"[批量分析] 找到 {len(sheet_reports)} 个待处理的Sheet")
+        logger.info(f"{tag} 找到 {len(sheet_reports)} 个待处理的Sheet")
         
-        # 3. 更新批量会话状态
+        # 3. 更新批量会话状态（保存分析需求，重试时复用）
         batch_session.status = "processing"
+        batch_session.analysis_request = analysis_request
         db.commit()
         
-        # 4. 启动异步任务处理每个Sheet
-        async def run_batch_analysis():
-            """后台异步任务"""
-            try:
-                from app.core.database import SessionLocal
-                background_db = SessionLocal()
-                
-                try:
-                    background_sheet_reports = background_db.query(SheetReport).filter(
-                        SheetReport.batch_session_id == batch_session_id
-                    ).order_by(SheetReport.sheet_index).all()
-                    
-                    # 并发处理所有Sheet（移除project_id参数）
-                    results = await process_all_sheets_concurrently(
-                        sheet_reports=background_sheet_reports,
-                        analysis_request=analysis_request,
-                        user_id=current_user.id,
-                        batch_session_id=batch_session_id,
-                        db=background_db
-                    )
-                    
-                    # 更新批量会话状态
-                    background_batch_session = background_db.query(BatchAnalysisSession).filter(
-                        BatchAnalysisSession.id == batch_session_id
-                    ).first()
-                    
-                    if background_batch_session:
-                        completed_count = background_db.query(SheetReport).filter(
-                            SheetReport.batch_session_id == batch_session_id,
-                            SheetReport.report_status == "completed"
-                        ).count()
-                        
-                        failed_count = background_db.query(SheetReport).filter(
-                            SheetReport.batch_session_id == batch_session_id,
-                            SheetReport.report_status == "failed"
-                        ).count()
-                        
-                        total_count = background_batch_session.sheet_count
-                        
-                        if completed_count == total_count:
-                            background_batch_session.status = "completed"
-                        elif failed_count == total_count:
-                            background_batch_session.status = "failed"
-                        elif failed_count > 0:
-                            background_batch_session.status = "partial_failed"
-                        else:
-                            background_batch_session.status = "processing"
-                        
-                        background_db.commit()
-                        logger.info(f"[批量分析] 批量分析完成 - batch_session_id={batch_session_id}, completed={completed_count}, failed={failed_count}")
-                
-                finally:
-                    background_db.close()
-            
-            except Exception as e:
-                logger.error(f"[批量分析] 后台任务执行失败: {str(e)}", exc_info=True)
-                from app.core.database import SessionLocal
-                error_db = SessionLocal()
-                try:
-                    error_batch_session = error_db.query(BatchAnalysisSession).filter(
-                        BatchAnalysisSession.id == batch_session_id
-                    ).first()
-                    if error_batch_session:
-                        error_batch_session.status = "failed"
-                        error_db.commit()
-                finally:
-                    error_db.close()
-        
-        # 启动后台任务
-        asyncio.create_task(run_batch_analysis())
+        # 4. 启动后台任务
+        pipeline.start_batch(batch_session_id, analysis_request, current_user.id)
         
         # 5. 返回处理状态
         return SuccessResponse(
@@ -1458,28 +1353,126 @@ async def start_batch_analysis(
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"[批量分析] 启动批量分析失败: {str(e)}", exc_info=True)
+        logger.error(f"{tag} 启动批量分析失败: {str(e)}", exc_info=True)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"启动批量分析失败: {str(e)}"
         )
 
 
-@router.get("/batch/{batch_session_id}/status", response_model=SuccessResponse)
-async def get_batch_analysis_status(
-    batch_session_id: int = PathParam(..., description="批量会话ID"),
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
-):
-    """
-    获取批量分析状态（简化版，移除project_id参数）
-    """
-    logger.info(f"[批量分析] 查询状态 - batch_session_id={batch_session_id}, user_id={current_user.id}")
+async def _retry_batch_analysis(
+    pipeline: SheetAnalysisPipeline,
+    batch_session_id: int,
+    analysis_request: Optional[str],
+    db: Session,
+    current_user: User
+) -> SuccessResponse:
+    """重新排队失败或中断的Sheet并启动后台任务（分析需求变化时清除检查点）"""
+    tag = pipeline.config.log_tag
+    kind = pipeline.config.kind
+    session_model = pipeline.session_model
+    logger.info(f"{tag} 重试批量分析 - batch_session_id={batch_session_id}, user_id={current_user.id}")
+    
+    try:
+        # 1. 获取批量会话
+        batch_session = db.query(session_model).filter(
+            session_model.id == batch_session_id,
+            session_model.user_id == current_user.id
+        ).first()
+        
+        if not batch_session:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="批量会话不存在或无权限访问"
+            )
+        
+        # 2. 回收租约过期的generating记录，并把失败或已取消的Sheet重新排队
+        reclaimed_ids = await SheetLeaseService.reclaim_stale(db, kind, batch_session_id)
+        requeued_ids = SheetLeaseService.requeue_failed(db, kind, batch_session_id)
+        db.commit()
+        db.refresh(batch_session)
+        
+        progress = BatchProgressService.to_progress(batch_session)
+        if progress["pending_sheets"] == 0:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="没有需要重试的Sheet（失败、中断或已取消的Sheet）"
+            )
+        
+        retry_request = analysis_request or batch_session.analysis_request or "生成数据分析报告"
+
+        # 3. 分析需求变化时清除待处理Sheet的检查点（旧需求生成的文字/图表不能复用），并更新批量会话状态
+        if retry_request != batch_session.analysis_request:
+            cleared = SheetLeaseService.clear_checkpoints(db, kind, batch_session_id)
+            logger.info(f"{tag} 分析需求已变化，清除检查点 - batch_session_id={batch_session_id}, sheets={cleared}")
+        batch_session.status = "processing"
+        batch_session.analysis_request = retry_request
+        db.commit()
+        await BatchProgressService.publish(kind, batch_session_id, BatchProgressService.snapshot(batch_session))
+        
+        logger.info(f"{tag} 重新排队 - batch_session_id={batch_session_id}, failed={len(requeued_ids)}, stale={len(reclaimed_ids)}, pending={progress['pending_sheets']}")
+        
+        # 4. 启动后台任务（只处理pending的Sheet）
+        pipeline.start_batch(batch_session_id, retry_request, current_user.id)
+        
+        return SuccessResponse(
+            data={
+                "batch_session_id": batch_session_id,
+                "status": "processing",
+                "retry_sheets": progress["pending_sheets"],
+                "requeued_failed": len(requeued_ids),
+                "reclaimed_stale": len(reclaimed_ids),
+                "completed_sheets": progress["completed_sheets"]
+            },
+            message="已重新排队失败的Sheet，正在后台处理"
+        )
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        db.rollback()
+        logger.error(f"{tag} 重试批量分析失败: {str(e)}", exc_info=True)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"重试批量分析失败: {str(e)}"
+        )
+
+
+async def _get_batch_analysis_status(
+    pipeline: SheetAnalysisPipeline,
+    batch_session_id: int,
+    include_reports: bool,
+    db: Session,
+    current_user: User
+) -> SuccessResponse:
+    """读取物化计数器返回批量分析进度，include_reports=false 时优先命中Redis镜像"""
+    tag = pipeline.config.log_tag
+    session_model, sheet_model = pipeline.session_model, pipeline.sheet_model
+    logger.info(f"{tag} 查询状态 - batch_session_id={batch_session_id}, user_id={current_user.id}")
+    
+    # 仅查询进度：命中Redis镜像时无需访问数据库
+    if not include_reports:
+        cached = await BatchProgressService.get_cached(pipeline.config.kind, batch_session_id)
+        if isinstance(cached, dict) and cached.get("user_id") == current_user.id:
+            return SuccessResponse(
+                data={
+                    "batch_session_id": batch_session_id,
+                    "status": cached.get("status"),
+                    "total_sheets": cached.get("total_sheets", 0),
+                    "completed_sheets": cached.get("completed_sheets", 0),
+                    "failed_sheets": cached.get("failed_sheets", 0),
+                    "generating_sheets": cached.get("generating_sheets", 0),
+                    "pending_sheets": cached.get("pending_sheets", 0),
+                    "cancelled_sheets": cached.get("cancelled_sheets", 0),
+                    "reports": []
+                },
+                message="状态查询成功"
+            )
     
-    # 1. 获取批量会话（使用固定项目ID）
-    batch_session = db.query(BatchAnalysisSession).filter(
-        BatchAnalysisSession.id == batch_session_id,
-        BatchAnalysisSession.user_id == current_user.id
+    # 1. 获取批量会话
+    batch_session = db.query(session_model).filter(
+        session_model.id == batch_session_id,
+        session_model.user_id == current_user.id
     ).first()
     
     if not batch_session:
@@ -1488,16 +1481,15 @@ async def get_batch_analysis_status(
             detail="批量会话不存在或无权限访问"
         )
     
-    # 2. 获取所有Sheet报告
-    sheet_reports = db.query(SheetReport).filter(
-        SheetReport.batch_session_id == batch_session_id
-    ).order_by(SheetReport.sheet_index).all()
+    # 2. 统计状态（物化计数器，O(1)）
+    progress = BatchProgressService.to_progress(batch_session)
     
-    # 3. 统计状态
-    total_sheets = len(sheet_reports)
-    completed_sheets = sum(1 for sr in sheet_reports if sr.report_status == "completed")
-    failed_sheets = sum(1 for sr in sheet_reports if sr.report_status == "failed")
-    generating_sheets = sum(1 for sr in sheet_reports if sr.report_status == "generating")
+    # 3. 获取所有Sheet报告
+    sheet_reports = []
+    if include_reports:
+        sheet_reports = db.query(sheet_model).filter(
+            getattr(sheet_model, pipeline.fk_column) == batch_session_id
+        ).order_by(sheet_model.sheet_index).all()
     
     # 4. 构建报告列表
     reports_data = []
@@ -1511,7 +1503,7 @@ async def get_batch_analysis_status(
         
         if sr.report_status == "completed" and sr.report_content:
             report_data["report_content"] = sr.report_content
-        elif sr.report_status == "failed" and sr.error_message:
+        elif sr.report_status in ("failed", "cancelled") and sr.error_message:
             report_data["error_message"] = sr.error_message
         
         reports_data.append(report_data)
@@ -1520,51 +1512,336 @@ async def get_batch_analysis_status(
         data={
             "batch_session_id": batch_session_id,
             "status": batch_session.status,
-            "total_sheets": total_sheets,
-            "completed_sheets": completed_sheets,
-            "failed_sheets": failed_sheets,
-            "generating_sheets": generating_sheets,
-            "pending_sheets": total_sheets - completed_sheets - failed_sheets - generating_sheets,
+            "total_sheets": progress["total_sheets"],
+            "completed_sheets": progress["completed_sheets"],
+            "failed_sheets": progress["failed_sheets"],
+            "generating_sheets": progress["generating_sheets"],
+            "pending_sheets": progress["pending_sheets"],
+            "cancelled_sheets": progress["cancelled_sheets"],
             "reports": reports_data
         },
         message="状态查询成功"
     )
 
 
-@router.get("/batch/reports/{report_id}", response_model=SuccessResponse)
-async def get_sheet_report(
-    report_id: int = PathParam(..., description="报告ID"),
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
-):
-    """
-    获取单个报告详情（简化版，移除project_id参数）
-    """
-    logger.info(f"[批量分析] 查询报告详情 - report_id={report_id}, user_id={current_user.id}")
+async def _cancel_batch_analysis(
+    pipeline: SheetAnalysisPipeline,
+    batch_session_id: int,
+    db: Session,
+    current_user: User
+) -> SuccessResponse:
+    """取消批量分析：未完成的Sheet标记为cancelled，并终止后台任务释放并发名额"""
+    tag = pipeline.config.log_tag
+    kind = pipeline.config.kind
+    session_model = pipeline.session_model
+    logger.info(f"{tag} 取消批量分析 - batch_session_id={batch_session_id}, user_id={current_user.id}")
     
-    # 1. 获取报告
-    sheet_report = db.query(SheetReport).filter(
-        SheetReport.id == report_id
+    try:
+        # 1. 获取批量会话（行锁，避免与重试/状态汇总并发修改）
+        batch_session = db.query(session_model).filter(
+            session_model.id == batch_session_id,
+            session_model.user_id == current_user.id
+        ).with_for_update().first()
+        
+        if not batch_session:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="批量会话不存在或无权限访问"
+            )
+        
+        if batch_session.status != "processing" and not pipeline.is_running(batch_session_id):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="批量分析未在进行中，无需取消"
+            )
+        
+        # 2. 先落库取消状态：其他进程中的任务续约失败后终止，排队中的Sheet不再被领取
+        cancelled_ids = SheetLeaseService.cancel_unfinished(db, kind, batch_session_id)
+        batch_session.status = "cancelled"
+        db.commit()
+        db.refresh(batch_session)
+        await BatchProgressService.publish(kind, batch_session_id, BatchProgressService.snapshot(batch_session))
+        
+        # 3. 取消本进程内的后台任务（中断进行中的流式请求，立即归还并发名额）
+        task_cancelled = pipeline.cancel_batch(batch_session_id)
+        
+        progress = BatchProgressService.to_progress(batch_session)
+        logger.info(f"{tag} 批量分析已取消 - batch_session_id={batch_session_id}, cancelled={len(cancelled_ids)}, task_cancelled={task_cancelled}")
+        
+        return SuccessResponse(
+            data={
+                "batch_session_id": batch_session_id,
+                "status": "cancelled",
+                "cancelled_sheets": len(cancelled_ids),
+                "completed_sheets": progress["completed_sheets"],
+                "failed_sheets": progress["failed_sheets"]
+            },
+            message="批量分析已取消"
+        )
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        db.rollback()
+        logger.error(f"{tag} 取消批量分析失败: {str(e)}", exc_info=True)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"取消批量分析失败: {str(e)}"
+        )
+
+
+async def _export_batch_reports(
+    pipeline: SheetAnalysisPipeline,
+    batch_session_id: int,
+    export_format: str,
+    range_header: Optional[str],
+    db: Session,
+    current_user: User
+) -> Response:
+    """导出批量会话中所有已完成的报告：zip为并行渲染后流式输出，pdf为带目录的合并文档"""
+    tag = pipeline.config.log_tag
+    session_model, sheet_model = pipeline.session_model, pipeline.sheet_model
+    logger.info(f"{tag} 批量导出 - batch_session_id={batch_session_id}, format={export_format}, user_id={current_user.id}")
+    
+    # 1. 获取批量会话
+    batch_session = db.query(session_model).filter(
+        session_model.id == batch_session_id,
+        session_model.user_id == current_user.id
     ).first()
     
+    if not batch_session:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="批量会话不存在或无权限访问"
+        )
+    
+    # 2. 获取已完成的Sheet报告
+    sheet_reports = db.query(sheet_model).filter(
+        getattr(sheet_model, pipeline.fk_column) == batch_session_id,
+        sheet_model.report_status == "completed"
+    ).order_by(sheet_model.sheet_index).all()
+    
+    sheet_reports = [sr for sr in sheet_reports if sr.report_content]
+    if not sheet_reports:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="没有已完成的报告可导出"
+        )
+    
+    # 3. 在请求线程内取出渲染参数，流式响应期间不再访问数据库
+    entries = [
+        (BatchExportService.entry_name(sr), BatchExportService.sheet_render_kwargs(sr, batch_session_id))
+        for sr in sheet_reports
+    ]
+    filename = f"batch_{batch_session_id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{export_format}"
+    
+    if export_format == "zip":
+        return StreamingResponse(
+            BatchExportService.stream_zip(entries, tag),
+            media_type="application/zip",
+            headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+        )
+    
+    # 4. 合并PDF
+    title = f"{Path(batch_session.original_file_name).stem} - 批量分析报告"
+    sections = [render_kwargs for _, render_kwargs in entries]
+    try:
+        pdf_path, is_temp = await BatchExportService.render_merged_pdf(title, sections, tag)
+    except RenderBusyError as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="PDF生成繁忙，请稍后重试",
+            headers={"Retry-After": str(e.retry_after)}
+        )
+    except RenderTimeoutError as e:
+        logger.error(f"{tag} 合并PDF生成超时: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+            detail="PDF生成超时，请改用ZIP导出"
+        )
+    except Exception as e:
+        logger.error(f"{tag} 合并PDF生成失败: {str(e)}", exc_info=True)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"PDF生成失败: {str(e)}"
+        )
+    
+    logger.info(f"{tag} 合并PDF导出完成 - sheets={len(sections)}, path={pdf_path.name}")
+    if is_temp:
+        return artifact_cache.temp_file_response(pdf_path, filename, "pdf", range_header)
+    return artifact_cache.file_response(pdf_path, filename, "pdf", range_header)
+
+
+async def _upload_batch_excel(
+    pipeline: SheetAnalysisPipeline,
+    file: UploadFile,
+    db: Session,
+    current_user: User
+) -> SuccessResponse:
+    """上传多Sheet Excel文件，拆分后创建批量会话和各Sheet的报告记录"""
+    tag = pipeline.config.log_tag
+    kind = pipeline.config.kind
+    session_model, sheet_model = pipeline.session_model, pipeline.sheet_model
+    logger.info(f"{tag} 上传文件 - filename={file.filename}, user_id={current_user.id}")
+
+    # 1. 验证文件
+    if not file.filename:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="文件名不能为空"
+        )
+
+    file_ext = Path(file.filename).suffix.lower()
+    if file_ext not in ['.xlsx']:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="批量分析只支持 .xlsx 格式的文件"
+        )
+
+    # 验证文件大小（20MB）
+    file_content = await file.read()
+    file_size = len(file_content)
+    max_size = 20 * 1024 * 1024  # 20MB
+
+    if file_size > max_size:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="文件大小不能超过20MB"
+        )
+
+    try:
+        # 2. 创建批量会话记录（使用固定项目ID）
+        batch_session = session_model(
+            user_id=current_user.id,
+            original_file_name=file.filename,
+            original_file_path="",
+            split_files_dir="",
+            sheet_count=0,
+            status="processing"
+        )
+        db.add(batch_session)
+        db.flush()
+
+        batch_session_id = batch_session.id
+        logger.info(f"{tag} 创建批量会话 - batch_session_id={batch_session_id}")
+
+        # 3. 保存原始文件
+        batch_dir = Path(f"uploads/operation/project_{DEFAULT_PROJECT_ID}/{pipeline.config.upload_dir}/batch_{batch_session_id}")
+        original_dir = batch_dir / "original"
+        sheets_dir = batch_dir / "sheets"
+
+        original_dir.mkdir(parents=True, exist_ok=True)
+        sheets_dir.mkdir(parents=True, exist_ok=True)
+
+        original_file_path = original_dir / file.filename
+        with open(original_file_path, "wb") as f:
+            f.write(file_content)
+
+        logger.info(f"{tag} 原始文件已保存 - path={original_file_path}")
+
+        # 4. 拆分Excel文件
+        logger.info(f"{tag} 开始拆分Excel文件...")
+        split_files = ExcelService.split_excel_file(
+            source_file_path=str(original_file_path),
+            output_dir=sheets_dir,
+            batch_session_id=batch_session_id
+        )
+
+        sheet_count = len(split_files)
+        logger.info(f"{tag} 拆分完成 - sheet_count={sheet_count}")
+
+        # 验证所有拆分文件都存在
+        for sheet_info in split_files:
+            split_path = Path(sheet_info["split_file_path"])
+            if not split_path.exists():
+                logger.error(f"{tag} 拆分文件不存在: {split_path}")
+                raise Exception(f"拆分文件不存在: {split_path}")
+
+        # 5. 更新批量会话记录
+        batch_session.original_file_path = str(original_file_path)
+        batch_session.split_files_dir = str(sheets_dir)
+        batch_session.sheet_count = sheet_count
+        BatchProgressService.init_counters(batch_session, sheet_count)
+
+        # 6. 为每个Sheet创建报告记录
+        sheet_reports = []
+        for sheet_info in split_files:
+            sheet_report = sheet_model(
+                sheet_name=sheet_info["sheet_name"],
+                sheet_index=sheet_info["sheet_index"],
+                split_file_path=sheet_info["split_file_path"],
+                report_status="pending"
+            )
+            setattr(sheet_report, pipeline.fk_column, batch_session_id)
+            db.add(sheet_report)
+            sheet_reports.append(sheet_report)
+
+        db.commit()
+        await BatchProgressService.publish(kind, batch_session_id, BatchProgressService.snapshot(batch_session))
+        logger.info(f"{tag} 批量会话和Sheet报告记录已创建")
+
+        # 7. 返回结果
+        return SuccessResponse(
+            data={
+                "batch_session_id": batch_session_id,
+                "sheet_count": sheet_count,
+                "sheets": [
+                    {
+                        "id": sr.id,
+                        "sheet_name": sr.sheet_name,
+                        "sheet_index": sr.sheet_index,
+                        "split_file_path": sr.split_file_path,
+                        "report_status": sr.report_status
+                    }
+                    for sr in sheet_reports
+                ],
+                "status": batch_session.status
+            },
+            message="文件上传成功，已拆分完成"
+        )
+
+    except Exception as e:
+        db.rollback()
+        logger.error(f"{tag} 上传和拆分失败: {str(e)}", exc_info=True)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"文件上传和拆分失败: {str(e)}"
+        )
+
+
+async def _get_sheet_report(
+    pipeline: SheetAnalysisPipeline,
+    report_id: int,
+    db: Session,
+    current_user: User
+) -> SuccessResponse:
+    """查询单个Sheet报告详情（通过所属批量会话校验权限）"""
+    session_model, sheet_model = pipeline.session_model, pipeline.sheet_model
+    logger.info(f"{pipeline.config.log_tag} 查询报告详情 - report_id={report_id}, user_id={current_user.id}")
+
+    # 1. 获取报告
+    sheet_report = db.query(sheet_model).filter(
+        sheet_model.id == report_id
+    ).first()
+
     if not sheet_report:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="报告不存在"
         )
-    
+
     # 2. 验证权限（通过批量会话验证，使用固定项目ID）
-    batch_session = db.query(BatchAnalysisSession).filter(
-        BatchAnalysisSession.id == sheet_report.batch_session_id,
-        BatchAnalysisSession.user_id == current_user.id
+    batch_session = db.query(session_model).filter(
+        session_model.id == getattr(sheet_report, pipeline.fk_column),
+        session_model.user_id == current_user.id
     ).first()
-    
+
     if not batch_session:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="无权限访问此报告"
         )
-    
+
     # 3. 构建响应数据
     report_data = {
         "id": sheet_report.id,
@@ -1576,65 +1853,67 @@ async def get_sheet_report(
         "created_at": sheet_report.created_at.isoformat() if sheet_report.created_at else None,
         "updated_at": sheet_report.updated_at.isoformat() if sheet_report.updated_at else None
     }
-    
+
     return SuccessResponse(
         data=report_data,
         message="报告查询成功"
     )
 
 
-@router.post("/batch/reports/{report_id}/download")
-async def download_batch_report_pdf(
-    report_id: int = PathParam(..., description="报告ID"),
-    request_data: DownloadBatchReportRequest = Body(...),
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
-):
-    """
-    下载批量分析报告PDF（支持图表图片）（简化版，移除project_id参数）
-    """
+async def _download_batch_report_pdf(
+    pipeline: SheetAnalysisPipeline,
+    report_id: int,
+    request_data: Optional[DownloadBatchReportRequest],
+    db: Session,
+    current_user: User
+) -> Response:
+    """生成并返回单个Sheet报告的PDF（内容未变化时直接返回缓存的产物）"""
     import traceback
-    logger.info(f"[批量分析] ====== 开始下载报告PDF ======")
-    logger.info(f"[批量分析] report_id={report_id}, user_id={current_user.id}")
-    logger.info(f"[批量分析] 收到 {len(request_data.chart_images) if request_data.chart_images else 0} 个图表图片")
-    
+    tag = pipeline.config.log_tag
+    session_model, sheet_model = pipeline.session_model, pipeline.sheet_model
+    request_data = request_data or DownloadBatchReportRequest()
+    logger.info(f"{tag} ====== 开始下载报告PDF ======")
+    logger.info(f"{tag} report_id={report_id}, user_id={current_user.id}")
+    logger.info(f"{tag} 收到 {len(request_data.chart_images) if request_data.chart_images else 0} 个图表图片")
+
     try:
         # 1. 获取Sheet报告
-        sheet_report = db.query(SheetReport).filter(
-            SheetReport.id == report_id
+        sheet_report = db.query(sheet_model).filter(
+            sheet_model.id == report_id
         ).first()
-        
+
         if not sheet_report:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="报告不存在"
             )
-        
+
         # 2. 验证权限（使用固定项目ID）
-        batch_session = db.query(BatchAnalysisSession).filter(
-            BatchAnalysisSession.id == sheet_report.batch_session_id,
-            BatchAnalysisSession.user_id == current_user.id
+        batch_session_id = getattr(sheet_report, pipeline.fk_column)
+        batch_session = db.query(session_model).filter(
+            session_model.id == batch_session_id,
+            session_model.user_id == current_user.id
         ).first()
-        
+
         if not batch_session:
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail="无权限访问此报告"
             )
-        
+
         # 3. 检查报告状态和内容
         if sheet_report.report_status != "completed":
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail=f"报告尚未完成，当前状态: {sheet_report.report_status}"
             )
-        
+
         if not sheet_report.report_content:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="报告内容不存在"
             )
-        
+
         # 4. 获取报告内容
         report_content = {
             "text": str(sheet_report.report_content.get("text", "")),
@@ -1642,10 +1921,10 @@ async def download_batch_report_pdf(
             "tables": sheet_report.report_content.get("tables", []) or [],
             "metrics": sheet_report.report_content.get("metrics", {}) or {}
         }
-        
+
         if not report_content.get("text"):
             report_content["text"] = "报告内容为空"
-        
+
         # 5. 处理图表图片
         chart_images_data = []
         if request_data.chart_images:
@@ -1658,71 +1937,54 @@ async def download_batch_report_pdf(
                         'image_data': image_data
                     })
                 except Exception as e:
-                    logger.error(f"[批量分析] ✗ 解析图表图片失败: {str(e)}")
-        
-        # 6. 生成PDF
-        try:
-            from app.utils.pdf_generator import generate_report_pdf
-            
-            report_title = f"{sheet_report.sheet_name} - 数据分析报告"
-            pdf_bytes = generate_report_pdf(
-                title=report_title,
-                report_content=report_content,
-                session_id=sheet_report.batch_session_id,
-                chart_images=chart_images_data
-            )
-            logger.info(f"[批量分析] PDF生成成功 - 大小: {len(pdf_bytes)} bytes")
-        except Exception as e:
-            logger.error(f"[批量分析] PDF生成失败: {str(e)}", exc_info=True)
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail=f"PDF生成失败: {str(e)}"
-            )
-        
-        # 7. 返回PDF文件
+                    logger.error(f"{tag} ✗ 解析图表图片失败: {str(e)}")
+
+        # 6. 生成并返回PDF文件（内容未变化时直接返回缓存的产物）
         filename = f"{sheet_report.sheet_name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
-        
-        return Response(
-            content=pdf_bytes,
-            media_type="application/pdf",
-            headers={
-                "Content-Disposition": f'attachment; filename="{filename}"'
-            }
+
+        return await _report_pdf_response(
+            tag,
+            filename,
+            title=f"{sheet_report.sheet_name} - 数据分析报告",
+            report_content=report_content,
+            session_id=batch_session_id,
+            chart_images=chart_images_data
         )
-        
+
     except HTTPException:
         raise
     except Exception as e:
         error_traceback = traceback.format_exc()
-        logger.error(f"[批量分析] ====== PDF下载失败 ======")
-        logger.error(f"[批量分析] 错误类型: {type(e).__name__}")
-        logger.error(f"[批量分析] 错误消息: {str(e)}")
-        logger.error(f"[批量分析] 完整堆栈:\n{error_traceback}")
+        logger.error(f"{tag} ====== PDF下载失败 ======")
+        logger.error(f"{tag} 错误类型: {type(e).__name__}")
+        logger.error(f"{tag} 错误消息: {str(e)}")
+        logger.error(f"{tag} 完整堆栈:\n{error_traceback}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"生成PDF失败: {str(e)}"
         )
 
 
-@router.post("/batch/sessions", response_model=SuccessResponse)
-async def create_batch_session(
-    request_data: Optional[dict] = Body(default=None),
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
-):
-    """
-    创建新的批量分析会话（简化版，移除project_id参数）
-    """
+async def _create_batch_session(
+    pipeline: SheetAnalysisPipeline,
+    request_data: Optional[dict],
+    db: Session,
+    current_user: User
+) -> SuccessResponse:
+    """创建草稿状态的批量会话（等待上传文件）"""
+    tag = pipeline.config.log_tag
+    name = pipeline.config.display_name
+    session_model = pipeline.session_model
     title = request_data.get("title") if request_data else None
-    logger.info(f"[批量分析] 创建会话 - user_id={current_user.id}, title={title}")
-    
+    logger.info(f"{tag} 创建会话 - user_id={current_user.id}, title={title}")
+
     try:
         # 生成标题
         if not title:
-            title = f"批量分析_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
-        
+            title = f"{name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+
         # 创建批量会话（初始状态为draft，等待上传文件）
-        batch_session = BatchAnalysisSession(
+        batch_session = session_model(
             user_id=current_user.id,
             original_file_name=title,
             original_file_path="",
@@ -1733,9 +1995,9 @@ async def create_batch_session(
         db.add(batch_session)
         db.commit()
         db.refresh(batch_session)
-        
-        logger.info(f"[批量分析] 会话创建成功 - batch_session_id={batch_session.id}, title={batch_session.original_file_name}")
-        
+
+        logger.info(f"{tag} 会话创建成功 - batch_session_id={batch_session.id}, title={batch_session.original_file_name}")
+
         # 返回响应
         return SuccessResponse(
             data={
@@ -1746,38 +2008,37 @@ async def create_batch_session(
                 "created_at": batch_session.created_at.isoformat() if batch_session.created_at else None,
                 "updated_at": batch_session.updated_at.isoformat() if batch_session.updated_at else None
             },
-            message="批量分析会话创建成功"
+            message=f"{name}会话创建成功"
         )
     except Exception as e:
-        logger.error(f"[批量分析] 创建会话失败 - error={str(e)}")
+        logger.error(f"{tag} 创建会话失败 - error={str(e)}")
         db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"创建批量分析会话失败: {str(e)}"
+            detail=f"创建{name}会话失败: {str(e)}"
         )
 
 
-@router.get("/batch/sessions", response_model=SuccessResponse)
-async def get_batch_sessions(
-    page: int = Query(1, ge=1),
-    page_size: int = Query(20, ge=1, le=100),
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
-):
-    """
-    获取批量分析会话列表（简化版，移除project_id参数）
-    """
-    logger.info(f"[批量分析] 查询会话列表 - user_id={current_user.id}")
-    
+async def _get_batch_sessions(
+    pipeline: SheetAnalysisPipeline,
+    page: int,
+    page_size: int,
+    db: Session,
+    current_user: User
+) -> SuccessResponse:
+    """分页查询批量会话列表（进度取自物化计数器）"""
+    session_model = pipeline.session_model
+    logger.info(f"{pipeline.config.log_tag} 查询会话列表 - user_id={current_user.id}")
+
     # 1. 查询批量会话（使用固定项目ID）
-    query = db.query(BatchAnalysisSession).filter(
-        BatchAnalysisSession.user_id == current_user.id
-    ).order_by(BatchAnalysisSession.created_at.desc())
-    
+    query = db.query(session_model).filter(
+        session_model.user_id == current_user.id
+    ).order_by(session_model.created_at.desc())
+
     # 2. 分页
     total = query.count()
     sessions = query.offset((page - 1) * page_size).limit(page_size).all()
-    
+
     # 3. 构建响应数据
     sessions_data = []
     for session in sessions:
@@ -1786,10 +2047,11 @@ async def get_batch_sessions(
             "original_file_name": session.original_file_name,
             "sheet_count": session.sheet_count,
             "status": session.status,
+            "progress": BatchProgressService.to_progress(session),
             "created_at": session.created_at.isoformat() if session.created_at else None,
             "updated_at": session.updated_at.isoformat() if session.updated_at else None
         })
-    
+
     return SuccessResponse(
         data={
             "sessions": sessions_data,
@@ -1804,36 +2066,42 @@ async def get_batch_sessions(
     )
 
 
-@router.delete("/batch/sessions/{batch_session_id}", response_model=SuccessResponse)
-async def delete_batch_session(
-    batch_session_id: int = PathParam(..., description="批量会话ID"),
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
-):
-    """
-    删除批量分析会话（简化版，移除project_id参数）
-    """
-    logger.info(f"[批量分析] 删除会话 - batch_session_id={batch_session_id}, user_id={current_user.id}")
-    
+async def _delete_batch_session(
+    pipeline: SheetAnalysisPipeline,
+    batch_session_id: int,
+    db: Session,
+    current_user: User
+) -> SuccessResponse:
+    """删除批量会话：终止后台任务，释放内容存储引用后级联删除Sheet报告"""
+    tag = pipeline.config.log_tag
+    kind = pipeline.config.kind
+    session_model = pipeline.session_model
+    logger.info(f"{tag} 删除会话 - batch_session_id={batch_session_id}, user_id={current_user.id}")
+
     try:
         # 1. 查询批量会话（使用固定项目ID）
-        batch_session = db.query(BatchAnalysisSession).filter(
-            BatchAnalysisSession.id == batch_session_id,
-            BatchAnalysisSession.user_id == current_user.id
+        batch_session = db.query(session_model).filter(
+            session_model.id == batch_session_id,
+            session_model.user_id == current_user.id
         ).first()
-        
+
         if not batch_session:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="批量会话不存在或无权限访问"
             )
-        
-        # 2. 删除会话（级联删除会同时删除相关的SheetReport记录）
+
+        # 2. 终止仍在运行的后台任务，避免继续调用大模型并写入已删除的记录
+        pipeline.cancel_batch(batch_session_id)
+
+        # 3. 删除会话（级联删除会同时删除相关的Sheet报告记录，先释放其引用的内容存储对象）
+        _release_batch_content(db, kind, batch_session_id)
         db.delete(batch_session)
         db.commit()
-        
-        logger.info(f"[批量分析] 会话删除成功 - batch_session_id={batch_session_id}")
-        
+        await BatchProgressService.clear(kind, batch_session_id)
+
+        logger.info(f"{tag} 会话删除成功 - batch_session_id={batch_session_id}")
+
         return SuccessResponse(
             data={"deleted_id": batch_session_id},
             message="会话删除成功"
@@ -1841,7 +2109,7 @@ async def delete_batch_session(
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"[批量分析] 删除会话失败 - batch_session_id={batch_session_id}, error={str(e)}")
+        logger.error(f"{tag} 删除会话失败 - batch_session_id={batch_session_id}, error={str(e)}")
         db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -1849,6 +2117,158 @@ async def delete_batch_session(
         )
 
 
+# ==================== 批量分析相关API ====================
+
+@router.post("/batch/upload", response_model=SuccessResponse)
+async def upload_batch_excel(
+    file: UploadFile = File(...),
+    analysis_request: str = Form("生成数据分析报告"),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    上传多Sheet Excel文件并拆分（简化版，移除project_id参数）
+    拆分完成后自动开始批量分析
+    """
+    return await _upload_batch_excel(batch_pipeline, file, db, current_user)
+
+
+@router.post("/batch/analyze", response_model=SuccessResponse)
+async def start_batch_analysis(
+    batch_session_id: int = Form(...),
+    analysis_request: str = Form(...),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    开始批量分析（异步处理）（简化版，移除project_id参数）
+    复用现有的 generate_report 逻辑，对每个Sheet重复调用
+    """
+    return await _start_batch_analysis(batch_pipeline, batch_session_id, analysis_request, db, current_user)
+
+
+@router.post("/batch/{batch_session_id}/retry", response_model=SuccessResponse)
+async def retry_batch_analysis(
+    batch_session_id: int = PathParam(..., description="批量会话ID"),
+    analysis_request: Optional[str] = Form(None),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    重试批量分析中失败或中断的Sheet
+    只重新排队 failed 和租约过期的 generating 记录，已完成的Sheet保持不变；
+    已成功的文字/图表阶段通过检查点复用，不会重复调用大模型；
+    传入新的分析需求时清除检查点，按新需求重新生成
+    """
+    return await _retry_batch_analysis(batch_pipeline, batch_session_id, analysis_request, db, current_user)
+
+
+@router.post("/batch/{batch_session_id}/cancel", response_model=SuccessResponse)
+async def cancel_batch_analysis(
+    batch_session_id: int = PathParam(..., description="批量会话ID"),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    取消批量分析
+    未完成的Sheet标记为cancelled，可通过重试接口继续
+    """
+    return await _cancel_batch_analysis(batch_pipeline, batch_session_id, db, current_user)
+
+
+@router.get("/batch/{batch_session_id}/export")
+async def export_batch_reports(
+    batch_session_id: int = PathParam(..., description="批量会话ID"),
+    export_format: str = Query("zip", alias="format", pattern="^(zip|pdf)$", description="导出格式：zip（每个Sheet一个PDF）或pdf（带目录的合并文档）"),
+    range_header: Optional[str] = Header(default=None, alias="Range"),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    导出批量分析的全部已完成报告
+    zip按Sheet并行渲染，完成一个写入一个；pdf合并为一份带目录的文档
+    """
+    return await _export_batch_reports(batch_pipeline, batch_session_id, export_format, range_header, db, current_user)
+
+
+@router.get("/batch/{batch_session_id}/status", response_model=SuccessResponse)
+async def get_batch_analysis_status(
+    batch_session_id: int = PathParam(..., description="批量会话ID"),
+    include_reports: bool = Query(True, description="是否返回各Sheet报告内容（仅轮询进度时可传false）"),
+    db: Session = Depends(get_read_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    获取批量分析状态（简化版，移除project_id参数）
+    进度统计读取批量会话上的物化计数器；include_reports=false 时优先命中Redis镜像
+    """
+    return await _get_batch_analysis_status(batch_pipeline, batch_session_id, include_reports, db, current_user)
+
+
+@router.get("/batch/reports/{report_id}", response_model=SuccessResponse)
+async def get_sheet_report(
+    report_id: int = PathParam(..., description="报告ID"),
+    db: Session = Depends(get_read_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    获取单个报告详情（简化版，移除project_id参数）
+    """
+    return await _get_sheet_report(batch_pipeline, report_id, db, current_user)
+
+
+@router.post("/batch/reports/{report_id}/download")
+async def download_batch_report_pdf(
+    report_id: int = PathParam(..., description="报告ID"),
+    request_data: Optional[DownloadBatchReportRequest] = Body(default=None),
+    current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """
+    下载批量分析报告PDF（支持图表图片）（简化版，移除project_id参数）
+
+    请求体可省略：ECharts图表由服务端按配置渲染，只有HTML图表需要上传截图
+    """
+    return await _download_batch_report_pdf(batch_pipeline, report_id, request_data, db, current_user)
+
+
+@router.post("/batch/sessions", response_model=SuccessResponse)
+async def create_batch_session(
+    request_data: Optional[dict] = Body(default=None),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    创建新的批量分析会话（简化版，移除project_id参数）
+    """
+    return await _create_batch_session(batch_pipeline, request_data, db, current_user)
+
+
+@router.get("/batch/sessions", response_model=SuccessResponse)
+async def get_batch_sessions(
+    page: int = Query(1, ge=1),
+    page_size: int = Query(20, ge=1, le=100),
+    db: Session = Depends(get_read_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    获取批量分析会话列表（简化版，移除project_id参数）
+    """
+    return await _get_batch_sessions(batch_pipeline, page, page_size, db, current_user)
+
+
+@router.delete("/batch/sessions/{batch_session_id}", response_model=SuccessResponse)
+async def delete_batch_session(
+    batch_session_id: int = PathParam(..., description="批量会话ID"),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    删除批量分析会话（简化版，移除project_id参数）
+    """
+    return await _delete_batch_session(batch_pipeline, batch_session_id, db, current_user)
+
+
 # ==================== 定制化批量分析相关API ====================
 
 @router.post("/custom-batch/upload", response_model=SuccessResponse)
@@ -1862,129 +2282,7 @@ async def upload_custom_batch_excel(
     上传多Sheet Excel文件并拆分（定制化批量分析）
     拆分完成后自动开始批量分析
     """
-    logger.info(f"[定制化批量分析] 上传文件 - filename={file.filename}, user_id={current_user.id}")
-    
-    # 1. 验证文件
-    if not file.filename:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="文件名不能为空"
-        )
-    
-    file_ext = Path(file.filename).suffix.lower()
-    if file_ext not in ['.xlsx']:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="批量分析只支持 .xlsx 格式的文件"
-        )
-    
-    # 验证文件大小（20MB）
-    file_content = await file.read()
-    file_size = len(file_content)
-    max_size = 20 * 1024 * 1024  # 20MB
-    
-    if file_size > max_size:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="文件大小不能超过20MB"
-        )
-    
-    try:
-        # 2. 创建批量会话记录（使用固定项目ID）
-        batch_session = CustomBatchAnalysisSession(
-            user_id=current_user.id,
-            original_file_name=file.filename,
-            original_file_path="",
-            split_files_dir="",
-            sheet_count=0,
-            status="processing"
-        )
-        db.add(batch_session)
-        db.flush()
-        
-        batch_session_id = batch_session.id
-        logger.info(f"[定制化批量分析] 创建批量会话 - batch_session_id={batch_session_id}")
-        
-        # 3. 保存原始文件（使用custom_batch目录）
-        batch_dir = Path(f"uploads/operation/project_{DEFAULT_PROJECT_ID}/custom_batch/batch_{batch_session_id}")
-        original_dir = batch_dir / "original"
-        sheets_dir = batch_dir / "sheets"
-        
-        original_dir.mkdir(parents=True, exist_ok=True)
-        sheets_dir.mkdir(parents=True, exist_ok=True)
-        
-        original_file_path = original_dir / file.filename
-        with open(original_file_path, "wb") as f:
-            f.write(file_content)
-        
-        logger.info(f"[定制化批量分析] 原始文件已保存 - path={original_file_path}")
-        
-        # 4. 拆分Excel文件
-        logger.info(f"[定制化批量分析] 开始拆分Excel文件...")
-        split_files = ExcelService.split_excel_file(
-            source_file_path=str(original_file_path),
-            output_dir=sheets_dir,
-            batch_session_id=batch_session_id
-        )
-        
-        sheet_count = len(split_files)
-        logger.info(f"[定制化批量分析] 拆分完成 - sheet_count={sheet_count}")
-        
-        # 验证所有拆分文件都存在
-        for sheet_info in split_files:
-            split_path = Path(sheet_info["split_file_path"])
-            if not split_path.exists():
-                logger.error(f"[定制化批量分析] 拆分文件不存在: {split_path}")
-                raise Exception(f"拆分文件不存在: {split_path}")
-        
-        # 5. 更新批量会话记录
-        batch_session.original_file_path = str(original_file_path)
-        batch_session.split_files_dir = str(sheets_dir)
-        batch_session.sheet_count = sheet_count
-        
-        # 6. 为每个Sheet创建报告记录
-        sheet_reports = []
-        for sheet_info in split_files:
-            sheet_report = CustomSheetReport(
-                custom_batch_session_id=batch_session_id,
-                sheet_name=sheet_info["sheet_name"],
-                sheet_index=sheet_info["sheet_index"],
-                split_file_path=sheet_info["split_file_path"],
-                report_status="pending"
-            )
-            db.add(sheet_report)
-            sheet_reports.append(sheet_report)
-        
-        db.commit()
-        logger.info(f"[定制化批量分析] 批量会话和Sheet报告记录已创建")
-        
-        # 7. 返回结果
-        return SuccessResponse(
-            data={
-                "batch_session_id": batch_session_id,
-                "sheet_count": sheet_count,
-                "sheets": [
-                    {
-                        "id": sr.id,
-                        "sheet_name": sr.sheet_name,
-                        "sheet_index": sr.sheet_index,
-                        "split_file_path": sr.split_file_path,
-                        "report_status": sr.report_status
-                    }
-                    for sr in sheet_reports
-                ],
-                "status": batch_session.status
-            },
-            message="文件上传成功，已拆分完成"
-        )
-    
-    except Exception as e:
-        db.rollback()
-        logger.error(f"[定制化批量分析] 上传和拆分失败: {str(e)}", exc_info=True)
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"文件上传和拆分失败: {str(e)}"
-        )
+    return await _upload_batch_excel(custom_batch_pipeline, file, db, current_user)
 
 
 @router.post("/custom-batch/analyze", response_model=SuccessResponse)
@@ -1998,368 +2296,92 @@ async def start_custom_batch_analysis(
     开始定制化批量分析（异步处理）
     复用现有的 generate_report 逻辑，对每个Sheet重复调用
     """
-    logger.info(f"[定制化批量分析] 开始批量分析 - batch_session_id={batch_session_id}, user_id={current_user.id}")
-    
-    try:
-        # 1. 获取批量会话（使用固定项目ID）
-        batch_session = db.query(CustomBatchAnalysisSession).filter(
-            CustomBatchAnalysisSession.id == batch_session_id,
-            CustomBatchAnalysisSession.user_id == current_user.id
-        ).first()
-        
-        if not batch_session:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="批量会话不存在或无权限访问"
-            )
-        
-        # 2. 获取所有待处理的Sheet报告
-        sheet_reports = db.query(CustomSheetReport).filter(
-            CustomSheetReport.custom_batch_session_id == batch_session_id,
-            CustomSheetReport.report_status == "pending"
-        ).order_by(CustomSheetReport.sheet_index).all()
-        
-        if not sheet_reports:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="没有待处理的Sheet报告"
-            )
-        
-        logger.info(f"[定制化批量分析] 找到 {len(sheet_reports)} 个待处理的Sheet")
-        
-        # 3. 更新批量会话状态
-        batch_session.status = "processing"
-        db.commit()
-        
-        # 4. 启动异步任务处理每个Sheet
-        async def run_batch_analysis():
-            """后台异步任务"""
-            try:
-                from app.core.database import SessionLocal
-                background_db = SessionLocal()
-                
-                try:
-                    background_sheet_reports = background_db.query(CustomSheetReport).filter(
-                        CustomSheetReport.custom_batch_session_id == batch_session_id
-                    ).order_by(CustomSheetReport.sheet_index).all()
-                    
-                    # 并发处理所有Sheet（使用定制化批量分析函数）
-                    results = await process_all_custom_sheets_concurrently(
-                        sheet_reports=background_sheet_reports,
-                        analysis_request=analysis_request,
-                        user_id=current_user.id,
-                        batch_session_id=batch_session_id,
-                        db=background_db
-                    )
-                    
-                    # 更新批量会话状态
-                    background_batch_session = background_db.query(CustomBatchAnalysisSession).filter(
-                        CustomBatchAnalysisSession.id == batch_session_id
-                    ).first()
-                    
-                    if background_batch_session:
-                        completed_count = background_db.query(CustomSheetReport).filter(
-                            CustomSheetReport.custom_batch_session_id == batch_session_id,
-                            CustomSheetReport.report_status == "completed"
-                        ).count()
-                        
-                        failed_count = background_db.query(CustomSheetReport).filter(
-                            CustomSheetReport.custom_batch_session_id == batch_session_id,
-                            CustomSheetReport.report_status == "failed"
-                        ).count()
-                        
-                        total_count = background_batch_session.sheet_count
-                        
-                        if completed_count == total_count:
-                            background_batch_session.status = "completed"
-                        elif failed_count == total_count:
-                            background_batch_session.status = "failed"
-                        elif failed_count > 0:
-                            background_batch_session.status = "partial_failed"
-                        else:
-                            background_batch_session.status = "processing"
-                        
-                        background_db.commit()
-                        logger.info(f"[定制化批量分析] 批量分析完成 - batch_session_id={batch_session_id}, completed={completed_count}, failed={failed_count}")
-                
-                finally:
-                    background_db.close()
-            
-            except Exception as e:
-                logger.error(f"[定制化批量分析] 后台任务执行失败: {str(e)}", exc_info=True)
-                from app.core.database import SessionLocal
-                error_db = SessionLocal()
-                try:
-                    error_batch_session = error_db.query(CustomBatchAnalysisSession).filter(
-                        CustomBatchAnalysisSession.id == batch_session_id
-                    ).first()
-                    if error_batch_session:
-                        error_batch_session.status = "failed"
-                        error_db.commit()
-                finally:
-                    error_db.close()
-        
-        # 启动后台任务
-        asyncio.create_task(run_batch_analysis())
-        
-        # 5. 返回处理状态
-        return SuccessResponse(
-            data={
-                "batch_session_id": batch_session_id,
-                "status": "processing",
-                "total_sheets": len(sheet_reports),
-                "completed_sheets": 0
-            },
-            message="批量分析已开始，正在后台处理"
-        )
-    
-    except HTTPException:
-        raise
-    except Exception as e:
-        logger.error(f"[定制化批量分析] 启动批量分析失败: {str(e)}", exc_info=True)
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"启动批量分析失败: {str(e)}"
-        )
+    return await _start_batch_analysis(custom_batch_pipeline, batch_session_id, analysis_request, db, current_user)
+
+
+@router.post("/custom-batch/{batch_session_id}/retry", response_model=SuccessResponse)
+async def retry_custom_batch_analysis(
+    batch_session_id: int = PathParam(..., description="批量会话ID"),
+    analysis_request: Optional[str] = Form(None),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    重试定制化批量分析中失败或中断的Sheet
+    只重新排队 failed 和租约过期的 generating 记录，已完成的Sheet保持不变；
+    已成功的文字/图表阶段通过检查点复用，不会重复调用大模型；
+    传入新的分析需求时清除检查点，按新需求重新生成
+    """
+    return await _retry_batch_analysis(custom_batch_pipeline, batch_session_id, analysis_request, db, current_user)
+
+
+@router.post("/custom-batch/{batch_session_id}/cancel", response_model=SuccessResponse)
+async def cancel_custom_batch_analysis(
+    batch_session_id: int = PathParam(..., description="批量会话ID"),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    取消定制化批量分析
+    未完成的Sheet标记为cancelled，可通过重试接口继续
+    """
+    return await _cancel_batch_analysis(custom_batch_pipeline, batch_session_id, db, current_user)
+
+
+@router.get("/custom-batch/{batch_session_id}/export")
+async def export_custom_batch_reports(
+    batch_session_id: int = PathParam(..., description="批量会话ID"),
+    export_format: str = Query("zip", alias="format", pattern="^(zip|pdf)$", description="导出格式：zip（每个Sheet一个PDF）或pdf（带目录的合并文档）"),
+    range_header: Optional[str] = Header(default=None, alias="Range"),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    导出定制化批量分析的全部已完成报告
+    zip按Sheet并行渲染，完成一个写入一个；pdf合并为一份带目录的文档
+    """
+    return await _export_batch_reports(custom_batch_pipeline, batch_session_id, export_format, range_header, db, current_user)
 
 
 @router.get("/custom-batch/{batch_session_id}/status", response_model=SuccessResponse)
 async def get_custom_batch_analysis_status(
     batch_session_id: int = PathParam(..., description="批量会话ID"),
-    db: Session = Depends(get_db),
+    include_reports: bool = Query(True, description="是否返回各Sheet报告内容（仅轮询进度时可传false）"),
+    db: Session = Depends(get_read_db),
     current_user: User = Depends(get_current_active_user)
 ):
     """
     获取定制化批量分析状态
+    进度统计读取批量会话上的物化计数器；include_reports=false 时优先命中Redis镜像
     """
-    logger.info(f"[定制化批量分析] 查询状态 - batch_session_id={batch_session_id}, user_id={current_user.id}")
-    
-    # 1. 获取批量会话（使用固定项目ID）
-    batch_session = db.query(CustomBatchAnalysisSession).filter(
-        CustomBatchAnalysisSession.id == batch_session_id,
-        CustomBatchAnalysisSession.user_id == current_user.id
-    ).first()
-    
-    if not batch_session:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="批量会话不存在或无权限访问"
-        )
-    
-    # 2. 获取所有Sheet报告
-    sheet_reports = db.query(CustomSheetReport).filter(
-        CustomSheetReport.custom_batch_session_id == batch_session_id
-    ).order_by(CustomSheetReport.sheet_index).all()
-    
-    # 3. 统计状态
-    total_sheets = len(sheet_reports)
-    completed_sheets = sum(1 for sr in sheet_reports if sr.report_status == "completed")
-    failed_sheets = sum(1 for sr in sheet_reports if sr.report_status == "failed")
-    generating_sheets = sum(1 for sr in sheet_reports if sr.report_status == "generating")
-    
-    # 4. 构建报告列表
-    reports_data = []
-    for sr in sheet_reports:
-        report_data = {
-            "id": sr.id,
-            "sheet_name": sr.sheet_name,
-            "sheet_index": sr.sheet_index,
-            "report_status": sr.report_status,
-        }
-        
-        if sr.report_status == "completed" and sr.report_content:
-            report_data["report_content"] = sr.report_content
-        elif sr.report_status == "failed" and sr.error_message:
-            report_data["error_message"] = sr.error_message
-        
-        reports_data.append(report_data)
-    
-    return SuccessResponse(
-        data={
-            "batch_session_id": batch_session_id,
-            "status": batch_session.status,
-            "total_sheets": total_sheets,
-            "completed_sheets": completed_sheets,
-            "failed_sheets": failed_sheets,
-            "generating_sheets": generating_sheets,
-            "pending_sheets": total_sheets - completed_sheets - failed_sheets - generating_sheets,
-            "reports": reports_data
-        },
-        message="状态查询成功"
-    )
+    return await _get_batch_analysis_status(custom_batch_pipeline, batch_session_id, include_reports, db, current_user)
 
 
 @router.get("/custom-batch/reports/{report_id}", response_model=SuccessResponse)
 async def get_custom_sheet_report(
     report_id: int = PathParam(..., description="报告ID"),
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user: User = Depends(get_current_active_user)
 ):
     """
     获取单个报告详情（定制化批量分析）
     """
-    logger.info(f"[定制化批量分析] 查询报告详情 - report_id={report_id}, user_id={current_user.id}")
-    
-    # 1. 获取报告
-    sheet_report = db.query(CustomSheetReport).filter(
-        CustomSheetReport.id == report_id
-    ).first()
-    
-    if not sheet_report:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="报告不存在"
-        )
-    
-    # 2. 验证权限（通过批量会话验证，使用固定项目ID）
-    batch_session = db.query(CustomBatchAnalysisSession).filter(
-        CustomBatchAnalysisSession.id == sheet_report.custom_batch_session_id,
-        CustomBatchAnalysisSession.user_id == current_user.id
-    ).first()
-    
-    if not batch_session:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="无权限访问此报告"
-        )
-    
-    # 3. 构建响应数据
-    report_data = {
-        "id": sheet_report.id,
-        "sheet_name": sheet_report.sheet_name,
-        "sheet_index": sheet_report.sheet_index,
-        "report_status": sheet_report.report_status,
-        "report_content": sheet_report.report_content or {},
-        "error_message": sheet_report.error_message,
-        "created_at": sheet_report.created_at.isoformat() if sheet_report.created_at else None,
-        "updated_at": sheet_report.updated_at.isoformat() if sheet_report.updated_at else None
-    }
-    
-    return SuccessResponse(
-        data=report_data,
-        message="报告查询成功"
-    )
+    return await _get_sheet_report(custom_batch_pipeline, report_id, db, current_user)
 
 
 @router.post("/custom-batch/reports/{report_id}/download")
 async def download_custom_batch_report_pdf(
     report_id: int = PathParam(..., description="报告ID"),
-    request_data: DownloadBatchReportRequest = Body(...),
+    request_data: Optional[DownloadBatchReportRequest] = Body(default=None),
     current_user: User = Depends(get_current_active_user),
     db: Session = Depends(get_db)
 ):
     """
     下载定制化批量分析报告PDF（支持图表图片）
+
+    请求体可省略：ECharts图表由服务端按配置渲染，只有HTML图表需要上传截图
     """
-    import traceback
-    logger.info(f"[定制化批量分析] ====== 开始下载报告PDF ======")
-    logger.info(f"[定制化批量分析] report_id={report_id}, user_id={current_user.id}")
-    logger.info(f"[定制化批量分析] 收到 {len(request_data.chart_images) if request_data.chart_images else 0} 个图表图片")
-    
-    try:
-        # 1. 获取Sheet报告
-        sheet_report = db.query(CustomSheetReport).filter(
-            CustomSheetReport.id == report_id
-        ).first()
-        
-        if not sheet_report:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="报告不存在"
-            )
-        
-        # 2. 验证权限（使用固定项目ID）
-        batch_session = db.query(CustomBatchAnalysisSession).filter(
-            CustomBatchAnalysisSession.id == sheet_report.custom_batch_session_id,
-            CustomBatchAnalysisSession.user_id == current_user.id
-        ).first()
-        
-        if not batch_session:
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="无权限访问此报告"
-            )
-        
-        # 3. 检查报告状态和内容
-        if sheet_report.report_status != "completed":
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"报告尚未完成，当前状态: {sheet_report.report_status}"
-            )
-        
-        if not sheet_report.report_content:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="报告内容不存在"
-            )
-        
-        # 4. 获取报告内容
-        report_content = {
-            "text": str(sheet_report.report_content.get("text", "")),
-            "charts": sheet_report.report_content.get("charts", []) or [],
-            "tables": sheet_report.report_content.get("tables", []) or [],
-            "metrics": sheet_report.report_content.get("metrics", {}) or {}
-        }
-        
-        if not report_content.get("text"):
-            report_content["text"] = "报告内容为空"
-        
-        # 5. 处理图表图片
-        chart_images_data = []
-        if request_data.chart_images:
-            for chart_img in request_data.chart_images:
-                try:
-                    image_data = chart_img.image.split(',')[1] if ',' in chart_img.image else chart_img.image
-                    chart_images_data.append({
-                        'index': chart_img.index,
-                        'title': chart_img.title,
-                        'image_data': image_data
-                    })
-                except Exception as e:
-                    logger.error(f"[定制化批量分析] ✗ 解析图表图片失败: {str(e)}")
-        
-        # 6. 生成PDF
-        try:
-            from app.utils.pdf_generator import generate_report_pdf
-            
-            report_title = f"{sheet_report.sheet_name} - 数据分析报告"
-            pdf_bytes = generate_report_pdf(
-                title=report_title,
-                report_content=report_content,
-                session_id=sheet_report.custom_batch_session_id,
-                chart_images=chart_images_data
-            )
-            logger.info(f"[定制化批量分析] PDF生成成功 - 大小: {len(pdf_bytes)} bytes")
-        except Exception as e:
-            logger.error(f"[定制化批量分析] PDF生成失败: {str(e)}", exc_info=True)
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail=f"PDF生成失败: {str(e)}"
-            )
-        
-        # 7. 返回PDF文件
-        filename = f"{sheet_report.sheet_name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
-        
-        return Response(
-            content=pdf_bytes,
-            media_type="application/pdf",
-            headers={
-                "Content-Disposition": f'attachment; filename="{filename}"'
-            }
-        )
-        
-    except HTTPException:
-        raise
-    except Exception as e:
-        error_traceback = traceback.format_exc()
-        logger.error(f"[定制化批量分析] ====== PDF下载失败 ======")
-        logger.error(f"[定制化批量分析] 错误类型: {type(e).__name__}")
-        logger.error(f"[定制化批量分析] 错误消息: {str(e)}")
-        logger.error(f"[定制化批量分析] 完整堆栈:\n{error_traceback}")
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"生成PDF失败: {str(e)}"
-        )
+    return await _download_batch_report_pdf(custom_batch_pipeline, report_id, request_data, db, current_user)
 
 
 @router.post("/custom-batch/sessions", response_model=SuccessResponse)
@@ -2371,95 +2393,20 @@ async def create_custom_batch_session(
     """
     创建新的定制化批量分析会话
     """
-    title = request_data.get("title") if request_data else None
-    logger.info(f"[定制化批量分析] 创建会话 - user_id={current_user.id}, title={title}")
-    
-    try:
-        # 生成标题
-        if not title:
-            title = f"定制化批量分析_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
-        
-        # 创建批量会话（初始状态为draft，等待上传文件）
-        batch_session = CustomBatchAnalysisSession(
-            user_id=current_user.id,
-            original_file_name=title,
-            original_file_path="",
-            split_files_dir="",
-            sheet_count=0,
-            status="draft"  # 草稿状态，等待上传文件
-        )
-        db.add(batch_session)
-        db.commit()
-        db.refresh(batch_session)
-        
-        logger.info(f"[定制化批量分析] 会话创建成功 - batch_session_id={batch_session.id}, title={batch_session.original_file_name}")
-        
-        # 返回响应
-        return SuccessResponse(
-            data={
-                "id": batch_session.id,
-                "original_file_name": batch_session.original_file_name,
-                "sheet_count": batch_session.sheet_count,
-                "status": batch_session.status,
-                "created_at": batch_session.created_at.isoformat() if batch_session.created_at else None,
-                "updated_at": batch_session.updated_at.isoformat() if batch_session.updated_at else None
-            },
-            message="定制化批量分析会话创建成功"
-        )
-    except Exception as e:
-        logger.error(f"[定制化批量分析] 创建会话失败 - error={str(e)}")
-        db.rollback()
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"创建定制化批量分析会话失败: {str(e)}"
-        )
+    return await _create_batch_session(custom_batch_pipeline, request_data, db, current_user)
 
 
 @router.get("/custom-batch/sessions", response_model=SuccessResponse)
 async def get_custom_batch_sessions(
     page: int = Query(1, ge=1),
     page_size: int = Query(20, ge=1, le=100),
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user: User = Depends(get_current_active_user)
 ):
     """
     获取定制化批量分析会话列表
     """
-    logger.info(f"[定制化批量分析] 查询会话列表 - user_id={current_user.id}")
-    
-    # 1. 查询批量会话（使用固定项目ID）
-    query = db.query(CustomBatchAnalysisSession).filter(
-        CustomBatchAnalysisSession.user_id == current_user.id
-    ).order_by(CustomBatchAnalysisSession.created_at.desc())
-    
-    # 2. 分页
-    total = query.count()
-    sessions = query.offset((page - 1) * page_size).limit(page_size).all()
-    
-    # 3. 构建响应数据
-    sessions_data = []
-    for session in sessions:
-        sessions_data.append({
-            "id": session.id,
-            "original_file_name": session.original_file_name,
-            "sheet_count": session.sheet_count,
-            "status": session.status,
-            "created_at": session.created_at.isoformat() if session.created_at else None,
-            "updated_at": session.updated_at.isoformat() if session.updated_at else None
-        })
-    
-    return SuccessResponse(
-        data={
-            "sessions": sessions_data,
-            "pagination": {
-                "page": page,
-                "page_size": page_size,
-                "total": total,
-                "pages": (total + page_size - 1) // page_size
-            }
-        },
-        message="会话列表查询成功"
-    )
+    return await _get_batch_sessions(custom_batch_pipeline, page, page_size, db, current_user)
 
 
 @router.delete("/custom-batch/sessions/{batch_session_id}", response_model=SuccessResponse)
@@ -2471,40 +2418,7 @@ async def delete_custom_batch_session(
     """
     删除定制化批量分析会话
     """
-    logger.info(f"[定制化批量分析] 删除会话 - batch_session_id={batch_session_id}, user_id={current_user.id}")
-    
-    try:
-        # 1. 查询批量会话（使用固定项目ID）
-        batch_session = db.query(CustomBatchAnalysisSession).filter(
-            CustomBatchAnalysisSession.id == batch_session_id,
-            CustomBatchAnalysisSession.user_id == current_user.id
-        ).first()
-        
-        if not batch_session:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="批量会话不存在或无权限访问"
-            )
-        
-        # 2. 删除会话（级联删除会同时删除相关的CustomSheetReport记录）
-        db.delete(batch_session)
-        db.commit()
-        
-        logger.info(f"[定制化批量分析] 会话删除成功 - batch_session_id={batch_session_id}")
-        
-        return SuccessResponse(
-            data={"deleted_id": batch_session_id},
-            message="会话删除成功"
-        )
-    except HTTPException:
-        raise
-    except Exception as e:
-        logger.error(f"[定制化批量分析] 删除会话失败 - batch_session_id={batch_session_id}, error={str(e)}")
-        db.rollback()
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"删除会话失败: {str(e)}"
-        )
+    return await _delete_batch_session(custom_batch_pipeline, batch_session_id, db, current_user)
 
 
 # ==================== AI对话API ====================
@@ -2565,9 +2479,12 @@ async def dialog_stream(
 
     # 创建流式对话服务
     dialog_service = BailianDialogServiceStream()
+    user_id = current_user.id
 
     async def generate_sse():
         """生成 SSE 格式的流式响应"""
+        # 流式响应在返回后才执行，需在生成器内声明调度优先级
+        set_llm_context(user_id, PRIORITY_DIALOG)
         ai_response = ""
         action_type = "chat"
 
@@ -2643,6 +2560,7 @@ async def dialog_non_stream(
     from app.services.bailian_dialog_service import BailianDialogService
     
     logger.info(f"[AI对话] 收到非流式对话请求 - session_id={session_id}, user_id={current_user.id}")
+    set_llm_context(current_user.id, PRIORITY_DIALOG)
     
     # 解析参数
     try:
@@ -2687,7 +2605,7 @@ async def get_dialog_history(
     session_id: int = Query(..., description="会话ID"),
     limit: int = Query(20, ge=1, le=100, description="返回消息数量限制"),
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """
     获取对话历史记录（从DialogHistory表读取，支持版本标记）
@@ -2789,8 +2707,8 @@ async def clear_dialog_history(
             DialogHistory.session_id == session_id
         ).delete()
         
-        # 同时清空会话的messages字段（兼容旧数据）
-        conversation.messages = []
+        # 同时清空会话消息（兼容旧数据）
+        SessionMessageService.clear(db, session_id)
         db.commit()
         
         logger.info(f"[AI对话] 对话历史已清除 - session_id={session_id}")
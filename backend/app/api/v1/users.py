@@ -13,7 +13,8 @@ from app.schemas.user import (
 from app.schemas.common import SuccessResponse, PaginatedData, PaginationInfo
 from app.models.user import User
 from app.auth.dependencies import get_current_superadmin
-from app.core.security import get_password_hash
+from app.services.password_hash_service import password_hasher
+from app.services.principal_cache_service import principal_cache
 
 router = APIRouter()
 
@@ -94,7 +95,7 @@ async def create_user(
     # 创建用户
     new_user = User(
         username=user_data.username,
-        password_hash=get_password_hash(user_data.password),
+        password_hash=await password_hasher.hash(user_data.password),
         email=user_data.email,
         full_name=user_data.full_name,
         is_active=True,
@@ -122,8 +123,9 @@ async def update_user(
     更新用户信息
     
     仅管理员可访问
-    - 只能更新邮箱和全名
+    - 只能更新邮箱、全名和启用状态
     - 不能修改用户名
+    - 不能禁用自己和超级管理员
     """
     # 查找用户
     user = db.query(User).filter(User.id == user_id).first()
@@ -138,9 +140,20 @@ async def update_user(
         user.email = user_data.email
     if user_data.full_name is not None:
         user.full_name = user_data.full_name
+    if user_data.is_active is not None and user_data.is_active != user.is_active:
+        if not user_data.is_active and (user.id == current_user.id or user.is_admin):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="不能禁用自己或超级管理员"
+            )
+        user.is_active = user_data.is_active
+        if not user_data.is_active:
+            # 禁用后已签发的Token和会话失效，重新启用后需要重新登录
+            user.token_version = (user.token_version or 0) + 1
     
     db.commit()
     db.refresh(user)
+    await principal_cache.invalidate(user.id)
     
     return SuccessResponse(
         data=UserResponse.model_validate(user),
@@ -186,6 +199,7 @@ async def delete_user(
     # 删除用户（级联删除相关数据）
     db.delete(user)
     db.commit()
+    await principal_cache.invalidate(user_id)
     
     return SuccessResponse(
         message="删除用户成功"
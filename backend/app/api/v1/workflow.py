@@ -16,6 +16,8 @@ from app.schemas.workflow import (
 )
 from app.schemas.common import SuccessResponse
 from app.services.workflow_service import WorkflowService
+from app.services.session_message_service import SessionMessageService
+from app.services.function_config_service import FunctionConfigService
 from app.auth.dependencies import get_current_active_user, get_current_superadmin
 from app.models.user import User
 
@@ -199,6 +201,10 @@ async def get_conversations(
         conversations = WorkflowService.get_user_conversations(
             db, current_user.id, function_key
         )
+        # 一次查询加载全部会话的消息（大字段批量加载），避免逐个会话、逐条消息查询
+        messages_by_session = SessionMessageService.list_messages_by_session(
+            db, [c.id for c in conversations]
+        )
         
         result = []
         for c in conversations:
@@ -209,7 +215,7 @@ async def get_conversations(
                 "function_key": c.function_key,
                 "workflow_id": c.workflow_id,
                 "title": c.title,
-                "messages": c.messages,
+                "messages": messages_by_session[c.id],
                 "created_at": c.created_at.isoformat(),
                 "updated_at": c.updated_at.isoformat()
             })
@@ -363,7 +369,7 @@ async def execute_workflow(
                     request_data.conversation_id
                 )
                 
-                if conversation and conversation.messages:
+                if conversation:
                     max_messages_map = {
                         "operation_data_analysis": 10,
                         "default": 10
@@ -374,7 +380,9 @@ async def execute_workflow(
                     )
                     
                     history_text = format_conversation_history(
-                        conversation.messages,
+                        SessionMessageService.list_messages(
+                            db, conversation.id, include_payload=False, limit=max_messages * 2
+                        ),
                         max_messages=max_messages,
                         max_chars=2000
                     )
@@ -536,7 +544,7 @@ async def execute_workflow_stream(
                 db,
                 request_data.conversation_id
             )
-            if conversation and conversation.messages:
+            if conversation:
                 max_messages_map = {
                     "operation_data_analysis": 10,
                     "default": 10
@@ -546,7 +554,9 @@ async def execute_workflow_stream(
                     max_messages_map["default"]
                 )
                 history_text = format_conversation_history(
-                    conversation.messages,
+                    SessionMessageService.list_messages(
+                        db, conversation.id, include_payload=False, limit=max_messages * 2
+                    ),
                     max_messages=max_messages,
                     max_chars=2000
                 )
@@ -621,6 +631,9 @@ async def update_workflow(
             detail="工作流不存在"
         )
     
+    # 管理后台功能列表中包含工作流配置
+    await FunctionConfigService.invalidate()
+    
     return SuccessResponse(
         data=WorkflowResponse.model_validate(workflow),
         message="工作流更新成功"
@@ -641,5 +654,7 @@ async def delete_workflow(
             detail="工作流不存在"
         )
     
+    await FunctionConfigService.invalidate()
+    
     return SuccessResponse(message="工作流删除成功")
 
@@ -1,14 +1,18 @@
 """
 认证依赖项（用于FastAPI Depends）- 简化版，移除项目依赖
+
+当前用户从 principal_cache 读取（不每个请求查询 users 表），返回的 User 不属于数据库会话，
+需要修改用户时按 current_user.id 重新查询。
 """
 from typing import Optional
 from fastapi import Depends, HTTPException, status, Header, Cookie
 from sqlalchemy.orm import Session
 
-from app.core.database import get_db
+from app.core.database import get_db, db_router
 from app.core.security import decode_access_token
 from app.core.redis import get_redis, RedisClient
 from app.models.user import User
+from app.services.principal_cache_service import principal_cache
 from app.schemas.auth import TokenData
 
 
@@ -60,8 +64,8 @@ async def get_current_user_from_token(
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    # 获取用户
-    user = db.query(User).filter(User.id == user_id).first()
+    # 获取用户（缓存，令牌版本不一致时抛出401）
+    user = await principal_cache.get(db, user_id, payload.get("ver", 0))
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -74,6 +78,8 @@ async def get_current_user_from_token(
             detail="用户已被禁用",
         )
     
+    # 记录当前请求的用户（读写分离：该用户提交写操作后短时间内读主库）
+    db_router.set_request_user(user.id)
     return user
 
 
@@ -107,8 +113,8 @@ async def get_current_user_from_session(
             detail="会话数据不完整",
         )
     
-    # 获取用户
-    user = db.query(User).filter(User.id == user_id).first()
+    # 获取用户（缓存，会话版本不一致时抛出401）
+    user = await principal_cache.get(db, user_id, session_data.get("token_version", 0))
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -121,6 +127,8 @@ async def get_current_user_from_session(
             detail="用户已被禁用",
         )
     
+    # 记录当前请求的用户（读写分离：该用户提交写操作后短时间内读主库）
+    db_router.set_request_user(user.id)
     return user
 
 
@@ -1,6 +1,8 @@
 """
 配置管理模块（运营数据分析独立版）
 """
+import os
+import tempfile
 from typing import List, Optional, Union
 from urllib.parse import quote_plus
 from pydantic_settings import BaseSettings
@@ -30,6 +32,11 @@ class Settings(BaseSettings):
     POSTGRES_HOST: str = Field(default="postgres", env="POSTGRES_HOST")
     POSTGRES_PORT: int = Field(default=5432, env="POSTGRES_PORT")
     
+    # 只读副本（可选）：配置后只读接口走副本，见 app/core/db_routing.py
+    DATABASE_REPLICA_URL: Optional[str] = Field(default=None, env="DATABASE_REPLICA_URL")
+    DB_READ_YOUR_WRITES_SECONDS: int = Field(default=10, env="DB_READ_YOUR_WRITES_SECONDS")  # 用户写操作后读请求走主库的时长，应大于复制延迟
+    DB_REPLICA_RETRY_SECONDS: int = Field(default=30, env="DB_REPLICA_RETRY_SECONDS")  # 副本连接失败后回退到主库的时长
+    
     # Redis配置（可选）
     REDIS_URL: str = Field(default="redis://redis:6379/0", env="REDIS_URL")
     REDIS_PASSWORD: Optional[str] = Field(default=None, env="REDIS_PASSWORD")
@@ -90,6 +97,72 @@ class Settings(BaseSettings):
     MAX_UPLOAD_SIZE: int = Field(default=20971520, env="MAX_UPLOAD_SIZE")  # 20MB（批量分析需要）
     UPLOAD_DIR: str = Field(default="/app/uploads", env="UPLOAD_DIR")
     
+    # 大模型调用调度配置（对话 > 单报告 > 批量，按用户公平排队）
+    LLM_MAX_CONCURRENCY: int = Field(default=8, env="LLM_MAX_CONCURRENCY")  # 全局并发上限
+    LLM_PER_USER_CONCURRENCY: int = Field(default=3, env="LLM_PER_USER_CONCURRENCY")  # 单用户批量调用并发上限（对话和单报告不受限）
+    LLM_INTERACTIVE_RESERVED: int = Field(default=2, env="LLM_INTERACTIVE_RESERVED")  # 为交互式请求预留的名额
+    
+    # 批量分析配置
+    # Sheet处理租约时长（秒），超时未续约的generating记录视为中断，可被回收重试
+    BATCH_SHEET_LEASE_SECONDS: int = Field(default=300, env="BATCH_SHEET_LEASE_SECONDS")
+    # 心跳续约间隔（秒），应明显小于租约时长
+    BATCH_SHEET_HEARTBEAT_SECONDS: int = Field(default=60, env="BATCH_SHEET_HEARTBEAT_SECONDS")
+    
+    # PDF渲染配置（独立进程池渲染，避免阻塞事件循环）
+    PDF_RENDER_WORKERS: int = Field(default=2, env="PDF_RENDER_WORKERS")  # 渲染进程数，0表示在线程中渲染
+    PDF_RENDER_MAX_PENDING: int = Field(default=8, env="PDF_RENDER_MAX_PENDING")  # 渲染中+排队中的任务上限，超出返回503
+    PDF_RENDER_TIMEOUT_SECONDS: int = Field(default=60, env="PDF_RENDER_TIMEOUT_SECONDS")  # 单个任务超时
+    PDF_RENDER_RETRY_AFTER_SECONDS: int = Field(default=5, env="PDF_RENDER_RETRY_AFTER_SECONDS")  # 503时建议的重试间隔
+    PDF_EXPORT_TIMEOUT_SECONDS: int = Field(default=600, env="PDF_EXPORT_TIMEOUT_SECONDS")  # 批量合并导出（单个大文档）的超时
+    PDF_CHART_IMAGE_DPI: int = Field(default=150, env="PDF_CHART_IMAGE_DPI")  # 前端图表截图嵌入PDF前缩小到的分辨率
+    
+    # 报告产物缓存配置（渲染好的PDF/PNG按内容哈希缓存到磁盘）
+    ARTIFACT_CACHE_DIR: str = Field(default="/app/uploads/artifact_cache", env="ARTIFACT_CACHE_DIR")
+    ARTIFACT_CACHE_MAX_BYTES: int = Field(default=536870912, env="ARTIFACT_CACHE_MAX_BYTES")  # 512MB，超出后按LRU淘汰
+    # Nginx internal location 前缀（如 /_artifact_cache/），配置后命中缓存时通过 X-Accel-Redirect 由Nginx发送文件
+    ARTIFACT_ACCEL_REDIRECT_PREFIX: Optional[str] = Field(default=None, env="ARTIFACT_ACCEL_REDIRECT_PREFIX")
+    
+    # 内容寻址存储（大段HTML图表按SHA-256去重、gzip压缩后存到磁盘，数据库只保存哈希）
+    CONTENT_STORE_DIR: str = Field(default="/app/uploads/content_store", env="CONTENT_STORE_DIR")
+    CONTENT_STORE_MIN_BYTES: int = Field(default=4096, env="CONTENT_STORE_MIN_BYTES")  # 小于该字节数的内容仍内联存储
+    CONTENT_STORE_GC_GRACE_SECONDS: int = Field(default=86400, env="CONTENT_STORE_GC_GRACE_SECONDS")  # 引用归零后保留多久才删除
+    
+    # 会话版本存储：每隔多少个版本保存一次完整快照，其余版本只保存相对上一版本的增量
+    SESSION_VERSION_SNAPSHOT_INTERVAL: int = Field(default=10, env="SESSION_VERSION_SNAPSHOT_INTERVAL")
+    
+    # 会话/报告搜索配置（pg_trgm 三元组索引）
+    SEARCH_SIMILARITY_THRESHOLD: float = Field(default=0.3, env="SEARCH_SIMILARITY_THRESHOLD")  # 标题、文件名、Sheet名的相似度阈值
+    SEARCH_WORD_SIMILARITY_THRESHOLD: float = Field(default=0.5, env="SEARCH_WORD_SIMILARITY_THRESHOLD")  # 报告正文的词相似度阈值
+    SEARCH_CANDIDATE_LIMIT: int = Field(default=200, env="SEARCH_CANDIDATE_LIMIT")  # 每类数据参与排序的候选数上限（限制长文本打分的开销，匹配过多时取最近更新的）
+    SEARCH_SNIPPET_CHARS: int = Field(default=120, env="SEARCH_SNIPPET_CHARS")  # 报告正文摘要长度
+    
+    # 管理后台功能列表缓存（Redis，修改配置时主动失效）
+    FUNCTION_CONFIG_CACHE_TTL_SECONDS: int = Field(default=600, env="FUNCTION_CONFIG_CACHE_TTL_SECONDS")
+    
+    # 密码哈希（bcrypt在独立线程池中执行，不阻塞事件循环）
+    PASSWORD_BCRYPT_ROUNDS: int = Field(default=12, env="PASSWORD_BCRYPT_ROUNDS")  # 修改后旧哈希在用户下次登录时按新cost重新生成
+    PASSWORD_HASH_WORKERS: int = Field(default=2, env="PASSWORD_HASH_WORKERS")  # 同时计算哈希的线程数
+    PASSWORD_HASH_MAX_PENDING: int = Field(default=64, env="PASSWORD_HASH_MAX_PENDING")  # 计算中+排队中的上限，超出返回503
+    PASSWORD_HASH_RETRY_AFTER_SECONDS: int = Field(default=2, env="PASSWORD_HASH_RETRY_AFTER_SECONDS")  # 503时建议的重试间隔
+    
+    # 当前用户缓存（进程内LRU + Redis，用户被修改、禁用、删除时主动失效）
+    PRINCIPAL_CACHE_TTL_SECONDS: int = Field(default=300, env="PRINCIPAL_CACHE_TTL_SECONDS")  # Redis缓存时间
+    PRINCIPAL_CACHE_LOCAL_TTL_SECONDS: int = Field(default=10, env="PRINCIPAL_CACHE_LOCAL_TTL_SECONDS")  # 进程内缓存时间（其他进程的失效最多延迟这么久），0为关闭
+    PRINCIPAL_CACHE_LOCAL_SIZE: int = Field(default=1024, env="PRINCIPAL_CACHE_LOCAL_SIZE")
+    
+    # SQL查询统计（按请求统计查询次数、数据库耗时和疑似N+1，汇总到 /admin/metrics）
+    SQL_STATS_ENABLED: bool = Field(default=True, env="SQL_STATS_ENABLED")
+    SQL_STATS_HEADERS: bool = Field(default=False, env="SQL_STATS_HEADERS")  # 非调试模式下也返回 X-DB-* 响应头
+    SQL_STATS_TOP_N: int = Field(default=3, env="SQL_STATS_TOP_N")  # 每个请求记录的最慢语句数
+    SQL_N_PLUS_ONE_THRESHOLD: int = Field(default=5, env="SQL_N_PLUS_ONE_THRESHOLD")  # 同一语句在一个请求内执行达到该次数视为疑似N+1
+    SQL_QUERY_WARN_COUNT: int = Field(default=50, env="SQL_QUERY_WARN_COUNT")  # 单个请求查询次数超过该值时记录警告
+    
+    # 字体探测结果缓存文件（避免每次启动重新扫描系统字体）
+    FONT_CACHE_FILE: str = Field(
+        default=os.path.join(tempfile.gettempdir(), "operation-analysis-fonts.json"),
+        env="FONT_CACHE_FILE"
+    )
+    
     # 日志配置
     LOG_FILE: str = Field(default="/var/log/operation-analysis/app.log", env="LOG_FILE")
     LOG_ROTATION: str = Field(default="10 MB", env="LOG_ROTATION")
@@ -7,6 +7,8 @@ from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, Session
 
 from app.core.config import settings
+from app.core.db_routing import REQUEST_SESSION_INFO_KEY, DatabaseRouter, install_routing_events
+from app.core.query_stats import install_query_stats
 
 
 # 创建数据库引擎
@@ -20,6 +22,22 @@ engine = create_engine(
     echo=settings.DEBUG,  # 是否打印SQL语句
 )
 
+# 只读副本引擎（未配置 DATABASE_REPLICA_URL 时为None）
+replica_engine = create_engine(
+    settings.DATABASE_REPLICA_URL,
+    pool_pre_ping=True,
+    pool_size=20,
+    max_overflow=40,
+    pool_timeout=30,
+    pool_recycle=3600,
+    echo=settings.DEBUG,
+) if settings.DATABASE_REPLICA_URL else None
+
+# 请求级SQL统计（查询次数、耗时、疑似N+1）
+install_query_stats(engine)
+if replica_engine is not None:
+    install_query_stats(replica_engine)
+
 # 创建会话工厂
 SessionLocal = sessionmaker(
     autocommit=False,
@@ -27,6 +45,21 @@ SessionLocal = sessionmaker(
     bind=engine
 )
 
+ReplicaSessionLocal = sessionmaker(
+    autocommit=False,
+    autoflush=False,
+    bind=replica_engine
+) if replica_engine is not None else None
+
+# 读写分离路由（只读接口通过 app.api.deps.get_read_db 使用）
+db_router = DatabaseRouter(
+    primary_factory=SessionLocal,
+    replica_factory=ReplicaSessionLocal,
+    read_your_writes_seconds=settings.DB_READ_YOUR_WRITES_SECONDS,
+    retry_seconds=settings.DB_REPLICA_RETRY_SECONDS
+)
+install_routing_events(db_router, SessionLocal, ReplicaSessionLocal, replica_engine)
+
 # 创建基础模型类
 Base = declarative_base()
 
@@ -41,7 +74,7 @@ def get_db() -> Generator[Session, None, None]:
     def get_users(db: Session = Depends(get_db)):
         return db.query(User).all()
     """
-    db = SessionLocal()
+    db = SessionLocal(info={REQUEST_SESSION_INFO_KEY: True})
     try:
         yield db
     finally:
@@ -0,0 +1,241 @@
+"""
+读写分离路由
+
+配置了 DATABASE_REPLICA_URL 时，只读接口（会话列表/详情、版本、批量分析状态、报告、对话历史等）
+通过 get_read_db 使用只读副本，批量分析等写入仍走主库：
+- 读己之写：用户提交写操作后 DB_READ_YOUR_WRITES_SECONDS 秒内，其只读请求仍走主库，避免复制延迟导致读不到刚写入的数据。
+  写标记同时记录在本进程和Redis中（db:recent_write:<user_id>），其他进程也能看到
+- 自动回退：副本连接失败时标记为不可用，DB_REPLICA_RETRY_SECONDS 秒内只读请求全部走主库，之后再尝试副本
+- 只读会话（无论路由到副本还是主库）禁止flush，误用时立即报错
+
+未配置副本时 get_read_db 与 get_db 完全相同。
+"""
+import asyncio
+import threading
+import time
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Optional
+
+from loguru import logger
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import Session, sessionmaker
+
+from app.core.redis import redis_client
+
+
+READ_ONLY_INFO_KEY = "read_only"
+# 请求会话（get_db 创建）：提交写操作时记录读己之写标记
+REQUEST_SESSION_INFO_KEY = "request_session"
+
+# 当前请求的用户（由认证依赖设置），用于记录谁提交了写操作
+_request_user_id: ContextVar[Optional[int]] = ContextVar("db_request_user_id", default=None)
+
+
+def recent_write_key(user_id: int) -> str:
+    return f"db:recent_write:{user_id}"
+
+
+class DatabaseRouter:
+    """主库/只读副本路由"""
+
+    def __init__(
+        self,
+        primary_factory: Callable[..., Session],
+        replica_factory: Optional[Callable[..., Session]],
+        read_your_writes_seconds: int,
+        retry_seconds: int
+    ):
+        self.primary_factory = primary_factory
+        self.replica_factory = replica_factory
+        self.read_your_writes_seconds = max(0, read_your_writes_seconds)
+        self.retry_seconds = max(1, retry_seconds)
+
+        self._lock = threading.Lock()
+        # user_id -> 读己之写窗口结束时间（monotonic）
+        self._recent_writes: Dict[int, float] = {}
+        # 副本不可用截止时间（monotonic），0表示可用
+        self._replica_down_until = 0.0
+        # 事件循环（在线程池中提交时用来写Redis标记）
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+        # 统计信息
+        self._replica_reads = 0
+        self._primary_reads = 0
+        self._read_your_writes = 0
+        self._fallbacks = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.replica_factory is not None
+
+    # ==================== 读己之写 ====================
+
+    def set_request_user(self, user_id: int) -> None:
+        """记录当前请求的用户（认证依赖中调用）"""
+        _request_user_id.set(user_id)
+        if self._loop is None:
+            try:
+                self._loop = asyncio.get_running_loop()
+            except RuntimeError:
+                pass
+
+    def mark_write(self, user_id: int) -> None:
+        """用户提交了写操作：窗口期内该用户的只读请求走主库"""
+        if not self.enabled or not self.read_your_writes_seconds:
+            return
+        now = time.monotonic()
+        with self._lock:
+            self._recent_writes[user_id] = now + self.read_your_writes_seconds
+            # 顺带清理过期标记
+            if len(self._recent_writes) > 1024:
+                self._recent_writes = {uid: until for uid, until in self._recent_writes.items() if until > now}
+
+        coro = redis_client.set(recent_write_key(user_id), "1", expire=self.read_your_writes_seconds)
+        try:
+            asyncio.get_running_loop().create_task(self._publish(coro))
+        except RuntimeError:
+            # 同步接口在线程池中提交：交给主事件循环写入
+            if self._loop is not None and self._loop.is_running():
+                asyncio.run_coroutine_threadsafe(self._publish(coro), self._loop)
+            else:
+                coro.close()
+
+    @staticmethod
+    async def _publish(coro) -> None:
+        try:
+            await coro
+        except Exception as e:
+            logger.warning(f"[读写分离] 写入读己之写标记失败: {str(e)}")
+
+    async def recently_wrote(self, user_id: int) -> bool:
+        with self._lock:
+            until = self._recent_writes.get(user_id)
+        if until is not None and until > time.monotonic():
+            return True
+        try:
+            return await redis_client.exists(recent_write_key(user_id))
+        except Exception as e:
+            # Redis不可用时无法确认其他进程的写操作，保守地走主库
+            logger.warning(f"[读写分离] 读取读己之写标记失败: {str(e)}")
+            return True
+
+    # ==================== 副本可用性 ====================
+
+    def replica_available(self) -> bool:
+        with self._lock:
+            return self._replica_down_until <= time.monotonic()
+
+    def mark_replica_down(self, error: Exception) -> None:
+        with self._lock:
+            already_down = self._replica_down_until > time.monotonic()
+            self._replica_down_until = time.monotonic() + self.retry_seconds
+        if not already_down:
+            logger.warning(f"[读写分离] 只读副本不可用，{self.retry_seconds}秒内读请求回退到主库: {str(error)}")
+
+    # ==================== 会话 ====================
+
+    def _primary_read_session(self) -> Session:
+        return self.primary_factory(info={READ_ONLY_INFO_KEY: True})
+
+    async def read_session(self, user_id: Optional[int]) -> Session:
+        """
+        创建只读会话
+
+        副本未配置、不可用，或用户处于读己之写窗口期时返回主库会话；
+        路由到副本时先取出一个连接（pool_pre_ping 检查连接），失败则回退到主库。
+        """
+        if not self.enabled:
+            return self.primary_factory(info={REQUEST_SESSION_INFO_KEY: True})
+
+        if user_id is not None and await self.recently_wrote(user_id):
+            with self._lock:
+                self._read_your_writes += 1
+            return self._primary_read_session()
+
+        if self.replica_available():
+            db = self.replica_factory(info={READ_ONLY_INFO_KEY: True})
+            try:
+                await asyncio.to_thread(db.connection)
+            except DBAPIError as e:
+                db.close()
+                self.mark_replica_down(e)
+                with self._lock:
+                    self._fallbacks += 1
+            else:
+                with self._lock:
+                    self._replica_reads += 1
+                return db
+
+        with self._lock:
+            self._primary_reads += 1
+        return self._primary_read_session()
+
+    def snapshot(self) -> Dict[str, Any]:
+        """路由统计"""
+        with self._lock:
+            down_seconds = max(0.0, self._replica_down_until - time.monotonic())
+            return {
+                "enabled": self.enabled,
+                "replica_available": down_seconds == 0,
+                "replica_retry_in_seconds": round(down_seconds, 1),
+                "replica_reads": self._replica_reads,
+                "primary_reads": self._primary_reads,
+                "read_your_writes": self._read_your_writes,
+                "fallbacks": self._fallbacks,
+            }
+
+
+# ==================== 会话事件 ====================
+
+def _before_flush(session: Session, flush_context, instances) -> None:
+    if session.info.get(READ_ONLY_INFO_KEY) and (session.new or session.dirty or session.deleted):
+        raise RuntimeError("只读会话不能写入数据库（接口应使用 get_db）")
+
+
+def _after_flush(session: Session, flush_context) -> None:
+    session.info["has_writes"] = True
+
+
+def _do_orm_execute(orm_execute_state) -> None:
+    # query().update()/delete()、session.execute(insert(...)) 不经过flush
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        orm_execute_state.session.info["has_writes"] = True
+
+
+def _after_rollback(session: Session) -> None:
+    session.info.pop("has_writes", None)
+
+
+def install_routing_events(
+    router: DatabaseRouter,
+    primary_factory: sessionmaker,
+    replica_factory: Optional[sessionmaker],
+    replica_engine: Optional[Engine]
+) -> None:
+    """注册会话事件：主库提交写操作时记录读己之写标记，只读会话禁止flush，副本断连时回退"""
+
+    def _after_commit(session: Session) -> None:
+        # 只统计请求会话（get_db）：请求中启动的后台任务（批量分析等）会继承请求上下文，其写入不算用户的写操作
+        if not session.info.pop("has_writes", False) or not session.info.get(REQUEST_SESSION_INFO_KEY):
+            return
+        user_id = _request_user_id.get()
+        if user_id is not None:
+            router.mark_write(user_id)
+
+    event.listen(primary_factory, "before_flush", _before_flush)
+    event.listen(primary_factory, "after_flush", _after_flush)
+    event.listen(primary_factory, "do_orm_execute", _do_orm_execute)
+    event.listen(primary_factory, "after_commit", _after_commit)
+    event.listen(primary_factory, "after_rollback", _after_rollback)
+    if replica_factory is not None:
+        event.listen(replica_factory, "before_flush", _before_flush)
+
+    if replica_engine is not None:
+        def _handle_error(context) -> None:
+            # 查询过程中副本断连：后续读请求回退到主库（当前请求仍返回错误）
+            if context.is_disconnect:
+                router.mark_replica_down(context.original_exception)
+
+        event.listen(replica_engine, "handle_error", _handle_error)
@@ -0,0 +1,233 @@
+"""
+SQL查询统计
+
+通过 SQLAlchemy 引擎事件记录每个请求执行的SQL：
+- 请求级：查询次数、数据库总耗时、最慢的几条语句；同一语句（参数化后的SQL文本相同）
+  在一个请求内执行次数达到 SQL_N_PLUS_ONE_THRESHOLD 时标记为疑似 N+1
+- 进程级：按路由汇总请求数、查询数、数据库耗时和 N+1 次数，供 /admin/metrics 查看
+- 测试/脚本：count_queries() 统计代码块内的全部查询，assert_query_budget() 校验查询预算（见 scripts/check_query_budgets.py）
+
+请求级统计由 app/middleware/query_stats_middleware.py 开启；
+后台任务、脚本中的查询没有请求上下文，不计入请求统计。
+"""
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.core.config import settings
+
+
+# 日志、指标中展示的SQL最大长度
+STATEMENT_PREVIEW_CHARS = 300
+
+
+def _preview(statement: str) -> str:
+    statement = " ".join(statement.split())
+    if len(statement) > STATEMENT_PREVIEW_CHARS:
+        return statement[:STATEMENT_PREVIEW_CHARS] + "..."
+    return statement
+
+
+@dataclass
+class RequestQueryStats:
+    """单个请求的SQL统计"""
+
+    label: str
+    query_count: int = 0
+    total_seconds: float = 0.0
+    # 参数化SQL -> [执行次数, 累计耗时]
+    statements: Dict[str, List[float]] = field(default_factory=dict)
+    # 最慢的语句 (耗时, SQL)，按耗时倒序，最多 SQL_STATS_TOP_N 条
+    slowest: List[Tuple[float, str]] = field(default_factory=list)
+    # 请求结束后置为True：请求内启动的后台任务继续执行的查询不再计入
+    closed: bool = False
+
+    def record(self, statement: str, seconds: float) -> None:
+        if self.closed:
+            return
+        self.query_count += 1
+        self.total_seconds += seconds
+        entry = self.statements.setdefault(statement, [0, 0.0])
+        entry[0] += 1
+        entry[1] += seconds
+
+        top_n = settings.SQL_STATS_TOP_N
+        if len(self.slowest) < top_n or seconds > self.slowest[-1][0]:
+            self.slowest.append((seconds, statement))
+            self.slowest.sort(key=lambda item: item[0], reverse=True)
+            del self.slowest[top_n:]
+
+    def n_plus_one(self) -> List[Tuple[str, int]]:
+        """疑似 N+1 的语句及其执行次数（按次数倒序）"""
+        threshold = settings.SQL_N_PLUS_ONE_THRESHOLD
+        repeated = [(statement, int(entry[0])) for statement, entry in self.statements.items() if entry[0] >= threshold]
+        return sorted(repeated, key=lambda item: item[1], reverse=True)
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "query_count": self.query_count,
+            "db_ms": round(self.total_seconds * 1000, 1),
+            "slowest": [
+                {"ms": round(seconds * 1000, 1), "statement": _preview(statement)}
+                for seconds, statement in self.slowest
+            ],
+            "n_plus_one": [
+                {"count": count, "statement": _preview(statement)}
+                for statement, count in self.n_plus_one()
+            ],
+        }
+
+
+_current_stats: ContextVar[Optional[RequestQueryStats]] = ContextVar("request_query_stats", default=None)
+
+
+def start_request(label: str) -> RequestQueryStats:
+    """开始统计当前请求（由中间件调用）"""
+    stats = RequestQueryStats(label=label)
+    _current_stats.set(stats)
+    return stats
+
+
+def current_request_stats() -> Optional[RequestQueryStats]:
+    return _current_stats.get()
+
+
+class QueryMetrics:
+    """按路由汇总的SQL指标（进程内）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._routes: Dict[str, Dict[str, float]] = {}
+        # 每个路由最近一次出现的 N+1 语句
+        self._last_n_plus_one: Dict[str, Dict[str, Any]] = {}
+
+    def record(self, stats: RequestQueryStats) -> None:
+        repeated = stats.n_plus_one()
+        with self._lock:
+            route = self._routes.setdefault(stats.label, {
+                "requests": 0,
+                "queries": 0,
+                "max_queries": 0,
+                "db_seconds": 0.0,
+                "max_db_seconds": 0.0,
+                "n_plus_one_requests": 0,
+            })
+            route["requests"] += 1
+            route["queries"] += stats.query_count
+            route["max_queries"] = max(route["max_queries"], stats.query_count)
+            route["db_seconds"] += stats.total_seconds
+            route["max_db_seconds"] = max(route["max_db_seconds"], stats.total_seconds)
+            if repeated:
+                route["n_plus_one_requests"] += 1
+                statement, count = repeated[0]
+                self._last_n_plus_one[stats.label] = {"count": count, "statement": _preview(statement)}
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            result = {}
+            for label, route in sorted(self._routes.items(), key=lambda item: item[1]["db_seconds"], reverse=True):
+                requests = route["requests"] or 1
+                result[label] = {
+                    "requests": int(route["requests"]),
+                    "avg_queries": round(route["queries"] / requests, 1),
+                    "max_queries": int(route["max_queries"]),
+                    "avg_db_ms": round(route["db_seconds"] * 1000 / requests, 1),
+                    "max_db_ms": round(route["max_db_seconds"] * 1000, 1),
+                    "n_plus_one_requests": int(route["n_plus_one_requests"]),
+                    "last_n_plus_one": self._last_n_plus_one.get(label),
+                }
+            return result
+
+
+# 全局SQL指标
+query_metrics = QueryMetrics()
+
+
+# ==================== 引擎事件 ====================
+
+# 测试/脚本中 count_queries() 注册的收集器（不依赖请求上下文，跨线程生效）
+_captures: List[List[str]] = []
+_captures_lock = threading.Lock()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # 每次执行前覆盖（语句执行失败时不会触发after事件，不能用栈）
+    conn.info["query_started_at"] = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.pop("query_started_at", None)
+    elapsed = time.perf_counter() - started if started is not None else 0.0
+
+    stats = _current_stats.get()
+    if stats is not None:
+        stats.record(statement, elapsed)
+    if _captures:
+        with _captures_lock:
+            for captured in _captures:
+                captured.append(statement)
+
+
+def install_query_stats(engine: Engine) -> None:
+    """在引擎上注册统计事件（SQL_STATS_ENABLED 为False时不注册）"""
+    if not settings.SQL_STATS_ENABLED:
+        return
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+# ==================== 测试辅助 ====================
+
+@contextmanager
+def count_queries() -> Iterator[List[str]]:
+    """
+    统计代码块内执行的全部SQL（包括 TestClient 在其他线程中处理的请求）
+
+    用法：
+        with count_queries() as statements:
+            client.get("/api/v1/admin/functions")
+        assert len(statements) <= 3
+    """
+    captured: List[str] = []
+    with _captures_lock:
+        _captures.append(captured)
+    try:
+        yield captured
+    finally:
+        with _captures_lock:
+            _captures.remove(captured)
+
+
+@contextmanager
+def assert_query_budget(max_queries: int, label: str = "") -> Iterator[List[str]]:
+    """
+    查询预算断言：代码块内的SQL超过 max_queries 条，或出现重复语句达到 N+1 阈值时抛出 AssertionError
+
+    用法：
+        with assert_query_budget(3, "GET /admin/functions"):
+            client.get("/api/v1/admin/functions", headers=headers)
+    """
+    with count_queries() as statements:
+        yield statements
+
+    counts: Dict[str, int] = {}
+    for statement in statements:
+        counts[statement] = counts.get(statement, 0) + 1
+    repeated = [
+        f"  x{count}: {_preview(statement)}"
+        for statement, count in sorted(counts.items(), key=lambda item: item[1], reverse=True)
+        if count >= settings.SQL_N_PLUS_ONE_THRESHOLD
+    ]
+    problems = []
+    if len(statements) > max_queries:
+        problems.append(f"查询次数 {len(statements)} 超出预算 {max_queries}")
+    if repeated:
+        problems.append("疑似 N+1：\n" + "\n".join(repeated))
+    if problems:
+        raise AssertionError(f"[SQL统计] {label or '代码块'} " + "；".join(problems))
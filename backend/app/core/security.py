@@ -2,15 +2,19 @@
 安全相关配置和工具（运营数据分析独立版）
 """
 from datetime import datetime, timedelta
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Tuple
 from jose import jwt, JWTError
 from passlib.context import CryptContext
 
 from app.core.config import settings
 
 
-# 密码加密上下文
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# 密码加密上下文（cost与配置不一致的哈希视为需要更新）
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__rounds=settings.PASSWORD_BCRYPT_ROUNDS
+)
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
@@ -27,6 +31,20 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
 
+def verify_and_update_password(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """
+    验证密码，哈希的cost与当前配置不一致时同时生成新哈希
+    
+    Args:
+        plain_password: 明文密码
+        hashed_password: 哈希密码
+    
+    Returns:
+        (是否匹配, 新哈希)，不需要更新时新哈希为None
+    """
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
+
 def get_password_hash(password: str) -> str:
     """
     获取密码哈希
@@ -93,13 +111,14 @@ def decode_access_token(token: str) -> Optional[Dict[str, Any]]:
         return None
 
 
-def create_session_token(user_id: int, project_id: int = 1) -> str:
+def create_session_token(user_id: int, project_id: int = 1, token_version: int = 0) -> str:
     """
     创建Session令牌（用于浏览器访问）
     
     Args:
         user_id: 用户ID
         project_id: 项目ID（固定为1，简化版）
+        token_version: 用户的令牌版本（users.token_version）
     
     Returns:
         Session令牌
@@ -107,7 +126,8 @@ def create_session_token(user_id: int, project_id: int = 1) -> str:
     data = {
         "user_id": user_id,
         "project_id": project_id,
-        "type": "session"
+        "type": "session",
+        "ver": token_version
     }
     return create_access_token(
         data,
@@ -118,7 +138,8 @@ def create_session_token(user_id: int, project_id: int = 1) -> str:
 def create_api_token(
     user_id: int,
     project_id: int = 1,
-    purpose: str = "api"
+    purpose: str = "api",
+    token_version: int = 0
 ) -> str:
     """
     创建API令牌（用于API访问）
@@ -127,6 +148,7 @@ def create_api_token(
         user_id: 用户ID
         project_id: 项目ID（固定为1，简化版）
         purpose: 用途标识
+        token_version: 用户的令牌版本（users.token_version）
     
     Returns:
         API令牌
@@ -135,7 +157,8 @@ def create_api_token(
         "user_id": user_id,
         "project_id": project_id,
         "type": "api",
-        "purpose": purpose
+        "purpose": purpose,
+        "ver": token_version
     }
     return create_access_token(data)
 
@@ -7,6 +7,8 @@ from fastapi.exceptions import RequestValidationError
 from sqlalchemy.exc import IntegrityError, OperationalError
 from loguru import logger
 
+from app.services.password_hash_service import PasswordHashBusyError
+
 
 async def error_handler_middleware(request: Request, call_next):
     """全局错误处理中间件"""
@@ -80,3 +82,20 @@ async def operational_error_handler(request: Request, exc: OperationalError):
         }
     )
 
+
+
+async def password_hash_busy_handler(request: Request, exc: PasswordHashBusyError):
+    """密码哈希队列已满（登录高峰）"""
+    logger.warning(f"[密码哈希] 队列已满，拒绝请求: {request.method} {request.url.path}")
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        headers={"Retry-After": str(exc.retry_after)},
+        content={
+            "success": False,
+            "error": {
+                "code": "SERVICE_BUSY",
+                "message": "登录人数较多，请稍后重试",
+                "details": None
+            }
+        }
+    )
@@ -0,0 +1,61 @@
+"""
+SQL统计中间件
+
+为每个请求开启SQL统计（见 app/core/query_stats.py），请求结束后：
+- 汇总到按路由的SQL指标
+- 出现疑似 N+1 或查询次数超过 SQL_QUERY_WARN_COUNT 时记录警告日志（附最慢的语句）
+- 调试模式或开启 SQL_STATS_HEADERS 时添加响应头 X-DB-Query-Count / X-DB-Time-Ms / X-DB-N-Plus-One
+"""
+from typing import Dict
+
+from fastapi import Request
+from loguru import logger
+
+from app.core.config import settings
+from app.core.query_stats import query_metrics, start_request
+
+
+# endpoint函数 -> 路由路径模板（如 /api/v1/operation/sessions/{id}），避免按实际URL产生大量指标
+_route_paths: Dict[object, str] = {}
+
+
+def _route_label(request: Request) -> str:
+    endpoint = request.scope.get("endpoint")
+    if endpoint is None:
+        return f"{request.method} <unmatched>"
+    path = _route_paths.get(endpoint)
+    if path is None:
+        path = next(
+            (route.path for route in request.app.routes if getattr(route, "endpoint", None) is endpoint),
+            request.url.path
+        )
+        _route_paths[endpoint] = path
+    return f"{request.method} {path}"
+
+
+async def query_stats_middleware(request: Request, call_next):
+    """请求级SQL统计中间件"""
+    if not settings.SQL_STATS_ENABLED:
+        return await call_next(request)
+
+    stats = start_request(f"{request.method} {request.url.path}")
+    try:
+        response = await call_next(request)
+    finally:
+        stats.closed = True
+        # 路由在 call_next 中完成匹配后才能取到路径模板
+        stats.label = _route_label(request)
+        query_metrics.record(stats)
+
+    summary = stats.summary()
+    if summary["n_plus_one"] or stats.query_count > settings.SQL_QUERY_WARN_COUNT:
+        logger.warning(
+            f"[SQL统计] {stats.label} - queries={stats.query_count}, db_ms={summary['db_ms']}, "
+            f"n_plus_one={summary['n_plus_one']}, slowest={summary['slowest']}"
+        )
+
+    if settings.DEBUG or settings.SQL_STATS_HEADERS:
+        response.headers["X-DB-Query-Count"] = str(stats.query_count)
+        response.headers["X-DB-Time-Ms"] = str(summary["db_ms"])
+        response.headers["X-DB-N-Plus-One"] = str(len(summary["n_plus_one"]))
+    return response
@@ -3,16 +3,20 @@
 """
 from app.models.user import User
 from app.models.session import AnalysisSession
+from app.models.session_message import AnalysisSessionMessage, AnalysisSessionMessagePayload
 from app.models.session_version import AnalysisSessionVersion
 from app.models.workflow import Workflow, WorkflowBinding
 from app.models.batch_analysis import BatchAnalysisSession, SheetReport
 from app.models.custom_batch_analysis import CustomBatchAnalysisSession, CustomSheetReport
 from app.models.function_module import FunctionModule
 from app.models.dialog_history import DialogHistory
+from app.models.content_blob import ContentBlob
 
 __all__ = [
     "User",
     "AnalysisSession",
+    "AnalysisSessionMessage",
+    "AnalysisSessionMessagePayload",
     "AnalysisSessionVersion",
     "Workflow",
     "WorkflowBinding",
@@ -22,4 +26,5 @@ __all__ = [
     "CustomSheetReport",
     "FunctionModule",
     "DialogHistory",
+    "ContentBlob",
 ]
@@ -0,0 +1,26 @@
+"""
+内容寻址存储的对象表
+
+大段HTML图表等内容按 SHA-256 存放在内容存储目录中（见 app/services/content_store_service.py），
+业务表只保存哈希；这里记录每个对象的引用计数，引用数归零且超过保留期后由清理脚本删除。
+"""
+from datetime import datetime
+from sqlalchemy import Column, DateTime, Integer, String
+
+from app.core.database import Base
+
+
+class ContentBlob(Base):
+    """内容存储对象表"""
+    __tablename__ = "content_blobs"
+
+    sha256 = Column(String(64), primary_key=True)  # 原始内容（UTF-8）的SHA-256
+    media_type = Column(String(100), nullable=False, default="text/html")
+    size = Column(Integer, nullable=False, default=0)  # 原始字节数
+    stored_size = Column(Integer, nullable=False, default=0)  # gzip压缩后的字节数
+    ref_count = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+
+    def __repr__(self):
+        return f"<ContentBlob(sha256='{self.sha256[:12]}', size={self.size}, ref_count={self.ref_count})>"
@@ -2,7 +2,7 @@
 定制化批量分析模型（独立存储）
 """
 from datetime import datetime
-from sqlalchemy import Column, Integer, String, DateTime, Text, ForeignKey, CheckConstraint
+from sqlalchemy import Column, Integer, String, DateTime, Text, ForeignKey, CheckConstraint, Index, text
 from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import relationship
 
@@ -19,12 +19,19 @@ class CustomBatchAnalysisSession(Base):
     original_file_path = Column(String(500), nullable=False)
     split_files_dir = Column(String(500), nullable=False)  # 拆分文件存储目录
     sheet_count = Column(Integer, nullable=False)  # Sheet总数
-    status = Column(String(50), default='draft', nullable=False)  # draft, processing, completed, failed, partial_failed
+    status = Column(String(50), default='draft', nullable=False)  # draft, processing, completed, failed, partial_failed, cancelled
+    analysis_request = Column(Text, nullable=True)  # 分析需求（重试时复用）
+    # 物化进度计数器（随每个Sheet状态迁移原子更新，避免COUNT查询）
+    pending_count = Column(Integer, default=0, server_default='0', nullable=False)
+    generating_count = Column(Integer, default=0, server_default='0', nullable=False)
+    completed_count = Column(Integer, default=0, server_default='0', nullable=False)
+    failed_count = Column(Integer, default=0, server_default='0', nullable=False)
+    cancelled_count = Column(Integer, default=0, server_default='0', nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
     
     __table_args__ = (
-        CheckConstraint("status IN ('draft', 'processing', 'completed', 'failed', 'partial_failed')", name='custom_batch_analysis_sessions_status_check'),
+        CheckConstraint("status IN ('draft', 'processing', 'completed', 'failed', 'partial_failed', 'cancelled')", name='custom_batch_analysis_sessions_status_check'),
     )
     
     # 关系
@@ -45,14 +52,22 @@ class CustomSheetReport(Base):
     sheet_index = Column(Integer, nullable=False)  # Sheet索引（从0开始）
     split_file_path = Column(String(500), nullable=False)  # 拆分后的文件路径
     report_content = Column(JSONB, nullable=True)  # 报告内容（text, charts, tables, metrics）
-    report_status = Column(String(50), default='pending', nullable=False)  # pending, generating, completed, failed
+    report_status = Column(String(50), default='pending', nullable=False)  # pending, generating, completed, failed, cancelled
     dify_conversation_id = Column(String(100), nullable=True)  # Dify对话ID（如果使用Chatflow）
     error_message = Column(Text, nullable=True)  # 错误信息（如果失败）
+    # 租约/心跳（进程中断后，过期的generating记录可被回收）
+    lease_expires_at = Column(DateTime, nullable=True)
+    heartbeat_at = Column(DateTime, nullable=True)
+    attempt_count = Column(Integer, default=0, server_default='0', nullable=False)
+    # 阶段检查点（文字和图表分别保存，重试时跳过已成功的阶段）
+    text_checkpoint = Column(Text, nullable=True)
+    chart_checkpoint = Column(JSONB, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
     
     __table_args__ = (
-        CheckConstraint("report_status IN ('pending', 'generating', 'completed', 'failed')", name='custom_sheet_reports_status_check'),
+        CheckConstraint("report_status IN ('pending', 'generating', 'completed', 'failed', 'cancelled')", name='custom_sheet_reports_status_check'),
+        Index('ix_custom_sheet_reports_generating_lease', 'lease_expires_at', postgresql_where=text("report_status = 'generating'")),
     )
     
     # 关系
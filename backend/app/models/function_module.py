@@ -24,6 +24,15 @@ class FunctionModule(Base):
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
     
+    # 全局工作流绑定（user_id为None；定制化批量分析按sheet_index各有一个），只读关系
+    global_bindings = relationship(
+        "WorkflowBinding",
+        primaryjoin="and_(FunctionModule.function_key == foreign(WorkflowBinding.function_key), "
+                    "WorkflowBinding.user_id.is_(None))",
+        order_by="WorkflowBinding.sheet_index",
+        viewonly=True
+    )
+    
     def __repr__(self):
         return f"<FunctionModule(id={self.id}, function_key='{self.function_key}', name='{self.name}')>"
 
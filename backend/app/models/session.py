@@ -2,11 +2,12 @@
 分析会话模型（运营数据分析独立版）
 """
 from datetime import datetime
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey
-from sqlalchemy.dialects.postgresql import JSONB
+from typing import Any, Dict, List
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Index
 from sqlalchemy.orm import relationship
 
 from app.core.database import Base
+from app.models.session_message import AnalysisSessionMessage
 
 
 class AnalysisSession(Base):
@@ -18,15 +19,36 @@ class AnalysisSession(Base):
     function_key = Column(String(50), default='operation_data_analysis', nullable=False)
     workflow_id = Column(Integer, ForeignKey('workflows.id', ondelete='SET NULL'), nullable=True)
     title = Column(String(200))
-    messages = Column(JSONB, default=list, nullable=False)  # [{ role: 'user/assistant', content: '...' }]
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+    # 消息摘要（冗余字段，由 SessionMessageService 写消息时维护，会话列表不再读取消息表）
+    message_count = Column(Integer, default=0, nullable=False)
+    last_role = Column(String(20), nullable=True)
+    last_message_at = Column(DateTime, nullable=True)
     
     # 关系
     user = relationship("User", back_populates="analysis_sessions")
     workflow = relationship("Workflow", back_populates="sessions")
     versions = relationship("AnalysisSessionVersion", back_populates="session", cascade="all, delete-orphan")
     dialog_histories = relationship("DialogHistory", back_populates="session", cascade="all, delete-orphan")
+    # 消息按条存储在 analysis_session_messages 中；追加和读取最后一条消息请使用 SessionMessageService
+    message_rows = relationship(
+        "AnalysisSessionMessage",
+        back_populates="session",
+        order_by=AnalysisSessionMessage.seq,
+        cascade="all, delete-orphan",
+        passive_deletes=True
+    )
+    
+    __table_args__ = (
+        # 会话列表：按用户和功能过滤，按 (updated_at, id) 倒序做游标分页
+        Index("ix_analysis_sessions_user_function_updated", "user_id", "function_key", "updated_at", "id"),
+    )
+    
+    @property
+    def messages(self) -> List[Dict[str, Any]]:
+        """兼容原 messages 字段的只读视图：[{ role: 'user/assistant', content: '...', ... }]（会加载全部消息；多个会话请使用 SessionMessageService.list_messages_by_session）"""
+        return [row.to_dict() for row in self.message_rows]
     
     def __repr__(self):
         return f"<AnalysisSession(id={self.id}, title='{self.title}', user_id={self.user_id})>"
@@ -0,0 +1,88 @@
+"""
+会话消息模型：AnalysisSession 的消息按条存储（只追加）
+
+大字段（如HTML图表）存放在单独的 payload 表中，查询消息列表、取最后一条消息时不会读到。
+"""
+from datetime import datetime
+from typing import Any, Dict
+
+from sqlalchemy import Boolean, Column, DateTime, ForeignKey, Index, Integer, String, Text
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.orm import relationship
+
+from app.core.database import Base
+
+
+# 存放到 payload 表中的大字段
+OUT_OF_LINE_KEYS = ("html_charts",)
+
+
+class AnalysisSessionMessage(Base):
+    """会话消息表"""
+    __tablename__ = "analysis_session_messages"
+
+    id = Column(Integer, primary_key=True, index=True)
+    session_id = Column(Integer, ForeignKey("analysis_sessions.id", ondelete="CASCADE"), nullable=False)
+    seq = Column(Integer, nullable=False)  # 会话内的消息序号，从0开始
+    role = Column(String(20), nullable=False)  # 'user' | 'assistant'
+    content = Column(Text, nullable=False, default="")
+    # 其余小字段：timestamp、file_name、charts、tables等
+    extra = Column(JSONB, nullable=True)
+    has_payload = Column(Boolean, nullable=False, default=False)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    session = relationship("AnalysisSession", back_populates="message_rows")
+    payload = relationship(
+        "AnalysisSessionMessagePayload",
+        uselist=False,
+        back_populates="message",
+        cascade="all, delete-orphan",
+        lazy="select"
+    )
+
+    __table_args__ = (
+        # 按会话顺序读取、追加时取最大序号
+        Index("ux_session_messages_session_seq", "session_id", "seq", unique=True),
+        # 取某个角色的最后一条消息（如最新的assistant报告）
+        Index("ix_session_messages_session_role_seq", "session_id", "role", "seq"),
+    )
+
+    @classmethod
+    def from_dict(cls, message: Dict[str, Any], seq: int) -> "AnalysisSessionMessage":
+        """旧格式的消息字典 -> 消息行（大字段拆到 payload）"""
+        extra = {k: v for k, v in message.items() if k not in ("role", "content") and k not in OUT_OF_LINE_KEYS}
+        payload = {k: message[k] for k in OUT_OF_LINE_KEYS if message.get(k)}
+        row = cls(
+            seq=seq,
+            role=str(message.get("role") or "user"),
+            content=str(message.get("content") or ""),
+            extra=extra or None,
+            has_payload=bool(payload)
+        )
+        if payload:
+            row.payload = AnalysisSessionMessagePayload(data=payload)
+        return row
+
+    def to_dict(self, include_payload: bool = True) -> Dict[str, Any]:
+        """转换为旧格式的消息字典（与原 messages JSONB 中的元素一致）"""
+        message: Dict[str, Any] = {"role": self.role, "content": self.content}
+        if self.extra:
+            message.update(self.extra)
+        if "timestamp" not in message and self.created_at:
+            message["timestamp"] = self.created_at.isoformat()
+        if include_payload and self.has_payload and self.payload and self.payload.data:
+            message.update(self.payload.data)
+        return message
+
+    def __repr__(self):
+        return f"<AnalysisSessionMessage(id={self.id}, session_id={self.session_id}, seq={self.seq}, role='{self.role}')>"
+
+
+class AnalysisSessionMessagePayload(Base):
+    """会话消息大字段表"""
+    __tablename__ = "analysis_session_message_payloads"
+
+    message_id = Column(Integer, ForeignKey("analysis_session_messages.id", ondelete="CASCADE"), primary_key=True)
+    data = Column(JSONB, nullable=False)
+
+    message = relationship("AnalysisSessionMessage", back_populates="payload")
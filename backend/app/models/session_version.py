@@ -1,10 +1,13 @@
 """
 会话版本表：存储某次报告/图表的快照
+
+内容按"定期快照 + 中间增量"存储（见 app/utils/version_delta.py），
+读写请使用 SessionVersionService；content_blob 延迟加载，查询版本列表时不会读取。
+较大的HTML图表存入内容存储，版本内容中不再包含，只在 html_charts_ref 中保存其哈希。
 """
 from datetime import datetime
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text
-from sqlalchemy.dialects.postgresql import JSONB
-from sqlalchemy.orm import relationship
+from sqlalchemy import Boolean, Column, Integer, String, DateTime, ForeignKey, Index, LargeBinary
+from sqlalchemy.orm import deferred, relationship
 
 from app.core.database import Base
 
@@ -16,23 +19,21 @@ class AnalysisSessionVersion(Base):
     session_id = Column(Integer, ForeignKey("analysis_sessions.id", ondelete="CASCADE"), nullable=False, index=True)
     version_no = Column(Integer, nullable=False)
     summary = Column(String(255), nullable=True)
-    report_text = Column(Text, nullable=True)
-    report_html_charts = Column(Text, nullable=True)
-    report_charts_json = Column(JSONB, nullable=True)
+    # True：content_blob 为完整快照；False：content_blob 为相对上一版本的增量
+    is_snapshot = Column(Boolean, nullable=False, default=True)
+    content_blob = deferred(Column(LargeBinary, nullable=True))
+    content_bytes = Column(Integer, nullable=False, default=0)  # 内容未压缩时的字节数
+    stored_bytes = Column(Integer, nullable=False, default=0)  # content_blob 的字节数
+    html_charts_ref = Column(String(64), nullable=True)  # HTML图表在内容存储中的哈希
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
     created_by = Column(Integer, ForeignKey("users.id", ondelete="SET NULL"), nullable=True)
 
     session = relationship("AnalysisSession", back_populates="versions")
 
+    __table_args__ = (
+        # 版本号在会话内唯一（创建版本时锁定会话行分配）
+        Index("ux_session_versions_session_version_no", "session_id", "version_no", unique=True),
+    )
+
     def __repr__(self):
         return f"<AnalysisSessionVersion(id={self.id}, session_id={self.session_id}, version_no={self.version_no})>"
-
-
-
-
-
-
-
-
-
-
@@ -24,6 +24,7 @@ class User(Base):
     # 状态
     is_active = Column(Boolean, default=True, index=True)
     is_admin = Column(Boolean, default=False, comment="管理员标识")
+    token_version = Column(Integer, nullable=False, default=0, server_default="0", comment="令牌版本（递增后旧Token失效）")
     
     # 时间戳
     created_at = Column(DateTime, default=datetime.utcnow)
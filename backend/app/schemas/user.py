@@ -37,12 +37,14 @@ class UserUpdate(BaseModel):
     """更新用户请求"""
     email: Optional[EmailStr] = Field(None, description="邮箱")
     full_name: Optional[str] = Field(None, max_length=100, description="全名")
+    is_active: Optional[bool] = Field(None, description="是否启用（禁用后已登录的会话立即失效）")
     
     class Config:
         json_schema_extra = {
             "example": {
                 "email": "user@example.com",
-                "full_name": "更新后的全名"
+                "full_name": "更新后的全名",
+                "is_active": True
             }
         }
 
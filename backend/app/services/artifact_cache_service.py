@@ -0,0 +1,278 @@
+"""
+报告产物缓存服务
+
+渲染好的PDF/PNG按内容哈希（报告内容、图表图片、标题、渲染器版本）缓存到磁盘，
+同一份报告重复下载时不再重新渲染：
+- 命中时刷新文件mtime，总大小超过 ARTIFACT_CACHE_MAX_BYTES 时按mtime淘汰最久未用的文件
+- 配置了 ARTIFACT_ACCEL_REDIRECT_PREFIX 时通过 X-Accel-Redirect 交给Nginx发送文件，
+  否则由FastAPI分块发送文件（支持Range）
+- 渲染进程直接写入缓存目录下的临时文件，完成后原子移入缓存，整份产物不经过Web进程内存
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import uuid
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from fastapi.responses import Response
+from loguru import logger
+from starlette.background import BackgroundTask
+
+from app.core.config import settings
+from app.utils.range_response import range_file_response
+
+
+# 渲染器版本：PDF/图片渲染逻辑变化导致输出不同时递增，旧缓存自然失效
+RENDERER_VERSIONS = {
+    "pdf": "pdf-4",
+    "png": "png-4",
+    "zip": "png-pages-2",
+}
+
+MEDIA_TYPES = {
+    "pdf": "application/pdf",
+    "png": "image/png",
+    "zip": "application/zip",
+}
+
+# 淘汰时清理到上限的比例，避免每次写入都触发淘汰
+EVICT_TARGET_RATIO = 0.9
+
+
+class ArtifactCacheService:
+    """报告产物磁盘缓存"""
+
+    def __init__(self, cache_dir: str, max_bytes: int, accel_prefix: Optional[str] = None):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max(0, max_bytes)
+        self.accel_prefix = accel_prefix.rstrip("/") + "/" if accel_prefix else None
+        self._lock = threading.Lock()
+        # 缓存目录总大小估计值（首次写入时扫描一次，之后增量维护）
+        self._total_bytes: Optional[int] = None
+
+        self._hits = 0
+        self._misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    # ==================== 缓存键 ====================
+
+    @staticmethod
+    def make_key(artifact_type: str, title: str, report_content: Dict[str, Any], chart_images: Optional[list] = None) -> str:
+        """
+        计算产物缓存键
+
+        图表图片先各自取哈希再参与计算，避免把大段base64拼进同一个JSON。
+        """
+        chart_digests = []
+        for chart_img in chart_images or []:
+            image_data = chart_img.get("image_data") or ""
+            chart_digests.append({
+                "index": chart_img.get("index"),
+                "title": chart_img.get("title"),
+                "sha256": hashlib.sha256(image_data.encode("utf-8")).hexdigest(),
+            })
+
+        payload = json.dumps(
+            {
+                "renderer": RENDERER_VERSIONS[artifact_type],
+                "title": title,
+                "report_content": report_content,
+                "chart_images": chart_digests,
+            },
+            ensure_ascii=False,
+            sort_keys=True,
+            default=str
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str, artifact_type: str) -> Path:
+        return self.cache_dir / key[:2] / f"{key}.{artifact_type}"
+
+    # ==================== 读写 ====================
+
+    def get(self, key: str, artifact_type: str) -> Optional[Path]:
+        """查找缓存文件，命中时刷新mtime（LRU）"""
+        if not self.enabled:
+            return None
+        path = self._path(key, artifact_type)
+        try:
+            os.utime(path, None)
+        except OSError:
+            with self._lock:
+                self._misses += 1
+            return None
+        with self._lock:
+            self._hits += 1
+        return path
+
+    def temp_path(self, artifact_type: str) -> Path:
+        """
+        渲染输出用的临时文件路径
+
+        缓存启用时放在缓存目录下（同一文件系统，渲染完成后可原子移入缓存），否则放在系统临时目录。
+        以"."开头，淘汰时不会被当作缓存文件。
+        """
+        directory = self.cache_dir if self.enabled else Path(tempfile.gettempdir())
+        directory.mkdir(parents=True, exist_ok=True)
+        return directory / f".render-{uuid.uuid4().hex}.{artifact_type}"
+
+    @staticmethod
+    def discard(path: Path) -> None:
+        """删除临时文件（响应发送完成后的后台任务）"""
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def commit(self, key: str, artifact_type: str, tmp_path: Path) -> Optional[Path]:
+        """
+        把渲染好的临时文件移入缓存
+
+        Returns:
+            缓存文件路径；缓存未启用或移动失败时返回None，临时文件保留由调用方处理
+        """
+        if not self.enabled:
+            return None
+        try:
+            size = os.stat(tmp_path).st_size
+        except OSError:
+            return None
+        if size > self.max_bytes:
+            return None
+
+        path = self._path(key, artifact_type)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"[产物缓存] 写入失败 - path={path}, error={str(e)}")
+            return None
+
+        with self._lock:
+            if self._total_bytes is None:
+                self._total_bytes = self._scan_total_bytes()
+            else:
+                self._total_bytes += size
+            need_evict = self._total_bytes > self.max_bytes
+        if need_evict:
+            self._evict()
+        return path
+
+    def put(self, key: str, artifact_type: str, data: bytes) -> Optional[Path]:
+        """写入缓存（先写临时文件再原子替换），写入失败时返回None"""
+        if not self.enabled or len(data) > self.max_bytes:
+            return None
+        try:
+            tmp_path = self.temp_path(artifact_type)
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+        except OSError as e:
+            logger.warning(f"[产物缓存] 写入失败 - key={key[:16]}, error={str(e)}")
+            return None
+
+        path = self.commit(key, artifact_type, tmp_path)
+        if path is None:
+            self.discard(tmp_path)
+        return path
+
+    def _scan_total_bytes(self) -> int:
+        total = 0
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                try:
+                    total += os.stat(os.path.join(root, name)).st_size
+                except OSError:
+                    continue
+        return total
+
+    def _evict(self) -> None:
+        """按mtime从旧到新删除，直到总大小降到上限的 EVICT_TARGET_RATIO 以下"""
+        entries = []
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if name.startswith("."):
+                    continue
+                file_path = os.path.join(root, name)
+                try:
+                    stat = os.stat(file_path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, file_path))
+
+        total = sum(size for _, size, _ in entries)
+        target = int(self.max_bytes * EVICT_TARGET_RATIO)
+        removed = 0
+        for _, size, file_path in sorted(entries):
+            if total <= target:
+                break
+            try:
+                os.remove(file_path)
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+
+        with self._lock:
+            self._total_bytes = total
+        logger.info(f"[产物缓存] LRU淘汰 - removed={removed}, total_bytes={total}, max_bytes={self.max_bytes}")
+
+    # ==================== 响应 ====================
+
+    def file_response(
+        self,
+        path: Path,
+        filename: str,
+        artifact_type: str,
+        range_header: Optional[str] = None,
+        background: Optional[BackgroundTask] = None
+    ) -> Response:
+        """
+        返回产物文件：缓存文件在配置了Nginx时使用 X-Accel-Redirect（由Nginx处理Range），
+        否则分块发送文件，带Content-Length并支持Range
+        """
+        headers = {"Content-Disposition": f'attachment; filename="{filename}"'}
+        media_type = MEDIA_TYPES[artifact_type]
+        if self.accel_prefix and background is None:
+            relative_path = path.relative_to(self.cache_dir).as_posix()
+            headers["X-Accel-Redirect"] = f"{self.accel_prefix}{relative_path}"
+            return Response(content=b"", media_type=media_type, headers=headers)
+        return range_file_response(path, media_type, headers, range_header, background)
+
+    def temp_file_response(
+        self,
+        tmp_path: Path,
+        filename: str,
+        artifact_type: str,
+        range_header: Optional[str] = None
+    ) -> Response:
+        """发送未进入缓存的临时文件，发送完成后删除"""
+        return self.file_response(
+            tmp_path,
+            filename,
+            artifact_type,
+            range_header,
+            background=BackgroundTask(self.discard, tmp_path)
+        )
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "hits": self._hits,
+                "misses": self._misses,
+                "total_bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+
+# 全局产物缓存实例
+artifact_cache = ArtifactCacheService(
+    cache_dir=settings.ARTIFACT_CACHE_DIR,
+    max_bytes=settings.ARTIFACT_CACHE_MAX_BYTES,
+    accel_prefix=settings.ARTIFACT_ACCEL_REDIRECT_PREFIX
+)
@@ -6,10 +6,11 @@ from datetime import datetime
 from typing import Optional, Tuple
 from sqlalchemy.orm import Session
 
-from app.core.security import verify_password, create_session_token, create_api_token
+from app.core.security import create_session_token, create_api_token
 from app.core.redis import RedisClient
 from app.core.config import settings
 from app.models.user import User
+from app.services.password_hash_service import password_hasher
 
 
 class AuthService:
@@ -31,6 +32,9 @@ class AuthService:
             
         Returns:
             验证成功返回User对象，失败返回None
+            
+        Raises:
+            PasswordHashBusyError: 密码哈希队列已满
         """
         from loguru import logger
         
@@ -46,11 +50,17 @@ class AuthService:
             logger.debug(f"用户不存在: username={username}")
             return None
         
-        # 验证密码
-        if not verify_password(password, user.password_hash):
+        # 验证密码（线程池中计算，不阻塞事件循环）
+        verified, new_hash = await password_hasher.verify_and_update(password, user.password_hash)
+        if not verified:
             logger.debug(f"密码验证失败: username={username}")
             return None
         
+        # 哈希cost与配置不一致时顺带更新（随登录时间一起提交）
+        if new_hash:
+            user.password_hash = new_hash
+            logger.info(f"[密码哈希] 登录时按新的cost重新生成哈希: user_id={user.id}")
+        
         # 检查用户状态
         if not user.is_active:
             logger.debug(f"用户未激活: username={username}")
@@ -78,13 +88,14 @@ class AuthService:
         session_id = str(uuid.uuid4())
         
         # 生成Session Token（使用固定project_id=1）
-        session_token = create_session_token(user.id, project_id=1)
+        session_token = create_session_token(user.id, project_id=1, token_version=user.token_version or 0)
         
         # 存储Session数据到Redis
         session_data = {
             "user_id": user.id,
             "username": user.username,
             "project_id": 1,  # 固定项目ID
+            "token_version": user.token_version or 0,
             "created_at": datetime.utcnow().isoformat()
         }
         
@@ -134,7 +145,8 @@ class AuthService:
     @staticmethod
     def generate_api_token(
         user_id: int,
-        purpose: str = "api"
+        purpose: str = "api",
+        token_version: int = 0
     ) -> str:
         """
         生成API访问令牌（简化版，移除project_id）
@@ -142,9 +154,10 @@ class AuthService:
         Args:
             user_id: 用户ID
             purpose: 用途标识
+            token_version: 用户的令牌版本（users.token_version）
             
         Returns:
             API令牌
         """
-        return create_api_token(user_id, project_id=1, purpose=purpose)
+        return create_api_token(user_id, project_id=1, purpose=purpose, token_version=token_version)
 
@@ -6,9 +6,12 @@ import json
 import re
 import uuid
 import httpx
+from bisect import bisect_right
 from typing import Dict, Any, List, Optional, AsyncGenerator
 from loguru import logger
 from app.core.config import settings
+from app.services.llm_scheduler import llm_scheduler
+from app.utils.report_ast import parse_report
 
 
 class BailianDialogServiceStream:
@@ -454,39 +457,22 @@ class BailianDialogServiceStream:
         
         selected_end = selected_start + len(selected_text)
         
-        # 从选中文字结束位置开始，查找下一个大章节的开始位置
-        text_after = report_text[selected_end:]
-        
-        # 查找下一个大章节的开始位置
-        # 匹配一级标题：## 标题、一、标题、1. 标题（但不是1.1这种二级标题）
-        next_major_section_patterns = [
-            r'\n#{1,2}\s+[^#]',  # Markdown一级或二级标题
-            r'\n[一二三四五六七八九十]+[、\.]\s*\S',  # 中文一级标题（如：五、后续行动计划）
-            r'\n(\d+)\.\s+(?!\d)',  # 数字一级标题（后面不是数字，避免匹配1.1）
-        ]
-        
-        earliest_pos = len(text_after)
-        matched_pattern = None
-        for pattern in next_major_section_patterns:
-            match = re.search(pattern, text_after)
-            if match:
-                # +1 是因为我们要保留换行符在前面的内容中
-                pos = match.start() + 1
-                if pos < earliest_pos:
-                    earliest_pos = pos
-                    matched_pattern = pattern
-                    logger.debug(f"[BailianDialogServiceStream] 找到下一个大章节，模式: {pattern}, 位置: {pos}")
+        # 查找选中文字之后下一个大章节的开始位置（章节结构来自报告结构缓存，同一版本的报告只解析一次）
+        # 大章节：一级/二级Markdown标题、中文序号标题（如：五、后续行动计划）、数字序号标题（1. 标题，不含1.1）
+        section_starts = parse_report(report_text).section_starts(max_level=2)
+        next_index = bisect_right(section_starts, selected_end)
         
         # 计算最终插入位置
-        if earliest_pos < len(text_after):
-            insert_pos = selected_end + earliest_pos
-            logger.info(f"[BailianDialogServiceStream] 智能插入 - 在下一个大章节前插入，模式: {matched_pattern}")
+        if next_index < len(section_starts):
+            insert_pos = section_starts[next_index]
+            heading = report_text[insert_pos:].split("\n", 1)[0].strip()
+            logger.info(f"[BailianDialogServiceStream] 智能插入 - 在下一个大章节前插入，标题: {heading[:50]}")
         else:
             # 如果没找到下一个大章节，就在选中文字后面插入
             insert_pos = selected_end
             logger.info(f"[BailianDialogServiceStream] 智能插入 - 未找到下一个大章节，在选中文字末尾插入")
         
-        logger.info(f"[BailianDialogServiceStream] 插入位置: selected_end={selected_end}, offset={earliest_pos}, final={insert_pos}")
+        logger.info(f"[BailianDialogServiceStream] 插入位置: selected_end={selected_end}, final={insert_pos}")
         
         return insert_pos
 
@@ -562,6 +548,12 @@ class BailianDialogServiceStream:
         return None
 
     async def _call_api_stream(self, prompt: str) -> AsyncGenerator[Dict[str, Any], None]:
+        """流式调用阿里百炼API（经LLM调度器排队，流式输出期间持有名额）"""
+        async with llm_scheduler.slot():
+            async for event in self._request_api_stream(prompt):
+                yield event
+
+    async def _request_api_stream(self, prompt: str) -> AsyncGenerator[Dict[str, Any], None]:
         """流式调用阿里百炼API"""
         if not self.api_key:
             yield {"type": "error", "content": "API密钥未配置"}
@@ -663,6 +655,15 @@ class BailianDialogServiceStream:
     async def _call_api_stream_with_messages(
         self,
         messages: List[Dict[str, str]]
+    ) -> AsyncGenerator[Dict[str, Any], None]:
+        """使用多条消息流式调用API（经LLM调度器排队，流式输出期间持有名额）"""
+        async with llm_scheduler.slot():
+            async for event in self._request_api_stream_with_messages(messages):
+                yield event
+
+    async def _request_api_stream_with_messages(
+        self,
+        messages: List[Dict[str, str]]
     ) -> AsyncGenerator[Dict[str, Any], None]:
         """
         使用多条消息流式调用API（支持多轮对话）
@@ -7,6 +7,7 @@ import json
 from typing import Dict, Any, Optional, List
 from loguru import logger
 from app.core.config import settings
+from app.services.llm_scheduler import llm_scheduler
 import pandas as pd
 from datetime import datetime
 
@@ -309,6 +310,16 @@ class BailianService:
         prompt: str,
         file_base64: str,
         file_name: str
+    ) -> Dict[str, Any]:
+        """调用阿里百炼API（经LLM调度器按优先级和用户公平排队）"""
+        async with llm_scheduler.slot():
+            return await self._request_dashscope_api(prompt, file_base64, file_name)
+    
+    async def _request_dashscope_api(
+        self,
+        prompt: str,
+        file_base64: str,
+        file_name: str
     ) -> Dict[str, Any]:
         """调用阿里百炼API（支持DashScope原生API和OpenAI兼容接口）"""
         if not self.api_key:
@@ -0,0 +1,225 @@
+"""
+批量报告导出服务
+
+一次导出批量会话中所有已完成的Sheet报告，替代逐个调用下载接口：
+- zip：各Sheet并行提交到PDF渲染进程池，先完成的先写入ZIP并立即发送给客户端，
+  总耗时接近最慢的单个Sheet
+- pdf：所有Sheet合并为一份带目录和书签的PDF（目录页码需要整份文档一起排版，在单个渲染进程中完成）
+单个Sheet和合并文档都走产物缓存，内容未变化时无需重新渲染；
+渲染结果都落在磁盘上，Web进程只按块读取发送。
+"""
+import asyncio
+import re
+import zipfile
+from pathlib import Path
+from typing import Any, AsyncIterator, BinaryIO, Dict, List, Tuple
+
+from loguru import logger
+
+from app.core.config import settings
+from app.services.artifact_cache_service import artifact_cache
+from app.services.pdf_render_service import pdf_render_service, RenderBusyError
+
+
+# 渲染队列已满时的重试间隔（秒）和最大重试次数
+BUSY_RETRY_DELAY_SECONDS = 0.5
+MAX_BUSY_RETRIES = 120
+
+# ZIP中记录失败Sheet的文件名
+FAILED_ENTRY_NAME = "导出失败.txt"
+
+# 从磁盘拷贝PDF到ZIP的分块大小
+ZIP_CHUNK_SIZE = 256 * 1024
+
+
+class _ZipStreamBuffer:
+    """
+    ZIP流式写缓冲
+
+    不提供 tell/seek，zipfile 会按不可寻址流写入（条目大小写在数据描述符中），
+    每写完一个条目由导出协程取走数据发送给客户端。
+    """
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+class BatchExportService:
+    """批量报告导出服务"""
+
+    @staticmethod
+    def sheet_render_kwargs(sheet_report: Any, batch_session_id: int) -> Dict[str, Any]:
+        """Sheet报告 -> generate_report_pdf 参数（与单个下载接口一致，缓存可共用）"""
+        content = sheet_report.report_content or {}
+        report_content = {
+            "text": str(content.get("text", "")),
+            "charts": content.get("charts", []) or [],
+            "tables": content.get("tables", []) or [],
+            "metrics": content.get("metrics", {}) or {}
+        }
+        if not report_content["text"]:
+            report_content["text"] = "报告内容为空"
+        return {
+            "title": f"{sheet_report.sheet_name} - 数据分析报告",
+            "report_content": report_content,
+            "session_id": batch_session_id,
+            "chart_images": []
+        }
+
+    @staticmethod
+    def entry_name(sheet_report: Any) -> str:
+        """ZIP条目名：序号前缀保证唯一且按Sheet顺序排列"""
+        safe_name = re.sub(r'[\\/:*?"<>|\x00-\x1f]', "_", str(sheet_report.sheet_name)).strip() or "sheet"
+        return f"{sheet_report.sheet_index + 1:02d}_{safe_name}.pdf"
+
+    @staticmethod
+    async def _render_with_retry(render, log_tag: str) -> int:
+        """渲染队列已满时等待后重试：导出是后台批量任务，不直接向客户端返回503"""
+        for attempt in range(MAX_BUSY_RETRIES):
+            try:
+                return await render()
+            except RenderBusyError:
+                if attempt == MAX_BUSY_RETRIES - 1:
+                    raise
+                if attempt == 0:
+                    logger.info(f"{log_tag} PDF渲染队列已满，等待重试 - {pdf_render_service.snapshot()}")
+                await asyncio.sleep(BUSY_RETRY_DELAY_SECONDS)
+        raise RenderBusyError(pdf_render_service.retry_after_seconds)
+
+    @staticmethod
+    async def _render_to_file(cache_key: str, render, log_tag: str) -> Tuple[Path, bool]:
+        """
+        获取PDF文件：命中产物缓存时直接返回缓存文件，否则渲染到临时文件后移入缓存
+
+        Returns:
+            (文件路径, 是否为临时文件)；临时文件（缓存未启用或移入失败）由调用方用完后删除
+        """
+        cached_path = artifact_cache.get(cache_key, "pdf")
+        if cached_path:
+            return cached_path, False
+
+        tmp_path = artifact_cache.temp_path("pdf")
+        try:
+            await BatchExportService._render_with_retry(lambda: render(str(tmp_path)), log_tag)
+        except BaseException:
+            artifact_cache.discard(tmp_path)
+            raise
+
+        cached_path = await asyncio.to_thread(artifact_cache.commit, cache_key, "pdf", tmp_path)
+        if cached_path:
+            return cached_path, False
+        return tmp_path, True
+
+    @staticmethod
+    async def render_sheet_pdf(render_kwargs: Dict[str, Any], log_tag: str) -> Tuple[Path, bool]:
+        """渲染单个Sheet的PDF（优先使用产物缓存），返回值同 _render_to_file"""
+        cache_key = artifact_cache.make_key(
+            "pdf",
+            render_kwargs["title"],
+            render_kwargs["report_content"],
+            render_kwargs.get("chart_images")
+        )
+        return await BatchExportService._render_to_file(
+            cache_key,
+            lambda output_path: pdf_render_service.render_pdf(output_path, **render_kwargs),
+            log_tag
+        )
+
+    @staticmethod
+    async def _open_sheet_pdf(render_kwargs: Dict[str, Any], log_tag: str) -> BinaryIO:
+        """渲染并打开Sheet的PDF：文件打开后即使被缓存淘汰或删除也能读完"""
+        path, is_temp = await BatchExportService.render_sheet_pdf(render_kwargs, log_tag)
+        try:
+            return open(path, "rb")
+        finally:
+            if is_temp:
+                artifact_cache.discard(path)
+
+    @staticmethod
+    async def stream_zip(entries: List[Tuple[str, Dict[str, Any]]], log_tag: str) -> AsyncIterator[bytes]:
+        """
+        并行渲染并流式输出ZIP
+
+        同时提交的渲染任务数不超过渲染进程数，给单个报告下载留出队列名额；
+        每个PDF从磁盘分块拷入ZIP，内存占用与Sheet数量和PDF大小无关。
+        客户端断开时取消尚未完成的渲染任务。单个Sheet失败不影响其他Sheet，
+        失败原因写入 FAILED_ENTRY_NAME。
+        """
+        semaphore = asyncio.Semaphore(max(1, pdf_render_service.workers))
+
+        async def render(name: str, render_kwargs: Dict[str, Any]):
+            async with semaphore:
+                try:
+                    return name, await BatchExportService._open_sheet_pdf(render_kwargs, log_tag), None
+                except Exception as e:
+                    return name, None, e
+
+        tasks = [asyncio.create_task(render(name, render_kwargs)) for name, render_kwargs in entries]
+        buffer = _ZipStreamBuffer()
+        failed: List[str] = []
+        try:
+            # PDF本身已压缩，ZIP中直接存储
+            with zipfile.ZipFile(buffer, "w", compression=zipfile.ZIP_STORED) as zip_file:
+                for next_done in asyncio.as_completed(tasks):
+                    name, source, error = await next_done
+                    if error is not None:
+                        logger.error(f"{log_tag} 导出Sheet失败 - entry={name}, error={str(error)}")
+                        failed.append(f"{name}: {str(error)}")
+                        continue
+                    with source, zip_file.open(name, "w") as entry:
+                        while True:
+                            chunk = await asyncio.to_thread(source.read, ZIP_CHUNK_SIZE)
+                            if not chunk:
+                                break
+                            entry.write(chunk)
+                            yield buffer.drain()
+                    yield buffer.drain()
+
+                if failed:
+                    zip_file.writestr(FAILED_ENTRY_NAME, "\n".join(failed))
+            # 中央目录在关闭ZIP时写入
+            yield buffer.drain()
+            logger.info(f"{log_tag} ZIP导出完成 - entries={len(entries)}, failed={len(failed)}")
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+                elif not task.cancelled():
+                    # 已渲染完但未写入ZIP（客户端中途断开）的文件
+                    _, source, _ = task.result()
+                    if source is not None:
+                        source.close()
+
+    @staticmethod
+    async def render_merged_pdf(title: str, sections: List[Dict[str, Any]], log_tag: str) -> Tuple[Path, bool]:
+        """渲染带目录的合并PDF（优先使用产物缓存），返回值同 _render_to_file"""
+        cache_key = artifact_cache.make_key(
+            "pdf",
+            title,
+            {"sections": [
+                {"title": section["title"], "report_content": section["report_content"]}
+                for section in sections
+            ]}
+        )
+        return await BatchExportService._render_to_file(
+            cache_key,
+            lambda output_path: pdf_render_service.render_merged_pdf(
+                output_path,
+                timeout_seconds=settings.PDF_EXPORT_TIMEOUT_SECONDS,
+                title=title,
+                sections=sections
+            ),
+            log_tag
+        )
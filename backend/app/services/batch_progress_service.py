@@ -0,0 +1,179 @@
+"""
+批量分析进度计数服务
+
+在批量会话表上维护物化计数器（pending/generating/completed/failed/cancelled），
+每次Sheet状态迁移时在同一事务内原子更新，并镜像到Redis，
+状态查询和会话列表无需再扫描Sheet报告表。
+"""
+from typing import Optional, Type, Union
+from sqlalchemy import update, func
+from sqlalchemy.orm import Session
+from loguru import logger
+
+from app.core.redis import redis_client
+from app.models.batch_analysis import BatchAnalysisSession
+from app.models.custom_batch_analysis import CustomBatchAnalysisSession
+
+
+BatchSessionModel = Union[Type[BatchAnalysisSession], Type[CustomBatchAnalysisSession]]
+
+# Sheet报告状态 -> 计数器列名
+STATUS_COUNTER_COLUMNS = {
+    "pending": "pending_count",
+    "generating": "generating_count",
+    "completed": "completed_count",
+    "failed": "failed_count",
+    "cancelled": "cancelled_count",
+}
+
+# 批量分析类型（用于Redis键区分）
+BATCH_KIND = "batch"
+CUSTOM_BATCH_KIND = "custom_batch"
+
+# Redis镜像过期时间（秒）
+PROGRESS_CACHE_EXPIRE = 24 * 60 * 60
+
+
+class BatchProgressService:
+    """批量分析进度计数服务类"""
+
+    @staticmethod
+    def _cache_key(kind: str, batch_session_id: int) -> str:
+        return f"batch_progress:{kind}:{batch_session_id}"
+
+    @staticmethod
+    def init_counters(batch_session, sheet_count: int) -> None:
+        """初始化计数器（上传拆分完成后，所有Sheet均为pending）"""
+        batch_session.pending_count = sheet_count
+        batch_session.generating_count = 0
+        batch_session.completed_count = 0
+        batch_session.failed_count = 0
+        batch_session.cancelled_count = 0
+
+    @staticmethod
+    def transition(
+        db: Session,
+        session_model: BatchSessionModel,
+        batch_session_id: int,
+        from_status: Optional[str],
+        to_status: str
+    ) -> Optional[dict]:
+        """
+        记录一次Sheet状态迁移
+
+        在数据库端执行 x = x - 1 / y = y + 1，不提交事务，
+        由调用方与Sheet报告的状态修改一起提交，保证两者原子一致。
+
+        Returns:
+            迁移后的进度快照（同 snapshot）；状态未变化时返回None
+        """
+        if from_status == to_status:
+            return None
+
+        values = {}
+        from_column = STATUS_COUNTER_COLUMNS.get(from_status)
+        to_column = STATUS_COUNTER_COLUMNS.get(to_status)
+        if from_column:
+            values[from_column] = func.greatest(getattr(session_model, from_column) - 1, 0)
+        if to_column:
+            values[to_column] = getattr(session_model, to_column) + 1
+        if not values:
+            return None
+
+        stmt = (
+            update(session_model)
+            .where(session_model.id == batch_session_id)
+            .values(**values)
+            .returning(
+                session_model.user_id,
+                session_model.status,
+                session_model.sheet_count,
+                session_model.pending_count,
+                session_model.generating_count,
+                session_model.completed_count,
+                session_model.failed_count,
+                session_model.cancelled_count,
+            )
+            .execution_options(synchronize_session=False)
+        )
+        row = db.execute(stmt).first()
+        if row is None:
+            return None
+
+        return {
+            "user_id": row.user_id,
+            "status": row.status,
+            "total_sheets": row.sheet_count,
+            "pending_sheets": row.pending_count,
+            "generating_sheets": row.generating_count,
+            "completed_sheets": row.completed_count,
+            "failed_sheets": row.failed_count,
+            "cancelled_sheets": row.cancelled_count,
+        }
+
+    @staticmethod
+    def to_progress(batch_session) -> dict:
+        """从批量会话行读取进度（O(1)，不访问Sheet报告表）"""
+        return {
+            "total_sheets": batch_session.sheet_count,
+            "pending_sheets": batch_session.pending_count,
+            "generating_sheets": batch_session.generating_count,
+            "completed_sheets": batch_session.completed_count,
+            "failed_sheets": batch_session.failed_count,
+            "cancelled_sheets": batch_session.cancelled_count,
+        }
+
+    @staticmethod
+    def snapshot(batch_session) -> dict:
+        """构建用于Redis镜像的进度快照（附带归属用户和会话状态）"""
+        return {
+            "user_id": batch_session.user_id,
+            "status": batch_session.status,
+            **BatchProgressService.to_progress(batch_session),
+        }
+
+    @staticmethod
+    def resolve_batch_status(progress: dict) -> str:
+        """根据计数器推导批量会话的最终状态"""
+        total = progress["total_sheets"]
+        completed = progress["completed_sheets"]
+        failed = progress["failed_sheets"]
+
+        if completed == total:
+            return "completed"
+        if failed == total:
+            return "failed"
+        if failed > 0:
+            return "partial_failed"
+        return "processing"
+
+    @staticmethod
+    async def publish(kind: str, batch_session_id: int, progress: Optional[dict]) -> None:
+        """将进度镜像到Redis（Redis不可用时静默跳过）"""
+        if not progress:
+            return
+        try:
+            await redis_client.set_json(
+                BatchProgressService._cache_key(kind, batch_session_id),
+                progress,
+                expire=PROGRESS_CACHE_EXPIRE
+            )
+        except Exception as e:
+            logger.warning(f"[批量进度] Redis镜像失败 - kind={kind}, batch_session_id={batch_session_id}, error={str(e)}")
+
+    @staticmethod
+    async def get_cached(kind: str, batch_session_id: int) -> Optional[dict]:
+        """读取Redis中的进度镜像"""
+        try:
+            return await redis_client.get_json(BatchProgressService._cache_key(kind, batch_session_id))
+        except Exception as e:
+            logger.warning(f"[批量进度] 读取Redis镜像失败 - kind={kind}, batch_session_id={batch_session_id}, error={str(e)}")
+            return None
+
+    @staticmethod
+    async def clear(kind: str, batch_session_id: int) -> None:
+        """删除Redis中的进度镜像（会话删除时调用）"""
+        try:
+            await redis_client.delete(BatchProgressService._cache_key(kind, batch_session_id))
+        except Exception as e:
+            logger.warning(f"[批量进度] 删除Redis镜像失败 - kind={kind}, batch_session_id={batch_session_id}, error={str(e)}")
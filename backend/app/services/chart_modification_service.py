@@ -5,6 +5,7 @@ from typing import Optional, Dict, Any
 from loguru import logger
 import httpx
 from app.core.config import settings
+from app.services.llm_scheduler import llm_scheduler
 
 
 class ChartModificationService:
@@ -128,6 +129,11 @@ class ChartModificationService:
 HTML代码："""
     
     async def _call_ai(self, prompt: str) -> Optional[str]:
+        """调用AI API（经LLM调度器排队）"""
+        async with llm_scheduler.slot():
+            return await self._request_ai(prompt)
+    
+    async def _request_ai(self, prompt: str) -> Optional[str]:
         """调用AI API"""
         try:
             async with httpx.AsyncClient(timeout=60.0, trust_env=False) as client:
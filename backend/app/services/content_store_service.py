@@ -0,0 +1,254 @@
+"""
+内容寻址存储服务
+
+会话消息、Sheet报告中的大段HTML图表不再写入数据库行：
+- 内容按 UTF-8 字节的 SHA-256 寻址，gzip 压缩后存放在 CONTENT_STORE_DIR/ab/<sha256>.gz，相同内容只存一份
+- 业务数据只保存哈希（如 html_charts -> html_charts_ref），content_blobs 表记录引用计数
+- 前端按哈希单独获取内容，响应带 ETag 和 immutable 缓存头，浏览器缓存后不再重复下载
+- 引用数归零的对象保留 CONTENT_STORE_GC_GRACE_SECONDS 后由 scripts/content_store_gc.py 清理
+"""
+import gzip
+import hashlib
+import os
+import re
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional
+
+from fastapi.responses import FileResponse, Response
+from loguru import logger
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.content_blob import ContentBlob
+
+
+DEFAULT_MEDIA_TYPE = "text/html"  # 文本类型由响应自动补充 charset=utf-8
+
+# 内容不可变：哈希相同即内容相同，可以永久缓存
+IMMUTABLE_CACHE_CONTROL = "private, max-age=31536000, immutable"
+
+COMPRESS_LEVEL = 6
+
+_DIGEST_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+
+
+def ref_key(key: str) -> str:
+    """业务字段名 -> 保存哈希的字段名（html_charts -> html_charts_ref）"""
+    return f"{key}_ref"
+
+
+class ContentStoreService:
+    """内容寻址存储（本地目录）"""
+
+    def __init__(self, store_dir: str, min_bytes: int):
+        self.store_dir = Path(store_dir)
+        self.min_bytes = max(0, min_bytes)
+
+    # ==================== 路径与哈希 ====================
+
+    @staticmethod
+    def is_digest(value: Any) -> bool:
+        return isinstance(value, str) and bool(_DIGEST_PATTERN.match(value))
+
+    def _path(self, digest: str) -> Path:
+        return self.store_dir / digest[:2] / f"{digest}.gz"
+
+    def _write(self, digest: str, data: bytes) -> int:
+        """写入压缩文件（已存在时只刷新修改时间，孤儿文件清理会跳过保留期内修改过的文件），返回压缩后的字节数"""
+        path = self._path(digest)
+        try:
+            os.utime(path)
+            return path.stat().st_size
+        except FileNotFoundError:
+            pass
+        compressed = gzip.compress(data, compresslevel=COMPRESS_LEVEL, mtime=0)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # 先写临时文件再原子替换，并发写入同一内容时结果一致
+        tmp_path = path.parent / f".tmp-{uuid.uuid4().hex}"
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(compressed)
+            os.replace(tmp_path, path)
+        finally:
+            if tmp_path.exists():
+                tmp_path.unlink()
+        return len(compressed)
+
+    # ==================== 引用计数 ====================
+
+    def put(self, db: Session, content: str, media_type: str = DEFAULT_MEDIA_TYPE) -> str:
+        """
+        保存内容并增加一次引用（不提交事务）
+
+        Returns:
+            内容的SHA-256
+        """
+        data = content.encode("utf-8")
+        digest = hashlib.sha256(data).hexdigest()
+        stored_size = self._write(digest, data)
+        now = datetime.utcnow()
+        stmt = insert(ContentBlob).values(
+            sha256=digest,
+            media_type=media_type,
+            size=len(data),
+            stored_size=stored_size,
+            ref_count=1,
+            created_at=now,
+            updated_at=now
+        )
+        db.execute(stmt.on_conflict_do_update(
+            index_elements=[ContentBlob.sha256],
+            set_={"ref_count": ContentBlob.ref_count + 1, "updated_at": now}
+        ))
+        # 清理任务删除记录时持有行锁并在提交前删除文件，上面的写入会等它提交后才返回：
+        # 此时文件若已被删除，重新写入，保证有引用的对象一定有文件
+        if not self._path(digest).exists():
+            self._write(digest, data)
+        return digest
+
+    def release(self, db: Session, digests: Iterable[Optional[str]]) -> int:
+        """释放引用（同一哈希出现多次时释放多次，不提交事务），返回涉及的对象数"""
+        counts = Counter(digest for digest in digests if self.is_digest(digest))
+        now = datetime.utcnow()
+        for digest, count in counts.items():
+            db.query(ContentBlob).filter(ContentBlob.sha256 == digest).update(
+                {ContentBlob.ref_count: ContentBlob.ref_count - count, ContentBlob.updated_at: now},
+                synchronize_session=False
+            )
+        return len(counts)
+
+    def externalize(self, db: Session, payload: Dict[str, Any], key: str = "html_charts") -> Dict[str, Any]:
+        """
+        把字典中的大字段移入存储，返回替换为 "<key>_ref" 的新字典（原字典不修改）
+
+        字段不存在、不是字符串或小于 CONTENT_STORE_MIN_BYTES 时原样返回。
+        """
+        value = payload.get(key) if isinstance(payload, dict) else None
+        if not isinstance(value, str) or len(value.encode("utf-8")) < self.min_bytes:
+            return payload
+        externalized = {k: v for k, v in payload.items() if k != key}
+        externalized[ref_key(key)] = self.put(db, value)
+        return externalized
+
+    # ==================== 读取 ====================
+
+    def read_text(self, digest: str) -> Optional[str]:
+        """读取内容（服务端需要原文时使用），不存在时返回None"""
+        if not self.is_digest(digest):
+            return None
+        try:
+            with gzip.open(self._path(digest), "rb") as f:
+                return f.read().decode("utf-8")
+        except OSError:
+            return None
+
+    def response(
+        self,
+        db: Session,
+        digest: str,
+        accept_encoding: Optional[str] = None,
+        if_none_match: Optional[str] = None
+    ) -> Optional[Response]:
+        """
+        按哈希返回内容，不存在时返回None
+
+        客户端支持gzip时直接发送压缩文件（Content-Encoding: gzip），否则解压后发送。
+        """
+        if not self.is_digest(digest):
+            return None
+        blob = db.query(ContentBlob.media_type).filter(ContentBlob.sha256 == digest).first()
+        path = self._path(digest)
+        if blob is None or not path.exists():
+            return None
+
+        etag = f'"{digest}"'
+        headers = {"ETag": etag, "Cache-Control": IMMUTABLE_CACHE_CONTROL, "Vary": "Accept-Encoding"}
+        if if_none_match and etag in [tag.strip() for tag in if_none_match.split(",")]:
+            return Response(status_code=304, headers=headers)
+        if accept_encoding and "gzip" in accept_encoding.lower():
+            headers["Content-Encoding"] = "gzip"
+            return FileResponse(path, media_type=blob.media_type, headers=headers)
+        with gzip.open(path, "rb") as f:
+            return Response(content=f.read(), media_type=blob.media_type, headers=headers)
+
+    # ==================== 清理 ====================
+
+    def collect_garbage(self, db: Session, grace_seconds: Optional[int] = None) -> Dict[str, int]:
+        """
+        删除引用数归零超过保留期的对象，以及没有对应记录的孤儿文件（如写入文件后事务回滚），提交事务
+
+        逐个对象删除记录：删除语句带 ref_count <= 0 条件（清理期间被重新引用的对象不会被删除），
+        并在提交前删除文件。此时记录的行锁仍被持有，并发的 put() 会等待提交后再检查文件是否存在。
+        """
+        grace = settings.CONTENT_STORE_GC_GRACE_SECONDS if grace_seconds is None else grace_seconds
+        cutoff = datetime.utcnow() - timedelta(seconds=grace)
+        candidates = db.query(ContentBlob.sha256).filter(
+            ContentBlob.ref_count <= 0,
+            ContentBlob.updated_at < cutoff
+        ).all()
+        db.commit()
+
+        deleted = []
+        removed_files = 0
+        for (digest,) in candidates:
+            row = db.execute(
+                ContentBlob.__table__.delete().where(
+                    ContentBlob.sha256 == digest,
+                    ContentBlob.ref_count <= 0,
+                    ContentBlob.updated_at < cutoff
+                ).returning(ContentBlob.sha256)
+            ).first()
+            if row is not None:
+                deleted.append(digest)
+                try:
+                    self._path(digest).unlink()
+                    removed_files += 1
+                except OSError:
+                    pass
+            db.commit()
+
+        # 孤儿文件：按目录批量核对数据库记录
+        orphan_files = 0
+        cutoff_ts = time.time() - grace
+        if self.store_dir.exists():
+            for directory in self.store_dir.iterdir():
+                if not directory.is_dir():
+                    continue
+                files = {}
+                for path in directory.iterdir():
+                    try:
+                        if path.stat().st_mtime >= cutoff_ts:
+                            continue
+                    except OSError:
+                        continue
+                    if path.name.startswith(".tmp-"):
+                        path.unlink(missing_ok=True)
+                        orphan_files += 1
+                    elif path.name.endswith(".gz"):
+                        files[path.name[:-3]] = path
+                if not files:
+                    continue
+                known = {
+                    row[0] for row in db.query(ContentBlob.sha256).filter(ContentBlob.sha256.in_(list(files))).all()
+                }
+                for digest, path in files.items():
+                    if digest not in known:
+                        path.unlink(missing_ok=True)
+                        orphan_files += 1
+
+        logger.info(
+            f"[内容存储] 清理完成 - deleted_blobs={len(deleted)}, removed_files={removed_files}, orphan_files={orphan_files}"
+        )
+        return {"deleted_blobs": len(deleted), "removed_files": removed_files, "orphan_files": orphan_files}
+
+
+# 全局内容存储实例
+content_store = ContentStoreService(
+    store_dir=settings.CONTENT_STORE_DIR,
+    min_bytes=settings.CONTENT_STORE_MIN_BYTES
+)
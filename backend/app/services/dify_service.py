@@ -6,6 +6,8 @@ import json
 from typing import Dict, Any, Optional, AsyncGenerator
 from loguru import logger
 
+from app.services.llm_scheduler import llm_scheduler
+
 
 class DifyService:
     """Dify API服务"""
@@ -299,7 +301,8 @@ class DifyService:
         try:
             # 增加超时时间到300秒（5分钟），因为复杂的Dify工作流可能需要较长时间执行
             logger.info(f"[DifyService] 开始发送HTTP POST请求到: {url}")
-            async with httpx.AsyncClient(timeout=300.0) as client:
+            # 经LLM调度器排队，避免与阿里百炼调用争抢上游并发
+            async with llm_scheduler.slot(user_id=user_id), httpx.AsyncClient(timeout=300.0) as client:
                 response = await client.post(url, json=payload, headers=headers)
                 logger.info(f"[DifyService] 收到HTTP响应 - status_code={response.status_code}")
                 logger.info(f"[DifyService] 响应内容长度: {len(response.text)} 字符")
@@ -0,0 +1,109 @@
+"""
+功能配置服务（管理后台功能列表）
+
+功能及其全局工作流绑定、工作流配置一次查询加载（selectinload 绑定 + joinedload 工作流），
+不再按功能、按绑定逐条查询。
+完整列表缓存在Redis中（读穿透，FUNCTION_CONFIG_CACHE_TTL_SECONDS 过期），
+修改功能配置、启用状态或工作流时调用 invalidate() 删除缓存；Redis不可用时直接查询数据库。
+"""
+from typing import Any, Dict, List, Optional
+
+from loguru import logger
+from sqlalchemy.orm import Session, selectinload
+
+from app.core.config import settings
+from app.core.redis import redis_client
+from app.models.function_module import FunctionModule
+from app.models.workflow import WorkflowBinding
+from app.schemas.workflow import WorkflowResponse
+
+
+# 定制化批量分析：按sheet_index绑定多个工作流
+CUSTOM_BATCH_FUNCTION_KEY = "custom_operation_data_analysis"
+
+FUNCTION_LIST_CACHE_KEY = "admin:functions"
+
+
+class FunctionConfigService:
+    """功能配置服务"""
+
+    @staticmethod
+    def _function_dict(func: FunctionModule) -> Dict[str, Any]:
+        """功能 -> 响应字典（可JSON序列化，时间为ISO字符串）"""
+        data = {
+            "id": func.id,
+            "function_key": func.function_key,
+            "name": func.name,
+            "description": func.description,
+            "route_path": func.route_path,
+            "icon": func.icon,
+            "category": func.category,
+            "is_enabled": func.is_enabled,
+            "sort_order": func.sort_order,
+            "created_at": func.created_at.isoformat() if func.created_at else None,
+            "updated_at": func.updated_at.isoformat() if func.updated_at else None,
+            "workflow": None,
+        }
+        if func.function_key == CUSTOM_BATCH_FUNCTION_KEY:
+            # 多个工作流配置（sheet_index 0-5）
+            data["workflows"] = [
+                {
+                    "sheet_index": binding.sheet_index,
+                    "workflow": WorkflowResponse.model_validate(binding.workflow).model_dump(mode="json")
+                }
+                for binding in func.global_bindings
+                if binding.sheet_index is not None and binding.workflow is not None
+            ]
+        else:
+            binding = next((b for b in func.global_bindings if b.sheet_index is None), None)
+            if binding and binding.workflow:
+                data["workflow"] = WorkflowResponse.model_validate(binding.workflow).model_dump(mode="json")
+        return data
+
+    @staticmethod
+    def load_functions(db: Session, function_key: Optional[str] = None) -> List[Dict[str, Any]]:
+        """从数据库加载功能及其工作流配置（功能一次查询，绑定和工作流一次查询）"""
+        query = db.query(FunctionModule).options(
+            selectinload(FunctionModule.global_bindings).joinedload(WorkflowBinding.workflow)
+        )
+        if function_key is not None:
+            query = query.filter(FunctionModule.function_key == function_key)
+        functions = query.order_by(FunctionModule.sort_order, FunctionModule.id).all()
+        return [FunctionConfigService._function_dict(func) for func in functions]
+
+    @staticmethod
+    async def list_functions(db: Session) -> List[Dict[str, Any]]:
+        """全部功能及其工作流配置（读穿透缓存）"""
+        try:
+            cached = await redis_client.get_json(FUNCTION_LIST_CACHE_KEY)
+            if cached is not None:
+                return cached
+        except Exception as e:
+            logger.warning(f"[功能配置] 读取缓存失败: {str(e)}")
+
+        functions = FunctionConfigService.load_functions(db)
+        try:
+            await redis_client.set_json(
+                FUNCTION_LIST_CACHE_KEY,
+                functions,
+                expire=settings.FUNCTION_CONFIG_CACHE_TTL_SECONDS
+            )
+        except Exception as e:
+            logger.warning(f"[功能配置] 写入缓存失败: {str(e)}")
+        return functions
+
+    @staticmethod
+    async def get_function(db: Session, function_key: str) -> Optional[Dict[str, Any]]:
+        """单个功能及其工作流配置，不存在时返回None"""
+        for func in await FunctionConfigService.list_functions(db):
+            if func["function_key"] == function_key:
+                return func
+        return None
+
+    @staticmethod
+    async def invalidate() -> None:
+        """删除功能列表缓存（修改功能或工作流配置并提交后调用）"""
+        try:
+            await redis_client.delete(FUNCTION_LIST_CACHE_KEY)
+        except Exception as e:
+            logger.warning(f"[功能配置] 删除缓存失败: {str(e)}")
@@ -0,0 +1,235 @@
+"""
+大模型调用调度器
+
+所有对上游大模型的调用都先在这里排队领取并发名额：
+- 优先级：交互式对话 > 单报告生成 > 批量分析
+- 同一优先级内按用户做加权公平排队（虚拟完成时间最小者先执行），
+  单个用户提交大量批量任务不会饿死其他用户
+- 每个用户同时占用的批量名额有上限（对话和单报告不受此限制），并为交互式请求预留名额，
+  批量任务高峰时对话和单报告的等待时间保持稳定
+
+调用方通过 set_llm_context 声明当前请求的用户和优先级，
+下游服务在发起HTTP请求前使用 llm_scheduler.slot() 领取名额。
+"""
+import asyncio
+import itertools
+import time
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from loguru import logger
+
+from app.core.config import settings
+
+
+# 优先级（数值越小越优先）
+PRIORITY_DIALOG = 0
+PRIORITY_REPORT = 1
+PRIORITY_BATCH = 2
+
+PRIORITY_NAMES = {
+    PRIORITY_DIALOG: "dialog",
+    PRIORITY_REPORT: "report",
+    PRIORITY_BATCH: "batch",
+}
+
+# 当前调用上下文：(用户ID, 优先级)
+_llm_context: ContextVar[Tuple[Optional[int], int]] = ContextVar(
+    "llm_context", default=(None, PRIORITY_REPORT)
+)
+
+
+def set_llm_context(user_id: Optional[int], priority: int) -> None:
+    """声明当前任务后续大模型调用所属的用户和优先级"""
+    _llm_context.set((user_id, priority))
+
+
+def get_llm_context() -> Tuple[Optional[int], int]:
+    """获取当前任务的大模型调用上下文"""
+    return _llm_context.get()
+
+
+@dataclass
+class _Waiter:
+    """排队中的调用"""
+    priority: int
+    tag: float  # 虚拟完成时间（加权公平排队）
+    seq: int
+    user_id: Optional[int]
+    future: asyncio.Future = field(compare=False)
+    enqueued_at: float = field(default_factory=time.monotonic, compare=False)
+
+    def sort_key(self):
+        return (self.priority, self.tag, self.seq)
+
+
+class LLMScheduler:
+    """大模型调用调度器（单进程内生效）"""
+
+    def __init__(
+        self,
+        max_concurrency: int,
+        per_user_limit: int,
+        interactive_reserved: int
+    ):
+        self.max_concurrency = max(1, max_concurrency)
+        # 单用户同时运行的批量调用上限
+        self.per_user_limit = max(1, per_user_limit)
+        # 批量任务最多只能占用 max_concurrency - interactive_reserved 个名额
+        self.batch_limit = max(1, self.max_concurrency - max(0, interactive_reserved))
+
+        self._waiters: List[_Waiter] = []
+        self._running = 0
+        self._running_batch = 0
+        self._running_batch_by_user: Dict[int, int] = {}
+        self._user_tags: Dict[Tuple[Optional[int], int], float] = {}
+        # (用户, 优先级) -> 排队中+执行中的调用数，归零时清理虚拟完成时间
+        self._active: Dict[Tuple[Optional[int], int], int] = {}
+        self._virtual_time = 0.0
+        self._seq = itertools.count()
+
+        # 统计信息
+        self._granted: Dict[int, int] = {p: 0 for p in PRIORITY_NAMES}
+        self._wait_seconds: Dict[int, float] = {p: 0.0 for p in PRIORITY_NAMES}
+
+    def _can_run(self, waiter: _Waiter) -> bool:
+        if self._running >= self.max_concurrency:
+            return False
+        if waiter.priority != PRIORITY_BATCH:
+            return True
+        if self._running_batch >= self.batch_limit:
+            return False
+        if waiter.user_id is not None and self._running_batch_by_user.get(waiter.user_id, 0) >= self.per_user_limit:
+            return False
+        return True
+
+    def _dispatch(self) -> None:
+        """按 (优先级, 虚拟完成时间) 顺序放行满足并发限制的等待者"""
+        if not self._waiters:
+            return
+        self._waiters.sort(key=_Waiter.sort_key)
+        remaining = []
+        for waiter in self._waiters:
+            if waiter.future.done():
+                continue
+            if self._can_run(waiter):
+                self._grant(waiter)
+                waiter.future.set_result(None)
+            else:
+                remaining.append(waiter)
+        self._waiters = remaining
+
+    def _grant(self, waiter: _Waiter) -> None:
+        self._running += 1
+        if waiter.priority == PRIORITY_BATCH:
+            self._running_batch += 1
+            if waiter.user_id is not None:
+                self._running_batch_by_user[waiter.user_id] = self._running_batch_by_user.get(waiter.user_id, 0) + 1
+        self._virtual_time = max(self._virtual_time, waiter.tag)
+        self._granted[waiter.priority] += 1
+        self._wait_seconds[waiter.priority] += time.monotonic() - waiter.enqueued_at
+
+    def _release(self, user_id: Optional[int], priority: int) -> None:
+        self._running -= 1
+        if priority == PRIORITY_BATCH:
+            self._running_batch -= 1
+            if user_id is not None:
+                count = self._running_batch_by_user.get(user_id, 0) - 1
+                if count > 0:
+                    self._running_batch_by_user[user_id] = count
+                else:
+                    self._running_batch_by_user.pop(user_id, None)
+        self._dispatch()
+
+    @asynccontextmanager
+    async def slot(
+        self,
+        user_id: Optional[int] = None,
+        priority: Optional[int] = None,
+        weight: float = 1.0
+    ):
+        """
+        领取一个大模型调用名额
+
+        Args:
+            user_id: 用户ID，默认取当前上下文
+            priority: 优先级，默认取当前上下文
+            weight: 公平排队权重，越大分到的份额越多
+        """
+        context_user_id, context_priority = get_llm_context()
+        user_id = context_user_id if user_id is None else user_id
+        priority = context_priority if priority is None else priority
+
+        # 同一用户同一优先级的请求依次累加虚拟完成时间
+        tag_key = (user_id, priority)
+        start_tag = max(self._virtual_time, self._user_tags.get(tag_key, 0.0))
+        tag = start_tag + 1.0 / max(weight, 0.01)
+        self._user_tags[tag_key] = tag
+        self._active[tag_key] = self._active.get(tag_key, 0) + 1
+
+        waiter = _Waiter(
+            priority=priority,
+            tag=tag,
+            seq=next(self._seq),
+            user_id=user_id,
+            future=asyncio.get_running_loop().create_future()
+        )
+        self._waiters.append(waiter)
+        self._dispatch()
+
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # 已获得名额但调用方被取消，归还名额
+                self._release(user_id, priority)
+            else:
+                waiter.future.cancel()
+                self._dispatch()
+            self._forget_tag(tag_key)
+            raise
+
+        waited = time.monotonic() - waiter.enqueued_at
+        if waited > 1.0:
+            logger.info(f"[LLM调度] 排队 {waited:.2f}s - user_id={user_id}, priority={PRIORITY_NAMES.get(priority, priority)}, {self.snapshot()}")
+
+        try:
+            yield
+        finally:
+            self._release(user_id, priority)
+            self._forget_tag(tag_key)
+
+    def _forget_tag(self, tag_key: Tuple[Optional[int], int]) -> None:
+        """该用户在此优先级上已无排队和执行中的调用时清理其虚拟完成时间，再次提交时从当前虚拟时间开始"""
+        count = self._active.pop(tag_key, 0) - 1
+        if count > 0:
+            self._active[tag_key] = count
+        else:
+            self._user_tags.pop(tag_key, None)
+
+    def snapshot(self) -> dict:
+        """当前调度状态和累计统计"""
+        waiting = {name: 0 for name in PRIORITY_NAMES.values()}
+        for waiter in self._waiters:
+            if not waiter.future.done():
+                waiting[PRIORITY_NAMES.get(waiter.priority, str(waiter.priority))] += 1
+        return {
+            "running": self._running,
+            "running_batch": self._running_batch,
+            "waiting": waiting,
+            "granted": {PRIORITY_NAMES[p]: n for p, n in self._granted.items()},
+            "avg_wait_seconds": {
+                PRIORITY_NAMES[p]: round(self._wait_seconds[p] / n, 3) if n else 0.0
+                for p, n in self._granted.items()
+            },
+        }
+
+
+# 全局调度器实例
+llm_scheduler = LLMScheduler(
+    max_concurrency=settings.LLM_MAX_CONCURRENCY,
+    per_user_limit=settings.LLM_PER_USER_CONCURRENCY,
+    interactive_reserved=settings.LLM_INTERACTIVE_RESERVED
+)
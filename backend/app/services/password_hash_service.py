@@ -0,0 +1,172 @@
+"""
+密码哈希服务
+
+bcrypt 是纯CPU的同步计算（cost=12 时单次约 100-300ms），直接在 async 登录接口中调用会阻塞事件循环，
+早高峰集中登录时所有SSE对话流都会卡顿。这里把哈希交给独立的线程池（bcrypt计算时释放GIL）：
+- 同时计算的线程数固定（PASSWORD_HASH_WORKERS），不占用默认线程池
+- 计算中+排队中的任务数有上限，超出时立即拒绝（接口返回503和Retry-After）
+- 登录验证通过时，如果哈希的cost与 PASSWORD_BCRYPT_ROUNDS 不一致，顺带返回新哈希供调用方保存
+- 记录排队等待和计算耗时，汇总到 /admin/metrics
+
+脚本等同步场景继续使用 app.core.security 中的同步函数。
+"""
+import asyncio
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from loguru import logger
+
+from app.core.config import settings
+from app.core.security import get_password_hash, verify_and_update_password
+
+
+class PasswordHashBusyError(Exception):
+    """密码哈希队列已满"""
+
+    def __init__(self, retry_after: int):
+        super().__init__("密码哈希队列已满")
+        self.retry_after = retry_after
+
+
+class PasswordHashService:
+    """密码哈希服务（线程池）"""
+
+    def __init__(self, workers: int, max_pending: int, retry_after_seconds: int):
+        self.workers = max(1, workers)
+        self.max_pending = max(1, max_pending)
+        self.retry_after_seconds = max(1, retry_after_seconds)
+
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._executor_lock = threading.Lock()
+        # 已提交且尚未结束的任务数
+        self._inflight = 0
+        self._lock = threading.Lock()
+
+        # 统计信息
+        self._verified = 0
+        self._hashed = 0
+        self._rehashed = 0
+        self._rejected = 0
+        self._failed = 0
+        self._executed = 0
+        self._hash_seconds = 0.0
+        self._max_hash_seconds = 0.0
+        self._wait_seconds = 0.0
+        self._max_wait_seconds = 0.0
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="password-hash")
+                logger.info(f"[密码哈希] 线程池已创建 - workers={self.workers}")
+            return self._executor
+
+    def shutdown(self) -> None:
+        """关闭线程池（应用关闭时调用）"""
+        with self._executor_lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+            logger.info("[密码哈希] 线程池已关闭")
+
+    def _timed(self, func: Callable[..., Any], submitted_at: float, *args: Any) -> Any:
+        """在线程池中执行并记录排队、计算耗时"""
+        started = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            finished = time.perf_counter()
+            wait, elapsed = started - submitted_at, finished - started
+            with self._lock:
+                self._executed += 1
+                self._wait_seconds += wait
+                self._max_wait_seconds = max(self._max_wait_seconds, wait)
+                self._hash_seconds += elapsed
+                self._max_hash_seconds = max(self._max_hash_seconds, elapsed)
+
+    def _on_done(self, future: Future) -> None:
+        """任务真正结束（完成/失败/取消）时归还队列名额，由执行器线程回调"""
+        with self._lock:
+            self._inflight -= 1
+            if not future.cancelled() and future.exception() is not None:
+                self._failed += 1
+
+    async def _run(self, func: Callable[..., Any], *args: Any) -> Any:
+        with self._lock:
+            if self._inflight >= self.max_pending:
+                self._rejected += 1
+                raise PasswordHashBusyError(self.retry_after_seconds)
+            self._inflight += 1
+        try:
+            future = self._get_executor().submit(self._timed, func, time.perf_counter(), *args)
+        except BaseException:
+            with self._lock:
+                self._inflight -= 1
+            raise
+        future.add_done_callback(self._on_done)
+        # 调用方被取消（客户端断开）时，仍在排队的任务不再执行，已在计算的任务结束后才归还名额
+        return await asyncio.wrap_future(future)
+
+    async def verify_and_update(self, plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+        """
+        验证密码（参数同 verify_and_update_password）
+
+        Returns:
+            (是否匹配, 新哈希)，哈希的cost与配置一致时新哈希为None
+
+        Raises:
+            PasswordHashBusyError: 计算中+排队中的任务已达上限
+        """
+        verified, new_hash = await self._run(verify_and_update_password, plain_password, hashed_password)
+        with self._lock:
+            self._verified += 1
+            if new_hash is not None:
+                self._rehashed += 1
+        return verified, new_hash
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        """验证密码（不需要更新哈希的场景，如修改密码时验证旧密码）"""
+        verified, _ = await self.verify_and_update(plain_password, hashed_password)
+        return verified
+
+    async def hash(self, password: str) -> str:
+        """
+        生成密码哈希
+
+        Raises:
+            PasswordHashBusyError: 计算中+排队中的任务已达上限
+        """
+        hashed = await self._run(get_password_hash, password)
+        with self._lock:
+            self._hashed += 1
+        return hashed
+
+    def snapshot(self) -> Dict[str, Any]:
+        """当前队列状态和累计统计"""
+        with self._lock:
+            count = self._executed or 1
+            return {
+                "workers": self.workers,
+                "rounds": settings.PASSWORD_BCRYPT_ROUNDS,
+                "inflight": self._inflight,
+                "max_pending": self.max_pending,
+                "verified": self._verified,
+                "hashed": self._hashed,
+                "rehashed": self._rehashed,
+                "failed": self._failed,
+                "rejected": self._rejected,
+                "avg_hash_ms": round(self._hash_seconds * 1000 / count, 1),
+                "max_hash_ms": round(self._max_hash_seconds * 1000, 1),
+                "avg_wait_ms": round(self._wait_seconds * 1000 / count, 1),
+                "max_wait_ms": round(self._max_wait_seconds * 1000, 1),
+            }
+
+
+# 全局密码哈希服务实例
+password_hasher = PasswordHashService(
+    workers=settings.PASSWORD_HASH_WORKERS,
+    max_pending=settings.PASSWORD_HASH_MAX_PENDING,
+    retry_after_seconds=settings.PASSWORD_HASH_RETRY_AFTER_SECONDS
+)
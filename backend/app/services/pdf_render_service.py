@@ -0,0 +1,226 @@
+"""
+PDF渲染服务
+
+reportlab渲染是纯CPU的同步操作，长报告加多张图表图片时耗时可达数秒，
+直接在 async 接口中调用会阻塞事件循环、卡住所有并发的SSE对话流。
+这里把渲染交给常驻的进程池：
+- 子进程启动时预先注册中文字体（见 app.utils.render_worker）
+- 渲染中+排队中的任务数有上限，超出时立即拒绝（接口返回503和Retry-After）
+- 单个任务有超时，超时后接口返回504：仍在排队的任务被取消；已在子进程中运行的任务无法取消，
+  终止该进程池的子进程并在下次渲染时重建，卡住的任务随之结束并归还名额
+- 子进程把PDF写入调用方指定的磁盘文件，Web进程不持有整份PDF的字节数据
+"""
+import asyncio
+import multiprocessing
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, List, Optional
+
+from loguru import logger
+
+from app.core.config import settings
+from app.utils import render_worker
+
+
+class RenderBusyError(Exception):
+    """渲染队列已满"""
+
+    def __init__(self, retry_after: int):
+        super().__init__("PDF渲染队列已满")
+        self.retry_after = retry_after
+
+
+class RenderTimeoutError(Exception):
+    """渲染超时"""
+
+
+class PDFRenderService:
+    """PDF渲染服务（进程池）"""
+
+    def __init__(
+        self,
+        workers: int,
+        max_pending: int,
+        timeout_seconds: float,
+        retry_after_seconds: int
+    ):
+        self.workers = max(0, workers)
+        self.max_pending = max(1, max_pending)
+        self.timeout_seconds = timeout_seconds
+        self.retry_after_seconds = max(1, retry_after_seconds)
+
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._executor_lock = threading.Lock()
+        # 已提交且尚未结束的任务数（包括超时后仍在子进程中运行的任务）
+        self._inflight = 0
+        self._inflight_lock = threading.Lock()
+
+        # 统计信息
+        self._completed = 0
+        self._rejected = 0
+        self._timed_out = 0
+        self._failed = 0
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._executor_lock:
+            if self._executor is None:
+                # spawn：子进程不继承父进程的数据库连接、事件循环和线程
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=render_worker.init_render_worker
+                )
+                logger.info(f"[PDF渲染] 进程池已创建 - workers={self.workers}")
+            return self._executor
+
+    def _reset_executor(self, executor: ProcessPoolExecutor, terminate: bool = False) -> None:
+        """
+        丢弃进程池，下次渲染时重建
+
+        Args:
+            executor: 出问题的进程池；已被替换时不再处理（避免关闭新建的进程池）
+            terminate: 是否终止子进程（渲染超时，任务卡在子进程中）
+        """
+        with self._executor_lock:
+            if self._executor is not executor:
+                return
+            self._executor = None
+        if terminate:
+            # ProcessPoolExecutor 没有公开的终止接口：直接终止子进程，执行器随之把未完成的任务标记为失败
+            for process in list((getattr(executor, "_processes", None) or {}).values()):
+                process.terminate()
+        executor.shutdown(wait=False, cancel_futures=True)
+        if terminate:
+            logger.warning("[PDF渲染] 渲染超时，已终止子进程，下次渲染时重建进程池")
+        else:
+            logger.warning("[PDF渲染] 进程池已损坏，下次渲染时重建")
+
+    def start(self) -> None:
+        """创建进程池并预热所有子进程（应用启动时调用）"""
+        if self.workers == 0:
+            logger.info("[PDF渲染] PDF_RENDER_WORKERS=0，在线程中渲染")
+            return
+        executor = self._get_executor()
+        futures: List[Future] = [executor.submit(render_worker.warmup) for _ in range(self.workers)]
+        for future in futures:
+            future.result()
+        logger.info(f"[PDF渲染] 进程池预热完成 - workers={self.workers}")
+
+    def shutdown(self) -> None:
+        """关闭进程池（应用关闭时调用）"""
+        with self._executor_lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+            logger.info("[PDF渲染] 进程池已关闭")
+
+    def _acquire(self) -> None:
+        with self._inflight_lock:
+            if self._inflight >= self.max_pending:
+                self._rejected += 1
+                raise RenderBusyError(self.retry_after_seconds)
+            self._inflight += 1
+
+    def _on_done(self, future: Future) -> None:
+        """任务真正结束（完成/失败/取消）时归还队列名额，由执行器线程回调"""
+        with self._inflight_lock:
+            self._inflight -= 1
+            if future.cancelled():
+                return
+            if future.exception() is None:
+                self._completed += 1
+            else:
+                self._failed += 1
+
+    async def render_pdf(self, output_path: str, **render_kwargs: Any) -> int:
+        """
+        渲染报告PDF并写入 output_path（参数同 write_report_pdf），返回文件大小
+
+        Raises:
+            RenderBusyError: 渲染中+排队中的任务已达上限
+            RenderTimeoutError: 等待超过 PDF_RENDER_TIMEOUT_SECONDS
+        """
+        return await self._render(render_worker.render_report_pdf, render_kwargs, output_path, self.timeout_seconds)
+
+    async def render_merged_pdf(self, output_path: str, timeout_seconds: Optional[float] = None, **render_kwargs: Any) -> int:
+        """
+        渲染带目录的合并报告PDF并写入 output_path（参数同 write_merged_report_pdf）
+
+        合并文档在单个子进程中排版，页数多时耗时较长，可单独指定超时。
+        """
+        return await self._render(
+            render_worker.render_merged_report_pdf,
+            render_kwargs,
+            output_path,
+            timeout_seconds or self.timeout_seconds
+        )
+
+    async def _render(
+        self,
+        render_func: Callable[[Dict[str, Any], str], int],
+        render_kwargs: Dict[str, Any],
+        output_path: str,
+        timeout_seconds: float,
+        retry: bool = True
+    ) -> int:
+        self._acquire()
+        executor: Optional[ProcessPoolExecutor] = None
+        try:
+            if self.workers == 0:
+                loop = asyncio.get_running_loop()
+                future = loop.run_in_executor(None, render_func, render_kwargs, output_path)
+                future.add_done_callback(self._on_done)
+                awaitable = future
+            else:
+                executor = self._get_executor()
+                future = executor.submit(render_func, render_kwargs, output_path)
+                future.add_done_callback(self._on_done)
+                awaitable = asyncio.wrap_future(future)
+        except BaseException:
+            with self._inflight_lock:
+                self._inflight -= 1
+            raise
+
+        try:
+            # 超时后 wait_for 会取消future：仍在排队的任务不再执行
+            return await asyncio.wait_for(awaitable, timeout=timeout_seconds)
+        except asyncio.TimeoutError:
+            with self._inflight_lock:
+                self._timed_out += 1
+            if executor is not None and not future.done():
+                # 任务已在子进程中运行：终止子进程，任务以失败结束并归还名额
+                self._reset_executor(executor, terminate=True)
+            logger.warning(f"[PDF渲染] 渲染超时 - timeout={timeout_seconds}s, {self.snapshot()}")
+            raise RenderTimeoutError(f"PDF渲染超过{timeout_seconds}秒")
+        except BrokenProcessPool:
+            with self._executor_lock:
+                recycled = self._executor is not executor
+            self._reset_executor(executor)
+            if recycled and retry:
+                # 进程池因其他任务超时被回收，本任务不是出错的原因，在新进程池中重新渲染一次
+                logger.info("[PDF渲染] 进程池已回收，重新提交渲染任务")
+                return await self._render(render_func, render_kwargs, output_path, timeout_seconds, retry=False)
+            raise
+
+    def snapshot(self) -> Dict[str, int]:
+        """当前队列状态和累计统计"""
+        with self._inflight_lock:
+            return {
+                "workers": self.workers,
+                "inflight": self._inflight,
+                "max_pending": self.max_pending,
+                "completed": self._completed,
+                "failed": self._failed,
+                "rejected": self._rejected,
+                "timed_out": self._timed_out,
+            }
+
+
+# 全局PDF渲染服务实例
+pdf_render_service = PDFRenderService(
+    workers=settings.PDF_RENDER_WORKERS,
+    max_pending=settings.PDF_RENDER_MAX_PENDING,
+    timeout_seconds=settings.PDF_RENDER_TIMEOUT_SECONDS,
+    retry_after_seconds=settings.PDF_RENDER_RETRY_AFTER_SECONDS
+)
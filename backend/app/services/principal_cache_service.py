@@ -0,0 +1,160 @@
+"""
+当前用户（认证主体）缓存服务
+
+认证依赖不再每个请求查询一次 users 表：
+- 进程内LRU（PRINCIPAL_CACHE_LOCAL_TTL_SECONDS，很短）+ Redis（PRINCIPAL_CACHE_TTL_SECONDS），
+  缓存用户的身份字段和令牌版本，不缓存密码哈希
+- 缓存按 (user_id, token_version) 匹配：Token/Session 中的版本与缓存不一致时回源数据库，
+  与数据库也不一致说明令牌已失效（修改密码、禁用、删除用户时递增 users.token_version）
+- 修改、禁用、删除用户或修改密码并提交后调用 invalidate()；
+  本进程立即生效，其他进程的进程内缓存最多延迟 PRINCIPAL_CACHE_LOCAL_TTL_SECONDS
+
+返回的 User 是不属于任何数据库会话的临时对象，只用于读取身份字段；
+需要修改用户时按 id 重新从数据库查询。
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from fastapi import HTTPException, status
+from loguru import logger
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.redis import redis_client
+from app.models.user import User
+
+
+# 缓存的字段（认证依赖和接口只读取这些字段）
+PRINCIPAL_FIELDS = ("id", "username", "email", "full_name", "is_active", "is_admin", "token_version")
+
+
+def principal_cache_key(user_id: int) -> str:
+    return f"principal:{user_id}"
+
+
+class PrincipalCacheService:
+    """当前用户缓存（进程内LRU + Redis）"""
+
+    def __init__(self, ttl_seconds: int, local_ttl_seconds: int, local_size: int):
+        self.ttl_seconds = ttl_seconds
+        self.local_ttl_seconds = max(0, local_ttl_seconds)
+        self.local_size = max(0, local_size)
+        # user_id -> (过期时间, 字段)
+        self._local: "OrderedDict[int, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.local_hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+        self.rejected = 0
+
+    # ==================== 进程内LRU ====================
+
+    def _local_get(self, user_id: int) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._local.get(user_id)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self._local[user_id]
+                return None
+            self._local.move_to_end(user_id)
+            return entry[1]
+
+    def _local_put(self, user_id: int, fields: Dict[str, Any]) -> None:
+        if not self.local_ttl_seconds or not self.local_size:
+            return
+        with self._lock:
+            self._local[user_id] = (time.monotonic() + self.local_ttl_seconds, fields)
+            self._local.move_to_end(user_id)
+            while len(self._local) > self.local_size:
+                self._local.popitem(last=False)
+
+    # ==================== 读取 ====================
+
+    async def _load(self, db: Session, user_id: int) -> Optional[Dict[str, Any]]:
+        """从数据库加载并写入两级缓存，用户不存在时返回None"""
+        columns = [getattr(User, name) for name in PRINCIPAL_FIELDS]
+        row = db.query(*columns).filter(User.id == user_id).first()
+        if row is None:
+            return None
+        fields = dict(zip(PRINCIPAL_FIELDS, row))
+        fields["token_version"] = fields["token_version"] or 0
+        self._local_put(user_id, fields)
+        try:
+            await redis_client.set_json(principal_cache_key(user_id), fields, expire=self.ttl_seconds)
+        except Exception as e:
+            logger.warning(f"[用户缓存] 写入缓存失败: user_id={user_id}, error={str(e)}")
+        return fields
+
+    async def _cached(self, user_id: int) -> Optional[Dict[str, Any]]:
+        fields = self._local_get(user_id)
+        if fields is not None:
+            self.local_hits += 1
+            return fields
+        try:
+            fields = await redis_client.get_json(principal_cache_key(user_id))
+        except Exception as e:
+            logger.warning(f"[用户缓存] 读取缓存失败: user_id={user_id}, error={str(e)}")
+            fields = None
+        if fields is not None:
+            self.redis_hits += 1
+            self._local_put(user_id, fields)
+        return fields
+
+    async def get(self, db: Session, user_id: int, token_version: int = 0) -> Optional[User]:
+        """
+        获取当前用户
+
+        Returns:
+            用户（临时对象）；用户不存在时返回None
+
+        Raises:
+            HTTPException: 令牌版本与用户当前版本不一致（401）
+        """
+        fields = await self._cached(user_id)
+        if fields is None or fields.get("token_version", 0) != token_version:
+            # 未命中，或缓存的版本与令牌不一致（缓存可能早于重新登录），以数据库为准
+            self.misses += 1
+            fields = await self._load(db, user_id)
+            if fields is None:
+                return None
+        if fields["token_version"] != token_version:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="登录已失效，请重新登录",
+            )
+        return User(**fields)
+
+    # ==================== 失效 ====================
+
+    async def invalidate(self, user_id: int) -> None:
+        """删除用户缓存（修改、禁用、删除用户或修改密码并提交后调用）"""
+        with self._lock:
+            self._local.pop(user_id, None)
+        try:
+            await redis_client.delete(principal_cache_key(user_id))
+        except Exception as e:
+            logger.warning(f"[用户缓存] 删除缓存失败: user_id={user_id}, error={str(e)}")
+
+    def snapshot(self) -> Dict[str, int]:
+        with self._lock:
+            size = len(self._local)
+        return {
+            "local_size": size,
+            "local_hits": self.local_hits,
+            "redis_hits": self.redis_hits,
+            "misses": self.misses,
+            "rejected": self.rejected,
+        }
+
+
+# 全局当前用户缓存
+principal_cache = PrincipalCacheService(
+    ttl_seconds=settings.PRINCIPAL_CACHE_TTL_SECONDS,
+    local_ttl_seconds=settings.PRINCIPAL_CACHE_LOCAL_TTL_SECONDS,
+    local_size=settings.PRINCIPAL_CACHE_LOCAL_SIZE
+)
@@ -0,0 +1,296 @@
+"""
+会话与报告搜索服务
+
+基于 pg_trgm 三元组GIN索引（迁移 add_search_trgm_indexes）搜索当前用户的：
+- session：单文件分析会话标题
+- session_report：单文件分析生成的报告正文（assistant消息）
+- batch_file：批量/定制化批量分析的原始文件名
+- sheet：批量/定制化批量分析的Sheet名称
+- sheet_report：批量/定制化批量分析的Sheet报告正文
+
+匹配条件只使用索引可加速的运算符（短字段 % 和 ILIKE，长文本 <% 和 ILIKE），
+每类数据先由索引取出不超过 SEARCH_CANDIDATE_LIMIT 条候选（匹配过多时取最近更新的），再计算相似度排序，
+长文本的打分开销与数据总量无关。包含完整查询词的结果排在仅模糊匹配的结果之前。
+"""
+import re
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from loguru import logger
+from sqlalchemy import Text, and_, case, func, literal, literal_column, or_, select, text
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.batch_analysis import BatchAnalysisSession, SheetReport
+from app.models.custom_batch_analysis import CustomBatchAnalysisSession, CustomSheetReport
+from app.models.session import AnalysisSession
+from app.models.session_message import AnalysisSessionMessage
+from app.services.batch_progress_service import BATCH_KIND, CUSTOM_BATCH_KIND
+
+
+SEARCH_TYPES = ("session", "session_report", "batch_file", "sheet", "sheet_report")
+
+# 摘要中命中位置之前保留的字符数
+SNIPPET_CONTEXT_CHARS = 40
+
+# pg_trgm 只能为至少3个字符的 ILIKE 模式使用索引
+MIN_INDEXED_LIKE_CHARS = 3
+
+# 批量分析类型 -> (会话模型, Sheet报告模型, 报告指向会话的外键列)
+_BATCH_MODELS = (
+    (BATCH_KIND, BatchAnalysisSession, SheetReport, SheetReport.batch_session_id),
+    (CUSTOM_BATCH_KIND, CustomBatchAnalysisSession, CustomSheetReport, CustomSheetReport.custom_batch_session_id),
+)
+
+
+def _report_text(report_model):
+    """报告正文表达式；键名写成常量，与表达式索引 (report_content ->> 'text') 完全一致"""
+    return report_model.report_content.op("->>", return_type=Text)(literal_column("'text'"))
+
+
+def _like_pattern(query: str) -> str:
+    escaped = query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+
+def _highlights(snippet: str, query: str) -> List[Tuple[int, int]]:
+    """摘要中查询词（整体及空格分隔的各个词）出现的位置，返回合并后的 [start, end) 区间"""
+    terms = {query, *query.split()}
+    ranges = []
+    for term in terms:
+        if term:
+            ranges.extend((m.start(), m.end()) for m in re.finditer(re.escape(term), snippet, re.IGNORECASE))
+    merged: List[Tuple[int, int]] = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+class SearchService:
+    """会话与报告搜索服务"""
+
+    @staticmethod
+    def _set_thresholds(db: Session) -> None:
+        """设置本事务内的 pg_trgm 匹配阈值（% 和 <% 运算符使用）"""
+        db.execute(
+            text(
+                "SELECT set_config('pg_trgm.similarity_threshold', :similarity, true), "
+                "set_config('pg_trgm.word_similarity_threshold', :word_similarity, true)"
+            ),
+            {
+                "similarity": str(settings.SEARCH_SIMILARITY_THRESHOLD),
+                "word_similarity": str(settings.SEARCH_WORD_SIMILARITY_THRESHOLD),
+            }
+        )
+
+    @staticmethod
+    def _match(field, query: str, pattern: str, long_text: bool):
+        """索引可加速的匹配条件"""
+        fuzzy = literal(query).op("<%")(field) if long_text else field.op("%")(query)
+        if len(query) < MIN_INDEXED_LIKE_CHARS:
+            return fuzzy
+        return or_(fuzzy, field.ilike(pattern, escape="\\"))
+
+    @staticmethod
+    def _ranked(
+        db: Session,
+        candidates,
+        query: str,
+        pattern: str,
+        long_text: bool,
+        limit: int
+    ) -> List[Dict[str, Any]]:
+        """
+        对候选结果打分排序
+
+        Args:
+            candidates: 带 field 列（被搜索的文本）的候选查询（已限制条数）
+        """
+        sub = candidates.subquery()
+        field = sub.c.field
+        exact = case((field.ilike(pattern, escape="\\"), 1.0), else_=0.0)
+        if long_text:
+            score = func.word_similarity(query, field) + exact
+            # 摘要定位到第一个词首次出现的位置（未精确出现时从开头截取）
+            anchor = query.split()[0].lower()
+            snippet_start = func.greatest(func.strpos(func.lower(field), anchor) - SNIPPET_CONTEXT_CHARS, 1)
+            snippet = func.substr(field, snippet_start, settings.SEARCH_SNIPPET_CHARS)
+            tail = func.length(field) >= snippet_start + settings.SEARCH_SNIPPET_CHARS
+        else:
+            score = func.similarity(field, query) + exact
+            snippet_start = literal(1)
+            snippet = field
+            tail = literal(False)
+        columns = [column for column in sub.c if column.name != "field"]
+        stmt = select(
+            *columns,
+            score.label("score"),
+            snippet.label("snippet"),
+            snippet_start.label("snippet_start"),
+            tail.label("snippet_truncated")
+        ).order_by(score.desc(), sub.c.updated_at.desc()).limit(limit)
+
+        results = []
+        for row in db.execute(stmt).mappings():
+            item = dict(row)
+            snippet_text = item.get("snippet") or ""
+            if item.pop("snippet_start", 1) > 1:
+                snippet_text = "…" + snippet_text
+            if item.pop("snippet_truncated", False):
+                snippet_text = snippet_text + "…"
+            item["snippet"] = snippet_text
+            item["highlights"] = _highlights(snippet_text, query)
+            item["score"] = round(float(item["score"]), 4)
+            if item.get("updated_at"):
+                item["updated_at"] = item["updated_at"].isoformat()
+            results.append(item)
+        return results
+
+    @staticmethod
+    def _search_sessions(db: Session, user_id: int, query: str, pattern: str, limit: int) -> List[Dict[str, Any]]:
+        candidates = select(
+            literal("session").label("type"),
+            AnalysisSession.id.label("id"),
+            AnalysisSession.id.label("session_id"),
+            AnalysisSession.title.label("title"),
+            AnalysisSession.updated_at.label("updated_at"),
+            AnalysisSession.title.label("field")
+        ).where(
+            AnalysisSession.user_id == user_id,
+            AnalysisSession.function_key == "operation_data_analysis",
+            SearchService._match(AnalysisSession.title, query, pattern, long_text=False)
+        ).order_by(AnalysisSession.updated_at.desc()).limit(settings.SEARCH_CANDIDATE_LIMIT)
+        return SearchService._ranked(db, candidates, query, pattern, False, limit)
+
+    @staticmethod
+    def _search_session_reports(db: Session, user_id: int, query: str, pattern: str, limit: int) -> List[Dict[str, Any]]:
+        candidates = select(
+            literal("session_report").label("type"),
+            AnalysisSessionMessage.id.label("id"),
+            AnalysisSession.id.label("session_id"),
+            AnalysisSession.title.label("title"),
+            AnalysisSessionMessage.created_at.label("updated_at"),
+            AnalysisSessionMessage.content.label("field")
+        ).join(
+            AnalysisSession, AnalysisSession.id == AnalysisSessionMessage.session_id
+        ).where(
+            AnalysisSessionMessage.role == "assistant",
+            AnalysisSession.user_id == user_id,
+            AnalysisSession.function_key == "operation_data_analysis",
+            SearchService._match(AnalysisSessionMessage.content, query, pattern, long_text=True)
+        ).order_by(AnalysisSessionMessage.created_at.desc()).limit(settings.SEARCH_CANDIDATE_LIMIT)
+        return SearchService._ranked(db, candidates, query, pattern, True, limit)
+
+    @staticmethod
+    def _search_batch_files(db: Session, user_id: int, query: str, pattern: str, limit: int) -> List[Dict[str, Any]]:
+        results = []
+        for kind, session_model, _, _ in _BATCH_MODELS:
+            candidates = select(
+                literal("batch_file").label("type"),
+                literal(kind).label("batch_kind"),
+                session_model.id.label("id"),
+                session_model.id.label("batch_session_id"),
+                session_model.original_file_name.label("title"),
+                session_model.updated_at.label("updated_at"),
+                session_model.original_file_name.label("field")
+            ).where(
+                session_model.user_id == user_id,
+                SearchService._match(session_model.original_file_name, query, pattern, long_text=False)
+            ).order_by(session_model.updated_at.desc()).limit(settings.SEARCH_CANDIDATE_LIMIT)
+            results.extend(SearchService._ranked(db, candidates, query, pattern, False, limit))
+        return results
+
+    @staticmethod
+    def _search_sheets(
+        db: Session,
+        user_id: int,
+        query: str,
+        pattern: str,
+        limit: int,
+        report_text: bool
+    ) -> List[Dict[str, Any]]:
+        """搜索Sheet名称（report_text=False）或Sheet报告正文（report_text=True）"""
+        results = []
+        for kind, session_model, report_model, session_fk in _BATCH_MODELS:
+            if report_text:
+                field = _report_text(report_model)
+                conditions = [report_model.report_status == "completed"]
+            else:
+                field = report_model.sheet_name
+                conditions = []
+            candidates = select(
+                literal("sheet_report" if report_text else "sheet").label("type"),
+                literal(kind).label("batch_kind"),
+                report_model.id.label("id"),
+                session_model.id.label("batch_session_id"),
+                report_model.sheet_index.label("sheet_index"),
+                (session_model.original_file_name + " / " + report_model.sheet_name).label("title"),
+                report_model.updated_at.label("updated_at"),
+                field.label("field")
+            ).join(
+                session_model, session_model.id == session_fk
+            ).where(
+                and_(
+                    session_model.user_id == user_id,
+                    SearchService._match(field, query, pattern, long_text=report_text),
+                    *conditions
+                )
+            ).order_by(report_model.updated_at.desc()).limit(settings.SEARCH_CANDIDATE_LIMIT)
+            results.extend(SearchService._ranked(db, candidates, query, pattern, report_text, limit))
+        return results
+
+    @staticmethod
+    def search(
+        db: Session,
+        user_id: int,
+        query: str,
+        types: Optional[Sequence[str]] = None,
+        limit: int = 20
+    ) -> List[Dict[str, Any]]:
+        """
+        搜索当前用户的会话和报告，按相似度降序返回
+
+        Returns:
+            [{type, id, title, snippet, highlights: [[start, end]], score, updated_at,
+              session_id | batch_kind + batch_session_id (+ sheet_index)}]
+        """
+        query = query.strip()
+        if not query:
+            return []
+        types = [t for t in SEARCH_TYPES if not types or t in types]
+        pattern = _like_pattern(query)
+        started = time.perf_counter()
+
+        SearchService._set_thresholds(db)
+        results: List[Dict[str, Any]] = []
+        if "session" in types:
+            results.extend(SearchService._search_sessions(db, user_id, query, pattern, limit))
+        if "session_report" in types:
+            results.extend(SearchService._search_session_reports(db, user_id, query, pattern, limit))
+        if "batch_file" in types:
+            results.extend(SearchService._search_batch_files(db, user_id, query, pattern, limit))
+        if "sheet" in types:
+            results.extend(SearchService._search_sheets(db, user_id, query, pattern, limit, report_text=False))
+        if "sheet_report" in types:
+            results.extend(SearchService._search_sheets(db, user_id, query, pattern, limit, report_text=True))
+
+        # 同一会话的多条报告消息只保留得分最高的一条
+        results.sort(key=lambda item: item["score"], reverse=True)
+        seen = set()
+        merged = []
+        for item in results:
+            key = (item["type"], item["session_id"]) if item["type"] == "session_report" else (item["type"], item.get("batch_kind"), item["id"])
+            if key in seen:
+                continue
+            seen.add(key)
+            merged.append(item)
+
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        logger.info(
+            f"[搜索] 搜索完成 - user_id={user_id}, query={query!r}, types={','.join(types)}, "
+            f"hits={len(merged)}, elapsed_ms={elapsed_ms:.1f}"
+        )
+        return merged[:limit]
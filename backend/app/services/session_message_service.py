@@ -0,0 +1,196 @@
+"""
+会话消息服务
+
+消息按条存储在 analysis_session_messages 中：
+- 追加消息只插入新行（先更新会话行取得行锁，序号取 (session_id, seq) 索引上的最大值 + 1），不读取也不重写已有消息
+- 读取最新的assistant消息、最近N条消息都只查询需要的行；大字段（HTML图表）默认不加载
+- 写消息时同步维护会话上的 message_count / last_role / last_message_at，会话列表只读会话表
+- 超过 CONTENT_STORE_MIN_BYTES 的HTML图表存入内容存储，消息中只保存 html_charts_ref（前端按哈希获取）
+"""
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional
+
+from loguru import logger
+from sqlalchemy import func
+from sqlalchemy.orm import Session, selectinload
+
+from app.models.session import AnalysisSession
+from app.models.session_message import AnalysisSessionMessage
+from app.services.content_store_service import content_store, ref_key
+
+
+class SessionMessageService:
+    """会话消息服务"""
+
+    @staticmethod
+    def _next_seq(db: Session, session_id: int) -> int:
+        max_seq = db.query(func.max(AnalysisSessionMessage.seq)).filter(
+            AnalysisSessionMessage.session_id == session_id
+        ).scalar()
+        return 0 if max_seq is None else max_seq + 1
+
+    @staticmethod
+    def _message_time(message: Dict[str, Any]) -> datetime:
+        """消息的时间（消息中的 timestamp，缺失或无法解析时为当前时间，统一为naive UTC）"""
+        timestamp = message.get("timestamp")
+        if isinstance(timestamp, str) and timestamp:
+            try:
+                return datetime.fromisoformat(timestamp.replace("Z", "+00:00")).replace(tzinfo=None)
+            except ValueError:
+                pass
+        return datetime.utcnow()
+
+    @staticmethod
+    def _update_summary(db: Session, session_id: int, appended: Optional[List[Dict[str, Any]]]) -> None:
+        """
+        更新会话上的消息摘要和 updated_at（会话列表按 updated_at 排序）
+
+        Args:
+            appended: 本次追加的消息；None 表示消息已清空
+        """
+        now = datetime.utcnow()
+        if appended is None:
+            values = {
+                AnalysisSession.message_count: 0,
+                AnalysisSession.last_role: None,
+                AnalysisSession.last_message_at: None,
+                AnalysisSession.updated_at: now,
+            }
+        else:
+            last = appended[-1]
+            values = {
+                AnalysisSession.message_count: AnalysisSession.message_count + len(appended),
+                AnalysisSession.last_role: str(last.get("role") or "user"),
+                AnalysisSession.last_message_at: SessionMessageService._message_time(last),
+                AnalysisSession.updated_at: now,
+            }
+        db.query(AnalysisSession).filter(AnalysisSession.id == session_id).update(
+            values, synchronize_session=False
+        )
+
+    @staticmethod
+    def append(db: Session, session_id: int, messages: Iterable[Dict[str, Any]]) -> List[AnalysisSessionMessage]:
+        """
+        追加消息（不提交事务，由调用方 commit）
+
+        Args:
+            messages: 旧格式的消息字典 [{role, content, timestamp, charts, html_charts, ...}]
+        """
+        messages = list(messages)
+        if not messages:
+            return []
+        # 先更新会话摘要：UPDATE 持有会话行锁直到事务结束，同一会话并发追加时依次分配序号
+        SessionMessageService._update_summary(db, session_id, messages)
+        seq = SessionMessageService._next_seq(db, session_id)
+        rows = []
+        for offset, message in enumerate(messages):
+            message = content_store.externalize(db, message, "html_charts")
+            row = AnalysisSessionMessage.from_dict(message, seq + offset)
+            row.session_id = session_id
+            db.add(row)
+            rows.append(row)
+        db.flush()
+        return rows
+
+    @staticmethod
+    def replace(db: Session, session_id: int, messages: Iterable[Dict[str, Any]]) -> List[AnalysisSessionMessage]:
+        """整体替换会话消息（不提交事务）"""
+        SessionMessageService.clear(db, session_id)
+        return SessionMessageService.append(db, session_id, messages)
+
+    @staticmethod
+    def release_content(db: Session, session_id: int) -> int:
+        """释放会话消息引用的内容存储对象（删除消息或会话前调用，不提交事务）"""
+        refs = db.query(AnalysisSessionMessage.extra[ref_key("html_charts")].astext).filter(
+            AnalysisSessionMessage.session_id == session_id,
+            AnalysisSessionMessage.extra.has_key(ref_key("html_charts"))
+        ).all()
+        return content_store.release(db, [ref for (ref,) in refs])
+
+    @staticmethod
+    def clear(db: Session, session_id: int) -> int:
+        """删除会话的全部消息（payload 由外键级联删除，不提交事务）"""
+        SessionMessageService.release_content(db, session_id)
+        deleted = db.query(AnalysisSessionMessage).filter(
+            AnalysisSessionMessage.session_id == session_id
+        ).delete(synchronize_session=False)
+        SessionMessageService._update_summary(db, session_id, None)
+        db.flush()
+        logger.info(f"[会话消息] 已清空会话消息 - session_id={session_id}, deleted={deleted}")
+        return deleted
+
+    @staticmethod
+    def list_messages(
+        db: Session,
+        session_id: int,
+        include_payload: bool = True,
+        limit: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        按顺序返回会话消息（旧格式字典）
+
+        Args:
+            include_payload: 是否加载大字段（一次查询批量加载，不会逐条查询）
+            limit: 只返回最后 limit 条
+        """
+        query = db.query(AnalysisSessionMessage).filter(AnalysisSessionMessage.session_id == session_id)
+        if include_payload:
+            query = query.options(selectinload(AnalysisSessionMessage.payload))
+        if limit is not None:
+            rows = query.order_by(AnalysisSessionMessage.seq.desc()).limit(limit).all()
+            rows.reverse()
+        else:
+            rows = query.order_by(AnalysisSessionMessage.seq).all()
+        return [row.to_dict(include_payload=include_payload) for row in rows]
+
+    @staticmethod
+    def list_messages_by_session(
+        db: Session,
+        session_ids: Iterable[int],
+        include_payload: bool = True
+    ) -> Dict[int, List[Dict[str, Any]]]:
+        """
+        批量返回多个会话的消息（会话列表等场景，不逐个会话查询）
+
+        Returns:
+            {session_id: 按顺序排列的消息字典}，没有消息的会话为空列表
+        """
+        result: Dict[int, List[Dict[str, Any]]] = {session_id: [] for session_id in session_ids}
+        if not result:
+            return result
+        query = db.query(AnalysisSessionMessage).filter(AnalysisSessionMessage.session_id.in_(list(result)))
+        if include_payload:
+            query = query.options(selectinload(AnalysisSessionMessage.payload))
+        rows = query.order_by(AnalysisSessionMessage.session_id, AnalysisSessionMessage.seq).all()
+        for row in rows:
+            result[row.session_id].append(row.to_dict(include_payload=include_payload))
+        return result
+
+    @staticmethod
+    def latest(
+        db: Session,
+        session_id: int,
+        role: Optional[str] = None,
+        include_payload: bool = False
+    ) -> Optional[Dict[str, Any]]:
+        """返回最后一条消息（可指定角色，如最新的assistant报告），没有时返回None"""
+        query = db.query(AnalysisSessionMessage).filter(AnalysisSessionMessage.session_id == session_id)
+        if role:
+            query = query.filter(AnalysisSessionMessage.role == role)
+        row = query.order_by(AnalysisSessionMessage.seq.desc()).first()
+        if row is None:
+            return None
+        return row.to_dict(include_payload=include_payload)
+
+    @staticmethod
+    def latest_report_content(db: Session, session_id: int) -> Optional[Dict[str, Any]]:
+        """最新assistant消息中的报告内容（text/charts/tables/metrics），用于PDF、图片导出"""
+        message = SessionMessageService.latest(db, session_id, role="assistant")
+        if message is None:
+            return None
+        return {
+            "text": str(message.get("content", "")),
+            "charts": message.get("charts", []) or [],
+            "tables": message.get("tables", []) or [],
+            "metrics": message.get("metrics", {}) or {}
+        }
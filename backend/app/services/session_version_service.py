@@ -0,0 +1,159 @@
+"""
+会话版本服务
+
+版本内容按"定期快照 + 中间增量"存储：
+- 每隔 SESSION_VERSION_SNAPSHOT_INTERVAL 个版本（或增量不比快照小时）保存完整快照
+- 其余版本只保存相对上一版本的压缩增量
+还原任意版本最多读取一个快照和 INTERVAL-1 个增量；版本列表只查询元数据列。
+较大的HTML图表存入内容存储（html_charts_ref），不参与快照/增量编码。
+"""
+from typing import Any, Dict, List, Optional
+
+from loguru import logger
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.session import AnalysisSession
+from app.models.session_version import AnalysisSessionVersion
+from app.services.content_store_service import content_store, ref_key
+from app.utils.version_delta import (
+    VersionContent,
+    apply_blob,
+    content_size,
+    decode_content,
+    encode_delta,
+    encode_snapshot,
+    normalize_content,
+)
+
+
+class SessionVersionService:
+    """会话版本服务"""
+
+    @staticmethod
+    def list_versions(db: Session, session_id: int) -> List[Dict[str, Any]]:
+        """版本列表（按版本号倒序，不读取内容）"""
+        rows = db.query(
+            AnalysisSessionVersion.id,
+            AnalysisSessionVersion.version_no,
+            AnalysisSessionVersion.summary,
+            AnalysisSessionVersion.created_at
+        ).filter(
+            AnalysisSessionVersion.session_id == session_id
+        ).order_by(AnalysisSessionVersion.version_no.desc()).all()
+        return [
+            {
+                "id": row.id,
+                "version_no": row.version_no,
+                "summary": row.summary,
+                "created_at": row.created_at.isoformat() if row.created_at else None
+            }
+            for row in rows
+        ]
+
+    @staticmethod
+    def _load_texts(db: Session, session_id: int, version_no: int) -> Optional[Dict[str, Optional[str]]]:
+        """还原某个版本各字段的文本形式：读取最近的快照及其后到目标版本的增量"""
+        snapshot_no = db.query(func.max(AnalysisSessionVersion.version_no)).filter(
+            AnalysisSessionVersion.session_id == session_id,
+            AnalysisSessionVersion.is_snapshot.is_(True),
+            AnalysisSessionVersion.version_no <= version_no
+        ).scalar()
+        if snapshot_no is None:
+            return None
+
+        chain = db.query(
+            AnalysisSessionVersion.version_no,
+            AnalysisSessionVersion.content_blob
+        ).filter(
+            AnalysisSessionVersion.session_id == session_id,
+            AnalysisSessionVersion.version_no >= snapshot_no,
+            AnalysisSessionVersion.version_no <= version_no
+        ).order_by(AnalysisSessionVersion.version_no, AnalysisSessionVersion.id).all()
+
+        texts = None
+        for _, blob in chain:
+            texts = apply_blob(texts, blob)
+        return texts
+
+    @staticmethod
+    def get_content(db: Session, version: AnalysisSessionVersion) -> VersionContent:
+        """
+        版本内容 {report_text, report_html_charts, report_charts_json, report_html_charts_ref}
+
+        HTML图表在内容存储中时 report_html_charts 为None，由前端按 report_html_charts_ref 获取。
+        """
+        texts = SessionVersionService._load_texts(db, version.session_id, version.version_no)
+        if texts is None:
+            logger.error(f"[版本管理] 版本内容缺少快照 - session_id={version.session_id}, version_no={version.version_no}")
+            raise ValueError(f"版本 V{version.version_no} 内容缺失")
+        content = decode_content(texts)
+        content[ref_key("report_html_charts")] = version.html_charts_ref
+        return content
+
+    @staticmethod
+    def release_content(db: Session, session_id: int) -> int:
+        """释放会话各版本引用的内容存储对象（删除版本或会话前调用，不提交事务）"""
+        refs = db.query(AnalysisSessionVersion.html_charts_ref).filter(
+            AnalysisSessionVersion.session_id == session_id,
+            AnalysisSessionVersion.html_charts_ref.isnot(None)
+        ).all()
+        return content_store.release(db, [ref for (ref,) in refs])
+
+    @staticmethod
+    def create_version(
+        db: Session,
+        session_id: int,
+        summary: Optional[str],
+        content: VersionContent,
+        created_by: Optional[int] = None
+    ) -> AnalysisSessionVersion:
+        """创建新版本（不提交事务）"""
+        # 锁定会话行直到事务结束：同一会话并发保存版本时依次分配版本号，增量也基于真正的上一版本计算
+        db.query(AnalysisSession.id).filter(AnalysisSession.id == session_id).with_for_update().first()
+        latest = db.query(
+            AnalysisSessionVersion.version_no
+        ).filter(
+            AnalysisSessionVersion.session_id == session_id
+        ).order_by(AnalysisSessionVersion.version_no.desc()).first()
+        version_no = latest.version_no + 1 if latest else 1
+
+        content = content_store.externalize(db, content, "report_html_charts")
+        html_charts_ref = content.get(ref_key("report_html_charts"))
+        texts = normalize_content(content)
+        size = content_size(texts)
+        blob, is_snapshot = None, True
+        if latest:
+            last_snapshot_no = db.query(func.max(AnalysisSessionVersion.version_no)).filter(
+                AnalysisSessionVersion.session_id == session_id,
+                AnalysisSessionVersion.is_snapshot.is_(True)
+            ).scalar()
+            if last_snapshot_no is not None and version_no - last_snapshot_no < settings.SESSION_VERSION_SNAPSHOT_INTERVAL:
+                base = SessionVersionService._load_texts(db, session_id, latest.version_no)
+                if base is not None:
+                    blob, is_snapshot = encode_delta(base, texts), False
+        if blob is None or len(blob) * 4 > size:
+            # 改动较大时比较快照大小，取较小者
+            snapshot_blob = encode_snapshot(texts)
+            if blob is None or len(snapshot_blob) <= len(blob):
+                blob, is_snapshot = snapshot_blob, True
+
+        version = AnalysisSessionVersion(
+            session_id=session_id,
+            version_no=version_no,
+            summary=summary or f"版本 {version_no}",
+            is_snapshot=is_snapshot,
+            content_blob=blob,
+            content_bytes=size,
+            stored_bytes=len(blob),
+            html_charts_ref=html_charts_ref,
+            created_by=created_by
+        )
+        db.add(version)
+        db.flush()
+        logger.info(
+            f"[版本管理] 保存版本内容 - session_id={session_id}, version_no={version_no}, "
+            f"{'snapshot' if is_snapshot else 'delta'}, content_bytes={size}, stored_bytes={len(blob)}"
+        )
+        return version
@@ -0,0 +1,297 @@
+"""
+Sheet处理租约服务
+
+每个进入generating状态的Sheet报告持有一个租约，处理期间由心跳定期续约。
+进程崩溃或任务中断后租约自然过期，过期记录可被回收并重新排队；
+文字和图表阶段的输出分别保存为检查点，重试时只重做失败的阶段。
+Sheet被取消（或租约被其他任务接管）后续约失败，心跳会取消仍在处理该Sheet的任务。
+"""
+import asyncio
+import json
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from sqlalchemy import or_, and_
+from sqlalchemy.orm import Session
+from loguru import logger
+
+from app.core.config import settings
+from app.models.batch_analysis import BatchAnalysisSession, SheetReport
+from app.models.custom_batch_analysis import CustomBatchAnalysisSession, CustomSheetReport
+from app.services.batch_progress_service import BatchProgressService, BATCH_KIND, CUSTOM_BATCH_KIND
+
+
+# 批量分析类型 -> (会话模型, Sheet报告模型, 外键列名)
+BATCH_MODELS = {
+    BATCH_KIND: (BatchAnalysisSession, SheetReport, "batch_session_id"),
+    CUSTOM_BATCH_KIND: (CustomBatchAnalysisSession, CustomSheetReport, "custom_batch_session_id"),
+}
+
+# 可被领取的Sheet状态（generating需租约过期）
+ACQUIRABLE_STATUSES = ("pending", "failed")
+
+# 重试时重新排队的Sheet状态
+REQUEUE_STATUSES = ("failed", "cancelled")
+
+# 取消时需要终止的Sheet状态
+UNFINISHED_STATUSES = ("pending", "generating")
+
+
+class SheetLeaseService:
+    """Sheet处理租约服务类"""
+
+    @staticmethod
+    def _lease_deadline(now: datetime) -> datetime:
+        return now + timedelta(seconds=settings.BATCH_SHEET_LEASE_SECONDS)
+
+    @staticmethod
+    def _stale_condition(sheet_model, now: datetime):
+        """generating且租约已过期（历史记录无租约时按updated_at判断）"""
+        legacy_deadline = now - timedelta(seconds=settings.BATCH_SHEET_LEASE_SECONDS)
+        return and_(
+            sheet_model.report_status == "generating",
+            or_(
+                sheet_model.lease_expires_at < now,
+                and_(sheet_model.lease_expires_at.is_(None), sheet_model.updated_at < legacy_deadline)
+            )
+        )
+
+    @staticmethod
+    def is_stale(sheet_report, now: Optional[datetime] = None) -> bool:
+        """判断Sheet报告是否为已中断的generating记录"""
+        if sheet_report.report_status != "generating":
+            return False
+        now = now or datetime.utcnow()
+        if sheet_report.lease_expires_at is not None:
+            return sheet_report.lease_expires_at < now
+        return sheet_report.updated_at < now - timedelta(seconds=settings.BATCH_SHEET_LEASE_SECONDS)
+
+    @staticmethod
+    async def acquire(db: Session, kind: str, sheet_report_id: int):
+        """
+        领取Sheet报告的处理租约
+
+        行锁内检查状态：pending/failed 或租约过期的generating 才可领取，
+        已完成或正被其他任务处理的Sheet直接跳过，保证重复触发时幂等。
+
+        Returns:
+            领取成功返回Sheet报告对象，否则返回None
+        """
+        session_model, sheet_model, fk_column = BATCH_MODELS[kind]
+        sheet_report = db.query(sheet_model).filter(
+            sheet_model.id == sheet_report_id
+        ).with_for_update().first()
+        if not sheet_report:
+            db.rollback()
+            return None
+
+        now = datetime.utcnow()
+        if sheet_report.report_status not in ACQUIRABLE_STATUSES and not SheetLeaseService.is_stale(sheet_report, now):
+            db.rollback()
+            return None
+
+        batch_session_id = getattr(sheet_report, fk_column)
+        progress = BatchProgressService.transition(
+            db, session_model, batch_session_id, sheet_report.report_status, "generating"
+        )
+        sheet_report.report_status = "generating"
+        sheet_report.error_message = None
+        sheet_report.lease_expires_at = SheetLeaseService._lease_deadline(now)
+        sheet_report.heartbeat_at = now
+        sheet_report.attempt_count = (sheet_report.attempt_count or 0) + 1
+        db.commit()
+        await BatchProgressService.publish(kind, batch_session_id, progress)
+        return sheet_report
+
+    @staticmethod
+    def renew(kind: str, sheet_report_id: int) -> bool:
+        """续约（使用独立数据库会话，不干扰处理中的事务）"""
+        from app.core.database import SessionLocal
+
+        _, sheet_model, _ = BATCH_MODELS[kind]
+        now = datetime.utcnow()
+        db = SessionLocal()
+        try:
+            updated = db.query(sheet_model).filter(
+                sheet_model.id == sheet_report_id,
+                sheet_model.report_status == "generating"
+            ).update(
+                {
+                    sheet_model.lease_expires_at: SheetLeaseService._lease_deadline(now),
+                    sheet_model.heartbeat_at: now,
+                },
+                synchronize_session=False
+            )
+            db.commit()
+            return updated > 0
+        finally:
+            db.close()
+
+    @staticmethod
+    def start_heartbeat(
+        kind: str,
+        sheet_report_id: int,
+        owner: Optional[asyncio.Task] = None
+    ) -> asyncio.Task:
+        """
+        启动心跳任务，调用方处理结束后需cancel
+
+        Args:
+            owner: 处理该Sheet的任务；续约失败（Sheet已取消、删除或被接管）时取消该任务，
+                使其正在进行的大模型调用立即中断并归还并发名额
+        """
+        async def heartbeat():
+            while True:
+                await asyncio.sleep(settings.BATCH_SHEET_HEARTBEAT_SECONDS)
+                try:
+                    if not SheetLeaseService.renew(kind, sheet_report_id):
+                        if owner is not None and not owner.done():
+                            logger.info(f"[Sheet租约] 租约已失效，终止处理任务 - kind={kind}, report_id={sheet_report_id}")
+                            owner.cancel()
+                        return
+                except Exception as e:
+                    logger.warning(f"[Sheet租约] 续约失败 - kind={kind}, report_id={sheet_report_id}, error={str(e)}")
+
+        return asyncio.create_task(heartbeat())
+
+    @staticmethod
+    def save_checkpoint(
+        db: Session,
+        kind: str,
+        sheet_report_id: int,
+        text_content: Optional[str] = None,
+        charts_result: Optional[dict] = None
+    ) -> None:
+        """保存阶段检查点（文字报告 / 图表结果）"""
+        _, sheet_model, _ = BATCH_MODELS[kind]
+        values = {}
+        if text_content is not None:
+            values[sheet_model.text_checkpoint] = text_content
+        if charts_result is not None:
+            # 图表结果中可能含有numpy等不可直接序列化的数据
+            values[sheet_model.chart_checkpoint] = json.loads(json.dumps(charts_result, ensure_ascii=False, default=str))
+        if not values:
+            return
+
+        db.query(sheet_model).filter(sheet_model.id == sheet_report_id).update(values, synchronize_session=False)
+        db.commit()
+
+    @staticmethod
+    async def reclaim_stale(
+        db: Session,
+        kind: str,
+        batch_session_id: Optional[int] = None,
+        mark_interrupted: bool = False
+    ) -> List[int]:
+        """
+        回收租约过期的generating记录，重置为pending
+
+        Args:
+            batch_session_id: 仅回收指定批量会话；None表示全部
+            mark_interrupted: 是否把仍处于processing的受影响会话标记为partial_failed
+                （启动时回收使用，便于前端提示重试）
+
+        Returns:
+            被回收的Sheet报告ID列表
+        """
+        session_model, sheet_model, fk_column = BATCH_MODELS[kind]
+        now = datetime.utcnow()
+
+        query = db.query(sheet_model).filter(SheetLeaseService._stale_condition(sheet_model, now))
+        if batch_session_id is not None:
+            query = query.filter(getattr(sheet_model, fk_column) == batch_session_id)
+        stale_reports = query.with_for_update(skip_locked=True).all()
+
+        if not stale_reports:
+            db.rollback()
+            return []
+
+        affected = set()
+        for sheet_report in stale_reports:
+            report_batch_id = getattr(sheet_report, fk_column)
+            affected.add(report_batch_id)
+            BatchProgressService.transition(db, session_model, report_batch_id, "generating", "pending")
+            sheet_report.report_status = "pending"
+            sheet_report.lease_expires_at = None
+
+        if mark_interrupted:
+            db.query(session_model).filter(
+                session_model.id.in_(list(affected)),
+                session_model.status == "processing"
+            ).update({session_model.status: "partial_failed"}, synchronize_session=False)
+
+        db.commit()
+
+        for report_batch_id in affected:
+            report_batch = db.query(session_model).filter(session_model.id == report_batch_id).first()
+            if report_batch:
+                await BatchProgressService.publish(kind, report_batch_id, BatchProgressService.snapshot(report_batch))
+
+        reclaimed_ids = [sr.id for sr in stale_reports]
+        logger.info(f"[Sheet租约] 回收中断的Sheet - kind={kind}, count={len(reclaimed_ids)}, batch_ids={sorted(affected)}")
+        return reclaimed_ids
+
+    @staticmethod
+    def requeue_failed(db: Session, kind: str, batch_session_id: int) -> List[int]:
+        """
+        将失败或已取消的Sheet重置为pending（保留检查点），不提交事务
+
+        Returns:
+            被重新排队的Sheet报告ID列表
+        """
+        session_model, sheet_model, fk_column = BATCH_MODELS[kind]
+        failed_reports = db.query(sheet_model).filter(
+            getattr(sheet_model, fk_column) == batch_session_id,
+            sheet_model.report_status.in_(REQUEUE_STATUSES)
+        ).with_for_update().all()
+
+        for sheet_report in failed_reports:
+            BatchProgressService.transition(db, session_model, batch_session_id, sheet_report.report_status, "pending")
+            sheet_report.report_status = "pending"
+            sheet_report.error_message = None
+
+        return [sr.id for sr in failed_reports]
+
+    @staticmethod
+    def clear_checkpoints(db: Session, kind: str, batch_session_id: int) -> int:
+        """
+        清除待处理Sheet的阶段检查点，不提交事务
+
+        分析需求变化后旧的文字/图表结果不再适用，重试时需重新生成；已完成的Sheet不受影响。
+
+        Returns:
+            被清除检查点的Sheet数量
+        """
+        _, sheet_model, fk_column = BATCH_MODELS[kind]
+        return db.query(sheet_model).filter(
+            getattr(sheet_model, fk_column) == batch_session_id,
+            sheet_model.report_status.in_(UNFINISHED_STATUSES),
+            or_(sheet_model.text_checkpoint.isnot(None), sheet_model.chart_checkpoint.isnot(None))
+        ).update(
+            {sheet_model.text_checkpoint: None, sheet_model.chart_checkpoint: None},
+            synchronize_session=False
+        )
+
+    @staticmethod
+    def cancel_unfinished(db: Session, kind: str, batch_session_id: int) -> List[int]:
+        """
+        将pending和generating的Sheet标记为cancelled并清除租约，不提交事务
+
+        已取消的Sheet不会再被领取；其他进程中仍在处理的Sheet在下次续约失败时终止。
+
+        Returns:
+            被取消的Sheet报告ID列表
+        """
+        session_model, sheet_model, fk_column = BATCH_MODELS[kind]
+        unfinished_reports = db.query(sheet_model).filter(
+            getattr(sheet_model, fk_column) == batch_session_id,
+            sheet_model.report_status.in_(UNFINISHED_STATUSES)
+        ).with_for_update().all()
+
+        for sheet_report in unfinished_reports:
+            BatchProgressService.transition(db, session_model, batch_session_id, sheet_report.report_status, "cancelled")
+            sheet_report.report_status = "cancelled"
+            sheet_report.error_message = "已取消"
+            sheet_report.lease_expires_at = None
+
+        return [sr.id for sr in unfinished_reports]
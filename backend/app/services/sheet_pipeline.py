@@ -0,0 +1,490 @@
+"""
+Sheet分析流水线引擎
+
+批量分析和定制化批量分析共用同一条分阶段流水线：
+    load（领取租约）→ profile（校验拆分文件）→ prompt（选择固定prompt模板）
+    → generate（文字报告与图表并行生成，带检查点）→ merge（合并报告）→ persist（落库）
+两者只在prompt选择策略上不同，由 SheetPipelineConfig.prompt_strategy 注入。
+每个阶段记录耗时，既写入日志也汇总到 pipeline_metrics。
+
+批量会话的后台任务通过 start_batch 启动并登记，cancel_batch 取消任务时，
+CancelledError 会传递到正在进行的httpx流式请求和排队中的Sheet，
+并发名额（Sheet信号量和大模型调度器）随上下文退出立即归还。
+"""
+import asyncio
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlalchemy.orm import Session
+from loguru import logger
+
+from app.services.chart_generator import ChartGenerator
+from app.services.report_merger import ReportMerger
+from app.services.bailian_service import BailianService
+from app.services.batch_progress_service import BatchProgressService
+from app.services.sheet_lease_service import SheetLeaseService, BATCH_MODELS
+from app.services.llm_scheduler import set_llm_context, PRIORITY_BATCH
+from app.services.content_store_service import content_store, ref_key
+
+
+# 流水线阶段（按执行顺序）
+PIPELINE_STAGES = ("load", "profile", "prompt", "generate", "merge", "persist")
+
+# 单个批量会话内同时处理的Sheet数量（避免对阿里百炼API造成压力）
+DEFAULT_SHEET_CONCURRENCY = 3
+
+
+@dataclass
+class SheetPipelineConfig:
+    """流水线配置：批量分析类型、日志前缀、名称、上传目录和prompt选择策略"""
+    kind: str
+    log_tag: str
+    # 名称（会话默认标题、接口提示信息）
+    display_name: str
+    # 上传文件目录名：uploads/operation/project_<id>/<upload_dir>/batch_<batch_session_id>
+    upload_dir: str
+    # 根据Sheet报告选择固定prompt模板
+    prompt_strategy: Callable[[Any], str]
+    sheet_concurrency: int = DEFAULT_SHEET_CONCURRENCY
+
+
+@dataclass
+class SheetJob:
+    """单个Sheet在流水线中的上下文，各阶段依次填充"""
+    sheet_report_id: int
+    sheet_name: str
+    split_file_path: str
+    analysis_request: str
+    batch_session_id: int
+    user_id: int
+    chart_customization_prompt: Optional[str] = None
+    chart_generation_mode: str = "html"
+
+    sheet_report: Any = None
+    file_path: Optional[Path] = None
+    fixed_prompt_template: Optional[str] = None
+    charts_result: Optional[dict] = None
+    report_text: Optional[str] = None
+    report_content: Optional[dict] = None
+    timings: Dict[str, float] = field(default_factory=dict)
+
+
+class PipelineMetrics:
+    """各阶段耗时统计（进程内）"""
+
+    def __init__(self):
+        self._stats: Dict[str, Dict[str, Dict[str, float]]] = {}
+
+    def record(self, kind: str, stage: str, seconds: float) -> None:
+        stage_stats = self._stats.setdefault(kind, {}).setdefault(
+            stage, {"count": 0, "total_seconds": 0.0, "max_seconds": 0.0}
+        )
+        stage_stats["count"] += 1
+        stage_stats["total_seconds"] += seconds
+        stage_stats["max_seconds"] = max(stage_stats["max_seconds"], seconds)
+
+    def snapshot(self) -> Dict[str, Dict[str, Dict[str, float]]]:
+        result = {}
+        for kind, stages in self._stats.items():
+            result[kind] = {
+                stage: {
+                    "count": int(stats["count"]),
+                    "avg_seconds": round(stats["total_seconds"] / stats["count"], 3) if stats["count"] else 0.0,
+                    "max_seconds": round(stats["max_seconds"], 3),
+                }
+                for stage, stats in stages.items()
+            }
+        return result
+
+
+# 全局流水线指标
+pipeline_metrics = PipelineMetrics()
+
+
+class SheetAnalysisPipeline:
+    """Sheet分析流水线"""
+
+    def __init__(self, config: SheetPipelineConfig):
+        self.config = config
+        self.session_model, self.sheet_model, self.fk_column = BATCH_MODELS[config.kind]
+        # 本进程内运行中的批量会话后台任务：batch_session_id -> Task
+        self._batch_tasks: Dict[int, asyncio.Task] = {}
+
+    @contextmanager
+    def _stage(self, job: SheetJob, stage: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            job.timings[stage] = round(elapsed, 3)
+            pipeline_metrics.record(self.config.kind, stage, elapsed)
+
+    # ==================== 各阶段 ====================
+
+    async def _load(self, db: Session, job: SheetJob) -> bool:
+        """领取处理租约（已完成或正被处理的Sheet返回False）"""
+        job.sheet_report = await SheetLeaseService.acquire(db, self.config.kind, job.sheet_report_id)
+        return job.sheet_report is not None
+
+    def _profile(self, job: SheetJob) -> None:
+        """校验拆分后的文件（兼容Windows路径分隔符）"""
+        tag = self.config.log_tag
+        file_path_obj = Path(job.split_file_path)
+
+        if not file_path_obj.exists() and '\\' in str(job.split_file_path):
+            alt_path = Path(job.split_file_path.replace('\\', '/'))
+            if alt_path.exists():
+                file_path_obj = alt_path
+                logger.info(f"{tag} 使用替代路径格式: {alt_path}")
+
+        if not file_path_obj.exists():
+            error_msg = f"拆分后的文件不存在: {job.split_file_path}"
+            logger.error(f"{tag} {error_msg}")
+            raise FileNotFoundError(error_msg)
+
+        file_size = file_path_obj.stat().st_size
+        if file_size == 0:
+            raise Exception(f"文件大小为0: {job.split_file_path}")
+        logger.info(f"{tag} 文件验证通过 - 路径: {file_path_obj}, 大小: {file_size} bytes")
+        job.file_path = file_path_obj
+
+    def _prompt(self, job: SheetJob) -> None:
+        """按策略选择固定prompt模板"""
+        job.fixed_prompt_template = self.config.prompt_strategy(job.sheet_report)
+        logger.info(f"{self.config.log_tag} Sheet {job.sheet_name} 使用固定prompt模板，长度: {len(job.fixed_prompt_template)}")
+
+    async def _generate(self, db: Session, job: SheetJob) -> None:
+        """文字报告和图表并行生成，成功的阶段分别保存检查点"""
+        tag = self.config.log_tag
+        kind = self.config.kind
+        text_checkpoint = job.sheet_report.text_checkpoint
+        chart_checkpoint = job.sheet_report.chart_checkpoint
+        chart_generator = ChartGenerator()
+        bailian_service = BailianService()
+
+        async def generate_charts():
+            if chart_checkpoint and chart_checkpoint.get("generate_type") == job.chart_generation_mode:
+                logger.info(f"{tag} 复用图表检查点 - report_id={job.sheet_report_id}")
+                return chart_checkpoint
+
+            # 合并分析需求和图表定制 prompt（用于HTML生成）
+            chart_prompt = job.analysis_request
+            if job.chart_customization_prompt:
+                chart_prompt = f"{job.analysis_request}\n\n图表定制要求：\n{job.chart_customization_prompt}"
+
+            charts_result = await chart_generator.generate_charts_from_excel(
+                file_path=str(job.file_path),
+                analysis_request=chart_prompt,
+                generate_type=job.chart_generation_mode,  # "html" 或 "json"
+                chart_customization=job.chart_customization_prompt if job.chart_customization_prompt else None
+            )
+
+            if isinstance(charts_result, dict) and charts_result.get("success"):
+                SheetLeaseService.save_checkpoint(
+                    db, kind, job.sheet_report_id,
+                    charts_result={**charts_result, "generate_type": job.chart_generation_mode}
+                )
+            return charts_result
+
+        async def generate_text():
+            if text_checkpoint:
+                logger.info(f"{tag} 复用文字报告检查点 - report_id={job.sheet_report_id}")
+                return text_checkpoint
+
+            logger.info(f"{tag} 调用阿里百炼API生成文字报告 - file_path={job.file_path}")
+            text_result = await bailian_service.analyze_excel_and_generate_text_report(
+                file_path=str(job.file_path),
+                user_prompt=job.analysis_request,  # 用户输入的分析需求
+                fixed_prompt_template=job.fixed_prompt_template
+            )
+
+            if not text_result.get("success"):
+                error_msg = text_result.get("error", "文字报告生成失败")
+                logger.error(f"{tag} 文字报告生成失败 - {error_msg}")
+                return f"文字生成失败：{error_msg}"
+
+            text_content = text_result.get("text_content", "")
+            if not isinstance(text_content, str):
+                logger.error(f"{tag} text_content 不是字符串，类型: {type(text_content)}")
+                return str(text_content) if text_content else "报告生成失败"
+
+            logger.info(f"{tag} 文字报告生成成功 - 长度: {len(text_content)}")
+            SheetLeaseService.save_checkpoint(db, kind, job.sheet_report_id, text_content=text_content)
+            return text_content
+
+        charts_result, report_text = await asyncio.gather(
+            generate_charts(),
+            generate_text(),
+            return_exceptions=True
+        )
+
+        if isinstance(charts_result, Exception):
+            logger.error(f"{tag} 图表生成异常: {charts_result}")
+            charts_result = {"success": False, "charts": [], "data_summary": {}, "error": str(charts_result)}
+
+        if isinstance(report_text, Exception):
+            logger.error(f"{tag} 文字生成异常: {report_text}")
+            report_text = "报告生成失败，请重试。"
+
+        if not isinstance(report_text, str):
+            logger.error(f"{tag} report_text 不是字符串，类型: {type(report_text)}, 值: {report_text}")
+            report_text = str(report_text) if report_text else "报告生成失败，请重试。"
+
+        job.charts_result = charts_result
+        job.report_text = report_text
+
+    def _merge(self, job: SheetJob) -> None:
+        """合并文字报告和图表"""
+        charts_result = job.charts_result
+        if isinstance(charts_result, dict) and charts_result.get("success"):
+            charts = charts_result.get("charts", []) if job.chart_generation_mode == "json" else []
+            html_charts = charts_result.get("html_content") if job.chart_generation_mode == "html" else None
+            data_summary = charts_result.get("data_summary", {})
+        else:
+            charts = []
+            html_charts = None
+            data_summary = {}
+            logger.warning(f"{self.config.log_tag} 图表生成失败: {charts_result.get('error') if isinstance(charts_result, dict) else str(charts_result)}")
+
+        job.report_content = ReportMerger().merge_report(
+            text_content=job.report_text,
+            charts=charts,
+            data_summary=data_summary,
+            html_charts=html_charts
+        )
+
+    async def _persist(self, db: Session, job: SheetJob) -> bool:
+        """
+        保存报告内容并标记completed（计数器同事务更新）
+
+        Returns:
+            Sheet在处理期间已被取消或删除时不落库，返回False
+        """
+        sheet_report = db.query(self.sheet_model).filter(
+            self.sheet_model.id == job.sheet_report_id
+        ).with_for_update().populate_existing().first()
+        if not sheet_report or sheet_report.report_status != "generating":
+            db.rollback()
+            logger.info(f"{self.config.log_tag} Sheet {job.sheet_name} 已取消或已删除，丢弃结果 - report_id={job.sheet_report_id}")
+            return False
+
+        progress = BatchProgressService.transition(
+            db, self.session_model, job.batch_session_id, sheet_report.report_status, "completed"
+        )
+        # 重新生成时释放旧报告的HTML图表引用；新报告的HTML图表存入内容存储，行内只保存哈希
+        if isinstance(sheet_report.report_content, dict):
+            content_store.release(db, [sheet_report.report_content.get(ref_key("html_charts"))])
+        sheet_report.report_content = content_store.externalize(db, job.report_content, "html_charts")
+        sheet_report.report_status = "completed"
+        sheet_report.lease_expires_at = None
+        db.commit()
+        await BatchProgressService.publish(self.config.kind, job.batch_session_id, progress)
+        return True
+
+    async def _mark_failed(self, db: Session, job: SheetJob, error: Exception) -> None:
+        """标记Sheet失败并记录错误信息"""
+        db.rollback()
+        sheet_report = db.query(self.sheet_model).filter(self.sheet_model.id == job.sheet_report_id).first()
+        if not sheet_report or sheet_report.report_status == "cancelled":
+            return
+        progress = BatchProgressService.transition(
+            db, self.session_model, job.batch_session_id, sheet_report.report_status, "failed"
+        )
+        sheet_report.report_status = "failed"
+        sheet_report.error_message = str(error)
+        sheet_report.lease_expires_at = None
+        db.commit()
+        await BatchProgressService.publish(self.config.kind, job.batch_session_id, progress)
+
+    # ==================== 执行入口 ====================
+
+    async def run_sheet(self, db: Session, job: SheetJob) -> Optional[dict]:
+        """
+        执行单个Sheet的完整流水线
+
+        Returns:
+            合并后的报告内容；Sheet已完成、正被其他任务处理或已取消时返回None
+        """
+        tag = self.config.log_tag
+        heartbeat = None
+        try:
+            with self._stage(job, "load"):
+                acquired = await self._load(db, job)
+            if not acquired:
+                logger.info(f"{tag} Sheet {job.sheet_name} 已完成或正在处理中，跳过 - report_id={job.sheet_report_id}")
+                return None
+
+            heartbeat = SheetLeaseService.start_heartbeat(
+                self.config.kind, job.sheet_report_id, owner=asyncio.current_task()
+            )
+            logger.info(f"{tag} Sheet {job.sheet_name} 开始分析 - report_id={job.sheet_report_id}, sheet_index={job.sheet_report.sheet_index}")
+
+            with self._stage(job, "profile"):
+                self._profile(job)
+            with self._stage(job, "prompt"):
+                self._prompt(job)
+            with self._stage(job, "generate"):
+                await self._generate(db, job)
+            with self._stage(job, "merge"):
+                self._merge(job)
+            with self._stage(job, "persist"):
+                persisted = await self._persist(db, job)
+            if not persisted:
+                return None
+
+            html_charts = job.report_content.get("html_charts") if isinstance(job.report_content, dict) else None
+            logger.info(f"{tag} Sheet {job.sheet_name} 分析完成 - text_length={len(job.report_text)}, html_charts_length={len(html_charts) if html_charts else 0}, timings={job.timings}")
+            return job.report_content
+
+        except asyncio.CancelledError:
+            # 取消方已负责更新Sheet状态，这里只回滚未提交的修改
+            db.rollback()
+            logger.info(f"{tag} Sheet {job.sheet_name} 已取消 - report_id={job.sheet_report_id}, timings={job.timings}")
+            raise
+
+        except Exception as e:
+            logger.error(f"{tag} Sheet {job.sheet_name} 分析失败: {str(e)}, timings={job.timings}", exc_info=True)
+            await self._mark_failed(db, job, e)
+            raise
+
+        finally:
+            if heartbeat:
+                heartbeat.cancel()
+
+    async def run_sheets(
+        self,
+        db: Session,
+        sheet_reports: List[Any],
+        analysis_request: str,
+        user_id: int,
+        batch_session_id: int,
+        chart_customization_prompt: Optional[str] = None,
+        chart_generation_mode: str = "html"
+    ) -> List[Optional[dict]]:
+        """
+        并发处理多个Sheet，单个失败不影响其他Sheet
+
+        单个Sheet被取消时其信号量名额立即释放给后续Sheet；
+        整个任务被取消时所有运行中和排队中的Sheet一并取消。
+        """
+        semaphore = asyncio.Semaphore(self.config.sheet_concurrency)
+
+        async def bounded(sheet_report):
+            job = SheetJob(
+                sheet_report_id=sheet_report.id,
+                sheet_name=sheet_report.sheet_name,
+                split_file_path=sheet_report.split_file_path,
+                analysis_request=analysis_request,
+                batch_session_id=batch_session_id,
+                user_id=user_id,
+                chart_customization_prompt=chart_customization_prompt,
+                chart_generation_mode=chart_generation_mode
+            )
+            async with semaphore:
+                try:
+                    return await self.run_sheet(db, job)
+                except Exception as e:
+                    logger.error(f"{self.config.log_tag} Sheet分析任务失败: {str(e)}")
+                    return None
+
+        results = await asyncio.gather(*[bounded(sr) for sr in sheet_reports], return_exceptions=True)
+
+        success_count = sum(1 for r in results if r is not None and not isinstance(r, BaseException))
+        logger.info(f"{self.config.log_tag} 完成 - 成功: {success_count}, 未成功或跳过: {len(results) - success_count}")
+        return results
+
+    async def run_batch(self, batch_session_id: int, analysis_request: str, user_id: int) -> None:
+        """
+        批量会话后台任务：处理所有pending的Sheet并根据计数器汇总会话状态
+        首次分析和重试共用
+        """
+        from app.core.database import SessionLocal
+
+        tag = self.config.log_tag
+        kind = self.config.kind
+        session_model, sheet_model = self.session_model, self.sheet_model
+        # 批量任务使用最低优先级，不挤占交互式对话和单报告生成
+        set_llm_context(user_id, PRIORITY_BATCH)
+
+        try:
+            background_db = SessionLocal()
+            try:
+                sheet_reports = background_db.query(sheet_model).filter(
+                    getattr(sheet_model, self.fk_column) == batch_session_id,
+                    sheet_model.report_status == "pending"
+                ).order_by(sheet_model.sheet_index).all()
+
+                await self.run_sheets(
+                    db=background_db,
+                    sheet_reports=sheet_reports,
+                    analysis_request=analysis_request,
+                    user_id=user_id,
+                    batch_session_id=batch_session_id
+                )
+
+                batch_session = background_db.query(session_model).filter(
+                    session_model.id == batch_session_id
+                ).populate_existing().first()
+                if batch_session and batch_session.status == "cancelled":
+                    logger.info(f"{tag} 批量分析已被取消 - batch_session_id={batch_session_id}")
+                elif batch_session:
+                    progress = BatchProgressService.to_progress(batch_session)
+                    batch_session.status = BatchProgressService.resolve_batch_status(progress)
+                    background_db.commit()
+                    await BatchProgressService.publish(kind, batch_session_id, BatchProgressService.snapshot(batch_session))
+                    logger.info(f"{tag} 批量分析完成 - batch_session_id={batch_session_id}, completed={progress['completed_sheets']}, failed={progress['failed_sheets']}")
+            finally:
+                background_db.close()
+
+        except asyncio.CancelledError:
+            logger.info(f"{tag} 后台任务已取消 - batch_session_id={batch_session_id}")
+            raise
+
+        except Exception as e:
+            logger.error(f"{tag} 后台任务执行失败: {str(e)}", exc_info=True)
+            error_db = SessionLocal()
+            try:
+                batch_session = error_db.query(session_model).filter(
+                    session_model.id == batch_session_id
+                ).first()
+                if batch_session:
+                    batch_session.status = "failed"
+                    error_db.commit()
+                    await BatchProgressService.publish(kind, batch_session_id, BatchProgressService.snapshot(batch_session))
+            finally:
+                error_db.close()
+
+    def start_batch(self, batch_session_id: int, analysis_request: str, user_id: int) -> asyncio.Task:
+        """启动批量会话后台任务并登记，供取消时查找"""
+        task = asyncio.create_task(self.run_batch(batch_session_id, analysis_request, user_id))
+        self._batch_tasks[batch_session_id] = task
+
+        def _unregister(done_task: asyncio.Task) -> None:
+            if self._batch_tasks.get(batch_session_id) is done_task:
+                self._batch_tasks.pop(batch_session_id, None)
+
+        task.add_done_callback(_unregister)
+        return task
+
+    def is_running(self, batch_session_id: int) -> bool:
+        """批量会话是否有运行中的后台任务（仅本进程）"""
+        task = self._batch_tasks.get(batch_session_id)
+        return task is not None and not task.done()
+
+    def cancel_batch(self, batch_session_id: int) -> bool:
+        """
+        取消本进程内批量会话的后台任务
+
+        Returns:
+            存在运行中的任务并已发出取消时返回True
+        """
+        task = self._batch_tasks.get(batch_session_id)
+        if task is None or task.done():
+            return False
+        task.cancel()
+        logger.info(f"{self.config.log_tag} 取消后台任务 - batch_session_id={batch_session_id}")
+        return True
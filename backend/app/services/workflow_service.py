@@ -6,6 +6,8 @@ from sqlalchemy.orm import Session
 
 from app.models.workflow import Workflow, WorkflowBinding
 from app.models.session import AnalysisSession
+from app.services.session_message_service import SessionMessageService
+from app.services.session_version_service import SessionVersionService
 from app.schemas.workflow import WorkflowCreate, WorkflowUpdate
 
 
@@ -196,11 +198,13 @@ class WorkflowService:
             user_id=user_id,
             function_key=function_key,
             workflow_id=workflow_id,
-            title=title or f"新对话 {function_key}",
-            messages=messages or []
+            title=title or f"新对话 {function_key}"
         )
         
         db.add(conversation)
+        db.flush()
+        if messages:
+            SessionMessageService.append(db, conversation.id, messages)
         db.commit()
         db.refresh(conversation)
         
@@ -242,7 +246,7 @@ class WorkflowService:
         if title is not None:
             conversation.title = title
         if messages is not None:
-            conversation.messages = messages
+            SessionMessageService.replace(db, conversation.id, messages)
         
         db.commit()
         db.refresh(conversation)
@@ -261,9 +265,7 @@ class WorkflowService:
         if not conversation:
             return None
         
-        messages = conversation.messages or []
-        messages.append({"role": role, "content": content})
-        conversation.messages = messages
+        SessionMessageService.append(db, conversation.id, [{"role": role, "content": content}])
         
         db.commit()
         db.refresh(conversation)
@@ -277,6 +279,8 @@ class WorkflowService:
         if not conversation:
             return False
         
+        SessionMessageService.release_content(db, conversation_id)
+        SessionVersionService.release_content(db, conversation_id)
         db.delete(conversation)
         db.commit()
         
@@ -0,0 +1,115 @@
+"""
+图表图片处理（PDF嵌入前）
+
+前端截图的图表通常是2~3倍的高分屏尺寸，且同一张图可能在文档中重复出现。
+每份PDF文档使用一个 ChartImagePipeline：
+- 按Base64内容的SHA-256去重，重复图片不再解码，直接复用同一个 ImageReader，
+  reportlab 据此复用同一个图片XObject
+- 首次出现的图片只解码一次，按目标DPI缩小到实际绘制尺寸，透明背景合成到白底（不再生成SMask）
+"""
+import base64
+import hashlib
+import io
+import math
+from typing import Any, Dict, Optional, Tuple
+
+from loguru import logger
+from PIL import Image
+from reportlab.lib.utils import ImageReader
+from reportlab.platypus import Flowable
+
+from app.core.config import settings
+
+
+class ChartImageFlowable(Flowable):
+    """按指定尺寸绘制共享 ImageReader 的图片（platypus Image 不接受 ImageReader 对象）"""
+
+    def __init__(self, reader: ImageReader, width: float, height: float, hAlign: str = "CENTER"):
+        super().__init__()
+        self.reader = reader
+        self.drawWidth = width
+        self.drawHeight = height
+        self.hAlign = hAlign
+
+    def wrap(self, availWidth, availHeight):
+        return self.drawWidth, self.drawHeight
+
+    def draw(self):
+        self.canv.drawImage(self.reader, 0, 0, self.drawWidth, self.drawHeight, mask=None)
+
+
+def normalize_chart_image(image_data: bytes, width: float, height: float, dpi: int) -> Image.Image:
+    """
+    解码图片并缩小到目标DPI下的绘制尺寸（只缩小不放大），返回RGB图片
+
+    Args:
+        image_data: 图片原始字节（PNG/JPEG等）
+        width: 绘制宽度（pt）
+        height: 绘制高度（pt）
+        dpi: 目标分辨率
+    """
+    target_width = max(1, math.ceil(width / 72 * dpi))
+    target_height = max(1, math.ceil(height / 72 * dpi))
+
+    with Image.open(io.BytesIO(image_data)) as source:
+        # JPEG可在解码时直接按比例缩小
+        source.draft("RGB", (target_width, target_height))
+        img = source.convert("RGBA") if source.mode in ("RGBA", "LA", "P", "PA") else source.convert("RGB")
+
+    # 图片在PDF中按绘制框拉伸，两个方向分别缩小到目标像素即可
+    size = (min(img.width, target_width), min(img.height, target_height))
+    if size != img.size:
+        img = img.resize(size, Image.LANCZOS, reducing_gap=2.0)
+
+    if img.mode == "RGBA":
+        background = Image.new("RGB", img.size, "white")
+        background.paste(img, mask=img.getchannel("A"))
+        img = background
+    return img
+
+
+class ChartImagePipeline:
+    """单份PDF文档内的图表图片处理与去重"""
+
+    def __init__(self, dpi: Optional[int] = None):
+        self.dpi = dpi or settings.PDF_CHART_IMAGE_DPI
+        self._readers: Dict[Tuple[str, int, int], ImageReader] = {}
+        self.images = 0
+        self.input_bytes = 0
+        self.input_pixels = 0
+        self.output_pixels = 0
+
+    def reader(self, image_base64: str, width: float, height: float) -> ImageReader:
+        """返回处理后的图片；相同图片以相同尺寸绘制时返回同一个 ImageReader"""
+        self.images += 1
+        key = (hashlib.sha256(image_base64.encode("ascii", "ignore")).hexdigest(), round(width), round(height))
+        reader = self._readers.get(key)
+        if reader is not None:
+            return reader
+
+        image_data = base64.b64decode(image_base64)
+        with Image.open(io.BytesIO(image_data)) as probe:
+            self.input_pixels += probe.width * probe.height
+        img = normalize_chart_image(image_data, width, height, self.dpi)
+        self.input_bytes += len(image_data)
+        self.output_pixels += img.width * img.height
+
+        reader = ImageReader(img)
+        self._readers[key] = reader
+        return reader
+
+    def flowable(self, image_base64: str, width: float, height: float) -> ChartImageFlowable:
+        return ChartImageFlowable(self.reader(image_base64, width, height), width, height)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "images": self.images,
+            "unique": len(self._readers),
+            "input_kb": round(self.input_bytes / 1024, 1),
+            "input_pixels": self.input_pixels,
+            "output_pixels": self.output_pixels,
+        }
+
+    def log_summary(self) -> None:
+        if self.images:
+            logger.info(f"[PDF生成] 图表图片处理完成 - dpi={self.dpi}, {self.snapshot()}")
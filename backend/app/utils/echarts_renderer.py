@@ -0,0 +1,470 @@
+"""
+ECharts配置离线渲染工具
+
+把 parse_echarts_from_text / PyechartsGenerator 产出的ECharts配置直接渲染为图表，
+导出PDF时不再需要浏览器截图上传：
+- PDF：渲染为reportlab矢量图形（Drawing），清晰且体积小
+- PNG：使用Pillow栅格化，用于报告长图
+
+支持 bar / line / pie / scatter（覆盖 PyechartsGenerator 的全部类型），
+其他类型返回None，由调用方回退为文字说明。
+解析结果和PNG按图表配置哈希缓存在进程内。
+"""
+import hashlib
+import io
+import json
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from loguru import logger
+
+from app.utils.font_registry import font_registry
+
+
+# ECharts默认调色板
+PALETTE = [
+    "#5470c6", "#91cc75", "#fac858", "#ee6666", "#73c0de",
+    "#3ba272", "#fc8452", "#9a60b4", "#ea7ccc",
+]
+
+SUPPORTED_TYPES = ("bar", "line", "pie", "scatter")
+
+# 进程内缓存条数
+SPEC_CACHE_SIZE = 256
+PNG_CACHE_SIZE = 64
+
+# 坐标轴标签最大长度（超出截断）
+MAX_LABEL_LENGTH = 12
+
+
+class _LRUCache:
+    """线程安全的简单LRU缓存"""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._data: "OrderedDict[Any, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._data:
+                return None
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def set(self, key, value) -> None:
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+
+_spec_cache = _LRUCache(SPEC_CACHE_SIZE)
+_png_cache = _LRUCache(PNG_CACHE_SIZE)
+
+
+# ==================== 配置解析 ====================
+
+def get_chart_option(chart: Any) -> Optional[Dict[str, Any]]:
+    """从图表条目中取出ECharts配置（兼容 {"config": {...}} 和直接的配置字典）"""
+    if not isinstance(chart, dict):
+        return None
+    option = chart.get("config")
+    if isinstance(option, dict):
+        return option
+    if "series" in chart:
+        return chart
+    return None
+
+
+def chart_config_hash(option: Dict[str, Any]) -> str:
+    """图表配置哈希（键顺序无关）"""
+    payload = json.dumps(option, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _first(value: Any) -> Any:
+    """ECharts中很多配置项既可以是对象也可以是数组"""
+    if isinstance(value, list):
+        return value[0] if value else None
+    return value
+
+
+def _to_number(value: Any) -> float:
+    if isinstance(value, dict):
+        value = value.get("value")
+    if isinstance(value, (list, tuple)):
+        value = value[-1] if value else None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _truncate(label: Any) -> str:
+    text = str(label)
+    return text if len(text) <= MAX_LABEL_LENGTH else text[:MAX_LABEL_LENGTH - 1] + "…"
+
+
+def _extract_spec(option: Dict[str, Any], fallback_title: str = "") -> Optional[Dict[str, Any]]:
+    series_list = option.get("series")
+    if isinstance(series_list, dict):
+        series_list = [series_list]
+    if not series_list or not isinstance(series_list, list):
+        return None
+
+    chart_type = (series_list[0] or {}).get("type", "bar")
+    if chart_type not in SUPPORTED_TYPES:
+        return None
+
+    title_option = _first(option.get("title")) or {}
+    title = title_option.get("text") if isinstance(title_option, dict) else None
+    spec: Dict[str, Any] = {"type": chart_type, "title": title or fallback_title or ""}
+
+    if chart_type == "pie":
+        slices = []
+        for item in (series_list[0].get("data") or []):
+            if isinstance(item, dict):
+                slices.append((str(item.get("name", "")), _to_number(item.get("value"))))
+            elif isinstance(item, (list, tuple)) and len(item) >= 2:
+                slices.append((str(item[0]), _to_number(item[1])))
+        spec["slices"] = [(name, value) for name, value in slices if value > 0]
+        return spec if spec["slices"] else None
+
+    x_axis = _first(option.get("xAxis")) or {}
+    y_axis = _first(option.get("yAxis")) or {}
+
+    if chart_type == "scatter":
+        series = []
+        categories = x_axis.get("data") if isinstance(x_axis, dict) else None
+        for s in series_list:
+            points = []
+            for i, item in enumerate(s.get("data") or []):
+                if isinstance(item, dict):
+                    item = item.get("value")
+                if isinstance(item, (list, tuple)) and len(item) >= 2:
+                    points.append((_to_number(item[0]), _to_number(item[1])))
+                elif categories is not None:
+                    points.append((float(i), _to_number(item)))
+            series.append((str(s.get("name", "")), points))
+        spec["series"] = [(name, points) for name, points in series if points]
+        return spec if spec["series"] else None
+
+    # bar / line：类目轴在x轴；y轴为类目轴时是横向柱状图
+    horizontal = isinstance(y_axis, dict) and y_axis.get("type") == "category" and y_axis.get("data")
+    category_axis = y_axis if horizontal else x_axis
+    categories = [str(c.get("value", "")) if isinstance(c, dict) else str(c) for c in (category_axis.get("data") or [])]
+
+    series = []
+    for s in series_list:
+        if s.get("type", chart_type) not in ("bar", "line"):
+            continue
+        values = [_to_number(v) for v in (s.get("data") or [])]
+        series.append((str(s.get("name", "")), values, s.get("type", chart_type)))
+    # 没有任何数据时不生成图形（reportlab坐标轴在生成PDF时才计算范围，空数据会报错），回退为文字说明
+    if not series or all(not values for _, values, _ in series):
+        return None
+
+    length = max(len(values) for _, values, _ in series)
+    if not categories:
+        categories = [str(i + 1) for i in range(length)]
+    length = len(categories)
+    if length == 0:
+        return None
+    spec["categories"] = categories
+    spec["series"] = [(name, (values + [0.0] * length)[:length]) for name, values, _ in series]
+    # 柱线混合图：PNG和PDF都按各系列自身的类型绘制
+    spec["series_types"] = [series_type for _, _, series_type in series]
+    spec["horizontal"] = bool(horizontal) and chart_type == "bar"
+    return spec
+
+
+def get_chart_spec(chart: Any) -> Optional[Dict[str, Any]]:
+    """解析图表条目为绘图所需的数据（按配置哈希缓存）"""
+    option = get_chart_option(chart)
+    if not option:
+        return None
+    fallback_title = str(chart.get("title", "")) if isinstance(chart, dict) else ""
+    key = (chart_config_hash(option), fallback_title)
+    spec = _spec_cache.get(key)
+    if spec is None:
+        try:
+            spec = _extract_spec(option, fallback_title) or {}
+        except Exception as e:
+            logger.warning(f"[图表渲染] 解析ECharts配置失败: {str(e)}")
+            spec = {}
+        _spec_cache.set(key, spec)
+    return spec or None
+
+
+# ==================== PDF矢量图形 ====================
+
+def render_chart_drawing(chart: Any, width: float, height: float):
+    """
+    将ECharts配置渲染为reportlab矢量图形
+
+    Returns:
+        reportlab Drawing；不支持的图表类型返回None
+    """
+    spec = get_chart_spec(chart)
+    if not spec:
+        return None
+
+    from reportlab.lib import colors
+    from reportlab.graphics.shapes import Drawing, String
+    from reportlab.graphics.charts.barcharts import VerticalBarChart, HorizontalBarChart
+    from reportlab.graphics.charts.linecharts import HorizontalLineChart
+    from reportlab.graphics.charts.lineplots import ScatterPlot
+    from reportlab.graphics.charts.piecharts import Pie
+    from reportlab.graphics.charts.legends import Legend
+
+    font_name = font_registry.register_pdf_font() or "Helvetica"
+    palette = [colors.HexColor(c) for c in PALETTE]
+
+    drawing = Drawing(width, height)
+    if spec["title"]:
+        drawing.add(String(width / 2, height - 16, spec["title"], fontName=font_name, fontSize=11, textAnchor="middle"))
+
+    plot_x, plot_y = 45, 45
+    plot_width, plot_height = width - plot_x - 20, height - plot_y - 35
+    legend_items: List[Tuple[Any, str]] = []
+    overlay = None
+
+    if spec["type"] == "pie":
+        size = min(plot_width, plot_height)
+        pie = Pie()
+        pie.x = plot_x
+        pie.y = plot_y - 10 + (plot_height - size) / 2
+        pie.width = pie.height = size
+        pie.data = [value for _, value in spec["slices"]]
+        pie.slices.strokeColor = colors.white
+        pie.slices.strokeWidth = 0.5
+        for i in range(len(pie.data)):
+            pie.slices[i].fillColor = palette[i % len(palette)]
+        drawing.add(pie)
+        legend_items = [(palette[i % len(palette)], _truncate(name)) for i, (name, _) in enumerate(spec["slices"])]
+        legend = Legend()
+        legend.x = plot_x + size + 20
+        legend.y = plot_y + plot_height - 10
+        legend.alignment = "right"
+        legend.fontName = font_name
+        legend.fontSize = 8
+        legend.columnMaximum = 12
+        legend.colorNamePairs = legend_items
+        drawing.add(legend)
+        return drawing
+
+    if spec["type"] == "scatter":
+        plot = ScatterPlot()
+        plot.data = [points for _, points in spec["series"]]
+        for i in range(len(plot.data)):
+            plot.lines[i].strokeColor = palette[i % len(palette)]
+            plot.lines[i].symbol.fillColor = palette[i % len(palette)]
+        plot.xLabel = plot.yLabel = ""
+        plot.xValueAxis.labels.fontName = plot.yValueAxis.labels.fontName = font_name
+        plot.xValueAxis.labels.fontSize = plot.yValueAxis.labels.fontSize = 7
+        legend_items = [(palette[i % len(palette)], _truncate(name)) for i, (name, _) in enumerate(spec["series"])]
+    else:
+        series_types = spec.get("series_types") or [spec["type"]] * len(spec["series"])
+        if spec["horizontal"]:
+            # 横向柱状图没有对应的折线画法，全部按柱绘制
+            series_types = ["bar"] * len(spec["series"])
+        bar_indexes = [i for i, series_type in enumerate(series_types) if series_type == "bar"]
+        line_indexes = [i for i, series_type in enumerate(series_types) if series_type != "bar"]
+        all_values = [v for _, values in spec["series"] for v in values]
+
+        def setup_category_plot(plot, indexes):
+            plot.data = [tuple(spec["series"][i][1]) for i in indexes]
+            plot.categoryAxis.categoryNames = [_truncate(c) for c in spec["categories"]]
+            plot.categoryAxis.labels.fontName = font_name
+            plot.categoryAxis.labels.fontSize = 7
+            if not spec["horizontal"] and len(spec["categories"]) > 8:
+                plot.categoryAxis.labels.angle = 30
+                plot.categoryAxis.labels.boxAnchor = "ne"
+            plot.valueAxis.labels.fontName = font_name
+            plot.valueAxis.labels.fontSize = 7
+            if all_values and min(all_values) >= 0:
+                plot.valueAxis.valueMin = 0
+            plot.x, plot.y = plot_x, plot_y
+            plot.width, plot.height = plot_width, plot_height
+
+        if bar_indexes:
+            plot = HorizontalBarChart() if spec["horizontal"] else VerticalBarChart()
+            for n, i in enumerate(bar_indexes):
+                plot.bars[n].fillColor = palette[i % len(palette)]
+                plot.bars[n].strokeColor = None
+            setup_category_plot(plot, bar_indexes)
+        if line_indexes:
+            lines = HorizontalLineChart()
+            for n, i in enumerate(line_indexes):
+                lines.lines[n].strokeColor = palette[i % len(palette)]
+                lines.lines[n].strokeWidth = 1.5
+            setup_category_plot(lines, line_indexes)
+            if bar_indexes:
+                # 柱线混合：折线叠加在柱状图上，两者使用相同的数值范围，折线图不再重复绘制坐标轴
+                value_min = 0 if min(all_values) >= 0 else min(all_values)
+                value_max = max(all_values) if max(all_values) > value_min else value_min + 1
+                for chart in (plot, lines):
+                    chart.valueAxis.valueMin = value_min
+                    chart.valueAxis.valueMax = value_max
+                lines.categoryAxis.visible = False
+                lines.valueAxis.visible = False
+                overlay = lines
+            else:
+                plot = lines
+        legend_items = [(palette[i % len(palette)], _truncate(name)) for i, (name, _) in enumerate(spec["series"])]
+
+    if spec["type"] == "scatter":
+        plot.x, plot.y = plot_x, plot_y
+        plot.width, plot.height = plot_width, plot_height
+    drawing.add(plot)
+    if overlay is not None:
+        drawing.add(overlay)
+
+    if len(legend_items) > 1 or (legend_items and legend_items[0][1]):
+        legend = Legend()
+        legend.x = plot_x
+        legend.y = 10
+        legend.alignment = "right"
+        legend.boxAnchor = "sw"
+        legend.deltax = 70
+        legend.columnMaximum = 1
+        legend.fontName = font_name
+        legend.fontSize = 7
+        legend.colorNamePairs = legend_items[:8]
+        drawing.add(legend)
+    return drawing
+
+
+# ==================== PNG栅格化 ====================
+
+def render_chart_png(chart: Any, width: int = 1000, height: int = 560) -> Optional[bytes]:
+    """
+    使用Pillow将ECharts配置栅格化为PNG（按配置哈希和尺寸缓存）
+
+    Returns:
+        PNG字节数据；不支持的图表类型返回None
+    """
+    spec = get_chart_spec(chart)
+    if not spec:
+        return None
+
+    key = (chart_config_hash(get_chart_option(chart)), spec["title"], width, height)
+    cached = _png_cache.get(key)
+    if cached is not None:
+        return cached
+
+    from PIL import Image, ImageDraw
+
+    image = Image.new("RGB", (width, height), "white")
+    draw = ImageDraw.Draw(image)
+    title_font = font_registry.get_image_font(24)
+    label_font = font_registry.get_image_font(14)
+
+    if spec["title"]:
+        draw.text((width // 2, 12), spec["title"], fill="#333333", font=title_font, anchor="mt")
+
+    left, top, right, bottom = 80, 60, width - 30, height - 70
+
+    if spec["type"] == "pie":
+        total = sum(value for _, value in spec["slices"]) or 1.0
+        size = min(right - left, bottom - top)
+        box = [left, top, left + size, top + size]
+        start = -90.0
+        for i, (name, value) in enumerate(spec["slices"]):
+            extent = 360.0 * value / total
+            draw.pieslice(box, start, start + extent, fill=PALETTE[i % len(PALETTE)], outline="white")
+            start += extent
+        legend_x, legend_y = left + size + 40, top
+        for i, (name, value) in enumerate(spec["slices"][:16]):
+            draw.rectangle([legend_x, legend_y + 3, legend_x + 14, legend_y + 17], fill=PALETTE[i % len(PALETTE)])
+            draw.text((legend_x + 22, legend_y), f"{_truncate(name)} {value / total:.1%}", fill="#333333", font=label_font)
+            legend_y += 24
+    else:
+        _draw_cartesian(draw, spec, (left, top, right, bottom), label_font)
+
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG", optimize=True)
+    png_bytes = buffer.getvalue()
+    _png_cache.set(key, png_bytes)
+    return png_bytes
+
+
+def _draw_cartesian(draw, spec: Dict[str, Any], box: Tuple[int, int, int, int], font) -> None:
+    """绘制柱状图/折线图/散点图的坐标系和数据"""
+    left, top, right, bottom = box
+
+    if spec["type"] == "scatter":
+        xs = [x for _, points in spec["series"] for x, _ in points]
+        ys = [y for _, points in spec["series"] for _, y in points]
+        if not xs:
+            return
+        x_min, x_max = min(xs), max(xs)
+    else:
+        ys = [v for _, values in spec["series"] for v in values]
+    if not ys:
+        return
+    y_min, y_max = min(min(ys), 0.0), max(max(ys), 0.0)
+    if y_max == y_min:
+        y_max = y_min + 1.0
+
+    def y_pos(value: float) -> float:
+        return bottom - (value - y_min) / (y_max - y_min) * (bottom - top)
+
+    # 网格线和数值刻度
+    for step in range(6):
+        value = y_min + (y_max - y_min) * step / 5
+        y = y_pos(value)
+        draw.line([(left, y), (right, y)], fill="#eeeeee")
+        draw.text((left - 8, y), f"{value:,.4g}", fill="#666666", font=font, anchor="rm")
+    draw.line([(left, bottom), (right, bottom)], fill="#999999")
+    draw.line([(left, top), (left, bottom)], fill="#999999")
+
+    if spec["type"] == "scatter":
+        if x_max == x_min:
+            x_max = x_min + 1.0
+        for i, (_, points) in enumerate(spec["series"]):
+            color = PALETTE[i % len(PALETTE)]
+            for x, y in points:
+                px = left + (x - x_min) / (x_max - x_min) * (right - left)
+                py = y_pos(y)
+                draw.ellipse([px - 4, py - 4, px + 4, py + 4], fill=color)
+        return
+
+    categories = spec["categories"]
+    slot = (right - left) / max(len(categories), 1)
+    label_every = max(1, len(categories) // 12)
+    for i, category in enumerate(categories):
+        if i % label_every == 0:
+            draw.text((left + slot * (i + 0.5), bottom + 8), _truncate(category), fill="#666666", font=font, anchor="mt")
+
+    series_types = spec.get("series_types") or [spec["type"]] * len(spec["series"])
+    bar_indexes = [i for i, series_type in enumerate(series_types) if series_type == "bar"]
+    # 先画柱再画线，折线不会被柱子遮挡
+    draw_order = bar_indexes + [i for i in range(len(spec["series"])) if i not in bar_indexes]
+    for s_index in draw_order:
+        _, values = spec["series"][s_index]
+        color = PALETTE[s_index % len(PALETTE)]
+        if series_types[s_index] == "bar":
+            bar_width = slot * 0.7 / len(bar_indexes)
+            bar_offset = bar_indexes.index(s_index)
+            for i, value in enumerate(values):
+                x0 = left + slot * i + slot * 0.15 + bar_width * bar_offset
+                draw.rectangle([x0, min(y_pos(value), y_pos(0)), x0 + bar_width - 1, max(y_pos(value), y_pos(0))], fill=color)
+        else:
+            points = [(left + slot * (i + 0.5), y_pos(value)) for i, value in enumerate(values)]
+            if len(points) > 1:
+                draw.line(points, fill=color, width=3)
+            for px, py in points:
+                draw.ellipse([px - 3, py - 3, px + 3, py + 3], fill=color)
+
+    # 图例
+    legend_x = left
+    for s_index, (name, _) in enumerate(spec["series"][:8]):
+        if not name:
+            continue
+        draw.rectangle([legend_x, bottom + 40, legend_x + 14, bottom + 54], fill=PALETTE[s_index % len(PALETTE)])
+        draw.text((legend_x + 20, bottom + 38), _truncate(name), fill="#333333", font=font)
+        legend_x += 160
@@ -0,0 +1,261 @@
+"""
+中文字体注册表
+
+PDF和图片渲染共用：
+- 字体路径只探测一次，结果写入磁盘缓存（FONT_CACHE_FILE），进程重启或新的渲染子进程直接复用
+- 首次使用时才注册reportlab字体，导入模块不再触发字体扫描
+- 图片渲染按字号缓存 ImageFont 对象，同一字号只加载一次
+- reportlab 对 TrueType 字体按实际用到的字形子集嵌入，PDF中不会包含整个CJK字体文件
+"""
+import json
+import os
+import platform
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from loguru import logger
+
+from app.core.config import settings
+
+
+# 项目内的字体文件目录
+PROJECT_FONT_DIR = Path(__file__).parent.parent.parent / "fonts"
+
+# reportlab 中注册的字体名
+PDF_FONT_NAME = "ChineseFont"
+
+# 字体用途
+PURPOSE_PDF = "pdf"
+PURPOSE_IMAGE = "image"
+
+# 项目字体（按优先级排序）
+_PROJECT_FONTS = {
+    PURPOSE_PDF: [
+        "SourceHanSansCN-Regular.otf",
+        "SourceHanSansSC-Regular.otf",
+        "NotoSansSC-Regular.otf",
+        "wqy-microhei.ttc",
+        "simhei.ttf",
+    ],
+    PURPOSE_IMAGE: [
+        "SourceHanSansCN-Regular.otf",
+        "wqy-microhei.ttc",
+        "simhei.ttf",
+    ],
+}
+
+# 系统字体（按优先级排序）
+_WINDOWS_FONTS = {
+    PURPOSE_PDF: [
+        "C:/Windows/Fonts/simhei.ttf",   # 黑体（最稳定）
+        "C:/Windows/Fonts/msyh.ttc",     # 微软雅黑
+        "C:/Windows/Fonts/simsun.ttc",   # 宋体
+    ],
+    PURPOSE_IMAGE: [
+        "C:/Windows/Fonts/msyh.ttc",
+        "C:/Windows/Fonts/simhei.ttf",
+        "C:/Windows/Fonts/simsun.ttc",
+    ],
+}
+
+_UNIX_FONTS = {
+    PURPOSE_PDF: [
+        "/usr/share/fonts/truetype/wqy/wqy-microhei.ttc",
+        "/usr/share/fonts/truetype/wqy/wqy-zenhei.ttc",
+        "/usr/share/fonts/opentype/noto/NotoSansCJK-Regular.ttc",
+        "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",  # 备用字体
+        "/System/Library/Fonts/PingFang.ttc",  # macOS
+        "/System/Library/Fonts/STHeiti Light.ttc",  # macOS
+    ],
+    PURPOSE_IMAGE: [
+        "/usr/share/fonts/truetype/wqy/wqy-microhei.ttc",
+        "/usr/share/fonts/truetype/wqy/wqy-zenhei.ttc",
+        "/System/Library/Fonts/PingFang.ttc",  # macOS
+    ],
+}
+
+# 固定路径都不存在时扫描的目录（仅在磁盘缓存未命中时执行一次）
+_SCAN_DIRS = ["/usr/share/fonts", "/usr/local/share/fonts"]
+_SCAN_KEYWORDS = ("wqy", "notosanscjk", "sourcehansans")
+
+
+class FontRegistry:
+    """中文字体注册表（进程内单例）"""
+
+    def __init__(self, cache_file: str):
+        self.cache_file = Path(cache_file)
+        self._lock = threading.Lock()
+        # 用途 -> (字体路径, TTC子字体索引)；None 表示已探测但没有可用字体
+        self._resolved: Dict[str, Optional[Tuple[str, int]]] = {}
+        self._pdf_font_name: Optional[str] = None
+        self._pdf_registered = False
+        self._image_fonts: Dict[int, object] = {}
+
+    # ==================== 磁盘缓存 ====================
+
+    def _read_disk_cache(self) -> Dict[str, dict]:
+        try:
+            with open(self.cache_file, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            return data if isinstance(data, dict) else {}
+        except (OSError, ValueError):
+            return {}
+
+    def _write_disk_cache(self, purpose: str, font_path: str, subfont_index: int) -> None:
+        data = self._read_disk_cache()
+        try:
+            stat = os.stat(font_path)
+            data[purpose] = {
+                "path": font_path,
+                "subfont_index": subfont_index,
+                "size": stat.st_size,
+                "mtime": int(stat.st_mtime),
+            }
+            self.cache_file.parent.mkdir(parents=True, exist_ok=True)
+            tmp_file = self.cache_file.with_suffix(f".{os.getpid()}.tmp")
+            with open(tmp_file, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp_file, self.cache_file)
+        except OSError as e:
+            logger.debug(f"[字体注册] 写入字体缓存失败: {str(e)}")
+
+    def _cached_candidate(self, purpose: str) -> Optional[Tuple[str, int]]:
+        """读取磁盘缓存，字体文件已变化或被删除时视为未命中"""
+        entry = self._read_disk_cache().get(purpose)
+        if not isinstance(entry, dict):
+            return None
+        try:
+            stat = os.stat(entry["path"])
+        except (OSError, KeyError, TypeError):
+            return None
+        if stat.st_size != entry.get("size") or int(stat.st_mtime) != entry.get("mtime"):
+            return None
+        return entry["path"], int(entry.get("subfont_index", -1))
+
+    # ==================== 探测 ====================
+
+    @staticmethod
+    def _candidates(purpose: str) -> List[str]:
+        """按优先级列出存在的候选字体文件"""
+        paths = [str(PROJECT_FONT_DIR / name) for name in _PROJECT_FONTS[purpose]]
+        if platform.system() == "Windows":
+            paths += _WINDOWS_FONTS[purpose]
+        else:
+            paths += _UNIX_FONTS[purpose]
+        existing = [p for p in paths if os.path.exists(p)]
+        if existing or platform.system() == "Windows":
+            return existing
+
+        # 固定路径都不存在时扫描系统字体目录（替代原来的 find 子进程）
+        for scan_dir in _SCAN_DIRS:
+            for root, _, files in os.walk(scan_dir):
+                for name in files:
+                    lower = name.lower()
+                    if lower.endswith((".ttf", ".ttc", ".otf")) and any(k in lower for k in _SCAN_KEYWORDS):
+                        existing.append(os.path.join(root, name))
+        return existing
+
+    def _resolve(self, purpose: str, loader) -> Optional[Tuple[str, int]]:
+        """
+        找到第一个能被 loader 成功加载的字体
+
+        loader(font_path, subfont_index) 加载失败时抛出异常。
+        优先尝试磁盘缓存中的路径，命中时不再遍历候选列表。
+        """
+        if purpose in self._resolved:
+            return self._resolved[purpose]
+
+        cached = self._cached_candidate(purpose)
+        if cached:
+            try:
+                loader(*cached)
+                self._resolved[purpose] = cached
+                return cached
+            except Exception as e:
+                logger.debug(f"[字体注册] 缓存的字体不可用 {cached[0]}: {str(e)}")
+
+        for font_path in self._candidates(purpose):
+            # .ttc 先尝试指定索引0，失败再尝试默认
+            indexes = [0, -1] if font_path.lower().endswith(".ttc") else [-1]
+            for subfont_index in indexes:
+                try:
+                    loader(font_path, subfont_index)
+                except Exception as e:
+                    logger.debug(f"[字体注册] 字体加载失败 {font_path}: {str(e)}")
+                    continue
+                logger.info(f"[字体注册] ✓ 使用字体 - purpose={purpose}, path={font_path}")
+                self._resolved[purpose] = (font_path, subfont_index)
+                self._write_disk_cache(purpose, font_path, subfont_index)
+                return self._resolved[purpose]
+
+        logger.error(f"[字体注册] ✗ 未找到可用的中文字体 - purpose={purpose}，请将字体文件放入 backend/fonts/ 目录")
+        self._resolved[purpose] = None
+        return None
+
+    # ==================== PDF ====================
+
+    def register_pdf_font(self) -> Optional[str]:
+        """在reportlab中注册中文字体（每个进程只注册一次），返回字体名称"""
+        if self._pdf_registered:
+            return self._pdf_font_name
+
+        with self._lock:
+            if self._pdf_registered:
+                return self._pdf_font_name
+
+            from reportlab.pdfbase import pdfmetrics
+            from reportlab.pdfbase.ttfonts import TTFont
+
+            def load(font_path: str, subfont_index: int) -> None:
+                # reportlab按实际用到的字形子集嵌入TrueType字体
+                if subfont_index >= 0:
+                    font = TTFont(PDF_FONT_NAME, font_path, subfontIndex=subfont_index)
+                else:
+                    font = TTFont(PDF_FONT_NAME, font_path)
+                pdfmetrics.registerFont(font)
+
+            resolved = self._resolve(PURPOSE_PDF, load)
+            self._pdf_font_name = PDF_FONT_NAME if resolved else None
+            self._pdf_registered = True
+            return self._pdf_font_name
+
+    # ==================== 图片 ====================
+
+    def get_image_font(self, size: int = 20):
+        """获取指定字号的 ImageFont（按字号缓存）"""
+        font = self._image_fonts.get(size)
+        if font is not None:
+            return font
+
+        from PIL import ImageFont
+
+        with self._lock:
+            font = self._image_fonts.get(size)
+            if font is not None:
+                return font
+
+            loaded = {}
+
+            def load(font_path: str, subfont_index: int) -> None:
+                loaded["font"] = ImageFont.truetype(font_path, size, index=max(subfont_index, 0))
+
+            resolved = self._resolve(PURPOSE_IMAGE, load)
+            if resolved:
+                font = loaded.get("font")
+                if font is None:
+                    # 用途已在其他字号上解析过，直接按路径加载
+                    font_path, subfont_index = resolved
+                    font = ImageFont.truetype(font_path, size, index=max(subfont_index, 0))
+            else:
+                # 使用默认字体（可能不支持中文）
+                try:
+                    font = ImageFont.load_default()
+                except Exception:
+                    return None
+            self._image_fonts[size] = font
+            return font
+
+
+# 全局字体注册表
+font_registry = FontRegistry(settings.FONT_CACHE_FILE)
@@ -3,393 +3,423 @@
 将报告内容渲染为PNG图片，避免PDF中文乱码问题
 """
 import io
-from typing import Dict, List, Any, Optional
-from PIL import Image, ImageDraw, ImageFont
+import zipfile
+from bisect import bisect_left
+from typing import Any, BinaryIO, Dict, List, Optional, Tuple
+from PIL import Image, ImageDraw
 from loguru import logger
-import re
-from pathlib import Path
+
+from app.utils.echarts_renderer import render_chart_png
+from app.utils.font_registry import font_registry
+from app.utils.png_stream import PNGStreamWriter
+from app.utils.report_ast import parse_report
+from app.utils.text_layout import get_font_metrics, wrap_line
+
+
+# 分块编码时每块的行数：内存中只保留一块画布（1200宽约3.5MB），与报告长度无关
+TILE_HEIGHT = 1024
+
+# 分页导出的页高（宽1200时按A4纵向比例）
+PAGE_HEIGHT = 1697
 
 
 def get_chinese_font(size: int = 20):
-    """获取中文字体，支持Windows和Linux"""
-    import platform
-    import os
-    
-    font_paths = []
-    
-    if platform.system() == "Windows":
-        font_paths = [
-            "C:/Windows/Fonts/msyh.ttc",      # 微软雅黑
-            "C:/Windows/Fonts/simhei.ttf",     # 黑体
-            "C:/Windows/Fonts/simsun.ttc",     # 宋体
-        ]
-    else:
-        # Linux/Mac
-        font_paths = [
-            "/usr/share/fonts/truetype/wqy/wqy-microhei.ttc",
-            "/usr/share/fonts/truetype/wqy/wqy-zenhei.ttc",
-            "/System/Library/Fonts/PingFang.ttc",  # macOS
-        ]
-    
-    # 尝试项目字体目录
-    backend_dir = Path(__file__).parent.parent.parent
-    project_fonts = [
-        backend_dir / "fonts" / "SourceHanSansCN-Regular.otf",
-        backend_dir / "fonts" / "wqy-microhei.ttc",
-        backend_dir / "fonts" / "simhei.ttf",
-    ]
-    
-    for font_path in project_fonts + [Path(p) for p in font_paths]:
-        try:
-            if font_path.exists():
-                font = ImageFont.truetype(str(font_path), size)
-                logger.info(f"[图片生成] 使用字体: {font_path}")
-                return font
-        except Exception as e:
-            logger.debug(f"[图片生成] 字体加载失败 {font_path}: {str(e)}")
-            continue
-    
-    # 使用默认字体（可能不支持中文）
-    try:
-        return ImageFont.load_default()
-    except:
-        return None
+    """获取中文字体，支持Windows和Linux（按字号缓存，字体路径只探测一次）"""
+    return font_registry.get_image_font(size)
 
 
 def parse_markdown_to_lines(text: str) -> List[Dict[str, Any]]:
-    """将Markdown文本解析为结构化行"""
+    """将Markdown文本展开为结构化行（h1/h2/h3/list/text/blank，结构来自 parse_report 的缓存）"""
     lines = []
-    for line in text.split('\n'):
-        line = line.strip()
-        if not line:
-            lines.append({"type": "blank", "content": ""})
-            continue
-        
-        if line.startswith('# '):
-            lines.append({"type": "h1", "content": line[2:].strip()})
-        elif line.startswith('## '):
-            lines.append({"type": "h2", "content": line[3:].strip()})
-        elif line.startswith('### '):
-            lines.append({"type": "h3", "content": line[4:].strip()})
-        elif line.startswith('- ') or line.startswith('* '):
-            lines.append({"type": "list", "content": line[2:].strip()})
-        else:
-            lines.append({"type": "text", "content": line})
-    
+    for block in parse_report(text).blocks:
+        if block.kind == "blank":
+            lines.extend({"type": "blank", "content": ""} for _ in range(block.count))
+        elif block.kind == "heading":
+            lines.append({"type": f"h{min(block.level, 3)}", "content": block.text})
+        elif block.kind == "list":
+            lines.extend({"type": "list", "content": item.text} for item in block.items)
+        elif block.kind == "paragraph":
+            lines.extend({"type": "text", "content": line} for line in block.lines)
+        elif block.kind == "table":
+            lines.extend({"type": "text", "content": " | ".join(row)} for row in (block.header,) + block.rows)
+        elif block.kind == "code":
+            lines.extend({"type": "text", "content": line} for line in block.lines if line)
+        elif block.kind == "chart":
+            lines.append({"type": "text", "content": f"图表: {block.title}"})
     return lines
 
 
 def wrap_text(text: str, font, max_width: int) -> List[str]:
-    """将文本按最大宽度换行"""
-    if not font:
-        # 简单估算：每个字符约10像素
-        chars_per_line = max_width // 10
-        words = text.split()
-        lines = []
-        current_line = []
-        current_length = 0
-        
-        for word in words:
-            word_length = len(word) + 1  # +1 for space
-            if current_length + word_length > chars_per_line and current_line:
-                lines.append(' '.join(current_line))
-                current_line = [word]
-                current_length = word_length
-            else:
-                current_line.append(word)
-                current_length += word_length
-        
-        if current_line:
-            lines.append(' '.join(current_line))
-        return lines
+    """将文本按最大宽度换行（中文逐字可断，英文按单词断行，字形宽度有缓存）"""
+    return wrap_line(text, font, max_width)
+
+
+class _ReportLayout:
+    """
+    报告图片排版：一遍排版生成显示列表，记录每个绘制操作的位置，最终高度即排版结束时的y
+
+    显示列表项：
+        ("text", (x, y), 文本, 字体, 颜色)
+        ("line", [(x1, y1), (x2, y2)], 颜色, 线宽)
+        ("rect", [x0, y0, x1, y1], 填充色, 边框色)
+        ("image", (x, y), PNG字节, 高度)
+    """
+
+    def __init__(self, padding: int, content_width: int):
+        self.padding = padding
+        self.content_width = content_width
+        self.y = padding
+        self.items: List[tuple] = []
+
+    def text_block(self, text: str, font, color: str, spacing: int, prefix: str = "") -> None:
+        """换行后逐行放置文本，行高取字体的 ascent + descent"""
+        line_height = get_font_metrics(font).line_height
+        for text_line in wrap_text(text, font, self.content_width):
+            self.items.append(("text", (self.padding, self.y), f"{prefix}{text_line}", font, color))
+            self.y += line_height + spacing
+
+    def text_line(self, text: str, font, color: str, advance: int, x: Optional[int] = None) -> None:
+        """放置单行文本（不换行），y前进固定高度"""
+        self.items.append(("text", (self.padding if x is None else x, self.y), text, font, color))
+        self.y += advance
+
+
+def _layout_table(layout: _ReportLayout, header, rows, font) -> None:
+    """排版表格：蓝底表头 + 斑马纹数据行，单元格文字最多15个字符"""
+    if not header:
+        return
+    cell_height = 35
+    col_width = layout.content_width // len(header)
     
-    lines = []
-    words = text.split()
-    current_line = []
+    # 表头
+    x = layout.padding
+    for col_label in header:
+        layout.items.append(("rect", [x, layout.y, x + col_width, layout.y + cell_height], '#3498db', None))
+        layout.items.append(("text", (x + 10, layout.y + 8), str(col_label)[:15], font, '#ffffff'))
+        x += col_width
+    layout.y += cell_height
     
-    for word in words:
-        test_line = ' '.join(current_line + [word]) if current_line else word
-        try:
-            bbox = font.getbbox(test_line)
-            width = bbox[2] - bbox[0]
-            if width > max_width and current_line:
-                lines.append(' '.join(current_line))
-                current_line = [word]
-            else:
-                current_line.append(word)
-        except:
-            # 如果字体不支持，使用简单估算
-            if len(test_line) > max_width // 10 and current_line:
-                lines.append(' '.join(current_line))
-                current_line = [word]
-            else:
-                current_line.append(word)
+    # 数据行
+    for row_idx, row in enumerate(rows):
+        x = layout.padding
+        bg_color = '#f8f9fa' if row_idx % 2 == 0 else '#ffffff'
+        for col_idx in range(len(header)):
+            cell_value = str(row[col_idx]) if col_idx < len(row) else ""
+            layout.items.append(("rect", [x, layout.y, x + col_width, layout.y + cell_height], bg_color, '#e0e0e0'))
+            layout.items.append(("text", (x + 10, layout.y + 8), cell_value[:15], font, '#333333'))
+            x += col_width
+        layout.y += cell_height
+    layout.y += 20
+
+
+def _layout_chart(layout: _ReportLayout, chart: Dict[str, Any], chart_height: int, font, label: str) -> None:
+    """排版图表：按ECharts配置渲染为PNG，不支持的类型显示文字说明"""
+    try:
+        chart_png = render_chart_png(chart, width=layout.content_width, height=chart_height)
+    except Exception as e:
+        logger.warning(f"[图片生成] 图表离线渲染失败 - title={chart.get('title', '')}, error={str(e)}")
+        chart_png = None
+    if chart_png:
+        layout.items.append(("image", (layout.padding, layout.y), chart_png, chart_height))
+        layout.y += chart_height + 40
+        return
+    
+    for text_line in wrap_text(str(label), font, layout.content_width):
+        layout.text_line(text_line, font, '#333333', 28)
+    layout.y += 20
+
+
+def _layout_report(
+    title: str,
+    report_content: Dict[str, Any],
+    width: int,
+    padding: int,
+    line_spacing: int,
+    page_margin: int
+) -> _ReportLayout:
+    """排版整份报告，生成显示列表"""
+    title_font = get_chinese_font(36)
+    h1_font = get_chinese_font(28)
+    h2_font = get_chinese_font(24)
+    h3_font = get_chinese_font(20)
+    text_font = get_chinese_font(18)
+    small_font = get_chinese_font(14)
+    
+    content_width = width - 2 * padding
+    layout = _ReportLayout(padding, content_width)
+    
+    # 标题
+    layout.text_block(title, title_font, '#1a1a1a', line_spacing)
+    layout.y += 20  # 标题后间距
+    
+    # 分隔线
+    layout.items.append(("line", [(padding, layout.y), (width - padding, layout.y)], '#e0e0e0', 2))
+    layout.y += 30
+    
+    # 文本内容（按缓存的报告结构排版）
+    text_content = report_content.get("text", "")
+    ast = parse_report(text_content) if text_content else None
+    heading_styles = {
+        1: (h1_font, '#2c3e50', 15),
+        2: (h2_font, '#34495e', 12),
+        3: (h3_font, '#34495e', 10),
+    }
+    chart_height = int(content_width * 0.56)
+    for block in (ast.blocks if ast else ()):
+        if block.kind == "blank":
+            layout.y += line_spacing * 2 * block.count
+        elif block.kind == "heading":
+            font, color, spacing = heading_styles[min(block.level, 3)]
+            layout.text_block(block.text, font, color, spacing)
+        elif block.kind == "paragraph":
+            for line in block.lines:
+                layout.text_block(line, text_font, '#333333', 8)
+        elif block.kind == "list":
+            for item in block.items:
+                layout.text_block(item.text, text_font, '#333333', 8, prefix=f"{item.marker} ")
+        elif block.kind == "table":
+            _layout_table(layout, block.header, block.rows, small_font)
+        elif block.kind == "chart":
+            _layout_chart(layout, block.as_chart(), chart_height, text_font, label=block.title or "图表")
+        elif block.kind == "code":
+            for line in block.lines:
+                layout.text_line(line, small_font, '#555555', 22)
+            layout.y += 10
+    
+    # 图表（按ECharts配置渲染，不支持的类型显示文字说明）
+    charts = report_content.get("charts", [])
+    if charts:
+        layout.y += 20
+        layout.text_line("图表", h1_font, '#2c3e50', 40)
+        for i, chart in enumerate(charts):
+            _layout_chart(layout, chart, chart_height, text_font, label=f"图表 {i+1}: {chart.get('title', f'图表 {i+1}')}")
     
-    if current_line:
-        lines.append(' '.join(current_line))
+    # 表格
+    tables = report_content.get("tables", [])
+    if tables:
+        layout.y += 20
+        layout.text_line("数据表格", h1_font, '#2c3e50', 40)
+        for table_data in tables:
+            columns = table_data.get("columns", []) if isinstance(table_data, dict) else []
+            data = table_data.get("data", []) if isinstance(table_data, dict) else []
+            if not (columns and data):
+                continue
+            header = [str(col.get("label", col.get("prop", ""))) for col in columns]
+            # 数据行（最多10行）
+            rows = [
+                [str(row.get(col.get("prop", ""), "")) if isinstance(row, dict) else "" for col in columns]
+                for row in data[:10]
+            ]
+            _layout_table(layout, header, rows, small_font)
+    
+    # 指标
+    metrics = report_content.get("metrics", {})
+    if metrics:
+        layout.y += 20
+        layout.text_line("关键指标", h1_font, '#2c3e50', 40)
+        for key, value in metrics.items():
+            for text_line in wrap_text(f"{key}: {value}", text_font, content_width):
+                layout.text_line(text_line, text_font, '#333333', 28)
+            layout.y += 10
     
-    return lines if lines else [text]
+    layout.y += page_margin
+    return layout
 
 
-def generate_report_image(
+def _item_extent(item: tuple) -> Tuple[int, int]:
+    """显示列表项占据的纵向范围 [top, bottom)"""
+    kind = item[0]
+    if kind == "text":
+        _, (_, y), _, font, _ = item
+        return int(y), int(y + get_font_metrics(font).line_height) + 1
+    if kind == "line":
+        _, points, _, line_width = item
+        ys = [point[1] for point in points]
+        return int(min(ys) - line_width), int(max(ys) + line_width) + 1
+    if kind == "rect":
+        _, box, _, _ = item
+        return int(box[1]), int(box[3]) + 1
+    _, (_, y), _, item_height = item
+    return int(y), int(y + item_height)
+
+
+class _DisplayIndex:
+    """按纵向位置索引显示列表，取出与某个区间相交的绘制项（保持原始绘制顺序）"""
+
+    def __init__(self, items: List[tuple]):
+        entries = sorted(
+            (_item_extent(item) + (seq, item) for seq, item in enumerate(items)),
+            key=lambda entry: entry[0]
+        )
+        self._entries = entries
+        self._tops = [entry[0] for entry in entries]
+        self._max_height = max((bottom - top for top, bottom, _, _ in entries), default=0)
+
+    def between(self, top: int, bottom: int) -> List[tuple]:
+        """与 [top, bottom) 相交的绘制项"""
+        start = bisect_left(self._tops, top - self._max_height)
+        end = bisect_left(self._tops, bottom)
+        hits = [entry for entry in self._entries[start:end] if entry[1] > top]
+        hits.sort(key=lambda entry: entry[2])
+        return [entry[3] for entry in hits]
+
+    def spanning(self, y: int) -> List[Tuple[int, int]]:
+        """跨越y（上沿在y之上、下沿在y之下）的绘制项的范围"""
+        start = bisect_left(self._tops, y - self._max_height)
+        end = bisect_left(self._tops, y)
+        return [(top, bottom) for top, bottom, _, _ in self._entries[start:end] if bottom > y]
+
+
+def _paint(draw: ImageDraw.ImageDraw, img: Image.Image, items: List[tuple], offset_y: int = 0) -> None:
+    """按显示列表绘制，offset_y 为画布顶部在整份报告中的纵坐标（分块绘制时使用）"""
+    for item in items:
+        kind = item[0]
+        try:
+            if kind == "text":
+                _, (x, y), text, font, color = item
+                draw.text((x, y - offset_y), text, fill=color, font=font)
+            elif kind == "line":
+                _, points, color, line_width = item
+                draw.line([(x, y - offset_y) for x, y in points], fill=color, width=line_width)
+            elif kind == "rect":
+                _, box, fill, outline = item
+                x0, y0, x1, y1 = box
+                draw.rectangle([x0, y0 - offset_y, x1, y1 - offset_y], fill=fill, outline=outline)
+            elif kind == "image":
+                _, (x, y), png_bytes, _ = item
+                with Image.open(io.BytesIO(png_bytes)) as chart_img:
+                    img.paste(chart_img, (x, y - offset_y))
+        except Exception as e:
+            logger.warning(f"[图片生成] 绘制{kind}失败: {str(e)}")
+
+
+def _render_slice(index: _DisplayIndex, width: int, top: int, bottom: int, height: Optional[int] = None, margin_top: int = 0) -> Image.Image:
+    """
+    绘制报告中 [top, bottom) 这一段，超出区间的部分被画布裁掉
+
+    Args:
+        height: 画布高度，默认等于区间高度（分页时固定为页高）
+        margin_top: 内容在画布中的上边距（分页时续页顶部留白）
+    """
+    canvas_height = height or (bottom - top)
+    img = Image.new('RGB', (width, canvas_height), color='white')
+    draw = ImageDraw.Draw(img)
+    _paint(draw, img, index.between(top, bottom), offset_y=top - margin_top)
+    if margin_top or canvas_height > bottom - top:
+        # 区间外被一并画上的相邻内容用白底覆盖
+        if margin_top:
+            draw.rectangle([0, 0, width, margin_top - 1], fill='white')
+        content_bottom = margin_top + bottom - top
+        if content_bottom < canvas_height:
+            draw.rectangle([0, content_bottom, width, canvas_height], fill='white')
+    return img
+
+
+def _page_breaks(index: _DisplayIndex, total_height: int, page_content_height: int) -> List[Tuple[int, int]]:
+    """
+    计算分页区间：分页线尽量不穿过任何绘制项（文本行、表格单元格、图表），
+    遇到比一页还高的绘制项时在页高处硬切
+    """
+    pages: List[Tuple[int, int]] = []
+    start = 0
+    while start < total_height:
+        limit = min(start + page_content_height, total_height)
+        cut = limit
+        if limit < total_height:
+            spans = index.spanning(cut)
+            while spans:
+                cut = min(top for top, _ in spans)
+                spans = index.spanning(cut)
+            if cut <= start:
+                cut = limit
+        pages.append((start, cut))
+        start = cut
+    return pages
+
+
+def _write_long_png(output: BinaryIO, index: _DisplayIndex, width: int, height: int, tile_height: int) -> int:
+    """按图块从上到下绘制并流式编码为一张长图"""
+    writer = PNGStreamWriter(output, width, height)
+    for top in range(0, height, tile_height):
+        tile = _render_slice(index, width, top, min(top + tile_height, height))
+        writer.write_rows(tile)
+        tile.close()
+    return writer.close()
+
+
+def _write_pages_zip(output: BinaryIO, index: _DisplayIndex, width: int, height: int, page_height: int, padding: int) -> int:
+    """按页绘制，每页一张PNG写入ZIP（page_001.png ...），续页顶部和每页底部留出内边距"""
+    pages = _page_breaks(index, height, page_height - 2 * padding)
+    # PNG本身已压缩，ZIP中直接存储
+    with zipfile.ZipFile(output, "w", compression=zipfile.ZIP_STORED) as zip_file:
+        for page_no, (top, bottom) in enumerate(pages, start=1):
+            margin_top = 0 if page_no == 1 else padding
+            page = _render_slice(index, width, top, bottom, height=page_height, margin_top=margin_top)
+            with zip_file.open(f"page_{page_no:03d}.png", "w") as entry:
+                writer = PNGStreamWriter(entry, width, page_height)
+                writer.write_rows(page)
+                writer.close()
+            page.close()
+    logger.info(f"[图片生成] 分页完成 - pages={len(pages)}")
+    return output.tell()
+
+
+def write_report_image(
+    output: BinaryIO,
     title: str,
     report_content: Dict[str, Any],
     session_id: int,
+    paginate: bool = False,
     width: int = 1200,
     padding: int = 40,
     line_spacing: int = 8,
-    page_margin: int = 60
-) -> bytes:
+    page_margin: int = 60,
+    tile_height: int = TILE_HEIGHT,
+    page_height: int = PAGE_HEIGHT
+) -> int:
     """
-    生成报告图片
+    生成报告图片并写入 output
+    
+    先一遍排版得到显示列表和准确高度，再按显示列表分块绘制：
+    - 长图（默认）：每次只绘制 tile_height 行并立即流式编码，内存占用与报告长度无关
+    - 分页（paginate=True）：按页高分页（分页线不穿过文本行、表格和图表），每页一张PNG，打包为ZIP
     
     Args:
+        output: 输出流（文件、ZIP条目等，只需支持write；分页模式还需支持tell）
         title: 报告标题
         report_content: 报告内容，包含text, charts, tables, metrics
         session_id: 会话ID
+        paginate: 是否分页输出ZIP
         width: 图片宽度（像素）
         padding: 内边距
         line_spacing: 行间距
         page_margin: 页面边距
+        tile_height: 长图分块编码的行数
+        page_height: 分页模式的页高（像素）
     
     Returns:
-        PNG图片的字节数据
+        写入的字节数
     """
     logger.info(f"[图片生成] ====== 开始生成报告图片 ======")
-    logger.info(f"[图片生成] 标题: {title}, session_id={session_id}")
+    logger.info(f"[图片生成] 标题: {title}, session_id={session_id}, paginate={paginate}")
     
     try:
-        # 获取字体
-        title_font = get_chinese_font(36)
-        h1_font = get_chinese_font(28)
-        h2_font = get_chinese_font(24)
-        h3_font = get_chinese_font(20)
-        text_font = get_chinese_font(18)
-        small_font = get_chinese_font(14)
+        # 1. 排版
+        layout = _layout_report(title, report_content, width, padding, line_spacing, page_margin)
+        height = max(int(layout.y), 800)
+        logger.info(f"[图片生成] 图片尺寸: {width}x{height}, 绘制项: {len(layout.items)}")
         
-        # 计算内容区域宽度
-        content_width = width - 2 * padding
-        
-        # 解析文本内容
-        text_content = report_content.get("text", "")
-        lines = parse_markdown_to_lines(text_content) if text_content else []
-        
-        # 计算所需高度
-        y = padding
-        y += 60  # 标题高度
-        y += 30  # 标题后间距
-        
-        for line in lines:
-            if line["type"] == "blank":
-                y += line_spacing * 2
-            elif line["type"] == "h1":
-                y += 40
-            elif line["type"] == "h2":
-                y += 35
-            elif line["type"] == "h3":
-                y += 30
-            else:
-                wrapped = wrap_text(line["content"], text_font, content_width)
-                y += len(wrapped) * (24 + line_spacing)
-        
-        # 添加图表和表格的高度估算
-        charts = report_content.get("charts", [])
-        tables = report_content.get("tables", [])
-        y += len(charts) * 300  # 每个图表约300像素高
-        y += len(tables) * 200  # 每个表格约200像素高
-        
-        # 添加底部边距
-        y += page_margin
-        
-        # 确保最小高度
-        height = max(y, 800)
-        
-        logger.info(f"[图片生成] 图片尺寸: {width}x{height}")
-        
-        # 创建图片
-        img = Image.new('RGB', (width, height), color='white')
-        draw = ImageDraw.Draw(img)
-        
-        # 绘制标题
-        y = padding
-        title_lines = wrap_text(title, title_font, content_width)
-        for line in title_lines:
-            try:
-                draw.text((padding, y), line, fill='#1a1a1a', font=title_font)
-                bbox = title_font.getbbox(line) if title_font else (0, 0, len(line) * 20, 30)
-                y += (bbox[3] - bbox[1]) + line_spacing
-            except Exception as e:
-                logger.warning(f"[图片生成] 绘制标题行失败: {str(e)}")
-                y += 40
-        
-        y += 20  # 标题后间距
-        
-        # 绘制分隔线
-        draw.line([(padding, y), (width - padding, y)], fill='#e0e0e0', width=2)
-        y += 30
-        
-        # 绘制文本内容
-        for line in lines:
-            if line["type"] == "blank":
-                y += line_spacing * 2
-                continue
-            
-            content = line["content"]
-            wrapped = wrap_text(content, text_font, content_width)
-            
-            if line["type"] == "h1":
-                font = h1_font
-                color = '#2c3e50'
-                spacing = 15
-            elif line["type"] == "h2":
-                font = h2_font
-                color = '#34495e'
-                spacing = 12
-            elif line["type"] == "h3":
-                font = h3_font
-                color = '#34495e'
-                spacing = 10
-            elif line["type"] == "list":
-                font = text_font
-                color = '#333333'
-                spacing = 8
-                wrapped = [f"• {w}" for w in wrapped]
-            else:
-                font = text_font
-                color = '#333333'
-                spacing = 8
-            
-            for text_line in wrapped:
-                try:
-                    draw.text((padding, y), text_line, fill=color, font=font)
-                    bbox = font.getbbox(text_line) if font else (0, 0, len(text_line) * 12, 20)
-                    y += (bbox[3] - bbox[1]) + spacing
-                except Exception as e:
-                    logger.warning(f"[图片生成] 绘制文本行失败: {str(e)}")
-                    y += 24
-        
-        # 绘制图表说明
-        if charts:
-            y += 20
-            try:
-                draw.text((padding, y), "图表", fill='#2c3e50', font=h1_font)
-                y += 40
-            except:
-                y += 40
-            
-            for i, chart in enumerate(charts):
-                chart_title = str(chart.get('title', f'图表 {i+1}'))
-                chart_text = f"图表 {i+1}: {chart_title}"
-                wrapped = wrap_text(chart_text, text_font, content_width)
-                for line in wrapped:
-                    try:
-                        draw.text((padding, y), line, fill='#333333', font=text_font)
-                        y += 28
-                    except:
-                        y += 28
-                y += 20
-        
-        # 绘制表格
-        if tables:
-            y += 20
-            try:
-                draw.text((padding, y), "数据表格", fill='#2c3e50', font=h1_font)
-                y += 40
-            except:
-                y += 40
-            
-            for table_data in tables:
-                try:
-                    columns = table_data.get("columns", [])
-                    data = table_data.get("data", [])
-                    
-                    if columns and data:
-                        # 绘制表头
-                        header_bg_color = '#3498db'
-                        header_text_color = '#ffffff'
-                        cell_height = 35
-                        col_width = content_width // len(columns)
-                        
-                        x = padding
-                        for col in columns:
-                            col_label = str(col.get("label", col.get("prop", "")))
-                            # 绘制表头背景
-                            draw.rectangle(
-                                [x, y, x + col_width, y + cell_height],
-                                fill=header_bg_color
-                            )
-                            # 绘制表头文本
-                            draw.text(
-                                (x + 10, y + 8),
-                                col_label[:15],  # 限制长度
-                                fill=header_text_color,
-                                font=small_font
-                            )
-                            x += col_width
-                        
-                        y += cell_height
-                        
-                        # 绘制数据行（最多10行）
-                        for row_idx, row in enumerate(data[:10]):
-                            x = padding
-                            bg_color = '#f8f9fa' if row_idx % 2 == 0 else '#ffffff'
-                            
-                            for col_idx, col in enumerate(columns):
-                                cell_value = str(row.get(col.get("prop", ""), ""))
-                                # 绘制单元格背景
-                                draw.rectangle(
-                                    [x, y, x + col_width, y + cell_height],
-                                    fill=bg_color,
-                                    outline='#e0e0e0'
-                                )
-                                # 绘制单元格文本
-                                draw.text(
-                                    (x + 10, y + 8),
-                                    cell_value[:15],  # 限制长度
-                                    fill='#333333',
-                                    font=small_font
-                                )
-                                x += col_width
-                            
-                            y += cell_height
-                        
-                        y += 20
-                except Exception as e:
-                    logger.warning(f"[图片生成] 绘制表格失败: {str(e)}")
-                    y += 50
-        
-        # 绘制指标
-        metrics = report_content.get("metrics", {})
-        if metrics:
-            y += 20
-            try:
-                draw.text((padding, y), "关键指标", fill='#2c3e50', font=h1_font)
-                y += 40
-            except:
-                y += 40
-            
-            for key, value in metrics.items():
-                metric_text = f"{key}: {value}"
-                wrapped = wrap_text(metric_text, text_font, content_width)
-                for line in wrapped:
-                    try:
-                        draw.text((padding, y), line, fill='#333333', font=text_font)
-                        y += 28
-                    except:
-                        y += 28
-                y += 10
-        
-        # 转换为字节
-        buffer = io.BytesIO()
-        img.save(buffer, format='PNG', optimize=True)
-        buffer.seek(0)
-        image_bytes = buffer.read()
-        buffer.close()
+        # 2. 分块绘制并编码
+        index = _DisplayIndex(layout.items)
+        if paginate:
+            size = _write_pages_zip(output, index, width, height, page_height, padding)
+        else:
+            size = _write_long_png(output, index, width, height, tile_height)
         
-        logger.info(f"[图片生成] 图片生成成功 - 大小: {len(image_bytes)} bytes")
+        logger.info(f"[图片生成] 图片生成成功 - 大小: {size} bytes")
         logger.info(f"[图片生成] ====== 图片生成完成 ======")
         
-        return image_bytes
+        return size
         
     except Exception as e:
         import traceback
@@ -401,3 +431,14 @@ def generate_report_image(
         logger.error(f"[图片生成] ====== 错误结束 ======")
         raise Exception(f"图片生成失败: {str(e)}")
 
+
+def generate_report_image(
+    title: str,
+    report_content: Dict[str, Any],
+    session_id: int,
+    **kwargs: Any
+) -> bytes:
+    """生成报告长图，返回PNG字节（参数同 write_report_image）"""
+    buffer = io.BytesIO()
+    write_report_image(buffer, title, report_content, session_id, **kwargs)
+    return buffer.getvalue()
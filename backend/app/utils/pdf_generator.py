@@ -2,327 +2,164 @@
 PDF生成工具
 """
 import io
-import base64
-from typing import Dict, List, Any, Optional
+from typing import BinaryIO, Dict, List, Any, Optional
+from reportlab import rl_config
 from reportlab.lib.pagesizes import A4
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.units import inch
 from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, PageBreak
 from reportlab.lib import colors
 from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
 from reportlab.lib.enums import TA_LEFT, TA_CENTER
 from loguru import logger
 
+from app.utils.chart_image_pipeline import ChartImagePipeline
+from app.utils.echarts_renderer import render_chart_drawing
+from app.utils.font_registry import font_registry
+from app.utils.report_ast import ReportAST, TableBlock, parse_report
+
+
+# 流（图片、页面内容）直接以二进制写入，不做ASCII85编码（编码后体积增加25%）
+rl_config.useA85 = 0
+
 
 # 全局变量：存储已注册的中文字体名称
 CHINESE_FONT_NAME = None
 
-# 注册中文字体（优先使用项目字体，然后尝试系统字体）
 def register_chinese_font():
-    """注册中文字体，返回字体名称"""
+    """注册中文字体，返回字体名称（字体探测和注册由字体注册表完成，每个进程只执行一次）"""
     global CHINESE_FONT_NAME
     
     if CHINESE_FONT_NAME:
         return CHINESE_FONT_NAME
     
-    import platform
-    import os
-    from pathlib import Path
-    
-    # 获取backend目录的绝对路径
-    backend_dir = Path(__file__).parent.parent.parent
+    CHINESE_FONT_NAME = font_registry.register_pdf_font()
+    return CHINESE_FONT_NAME
+
+
+def _escape(text: str) -> str:
+    return str(text).replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+
+
+def _markdown_table(block: TableBlock, styles_dict: Dict) -> Table:
+    """Markdown表格 -> ReportLab表格（单元格使用段落以便自动换行）"""
+    normal_style = styles_dict.get('Normal')
+    cell_style = ParagraphStyle('MarkdownTableCell', parent=normal_style, fontSize=9, leading=12)
+    header_style = ParagraphStyle('MarkdownTableHeader', parent=cell_style, textColor=colors.white)
+    column_count = max([len(block.header)] + [len(row) for row in block.rows])
     
-    # 优先使用项目内的字体文件（按优先级排序）
-    project_fonts = [
-        ("fonts/SourceHanSansCN-Regular.otf", "SourceHanSans-CN"),
-        ("fonts/SourceHanSansSC-Regular.otf", "SourceHanSans-SC"),
-        ("fonts/NotoSansSC-Regular.otf", "NotoSans-SC"),
-        ("fonts/wqy-microhei.ttc", "WQYMicroHei"),
-        ("fonts/simhei.ttf", "SimHei"),
-    ]
+    def to_row(cells, style):
+        cells = list(cells) + [''] * (column_count - len(cells))
+        return [Paragraph(_escape(cell), style) for cell in cells]
     
-    logger.info(f"[PDF生成] Backend目录: {backend_dir}")
-    logger.info(f"[PDF生成] 开始尝试注册项目字体...")
+    table = Table(
+        [to_row(block.header, header_style)] + [to_row(row, cell_style) for row in block.rows],
+        colWidths=[6.2 * inch / column_count] * column_count,
+        repeatRows=1
+    )
+    table.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#3498db')),
+        ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.HexColor('#f8f9fa'), colors.white]),
+        ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#e0e0e0')),
+        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+    ]))
+    return table
+
+
+def report_ast_to_flowables(ast: ReportAST, styles_dict: Dict) -> List:
+    """将报告结构转换为ReportLab段落（结构来自 parse_report 的缓存，这里只生成Flowable）"""
+    paragraphs = []
+    normal_style = styles_dict.get('Normal')
+    heading_styles = {
+        1: (styles_dict.get('Heading1'), 0.2*inch),
+        2: (styles_dict.get('Heading2'), 0.15*inch),
+        3: (styles_dict.get('Heading3', styles_dict.get('Heading2')), 0.1*inch),
+    }
+    list_style = styles_dict.get('ListItem') or ParagraphStyle(
+        'MarkdownListItem', parent=normal_style, leftIndent=18, bulletIndent=6
+    )
     
-    for font_file, font_name in project_fonts:
-        font_path = backend_dir / font_file
+    for block in ast.blocks:
         try:
-            if font_path.exists():
-                logger.info(f"[PDF生成] 找到字体文件: {font_path}")
-                # 对于 .ttc 文件，尝试指定索引
-                if font_path.suffix.lower() == '.ttc':
-                    try:
-                        pdfmetrics.registerFont(TTFont('ChineseFont', str(font_path), subfontIndex=0))
-                        CHINESE_FONT_NAME = 'ChineseFont'
-                        logger.info(f"[PDF生成] ✓ 成功注册项目中文字体: {font_name} ({font_path})")
-                        return CHINESE_FONT_NAME
-                    except Exception as e1:
-                        # 如果指定索引失败，尝试不指定索引
-                        try:
-                            pdfmetrics.registerFont(TTFont('ChineseFont', str(font_path)))
-                            CHINESE_FONT_NAME = 'ChineseFont'
-                            logger.info(f"[PDF生成] ✓ 成功注册项目中文字体: {font_name} ({font_path})")
-                            return CHINESE_FONT_NAME
-                        except Exception as e2:
-                            logger.warning(f"[PDF生成] 注册项目字体失败 {font_path}: {str(e2)}")
-                            continue
-                else:
-                    # .ttf 或 .otf 文件直接注册
-                    pdfmetrics.registerFont(TTFont('ChineseFont', str(font_path)))
-                    CHINESE_FONT_NAME = 'ChineseFont'
-                    logger.info(f"[PDF生成] ✓ 成功注册项目中文字体: {font_name} ({font_path})")
-                    return CHINESE_FONT_NAME
-            else:
-                logger.debug(f"[PDF生成] 项目字体文件不存在: {font_path}")
-        except Exception as e:
-            logger.warning(f"[PDF生成] 注册项目字体失败 {font_path}: {str(e)}")
-            continue
-    
-    logger.info(f"[PDF生成] 项目字体未找到，尝试使用系统字体...")
-    
-    # 如果项目字体不存在，尝试系统字体
-    if platform.system() == "Windows":
-        # Windows系统字体路径（按优先级排序）
-        font_paths = [
-            ("C:/Windows/Fonts/simhei.ttf", "SimHei"),         # 黑体（最稳定）
-            ("C:/Windows/Fonts/msyh.ttc", "Microsoft YaHei"),  # 微软雅黑
-            ("C:/Windows/Fonts/simsun.ttc", "SimSun"),         # 宋体
-        ]
-        
-        for font_path, font_display_name in font_paths:
-            try:
-                if os.path.exists(font_path):
-                    logger.info(f"[PDF生成] 找到系统字体: {font_path}")
-                    # 对于 .ttc 文件，尝试指定索引
-                    if font_path.endswith('.ttc'):
-                        try:
-                            pdfmetrics.registerFont(TTFont('ChineseFont', font_path, subfontIndex=0))
-                            CHINESE_FONT_NAME = 'ChineseFont'
-                            logger.info(f"[PDF生成] ✓ 成功注册系统中文字体: {font_display_name} ({font_path})")
-                            return CHINESE_FONT_NAME
-                        except Exception as e1:
-                            try:
-                                pdfmetrics.registerFont(TTFont('ChineseFont', font_path))
-                                CHINESE_FONT_NAME = 'ChineseFont'
-                                logger.info(f"[PDF生成] ✓ 成功注册系统中文字体: {font_display_name} ({font_path})")
-                                return CHINESE_FONT_NAME
-                            except Exception as e2:
-                                logger.warning(f"[PDF生成] 注册系统字体失败 {font_path}: {str(e2)}")
-                                continue
-                    else:
-                        # .ttf 文件直接注册
-                        pdfmetrics.registerFont(TTFont('ChineseFont', font_path))
-                        CHINESE_FONT_NAME = 'ChineseFont'
-                        logger.info(f"[PDF生成] ✓ 成功注册系统中文字体: {font_display_name} ({font_path})")
-                        return CHINESE_FONT_NAME
+            if block.kind == "heading":
+                style, space_after = heading_styles[min(block.level, 3)]
+                paragraphs.append(Paragraph(_escape(block.text), style))
+                paragraphs.append(Spacer(1, space_after))
+            elif block.kind == "paragraph":
+                paragraphs.append(Paragraph(_escape(' '.join(block.lines)), normal_style))
+                paragraphs.append(Spacer(1, 0.2*inch))
+            elif block.kind == "list":
+                for item in block.items:
+                    paragraphs.append(Paragraph(_escape(item.text), list_style, bulletText=item.marker))
+                paragraphs.append(Spacer(1, 0.2*inch))
+            elif block.kind == "table":
+                paragraphs.append(_markdown_table(block, styles_dict))
+                paragraphs.append(Spacer(1, 0.2*inch))
+            elif block.kind == "chart":
+                chart_drawing = create_chart_image(block.as_chart())
+                if chart_drawing:
+                    paragraphs.append(chart_drawing)
                 else:
-                    logger.debug(f"[PDF生成] 系统字体文件不存在: {font_path}")
-            except Exception as e:
-                logger.warning(f"[PDF生成] 注册系统字体失败 {font_path}: {str(e)}")
-                continue
-    else:
-        # Linux/Mac系统，尝试常见的中文字体路径
-        # 使用find命令查找字体文件（如果可用）
-        import subprocess
-        linux_font_paths = [
-            "/usr/share/fonts/truetype/wqy/wqy-microhei.ttc",
-            "/usr/share/fonts/truetype/wqy/wqy-zenhei.ttc",
-            "/usr/share/fonts/opentype/noto/NotoSansCJK-Regular.ttc",
-            "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",  # 备用字体
-            "/System/Library/Fonts/PingFang.ttc",  # macOS
-            "/System/Library/Fonts/STHeiti Light.ttc",  # macOS
-        ]
-        
-        # 尝试使用find命令查找wqy字体
-        try:
-            result = subprocess.run(
-                ['find', '/usr/share/fonts', '/usr/local/share/fonts', '-name', '*wqy*', '-type', 'f'],
-                capture_output=True,
-                text=True,
-                timeout=5
-            )
-            if result.returncode == 0 and result.stdout.strip():
-                found_fonts = result.stdout.strip().split('\n')
-                for font_path in found_fonts:
-                    if font_path and os.path.exists(font_path):
-                        linux_font_paths.insert(0, font_path)  # 优先使用找到的字体
-                        logger.info(f"[PDF生成] 通过find找到字体: {font_path}")
+                    paragraphs.append(Paragraph(_escape(f"图表: {block.title or '未命名图表'}"), normal_style))
+                paragraphs.append(Spacer(1, 0.2*inch))
+            elif block.kind == "code":
+                paragraphs.append(Paragraph('<br/>'.join(_escape(line) for line in block.lines), normal_style))
+                paragraphs.append(Spacer(1, 0.2*inch))
         except Exception as e:
-            logger.debug(f"[PDF生成] 使用find查找字体失败: {str(e)}")
-        
-        for font_path in linux_font_paths:
-            try:
-                if os.path.exists(font_path):
-                    logger.info(f"[PDF生成] 找到系统字体: {font_path}")
-                    pdfmetrics.registerFont(TTFont('ChineseFont', font_path))
-                    CHINESE_FONT_NAME = 'ChineseFont'
-                    logger.info(f"[PDF生成] ✓ 成功注册系统中文字体: {font_path}")
-                    return CHINESE_FONT_NAME
-            except Exception as e:
-                logger.debug(f"[PDF生成] 注册系统字体失败 {font_path}: {str(e)}")
-                continue
+            logger.warning(f"[PDF生成] 创建{block.kind}失败: {str(e)}")
     
-    logger.error("[PDF生成] ✗ 未能注册中文字体，PDF中的中文将显示为乱码")
-    logger.error("[PDF生成] 请按照文档说明添加字体文件到 backend/fonts/ 目录")
-    return None
-
-# 在模块加载时尝试注册字体
-try:
-    register_chinese_font()
-except Exception as e:
-    logger.error(f"[PDF生成] 字体注册过程出错: {str(e)}")
+    return paragraphs
 
 
 def markdown_to_paragraphs(text: str, styles_dict: Dict) -> List:
     """将Markdown文本转换为ReportLab段落"""
-    paragraphs = []
-    
     if not text:
-        return paragraphs
-    
-    # 简单的Markdown解析
-    lines = text.split('\n')
-    current_paragraph = []
-    
-    for line in lines:
-        line = line.strip()
-        if not line:
-            if current_paragraph:
-                try:
-                    para_text = ' '.join(current_paragraph).replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
-                    paragraphs.append(Paragraph(para_text, styles_dict.get('Normal')))
-                    paragraphs.append(Spacer(1, 0.2*inch))
-                except Exception as e:
-                    logger.warning(f"[PDF生成] 创建段落失败: {str(e)}")
-                current_paragraph = []
-            continue
-        
-        # 处理标题
-        if line.startswith('# '):
-            if current_paragraph:
-                try:
-                    para_text = ' '.join(current_paragraph).replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
-                    paragraphs.append(Paragraph(para_text, styles_dict.get('Normal')))
-                except Exception as e:
-                    logger.warning(f"[PDF生成] 创建段落失败: {str(e)}")
-                current_paragraph = []
-            try:
-                title_text = line[2:].replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
-                paragraphs.append(Paragraph(title_text, styles_dict.get('Heading1')))
-                paragraphs.append(Spacer(1, 0.2*inch))
-            except Exception as e:
-                logger.warning(f"[PDF生成] 创建标题失败: {str(e)}")
-        elif line.startswith('## '):
-            if current_paragraph:
-                try:
-                    para_text = ' '.join(current_paragraph).replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
-                    paragraphs.append(Paragraph(para_text, styles_dict.get('Normal')))
-                except Exception as e:
-                    logger.warning(f"[PDF生成] 创建段落失败: {str(e)}")
-                current_paragraph = []
-            try:
-                title_text = line[3:].replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
-                paragraphs.append(Paragraph(title_text, styles_dict.get('Heading2')))
-                paragraphs.append(Spacer(1, 0.15*inch))
-            except Exception as e:
-                logger.warning(f"[PDF生成] 创建标题失败: {str(e)}")
-        elif line.startswith('### '):
-            if current_paragraph:
-                try:
-                    para_text = ' '.join(current_paragraph).replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
-                    paragraphs.append(Paragraph(para_text, styles_dict.get('Normal')))
-                except Exception as e:
-                    logger.warning(f"[PDF生成] 创建段落失败: {str(e)}")
-                current_paragraph = []
-            try:
-                title_text = line[4:].replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
-                heading3_style = styles_dict.get('Heading3', styles_dict.get('Heading2'))
-                paragraphs.append(Paragraph(title_text, heading3_style))
-                paragraphs.append(Spacer(1, 0.1*inch))
-            except Exception as e:
-                logger.warning(f"[PDF生成] 创建标题失败: {str(e)}")
-        else:
-            # 普通文本，先不转义（在创建Paragraph时转义）
-            current_paragraph.append(line)
-    
-    if current_paragraph:
-        try:
-            para_text = ' '.join(current_paragraph).replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
-            paragraphs.append(Paragraph(para_text, styles_dict.get('Normal')))
-            paragraphs.append(Spacer(1, 0.2*inch))
-        except Exception as e:
-            logger.warning(f"[PDF生成] 创建段落失败: {str(e)}")
-    
-    return paragraphs
+        return []
+    return report_ast_to_flowables(parse_report(text), styles_dict)
 
 
-def create_chart_image(chart_data: Dict[str, Any], width: float = 6*inch, height: float = 4*inch):
-    """将ECharts配置转换为图片（简化版：显示为文本说明）"""
-    # 注意：完整的图表渲染需要headless browser或图表服务
-    # 这里先返回None，在PDF中显示文本说明
-    return None
+def create_chart_image(chart_data: Dict[str, Any], width: float = 5.5*inch, height: float = 3.5*inch):
+    """将ECharts配置渲染为矢量图形（不支持的图表类型返回None，显示为文本说明）"""
+    try:
+        return render_chart_drawing(chart_data, width, height)
+    except Exception as e:
+        logger.warning(f"[PDF生成] 图表离线渲染失败: {str(e)}")
+        return None
 
 
 def create_chart_image_from_base64(
     image_base64: str, 
     width: float = 5.5*inch, 
-    height: float = 3.5*inch
+    height: float = 3.5*inch,
+    pipeline: Optional[ChartImagePipeline] = None
 ):
     """
-    从Base64字符串创建ReportLab图片对象
+    从Base64字符串创建图片对象
+    
+    图片经 ChartImagePipeline 缩小到目标DPI、合成白底；同一文档中重复的图片只解码一次并复用同一个XObject。
     
     Args:
         image_base64: Base64编码的图片数据
         width: 图片宽度
         height: 图片高度
+        pipeline: 文档级图片处理器（去重范围），不传时单独处理这一张
     
     Returns:
-        ReportLab Image对象
+        图片Flowable对象，失败返回None
     """
     try:
-        # 解码Base64
-        image_data = base64.b64decode(image_base64)
+        pipeline = pipeline or ChartImagePipeline()
+        img = pipeline.flowable(image_base64, width, height)
         
-        # 创建BytesIO对象
-        image_buffer = io.BytesIO(image_data)
-        
-        # 创建ReportLab Image对象
-        from reportlab.platypus import Image as RLImage
-        img = RLImage(image_buffer, width=width, height=height)
-        
-        logger.info(f"[PDF生成] 成功创建图片对象 - size={len(image_data)} bytes")
+        logger.info(f"[PDF生成] 成功创建图片对象 - pixels={img.reader.getSize()}")
         return img
     except Exception as e:
         logger.error(f"[PDF生成] 创建图片失败: {str(e)}")
         return None
 
 
-def generate_report_pdf(
-    title: str,
-    report_content: Dict[str, Any],
-    session_id: int,
-    chart_images: Optional[List[Dict[str, Any]]] = None
-) -> bytes:
-    """
-    生成报告PDF
-    
-    Args:
-        title: 报告标题
-        report_content: 报告内容，包含text, charts, tables, metrics
-        session_id: 会话ID
-        chart_images: 图表图片数据列表 [{'index': 0, 'title': '图表1', 'image_data': 'base64...'}]
-    
-    Returns:
-        PDF文件的字节数据
-    """
-    buffer = io.BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=A4)
-    
-    # 创建样式
-    styles = getSampleStyleSheet()
-    
-    # 添加中文字体支持
+def _resolve_pdf_font() -> str:
+    """获取PDF使用的中文字体名称，注册失败时回退为Helvetica"""
     chinese_font = register_chinese_font()  # 确保字体已注册
     
     if not chinese_font:
@@ -350,7 +187,13 @@ def generate_report_pdf(
     
     logger.info(f"[PDF生成] 使用的字体: {chinese_font}")
     
-    # 自定义样式
+    return chinese_font
+
+
+def build_pdf_styles(chinese_font: str) -> Dict[str, ParagraphStyle]:
+    """创建报告PDF的段落样式（Title/Heading1/Heading2/Heading3/Normal/ListItem）"""
+    styles = getSampleStyleSheet()
+    
     try:
         title_style = ParagraphStyle(
             'CustomTitle',
@@ -409,6 +252,43 @@ def generate_report_pdf(
         heading3_style = styles['Heading2']
         normal_style = styles['Normal']
     
+    list_item_style = ParagraphStyle(
+        'CustomListItem',
+        parent=normal_style,
+        leftIndent=18,
+        bulletIndent=6
+    )
+    
+    return {
+        'Title': title_style,
+        'Heading1': heading1_style,
+        'Heading2': heading2_style,
+        'Heading3': heading3_style,
+        'Normal': normal_style,
+        'ListItem': list_item_style
+    }
+
+
+def build_report_story(
+    title: str,
+    report_content: Dict[str, Any],
+    chart_images: Optional[List[Dict[str, Any]]],
+    pdf_styles: Dict[str, ParagraphStyle],
+    chinese_font: str,
+    image_pipeline: Optional[ChartImagePipeline] = None
+) -> List:
+    """
+    构建单份报告的PDF内容（标题、正文、图表、表格、指标）
+
+    合并导出时每个Sheet调用一次，拼接到同一份文档中，共用同一个 image_pipeline 以便跨Sheet去重图片。
+    """
+    image_pipeline = image_pipeline or ChartImagePipeline()
+    title_style = pdf_styles['Title']
+    heading1_style = pdf_styles['Heading1']
+    heading2_style = pdf_styles['Heading2']
+    heading3_style = pdf_styles['Heading3']
+    normal_style = pdf_styles['Normal']
+    
     # 构建PDF内容
     story = []
     
@@ -432,7 +312,8 @@ def generate_report_pdf(
                 'Normal': normal_style,
                 'Heading1': heading1_style,
                 'Heading2': heading2_style,
-                'Heading3': heading3_style
+                'Heading3': heading3_style,
+                'ListItem': pdf_styles.get('ListItem')
             })
             story.extend(text_paragraphs)
         except Exception as e:
@@ -474,7 +355,8 @@ def generate_report_pdf(
                         chart_img = create_chart_image_from_base64(
                             img_data['image_data'],
                             width=5.5*inch,
-                            height=3.5*inch
+                            height=3.5*inch,
+                            pipeline=image_pipeline
                         )
                         
                         if chart_img:
@@ -495,10 +377,17 @@ def generate_report_pdf(
                             story.append(Spacer(1, 0.1*inch))
                             logger.warning(f"[PDF生成] ✗ 图表图片创建失败 - index={i}")
                     else:
-                        # 没有传入图片，显示文本说明
-                        chart_title = str(chart.get('title', '未命名图表')).replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
-                        story.append(Paragraph(f"图表 {i+1}: {chart_title}", normal_style))
-                        story.append(Spacer(1, 0.1*inch))
+                        # 没有传入图片，服务端按ECharts配置渲染（标题已包含在图形中）
+                        chart_drawing = create_chart_image(chart)
+                        if chart_drawing:
+                            story.append(chart_drawing)
+                            story.append(Spacer(1, 0.3*inch))
+                            logger.info(f"[PDF生成] ✓ 服务端渲染图表 - index={i}")
+                        else:
+                            # 不支持离线渲染的图表，显示文本说明
+                            chart_title = str(chart.get('title', '未命名图表')).replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+                            story.append(Paragraph(f"图表 {i+1}: {chart_title}", normal_style))
+                            story.append(Spacer(1, 0.1*inch))
                 except Exception as e:
                     logger.error(f"[PDF生成] 处理图表 {i} 时出错: {str(e)}", exc_info=True)
                     story.append(Paragraph(f"图表 {i+1}: 处理失败", normal_style))
@@ -515,7 +404,8 @@ def generate_report_pdf(
                     chart_img = create_chart_image_from_base64(
                         img_data['image_data'],
                         width=5.5*inch,
-                        height=3.5*inch
+                        height=3.5*inch,
+                        pipeline=image_pipeline
                     )
                     
                     if chart_img:
@@ -607,6 +497,43 @@ def generate_report_pdf(
             except Exception as e:
                 logger.warning(f"[PDF生成] 添加指标失败: {str(e)}")
     
+    return story
+
+
+def write_report_pdf(
+    output: BinaryIO,
+    title: str,
+    report_content: Dict[str, Any],
+    session_id: int,
+    chart_images: Optional[List[Dict[str, Any]]] = None
+) -> int:
+    """
+    生成报告PDF并写入文件对象
+    
+    Args:
+        output: 可写的二进制文件对象（渲染进程中为磁盘上的临时文件）
+        title: 报告标题
+        report_content: 报告内容，包含text, charts, tables, metrics
+        session_id: 会话ID
+        chart_images: 图表图片数据列表 [{'index': 0, 'title': '图表1', 'image_data': 'base64...'}]
+    
+    Returns:
+        写入的字节数
+    """
+    chinese_font = _resolve_pdf_font()
+    
+    pdf_styles = build_pdf_styles(chinese_font)
+    image_pipeline = ChartImagePipeline()
+    story = build_report_story(title, report_content, chart_images, pdf_styles, chinese_font, image_pipeline)
+    
+    text_content = report_content.get("text", "")
+    charts = report_content.get("charts", [])
+    tables = report_content.get("tables", [])
+    normal_style = pdf_styles['Normal']
+    
+    start_offset = output.tell()
+    doc = SimpleDocTemplate(output, pagesize=A4)
+    
     # 生成PDF
     try:
         if not story:
@@ -624,19 +551,15 @@ def generate_report_pdf(
         logger.info(f"[PDF生成] 表格数量: {len(tables)}")
         
         doc.build(story)
-        buffer.seek(0)
-        pdf_bytes = buffer.read()
-        buffer.close()
+        output.flush()
+        pdf_size = output.tell() - start_offset
+        image_pipeline.log_summary()
         
-        logger.info(f"[PDF生成] PDF生成成功 - 大小: {len(pdf_bytes)} bytes")
+        logger.info(f"[PDF生成] PDF生成成功 - 大小: {pdf_size} bytes")
         logger.info(f"[PDF生成] ====== PDF生成完成 ======")
-        return pdf_bytes
+        return pdf_size
     except Exception as e:
         import traceback
-        try:
-            buffer.close()
-        except:
-            pass
         error_msg = str(e)
         error_traceback = traceback.format_exc()
         logger.error(f"[PDF生成] ====== PDF生成失败 ======")
@@ -646,3 +569,99 @@ def generate_report_pdf(
         logger.error(f"[PDF生成] ====== 错误结束 ======")
         raise Exception(f"PDF生成失败: {error_msg}")
 
+
+def generate_report_pdf(
+    title: str,
+    report_content: Dict[str, Any],
+    session_id: int,
+    chart_images: Optional[List[Dict[str, Any]]] = None
+) -> bytes:
+    """
+    生成报告PDF（返回字节数据，参数同 write_report_pdf）
+
+    接口下载走渲染进程池写入临时文件，这里保留给脚本和小文档使用。
+    """
+    buffer = io.BytesIO()
+    try:
+        write_report_pdf(buffer, title, report_content, session_id, chart_images)
+        return buffer.getvalue()
+    finally:
+        buffer.close()
+
+
+class _MergedReportDocTemplate(SimpleDocTemplate):
+    """合并报告文档：各Sheet标题写入目录和PDF书签"""
+
+    def afterFlowable(self, flowable):
+        if isinstance(flowable, Paragraph) and flowable.style.name == 'SectionTitle':
+            text = flowable.getPlainText()
+            key = f"section-{self.seq.nextf('section')}"
+            self.canv.bookmarkPage(key)
+            self.canv.addOutlineEntry(text, key, level=0, closed=False)
+            self.notify('TOCEntry', (0, text, self.page, key))
+
+
+def write_merged_report_pdf(
+    output: BinaryIO,
+    title: str,
+    sections: List[Dict[str, Any]]
+) -> int:
+    """
+    把多份Sheet报告合并为一份带目录的PDF并写入文件对象
+    
+    Args:
+        output: 可写的二进制文件对象
+        title: 合并文档标题
+        sections: 报告列表 [{'title': ..., 'report_content': {...}, 'chart_images': [...]}]
+    
+    Returns:
+        写入的字节数
+    """
+    from reportlab.platypus.tableofcontents import TableOfContents
+    
+    chinese_font = _resolve_pdf_font()
+    pdf_styles = build_pdf_styles(chinese_font)
+    
+    # 各Sheet标题使用单独的样式名，afterFlowable据此生成目录项
+    section_styles = dict(pdf_styles)
+    section_styles['Title'] = ParagraphStyle('SectionTitle', parent=pdf_styles['Title'])
+    
+    toc = TableOfContents()
+    toc.levelStyles = [
+        ParagraphStyle('TOCLevel0', parent=pdf_styles['Normal'], fontSize=12, leading=20, leftIndent=10)
+    ]
+    
+    title_escaped = str(title).replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+    story = [
+        Paragraph(title_escaped, pdf_styles['Title']),
+        Spacer(1, 0.2*inch),
+        Paragraph("目录", pdf_styles['Heading1']),
+        toc,
+    ]
+    
+    image_pipeline = ChartImagePipeline()
+    for section in sections:
+        story.append(PageBreak())
+        story.extend(build_report_story(
+            section['title'],
+            section['report_content'],
+            section.get('chart_images'),
+            section_styles,
+            chinese_font,
+            image_pipeline
+        ))
+    
+    start_offset = output.tell()
+    doc = _MergedReportDocTemplate(output, pagesize=A4, title=str(title))
+    try:
+        # 目录页码需要两遍排版才能确定
+        doc.multiBuild(story)
+        output.flush()
+        pdf_size = output.tell() - start_offset
+        image_pipeline.log_summary()
+    except Exception as e:
+        logger.error(f"[PDF生成] 合并PDF生成失败: {str(e)}", exc_info=True)
+        raise Exception(f"合并PDF生成失败: {str(e)}")
+    
+    logger.info(f"[PDF生成] 合并PDF生成成功 - sections={len(sections)}, 大小: {pdf_size} bytes")
+    return pdf_size
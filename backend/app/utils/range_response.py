@@ -0,0 +1,100 @@
+"""
+支持Range请求的文件响应
+
+FileResponse（当前Starlette版本）不处理Range头，这里补充单区间的断点续传：
+- 无Range头：FileResponse按块发送文件，带Content-Length
+- bytes=start-end / bytes=start- / bytes=-suffix：返回206和Content-Range
+- 区间不合法：返回416
+多区间请求（multipart/byteranges）按无Range处理，返回完整文件。
+"""
+import os
+from pathlib import Path
+from typing import Dict, Iterator, Optional, Tuple, Union
+
+from fastapi.responses import FileResponse, Response, StreamingResponse
+from starlette.background import BackgroundTask
+
+
+# 分块读取大小
+CHUNK_SIZE = 64 * 1024
+
+
+def parse_range_header(range_header: Optional[str], file_size: int) -> Optional[Tuple[int, int]]:
+    """
+    解析Range头
+
+    Returns:
+        (start, end) 闭区间；无Range头或多区间时返回None
+
+    Raises:
+        ValueError: 区间格式错误或超出文件范围
+    """
+    if not range_header:
+        return None
+    unit, _, ranges = range_header.partition("=")
+    if unit.strip().lower() != "bytes" or not ranges:
+        raise ValueError(f"不支持的Range: {range_header}")
+    if "," in ranges:
+        return None
+
+    start_text, sep, end_text = ranges.strip().partition("-")
+    if not sep:
+        raise ValueError(f"不支持的Range: {range_header}")
+    if start_text == "":
+        # bytes=-suffix：最后suffix个字节
+        suffix = int(end_text)
+        if suffix <= 0:
+            raise ValueError(f"不支持的Range: {range_header}")
+        return max(0, file_size - suffix), file_size - 1
+
+    start = int(start_text)
+    end = int(end_text) if end_text else file_size - 1
+    end = min(end, file_size - 1)
+    if start > end or start >= file_size:
+        raise ValueError(f"Range超出文件范围: {range_header}")
+    return start, end
+
+
+def _iter_file_range(path: Union[str, Path], start: int, end: int) -> Iterator[bytes]:
+    with open(path, "rb") as f:
+        f.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = f.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def range_file_response(
+    path: Union[str, Path],
+    media_type: str,
+    headers: Optional[Dict[str, str]] = None,
+    range_header: Optional[str] = None,
+    background: Optional[BackgroundTask] = None
+) -> Response:
+    """返回文件响应，按Range头返回完整文件（200）或指定区间（206）"""
+    file_size = os.stat(path).st_size
+    headers = dict(headers or {})
+    headers["Accept-Ranges"] = "bytes"
+
+    try:
+        byte_range = parse_range_header(range_header, file_size)
+    except ValueError:
+        headers["Content-Range"] = f"bytes */{file_size}"
+        return Response(status_code=416, headers=headers, background=background)
+
+    if byte_range is None:
+        return FileResponse(path, media_type=media_type, headers=headers, background=background)
+
+    start, end = byte_range
+    headers["Content-Range"] = f"bytes {start}-{end}/{file_size}"
+    headers["Content-Length"] = str(end - start + 1)
+    return StreamingResponse(
+        _iter_file_range(path, start, end),
+        status_code=206,
+        media_type=media_type,
+        headers=headers,
+        background=background
+    )
@@ -0,0 +1,38 @@
+"""
+渲染进程入口
+
+运行在PDF渲染进程池的子进程中，只依赖渲染相关模块，不加载数据库和Web框架。
+渲染结果直接写入父进程指定的磁盘文件，只回传文件大小，PDF内容不经过进程间管道。
+"""
+from typing import Any, Dict
+
+from loguru import logger
+
+
+def init_render_worker() -> None:
+    """子进程初始化：预先注册中文字体并加载reportlab，首个任务无需再付出冷启动开销"""
+    from app.utils.pdf_generator import register_chinese_font
+
+    font_name = register_chinese_font()
+    logger.info(f"[PDF渲染进程] 初始化完成 - font={font_name}")
+
+
+def warmup() -> bool:
+    """预热任务：确保子进程已启动并完成初始化"""
+    return True
+
+
+def render_report_pdf(render_kwargs: Dict[str, Any], output_path: str) -> int:
+    """在子进程中生成报告PDF并写入 output_path（参数同 write_report_pdf），返回文件大小"""
+    from app.utils.pdf_generator import write_report_pdf
+
+    with open(output_path, "wb") as output:
+        return write_report_pdf(output, **render_kwargs)
+
+
+def render_merged_report_pdf(render_kwargs: Dict[str, Any], output_path: str) -> int:
+    """在子进程中生成带目录的合并报告PDF并写入 output_path（参数同 write_merged_report_pdf）"""
+    from app.utils.pdf_generator import write_merged_report_pdf
+
+    with open(output_path, "wb") as output:
+        return write_merged_report_pdf(output, **render_kwargs)
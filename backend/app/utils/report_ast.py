@@ -0,0 +1,303 @@
+"""
+报告Markdown结构（AST）
+
+报告正文按文本内容哈希缓存解析结果：每个报告版本只解析一次，
+PDF导出、图片导出和对话编辑（查找章节位置）共用同一份结构，重复导出和编辑时不再重新解析。
+
+支持的块：
+- Heading：# ~ ###### 标题
+- Paragraph：连续的普通文本行（保留每一行，图片逐行排版，PDF合并为一段）
+- ListBlock：- * + 无序列表和 1. 1) 有序列表
+- TableBlock：| a | b | 形式的表格（分隔行 |---| 被跳过）
+- ChartBlock：```echarts 围栏代码块中的ECharts配置（JSON解析失败时作为代码块）
+- CodeBlock：其他围栏代码块
+- Blank：连续空行
+
+解析结果在多个请求间共享，使用方不能修改其中的内容。
+"""
+import hashlib
+import json
+import re
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+
+# 缓存的报告结构数量
+AST_CACHE_SIZE = 256
+
+_HEADING_PATTERN = re.compile(r"^(#{1,6})\s+(.*?)\s*#*$")
+_BULLET_PATTERN = re.compile(r"^[-*+]\s+(.*)$")
+_ORDERED_PATTERN = re.compile(r"^(\d+)[.)]\s+(.*)$")
+_FENCE_PATTERN = re.compile(r"^(```|~~~)\s*([\w-]*)")
+_TABLE_SEPARATOR_PATTERN = re.compile(r"^\|?\s*:?-{2,}:?\s*(\|\s*:?-{2,}:?\s*)*\|?$")
+# 中文序号章节（如：五、后续行动计划）
+_CHINESE_SECTION_PATTERN = re.compile(r"^[一二三四五六七八九十]+[、.]\s*\S")
+
+
+@dataclass(frozen=True)
+class Heading:
+    start: int
+    level: int
+    text: str
+    kind: str = "heading"
+
+
+@dataclass(frozen=True)
+class Paragraph:
+    start: int
+    lines: Tuple[str, ...]
+    line_starts: Tuple[int, ...]
+    kind: str = "paragraph"
+
+
+@dataclass(frozen=True)
+class ListItem:
+    start: int
+    marker: str  # 无序列表为"•"，有序列表为原序号（如"1."）
+    text: str
+
+
+@dataclass(frozen=True)
+class ListBlock:
+    start: int
+    ordered: bool
+    items: Tuple[ListItem, ...]
+    kind: str = "list"
+
+
+@dataclass(frozen=True)
+class TableBlock:
+    start: int
+    header: Tuple[str, ...]
+    rows: Tuple[Tuple[str, ...], ...]
+    kind: str = "table"
+
+
+@dataclass(frozen=True)
+class ChartBlock:
+    start: int
+    option: Dict[str, Any]
+    kind: str = "chart"
+
+    @property
+    def title(self) -> str:
+        title = self.option.get("title")
+        if isinstance(title, list):
+            title = title[0] if title else {}
+        if isinstance(title, dict):
+            return str(title.get("text", ""))
+        return str(title or "")
+
+    def as_chart(self) -> Dict[str, Any]:
+        """转换为报告 charts 条目的格式，供图表渲染器使用"""
+        return {"title": self.title, "config": self.option}
+
+
+@dataclass(frozen=True)
+class CodeBlock:
+    start: int
+    language: str
+    lines: Tuple[str, ...]
+    kind: str = "code"
+
+
+@dataclass(frozen=True)
+class Blank:
+    start: int
+    count: int
+    kind: str = "blank"
+
+
+Block = Union[Heading, Paragraph, ListBlock, TableBlock, ChartBlock, CodeBlock, Blank]
+
+
+@dataclass(frozen=True)
+class ReportAST:
+    """一份报告正文的结构"""
+
+    text_hash: str
+    blocks: Tuple[Block, ...]
+
+    def headings(self, max_level: int = 6) -> List[Heading]:
+        return [block for block in self.blocks if block.kind == "heading" and block.level <= max_level]
+
+    def section_starts(self, max_level: int = 2) -> List[int]:
+        """
+        大章节的起始位置（升序）：max_level 及以上级别的Markdown标题、
+        中文序号章节（五、xxx）和数字序号章节（1. xxx，不含 1.1 这类小节）
+        """
+        starts = []
+        for block in self.blocks:
+            if block.kind == "heading" and block.level <= max_level:
+                starts.append(block.start)
+            elif block.kind == "paragraph":
+                starts.extend(
+                    line_start for line, line_start in zip(block.lines, block.line_starts)
+                    if _CHINESE_SECTION_PATTERN.match(line)
+                )
+            elif block.kind == "list" and block.ordered:
+                starts.extend(
+                    item.start for item in block.items
+                    if item.marker.endswith(".") and not item.text[:1].isdigit()
+                )
+        return sorted(starts)
+
+
+def _split_table_row(line: str) -> Tuple[str, ...]:
+    line = line.strip()
+    if line.startswith("|"):
+        line = line[1:]
+    if line.endswith("|"):
+        line = line[:-1]
+    return tuple(cell.strip() for cell in line.split("|"))
+
+
+def _parse_blocks(text: str) -> Tuple[Block, ...]:
+    blocks: List[Block] = []
+    # 每行的原文偏移和去除首尾空白后的内容
+    lines: List[Tuple[int, str]] = []
+    offset = 0
+    for raw in text.split("\n"):
+        stripped = raw.strip()
+        lines.append((offset + (len(raw) - len(raw.lstrip())) if stripped else offset, stripped))
+        offset += len(raw) + 1
+
+    i = 0
+    total = len(lines)
+    while i < total:
+        start, line = lines[i]
+
+        if not line:
+            count = 0
+            while i < total and not lines[i][1]:
+                count += 1
+                i += 1
+            blocks.append(Blank(start, count))
+            continue
+
+        fence = _FENCE_PATTERN.match(line)
+        if fence:
+            marker, language = fence.group(1), fence.group(2).lower()
+            body: List[str] = []
+            i += 1
+            while i < total and not lines[i][1].startswith(marker):
+                body.append(lines[i][1])
+                i += 1
+            i += 1  # 跳过结束标记（未闭合时直到文末）
+            if language == "echarts":
+                try:
+                    option = json.loads("\n".join(body))
+                    if isinstance(option, dict):
+                        blocks.append(ChartBlock(start, option))
+                        continue
+                except ValueError:
+                    pass
+            blocks.append(CodeBlock(start, language, tuple(body)))
+            continue
+
+        heading = _HEADING_PATTERN.match(line)
+        if heading:
+            blocks.append(Heading(start, len(heading.group(1)), heading.group(2)))
+            i += 1
+            continue
+
+        if line.startswith("|"):
+            rows: List[Tuple[str, ...]] = []
+            while i < total and lines[i][1].startswith("|"):
+                if not _TABLE_SEPARATOR_PATTERN.match(lines[i][1]):
+                    rows.append(_split_table_row(lines[i][1]))
+                i += 1
+            if rows:
+                blocks.append(TableBlock(start, rows[0], tuple(rows[1:])))
+            continue
+
+        if _BULLET_PATTERN.match(line) or _ORDERED_PATTERN.match(line):
+            ordered = bool(_ORDERED_PATTERN.match(line))
+            items: List[ListItem] = []
+            while i < total:
+                item_start, item_line = lines[i]
+                match = (_ORDERED_PATTERN if ordered else _BULLET_PATTERN).match(item_line)
+                if not match:
+                    break
+                if ordered:
+                    marker = item_line[:len(match.group(1)) + 1]
+                    items.append(ListItem(item_start, marker, match.group(2).strip()))
+                else:
+                    items.append(ListItem(item_start, "•", match.group(1).strip()))
+                i += 1
+            blocks.append(ListBlock(start, ordered, tuple(items)))
+            continue
+
+        # 普通段落：直到空行或其他类型的块
+        paragraph_lines: List[str] = []
+        paragraph_starts: List[int] = []
+        while i < total:
+            line_start, paragraph_line = lines[i]
+            if (
+                not paragraph_line
+                or _FENCE_PATTERN.match(paragraph_line)
+                or _HEADING_PATTERN.match(paragraph_line)
+                or paragraph_line.startswith("|")
+                or _BULLET_PATTERN.match(paragraph_line)
+                or _ORDERED_PATTERN.match(paragraph_line)
+            ):
+                break
+            paragraph_lines.append(paragraph_line)
+            paragraph_starts.append(line_start)
+            i += 1
+        blocks.append(Paragraph(start, tuple(paragraph_lines), tuple(paragraph_starts)))
+
+    return tuple(blocks)
+
+
+class _ASTCache:
+    """按文本哈希缓存的报告结构（LRU）"""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._data: "OrderedDict[str, ReportAST]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[ReportAST]:
+        with self._lock:
+            ast = self._data.get(key)
+            if ast is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return ast
+
+    def set(self, key: str, ast: ReportAST) -> None:
+        with self._lock:
+            self._data[key] = ast
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def snapshot(self) -> Dict[str, int]:
+        with self._lock:
+            return {"size": len(self._data), "hits": self.hits, "misses": self.misses}
+
+
+_ast_cache = _ASTCache(AST_CACHE_SIZE)
+
+
+def parse_report(text: Optional[str]) -> ReportAST:
+    """解析报告正文（相同文本直接返回缓存的结构）"""
+    text = text or ""
+    text_hash = hashlib.sha256(text.encode("utf-8", "surrogatepass")).hexdigest()
+    ast = _ast_cache.get(text_hash)
+    if ast is None:
+        ast = ReportAST(text_hash, _parse_blocks(text))
+        _ast_cache.set(text_hash, ast)
+    return ast
+
+
+def cache_stats() -> Dict[str, int]:
+    """报告结构缓存统计"""
+    return _ast_cache.snapshot()
@@ -0,0 +1,139 @@
+"""
+文本排版工具（报告图片使用）
+
+- 字形宽度按字体逐字测量一次，结果放入每个字体的LRU缓存，之后只做字典查找
+- 换行先把一行切成断行单元（中日韩字符逐字可断，英文单词和数字整体不断开），
+  再对单元宽度做前缀和，用二分查找确定每一行能容纳的最后一个单元
+- 一行文本的宽度等于各字形宽度之和（不考虑字距调整，对中文报告足够精确）
+"""
+import re
+import threading
+from bisect import bisect_right
+from collections import OrderedDict
+from itertools import accumulate
+from typing import Dict, List, Tuple
+
+
+# 每个字体缓存的字形宽度数（常用汉字约3500个，再加标点、字母和数字）
+GLYPH_CACHE_SIZE = 8192
+
+# 没有可用字体时每个字符的估算宽度
+FALLBACK_CHAR_WIDTH = 10
+
+# 断行单元：连续的非CJK非空白字符（单词、数字、URL）+ 后续空白，或单个字符
+_TOKEN_PATTERN = re.compile(
+    r"[^\s\u2e80-\u9fff\uac00-\ud7af\uf900-\ufaff\uff00-\uffef]+\s*|\s+|."
+)
+
+
+class FontMetrics:
+    """单个字体的字形宽度和行高（带LRU缓存）"""
+
+    def __init__(self, font, max_glyphs: int = GLYPH_CACHE_SIZE):
+        self.font = font
+        self.max_glyphs = max_glyphs
+        self._widths: "OrderedDict[str, float]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        if font is not None:
+            try:
+                ascent, descent = font.getmetrics()
+                self.line_height = ascent + descent
+            except Exception:
+                self.line_height = getattr(font, "size", 20)
+        else:
+            self.line_height = 20
+
+    def _measure(self, ch: str) -> float:
+        if self.font is None:
+            return FALLBACK_CHAR_WIDTH
+        try:
+            return self.font.getlength(ch)
+        except Exception:
+            return FALLBACK_CHAR_WIDTH
+
+    def glyph_width(self, ch: str) -> float:
+        with self._lock:
+            width = self._widths.get(ch)
+            if width is not None:
+                self._widths.move_to_end(ch)
+                self.hits += 1
+                return width
+            self.misses += 1
+
+        width = self._measure(ch)
+        with self._lock:
+            self._widths[ch] = width
+            if len(self._widths) > self.max_glyphs:
+                self._widths.popitem(last=False)
+        return width
+
+    def text_width(self, text: str) -> float:
+        return sum(self.glyph_width(ch) for ch in text)
+
+
+# 字体对象 -> 字形宽度缓存（字体由 font_registry 按字号缓存，对象在进程内保持不变）
+_metrics: Dict[int, FontMetrics] = {}
+_metrics_lock = threading.Lock()
+
+
+def get_font_metrics(font) -> FontMetrics:
+    key = id(font)
+    metrics = _metrics.get(key)
+    if metrics is None or metrics.font is not font:
+        with _metrics_lock:
+            metrics = _metrics.get(key)
+            if metrics is None or metrics.font is not font:
+                metrics = FontMetrics(font)
+                _metrics[key] = metrics
+    return metrics
+
+
+def wrap_line(text: str, font, max_width: float) -> List[str]:
+    """
+    按最大宽度把一行文本拆成多行
+
+    前缀和 + 二分查找：每一行只需一次 bisect，总复杂度 O(n log n)，字形宽度全部来自缓存。
+    """
+    if not text:
+        return [""]
+    metrics = get_font_metrics(font)
+
+    tokens: List[Tuple[str, float]] = []
+    for token in _TOKEN_PATTERN.findall(text):
+        width = metrics.text_width(token)
+        if width > max_width and len(token) > 1:
+            # 超过整行宽度的单元（长URL、长数字）按字符拆开
+            tokens.extend((ch, metrics.glyph_width(ch)) for ch in token)
+        else:
+            tokens.append((token, width))
+
+    prefix = [0.0] + list(accumulate(width for _, width in tokens))
+    lines: List[str] = []
+    start = 0
+    while start < len(tokens):
+        # 最后一个满足 prefix[end] - prefix[start] <= max_width 的 end，至少放一个单元
+        end = bisect_right(prefix, prefix[start] + max_width, lo=start + 1) - 1
+        end = max(end, start + 1)
+        line = "".join(token for token, _ in tokens[start:end]).rstrip()
+        if line or not lines:
+            lines.append(line)
+        start = end
+        # 行首的空白不占位
+        while start < len(tokens) and not tokens[start][0].strip():
+            start += 1
+    return lines or [""]
+
+
+def cache_stats() -> Dict[str, int]:
+    """字形宽度缓存统计"""
+    with _metrics_lock:
+        metrics_list = list(_metrics.values())
+    return {
+        "fonts": len(metrics_list),
+        "glyphs": sum(len(m._widths) for m in metrics_list),
+        "hits": sum(m.hits for m in metrics_list),
+        "misses": sum(m.misses for m in metrics_list),
+    }
@@ -0,0 +1,136 @@
+"""
+会话版本内容的快照/增量编码
+
+版本内容（VersionContent）由三个字段组成：report_text、report_html_charts、report_charts_json。
+- 快照：完整内容的JSON，zlib压缩
+- 增量：相对上一个版本，每个变化字段的一组编辑操作，zlib压缩
+  [[a, b], ["token", ...], ...]：[a, b] 表示复制上一版本的 tokens[a:b]，字符串列表表示插入的新 token
+
+文本按换行和 ">" 切分为 token（切分后拼接与原文完全一致），
+压缩成一行的HTML图表改动一处时，增量里也只包含改动附近的片段。
+图表配置（JSON）按缩进格式序列化后参与比较，还原时再解析。
+"""
+import json
+import re
+import zlib
+from difflib import SequenceMatcher
+from typing import Any, Dict, List, Optional, Union
+
+VERSION_FIELDS = ("report_text", "report_html_charts", "report_charts_json")
+JSON_FIELDS = ("report_charts_json",)
+
+COMPRESS_LEVEL = 6
+
+_TOKEN_PATTERN = re.compile(r"[^\n>]*[\n>]|[^\n>]+")
+
+VersionContent = Dict[str, Any]
+DeltaOp = Union[List[int], List[str]]
+
+
+def _field_text(field: str, value: Any) -> Optional[str]:
+    if value is None:
+        return None
+    if field in JSON_FIELDS:
+        return json.dumps(value, ensure_ascii=False, indent=1)
+    return str(value)
+
+
+def _field_value(field: str, value: Optional[str]) -> Any:
+    if value is None or field not in JSON_FIELDS:
+        return value
+    return json.loads(value)
+
+
+def tokenize(value: str) -> List[str]:
+    return _TOKEN_PATTERN.findall(value)
+
+
+def _pack(obj: Any) -> bytes:
+    return zlib.compress(json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8"), COMPRESS_LEVEL)
+
+
+def _unpack(blob: bytes) -> Any:
+    return json.loads(zlib.decompress(blob).decode("utf-8"))
+
+
+def normalize_content(content: VersionContent) -> Dict[str, Optional[str]]:
+    """版本内容 -> 各字段的文本形式（JSON字段序列化）"""
+    return {field: _field_text(field, content.get(field)) for field in VERSION_FIELDS}
+
+
+def content_size(texts: Dict[str, Optional[str]]) -> int:
+    """未压缩时的内容字节数"""
+    return sum(len(value.encode("utf-8")) for value in texts.values() if value)
+
+
+def encode_snapshot(texts: Dict[str, Optional[str]]) -> bytes:
+    return _pack({"snapshot": texts})
+
+
+def _diff_tokens(base: List[str], new: List[str]) -> List[DeltaOp]:
+    # 对话编辑通常只改动一处：先去掉相同的首尾，只对中间部分做序列比较
+    prefix = 0
+    limit = min(len(base), len(new))
+    while prefix < limit and base[prefix] == new[prefix]:
+        prefix += 1
+    suffix = 0
+    while suffix < limit - prefix and base[-1 - suffix] == new[-1 - suffix]:
+        suffix += 1
+
+    ops: List[DeltaOp] = []
+    if prefix:
+        ops.append([0, prefix])
+    matcher = SequenceMatcher(None, base[prefix:len(base) - suffix], new[prefix:len(new) - suffix], autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            ops.append([prefix + i1, prefix + i2])
+        elif tag in ("replace", "insert"):
+            ops.append(new[prefix + j1:prefix + j2])
+    if suffix:
+        ops.append([len(base) - suffix, len(base)])
+    return ops
+
+
+def encode_delta(base: Dict[str, Optional[str]], new: Dict[str, Optional[str]]) -> bytes:
+    """编码 new 相对 base 的增量（未变化的字段不写入）"""
+    changes: Dict[str, Any] = {}
+    for field in VERSION_FIELDS:
+        old_value, new_value = base.get(field), new.get(field)
+        if old_value == new_value:
+            continue
+        if new_value is None:
+            changes[field] = None
+        elif old_value is None:
+            changes[field] = [[new_value]]
+        else:
+            changes[field] = _diff_tokens(tokenize(old_value), tokenize(new_value))
+    return _pack({"delta": changes})
+
+
+def _apply_ops(base_value: Optional[str], ops: List[DeltaOp]) -> str:
+    base_tokens = tokenize(base_value) if base_value else []
+    parts: List[str] = []
+    for op in ops:
+        if op and isinstance(op[0], int):
+            parts.extend(base_tokens[op[0]:op[1]])
+        else:
+            parts.extend(op)
+    return "".join(parts)
+
+
+def apply_blob(base: Optional[Dict[str, Optional[str]]], blob: bytes) -> Dict[str, Optional[str]]:
+    """在 base（快照时为None）上应用一个快照或增量，返回各字段的文本形式"""
+    data = _unpack(blob)
+    if "snapshot" in data:
+        return dict(data["snapshot"])
+    if base is None:
+        raise ValueError("增量版本缺少基准内容")
+    texts = dict(base)
+    for field, ops in data["delta"].items():
+        texts[field] = None if ops is None else _apply_ops(base.get(field), ops)
+    return texts
+
+
+def decode_content(texts: Dict[str, Optional[str]]) -> VersionContent:
+    """各字段的文本形式 -> 版本内容（JSON字段解析）"""
+    return {field: _field_value(field, texts.get(field)) for field in VERSION_FIELDS}
@@ -12,12 +12,15 @@ from loguru import logger
 from app.core.config import settings
 from app.core.redis import redis_client
 from app.middleware.logging_middleware import logging_middleware
+from app.middleware.query_stats_middleware import query_stats_middleware
 from app.middleware.error_handler import (
     error_handler_middleware,
     validation_exception_handler,
     integrity_error_handler,
-    operational_error_handler
+    operational_error_handler,
+    password_hash_busy_handler
 )
+from app.services.password_hash_service import PasswordHashBusyError
 from app.api.v1 import api_router
 
 
@@ -65,11 +68,51 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         logger.warning(f"⚠️  数据库自动初始化检查失败: {e}，请手动运行 scripts/init_all.py")
     
+    # 回收上次进程中断遗留的generating记录（租约已过期的Sheet重置为pending，可通过重试接口继续）
+    try:
+        from app.core.database import SessionLocal
+        from app.services.batch_progress_service import BATCH_KIND, CUSTOM_BATCH_KIND
+        from app.services.sheet_lease_service import SheetLeaseService
+        
+        db = SessionLocal()
+        try:
+            for kind in (BATCH_KIND, CUSTOM_BATCH_KIND):
+                await SheetLeaseService.reclaim_stale(db, kind, mark_interrupted=True)
+        finally:
+            db.close()
+    except Exception as e:
+        logger.warning(f"⚠️  回收中断的批量分析任务失败: {e}")
+    
+    # 启动并预热PDF渲染进程池（子进程内预先注册字体）
+    try:
+        import asyncio
+        from app.services.pdf_render_service import pdf_render_service
+        
+        await asyncio.to_thread(pdf_render_service.start)
+    except Exception as e:
+        logger.warning(f"⚠️  PDF渲染进程池预热失败: {e}，将在首次下载时创建")
+    
     yield
     
     # 关闭时执行
     logger.info("正在关闭应用...")
     
+    # 关闭PDF渲染进程池
+    try:
+        from app.services.pdf_render_service import pdf_render_service
+        
+        pdf_render_service.shutdown()
+    except Exception as e:
+        logger.error(f"❌ PDF渲染进程池关闭失败: {e}")
+    
+    # 关闭密码哈希线程池
+    try:
+        from app.services.password_hash_service import password_hasher
+        
+        password_hasher.shutdown()
+    except Exception as e:
+        logger.error(f"❌ 密码哈希线程池关闭失败: {e}")
+    
     # 断开Redis连接
     try:
         await redis_client.disconnect()
@@ -97,6 +140,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# SQL统计中间件（最内层，只统计路由处理期间的查询）
+app.middleware("http")(query_stats_middleware)
+
 # 日志中间件
 app.middleware("http")(logging_middleware)
 
@@ -107,6 +153,7 @@ app.middleware("http")(error_handler_middleware)
 app.add_exception_handler(RequestValidationError, validation_exception_handler)
 app.add_exception_handler(IntegrityError, integrity_error_handler)
 app.add_exception_handler(OperationalError, operational_error_handler)
+app.add_exception_handler(PasswordHashBusyError, password_hash_busy_handler)
 
 # 注册API路由
 app.include_router(api_router, prefix="/api/v1")
@@ -0,0 +1,57 @@
+"""add materialized progress counters to batch analysis sessions
+
+Revision ID: add_batch_progress_counters
+Revises: add_dialog_histories
+Create Date: 2025-12-26
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "add_batch_progress_counters"
+down_revision = "add_dialog_histories"
+branch_labels = None
+depends_on = None
+
+
+# (会话表, Sheet报告表, 外键列)
+_BATCH_TABLES = [
+    ("batch_analysis_sessions", "sheet_reports", "batch_session_id"),
+    ("custom_batch_analysis_sessions", "custom_sheet_reports", "custom_batch_session_id"),
+]
+
+_COUNTER_COLUMNS = ["pending_count", "generating_count", "completed_count", "failed_count"]
+
+
+def upgrade():
+    for session_table, report_table, fk_column in _BATCH_TABLES:
+        for column in _COUNTER_COLUMNS:
+            op.add_column(
+                session_table,
+                sa.Column(column, sa.Integer(), nullable=False, server_default="0"),
+            )
+
+        # 回填历史数据：按Sheet报告状态统计一次
+        op.execute(f"""
+            UPDATE {session_table} AS s SET
+                pending_count = c.pending_count,
+                generating_count = c.generating_count,
+                completed_count = c.completed_count,
+                failed_count = c.failed_count
+            FROM (
+                SELECT {fk_column} AS session_id,
+                    COUNT(*) FILTER (WHERE report_status = 'pending') AS pending_count,
+                    COUNT(*) FILTER (WHERE report_status = 'generating') AS generating_count,
+                    COUNT(*) FILTER (WHERE report_status = 'completed') AS completed_count,
+                    COUNT(*) FILTER (WHERE report_status = 'failed') AS failed_count
+                FROM {report_table}
+                GROUP BY {fk_column}
+            ) AS c
+            WHERE s.id = c.session_id
+        """)
+
+
+def downgrade():
+    for session_table, _, _ in _BATCH_TABLES:
+        for column in reversed(_COUNTER_COLUMNS):
+            op.drop_column(session_table, column)
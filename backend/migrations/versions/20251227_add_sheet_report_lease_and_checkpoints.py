@@ -0,0 +1,57 @@
+"""add lease/heartbeat and stage checkpoints to sheet reports
+
+Revision ID: add_sheet_lease_checkpoints
+Revises: add_batch_progress_counters
+Create Date: 2025-12-27
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = "add_sheet_lease_checkpoints"
+down_revision = "add_batch_progress_counters"
+branch_labels = None
+depends_on = None
+
+
+_SESSION_TABLES = ["batch_analysis_sessions", "custom_batch_analysis_sessions"]
+_REPORT_TABLES = ["sheet_reports", "custom_sheet_reports"]
+
+
+def upgrade():
+    for session_table in _SESSION_TABLES:
+        op.add_column(session_table, sa.Column("analysis_request", sa.Text(), nullable=True))
+
+    for report_table in _REPORT_TABLES:
+        op.add_column(report_table, sa.Column("lease_expires_at", sa.DateTime(), nullable=True))
+        op.add_column(report_table, sa.Column("heartbeat_at", sa.DateTime(), nullable=True))
+        op.add_column(
+            report_table,
+            sa.Column("attempt_count", sa.Integer(), nullable=False, server_default="0"),
+        )
+        op.add_column(report_table, sa.Column("text_checkpoint", sa.Text(), nullable=True))
+        op.add_column(
+            report_table,
+            sa.Column("chart_checkpoint", postgresql.JSONB(astext_type=sa.Text()), nullable=True),
+        )
+        # 部分索引：回收任务只扫描generating记录
+        op.create_index(
+            f"ix_{report_table}_generating_lease",
+            report_table,
+            ["lease_expires_at"],
+            postgresql_where=sa.text("report_status = 'generating'"),
+        )
+
+
+def downgrade():
+    for report_table in _REPORT_TABLES:
+        op.drop_index(f"ix_{report_table}_generating_lease", table_name=report_table)
+        op.drop_column(report_table, "chart_checkpoint")
+        op.drop_column(report_table, "text_checkpoint")
+        op.drop_column(report_table, "attempt_count")
+        op.drop_column(report_table, "heartbeat_at")
+        op.drop_column(report_table, "lease_expires_at")
+
+    for session_table in _SESSION_TABLES:
+        op.drop_column(session_table, "analysis_request")
@@ -0,0 +1,68 @@
+"""add cancelled status and counter to batch analysis
+
+Revision ID: add_batch_cancelled_status
+Revises: add_sheet_lease_checkpoints
+Create Date: 2025-12-28
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "add_batch_cancelled_status"
+down_revision = "add_sheet_lease_checkpoints"
+branch_labels = None
+depends_on = None
+
+
+# (表名, 约束名, 状态列, 旧状态集合, 新状态集合)
+_STATUS_CONSTRAINTS = [
+    (
+        "batch_analysis_sessions", "batch_analysis_sessions_status_check", "status",
+        "'draft', 'processing', 'completed', 'failed', 'partial_failed'",
+        "'draft', 'processing', 'completed', 'failed', 'partial_failed', 'cancelled'",
+    ),
+    (
+        "custom_batch_analysis_sessions", "custom_batch_analysis_sessions_status_check", "status",
+        "'draft', 'processing', 'completed', 'failed', 'partial_failed'",
+        "'draft', 'processing', 'completed', 'failed', 'partial_failed', 'cancelled'",
+    ),
+    (
+        "sheet_reports", "sheet_reports_status_check", "report_status",
+        "'pending', 'generating', 'completed', 'failed'",
+        "'pending', 'generating', 'completed', 'failed', 'cancelled'",
+    ),
+    (
+        "custom_sheet_reports", "custom_sheet_reports_status_check", "report_status",
+        "'pending', 'generating', 'completed', 'failed'",
+        "'pending', 'generating', 'completed', 'failed', 'cancelled'",
+    ),
+]
+
+_SESSION_TABLES = ["batch_analysis_sessions", "custom_batch_analysis_sessions"]
+
+
+def upgrade():
+    for table, constraint, column, _, new_statuses in _STATUS_CONSTRAINTS:
+        op.drop_constraint(constraint, table, type_="check")
+        op.create_check_constraint(constraint, table, f"{column} IN ({new_statuses})")
+
+    for session_table in _SESSION_TABLES:
+        op.add_column(
+            session_table,
+            sa.Column("cancelled_count", sa.Integer(), nullable=False, server_default="0"),
+        )
+
+
+def downgrade():
+    for session_table in _SESSION_TABLES:
+        op.drop_column(session_table, "cancelled_count")
+
+    # 已取消的记录回退为可重试的状态
+    op.execute("UPDATE sheet_reports SET report_status = 'failed' WHERE report_status = 'cancelled'")
+    op.execute("UPDATE custom_sheet_reports SET report_status = 'failed' WHERE report_status = 'cancelled'")
+    op.execute("UPDATE batch_analysis_sessions SET status = 'partial_failed' WHERE status = 'cancelled'")
+    op.execute("UPDATE custom_batch_analysis_sessions SET status = 'partial_failed' WHERE status = 'cancelled'")
+
+    for table, constraint, column, old_statuses, _ in _STATUS_CONSTRAINTS:
+        op.drop_constraint(constraint, table, type_="check")
+        op.create_check_constraint(constraint, table, f"{column} IN ({old_statuses})")
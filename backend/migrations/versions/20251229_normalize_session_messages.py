@@ -0,0 +1,125 @@
+"""normalize analysis session messages into an append-only child table
+
+Revision ID: normalize_session_messages
+Revises: add_batch_cancelled_status
+Create Date: 2025-12-29
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = "normalize_session_messages"
+down_revision = "add_batch_cancelled_status"
+branch_labels = None
+depends_on = None
+
+
+# html_charts 为空值（null/[]/{}/""）时不拆出 payload，与 AnalysisSessionMessage.from_dict 一致
+_HAS_PAYLOAD = (
+    "COALESCE(m.msg->'html_charts', 'null'::jsonb) "
+    "NOT IN ('null'::jsonb, '[]'::jsonb, '{}'::jsonb, '\"\"'::jsonb, 'false'::jsonb)"
+)
+
+
+def upgrade():
+    op.create_table(
+        "analysis_session_messages",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column(
+            "session_id",
+            sa.Integer(),
+            sa.ForeignKey("analysis_sessions.id", ondelete="CASCADE"),
+            nullable=False,
+        ),
+        sa.Column("seq", sa.Integer(), nullable=False),
+        sa.Column("role", sa.String(length=20), nullable=False),
+        sa.Column("content", sa.Text(), nullable=False, server_default=""),
+        sa.Column("extra", postgresql.JSONB(astext_type=sa.Text()), nullable=True),
+        sa.Column("has_payload", sa.Boolean(), nullable=False, server_default=sa.false()),
+        sa.Column("created_at", sa.DateTime(), nullable=False, server_default=sa.func.now()),
+    )
+    op.create_index("ix_analysis_session_messages_id", "analysis_session_messages", ["id"])
+    op.create_index(
+        "ux_session_messages_session_seq",
+        "analysis_session_messages",
+        ["session_id", "seq"],
+        unique=True,
+    )
+    op.create_index(
+        "ix_session_messages_session_role_seq",
+        "analysis_session_messages",
+        ["session_id", "role", "seq"],
+    )
+
+    op.create_table(
+        "analysis_session_message_payloads",
+        sa.Column(
+            "message_id",
+            sa.Integer(),
+            sa.ForeignKey("analysis_session_messages.id", ondelete="CASCADE"),
+            primary_key=True,
+        ),
+        sa.Column("data", postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+    )
+
+    # 回填：数组下标作为序号，消息时间未知时使用会话的更新时间
+    op.execute(f"""
+        INSERT INTO analysis_session_messages (session_id, seq, role, content, extra, has_payload, created_at)
+        SELECT
+            s.id,
+            (m.ord - 1)::int,
+            COALESCE(m.msg->>'role', 'user'),
+            COALESCE(m.msg->>'content', ''),
+            NULLIF(m.msg - 'role' - 'content' - 'html_charts', '{{}}'::jsonb),
+            {_HAS_PAYLOAD},
+            s.updated_at
+        FROM analysis_sessions s
+        CROSS JOIN LATERAL jsonb_array_elements(s.messages) WITH ORDINALITY AS m(msg, ord)
+        WHERE jsonb_typeof(s.messages) = 'array' AND jsonb_typeof(m.msg) = 'object'
+    """)
+    op.execute("""
+        INSERT INTO analysis_session_message_payloads (message_id, data)
+        SELECT r.id, jsonb_build_object('html_charts', s.messages->r.seq->'html_charts')
+        FROM analysis_session_messages r
+        JOIN analysis_sessions s ON s.id = r.session_id
+        WHERE r.has_payload
+    """)
+
+    op.drop_column("analysis_sessions", "messages")
+
+
+def downgrade():
+    op.add_column(
+        "analysis_sessions",
+        sa.Column(
+            "messages",
+            postgresql.JSONB(astext_type=sa.Text()),
+            nullable=False,
+            server_default=sa.text("'[]'::jsonb"),
+        ),
+    )
+    op.execute("""
+        UPDATE analysis_sessions s
+        SET messages = agg.messages
+        FROM (
+            SELECT
+                r.session_id,
+                jsonb_agg(
+                    COALESCE(r.extra, '{}'::jsonb)
+                    || jsonb_build_object('role', r.role, 'content', r.content)
+                    || COALESCE(p.data, '{}'::jsonb)
+                    ORDER BY r.seq
+                ) AS messages
+            FROM analysis_session_messages r
+            LEFT JOIN analysis_session_message_payloads p ON p.message_id = r.id
+            GROUP BY r.session_id
+        ) agg
+        WHERE agg.session_id = s.id
+    """)
+
+    op.drop_table("analysis_session_message_payloads")
+    op.drop_index("ix_session_messages_session_role_seq", table_name="analysis_session_messages")
+    op.drop_index("ux_session_messages_session_seq", table_name="analysis_session_messages")
+    op.drop_index("ix_analysis_session_messages_id", table_name="analysis_session_messages")
+    op.drop_table("analysis_session_messages")
@@ -0,0 +1,64 @@
+"""add denormalized message summary and keyset index to analysis sessions
+
+Revision ID: add_session_message_summary
+Revises: normalize_session_messages
+Create Date: 2025-12-30
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "add_session_message_summary"
+down_revision = "normalize_session_messages"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column(
+        "analysis_sessions",
+        sa.Column("message_count", sa.Integer(), nullable=False, server_default="0"),
+    )
+    op.add_column("analysis_sessions", sa.Column("last_role", sa.String(length=20), nullable=True))
+    op.add_column("analysis_sessions", sa.Column("last_message_at", sa.DateTime(), nullable=True))
+
+    # 回填：消息数和最后一条消息（时间优先取消息中的 timestamp，与写入时一致忽略时区；格式不符时用行的 created_at）
+    op.execute("""
+        UPDATE analysis_sessions s
+        SET message_count = agg.message_count
+        FROM (
+            SELECT session_id, COUNT(*) AS message_count
+            FROM analysis_session_messages
+            GROUP BY session_id
+        ) agg
+        WHERE agg.session_id = s.id
+    """)
+    op.execute("""
+        UPDATE analysis_sessions s
+        SET last_role = last.role,
+            last_message_at = COALESCE(
+                CASE WHEN last.ts ~ '^\\d{4}-\\d{2}-\\d{2}[T ]\\d{2}:\\d{2}'
+                     THEN last.ts::timestamp END,
+                last.created_at
+            )
+        FROM (
+            SELECT DISTINCT ON (session_id)
+                session_id, role, extra->>'timestamp' AS ts, created_at
+            FROM analysis_session_messages
+            ORDER BY session_id, seq DESC
+        ) last
+        WHERE last.session_id = s.id
+    """)
+
+    op.create_index(
+        "ix_analysis_sessions_user_function_updated",
+        "analysis_sessions",
+        ["user_id", "function_key", "updated_at", "id"],
+    )
+
+
+def downgrade():
+    op.drop_index("ix_analysis_sessions_user_function_updated", table_name="analysis_sessions")
+    op.drop_column("analysis_sessions", "last_message_at")
+    op.drop_column("analysis_sessions", "last_role")
+    op.drop_column("analysis_sessions", "message_count")
@@ -0,0 +1,58 @@
+"""add pg_trgm GIN indexes for session and report search
+
+Revision ID: add_search_trgm_indexes
+Revises: add_session_message_summary
+Create Date: 2025-12-31
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "add_search_trgm_indexes"
+down_revision = "add_session_message_summary"
+branch_labels = None
+depends_on = None
+
+
+# (索引名, 表名, 索引表达式, 部分索引条件)
+# 查询条件必须包含相同的部分索引条件，报告正文表达式必须与 SearchService 中的写法一致
+_TRGM_INDEXES = [
+    ("ix_analysis_sessions_title_trgm", "analysis_sessions", "title", None),
+    (
+        "ix_session_messages_content_trgm", "analysis_session_messages", "content",
+        "role = 'assistant'",
+    ),
+    ("ix_batch_analysis_sessions_file_name_trgm", "batch_analysis_sessions", "original_file_name", None),
+    (
+        "ix_custom_batch_analysis_sessions_file_name_trgm", "custom_batch_analysis_sessions",
+        "original_file_name", None,
+    ),
+    ("ix_sheet_reports_sheet_name_trgm", "sheet_reports", "sheet_name", None),
+    ("ix_custom_sheet_reports_sheet_name_trgm", "custom_sheet_reports", "sheet_name", None),
+    (
+        "ix_sheet_reports_text_trgm", "sheet_reports", "(report_content ->> 'text')",
+        "report_status = 'completed'",
+    ),
+    (
+        "ix_custom_sheet_reports_text_trgm", "custom_sheet_reports", "(report_content ->> 'text')",
+        "report_status = 'completed'",
+    ),
+]
+
+
+def upgrade():
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+
+    # 报告表数据量大，并发建索引，不阻塞写入（CONCURRENTLY 不能在事务中执行）
+    with op.get_context().autocommit_block():
+        for name, table, expression, where in _TRGM_INDEXES:
+            where_clause = f" WHERE {where}" if where else ""
+            op.execute(
+                f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} "
+                f"ON {table} USING gin ({expression} gin_trgm_ops){where_clause}"
+            )
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for name, _, _, _ in reversed(_TRGM_INDEXES):
+            op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
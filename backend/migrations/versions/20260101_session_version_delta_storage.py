@@ -0,0 +1,130 @@
+"""store session version content as periodic snapshots plus compressed deltas
+
+Revision ID: session_version_delta_storage
+Revises: add_search_trgm_indexes
+Create Date: 2026-01-01
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+from app.utils.version_delta import (
+    apply_blob,
+    content_size,
+    decode_content,
+    encode_delta,
+    encode_snapshot,
+    normalize_content,
+)
+
+# revision identifiers, used by Alembic.
+revision = "session_version_delta_storage"
+down_revision = "add_search_trgm_indexes"
+branch_labels = None
+depends_on = None
+
+
+# 迁移存量数据时使用的快照间隔（与 SESSION_VERSION_SNAPSHOT_INTERVAL 默认值一致）
+_SNAPSHOT_INTERVAL = 10
+
+_versions = sa.table(
+    "analysis_session_versions",
+    sa.column("id", sa.Integer),
+    sa.column("session_id", sa.Integer),
+    sa.column("version_no", sa.Integer),
+    sa.column("report_text", sa.Text),
+    sa.column("report_html_charts", sa.Text),
+    sa.column("report_charts_json", postgresql.JSONB),
+    sa.column("is_snapshot", sa.Boolean),
+    sa.column("content_blob", sa.LargeBinary),
+    sa.column("content_bytes", sa.Integer),
+    sa.column("stored_bytes", sa.Integer),
+)
+
+
+def _session_ids(bind):
+    return [row[0] for row in bind.execute(sa.select(_versions.c.session_id).distinct())]
+
+
+def upgrade():
+    op.add_column(
+        "analysis_session_versions",
+        sa.Column("is_snapshot", sa.Boolean(), nullable=False, server_default=sa.true()),
+    )
+    op.add_column("analysis_session_versions", sa.Column("content_blob", sa.LargeBinary(), nullable=True))
+    op.add_column(
+        "analysis_session_versions",
+        sa.Column("content_bytes", sa.Integer(), nullable=False, server_default="0"),
+    )
+    op.add_column(
+        "analysis_session_versions",
+        sa.Column("stored_bytes", sa.Integer(), nullable=False, server_default="0"),
+    )
+
+    # 逐个会话按版本号重新编码（同一会话内与创建新版本时的规则一致；版本号重复时按id排序）
+    bind = op.get_bind()
+    for session_id in _session_ids(bind):
+        rows = bind.execute(
+            sa.select(
+                _versions.c.id,
+                _versions.c.report_text,
+                _versions.c.report_html_charts,
+                _versions.c.report_charts_json,
+            ).where(_versions.c.session_id == session_id).order_by(_versions.c.version_no, _versions.c.id)
+        ).all()
+        previous = None
+        for index, row in enumerate(rows):
+            texts = normalize_content({
+                "report_text": row.report_text,
+                "report_html_charts": row.report_html_charts,
+                "report_charts_json": row.report_charts_json,
+            })
+            size = content_size(texts)
+            blob, is_snapshot = encode_snapshot(texts), True
+            if previous is not None and index % _SNAPSHOT_INTERVAL:
+                delta = encode_delta(previous, texts)
+                if len(delta) < len(blob):
+                    blob, is_snapshot = delta, False
+            bind.execute(
+                _versions.update().where(_versions.c.id == row.id).values(
+                    is_snapshot=is_snapshot,
+                    content_blob=blob,
+                    content_bytes=size,
+                    stored_bytes=len(blob),
+                )
+            )
+            previous = texts
+
+    op.drop_column("analysis_session_versions", "report_charts_json")
+    op.drop_column("analysis_session_versions", "report_html_charts")
+    op.drop_column("analysis_session_versions", "report_text")
+
+
+def downgrade():
+    op.add_column("analysis_session_versions", sa.Column("report_text", sa.Text(), nullable=True))
+    op.add_column("analysis_session_versions", sa.Column("report_html_charts", sa.Text(), nullable=True))
+    op.add_column(
+        "analysis_session_versions",
+        sa.Column("report_charts_json", postgresql.JSONB(astext_type=sa.Text()), nullable=True),
+    )
+
+    bind = op.get_bind()
+    for session_id in _session_ids(bind):
+        rows = bind.execute(
+            sa.select(_versions.c.id, _versions.c.content_blob)
+            .where(_versions.c.session_id == session_id)
+            .order_by(_versions.c.version_no, _versions.c.id)
+        ).all()
+        texts = None
+        for row in rows:
+            if row.content_blob is None:
+                continue
+            texts = apply_blob(texts, row.content_blob)
+            bind.execute(
+                _versions.update().where(_versions.c.id == row.id).values(**decode_content(texts))
+            )
+
+    op.drop_column("analysis_session_versions", "stored_bytes")
+    op.drop_column("analysis_session_versions", "content_bytes")
+    op.drop_column("analysis_session_versions", "content_blob")
+    op.drop_column("analysis_session_versions", "is_snapshot")
@@ -0,0 +1,47 @@
+"""add content-addressed store for large html charts
+
+Revision ID: add_content_store
+Revises: session_version_delta_storage
+Create Date: 2026-01-02
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "add_content_store"
+down_revision = "session_version_delta_storage"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "content_blobs",
+        sa.Column("sha256", sa.String(length=64), nullable=False),
+        sa.Column("media_type", sa.String(length=100), nullable=False),
+        sa.Column("size", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("stored_size", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("ref_count", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("created_at", sa.DateTime(), nullable=False, server_default=sa.func.now()),
+        sa.Column("updated_at", sa.DateTime(), nullable=False, server_default=sa.func.now()),
+        sa.PrimaryKeyConstraint("sha256"),
+    )
+    # 清理脚本只扫描引用数归零的对象
+    op.create_index(
+        "ix_content_blobs_unreferenced",
+        "content_blobs",
+        ["updated_at"],
+        postgresql_where=sa.text("ref_count <= 0"),
+    )
+    op.add_column(
+        "analysis_session_versions",
+        sa.Column("html_charts_ref", sa.String(length=64), nullable=True),
+    )
+    # 存量数据仍内联存储（读取时两种形式都支持），可用 scripts/migrate_content_store.py 迁移到内容存储
+
+
+def downgrade():
+    # 降级前需确保内容已内联回数据库，否则引用的HTML图表将无法读取
+    op.drop_column("analysis_session_versions", "html_charts_ref")
+    op.drop_index("ix_content_blobs_unreferenced", table_name="content_blobs")
+    op.drop_table("content_blobs")
@@ -0,0 +1,26 @@
+"""add token_version to users
+
+Revision ID: add_user_token_version
+Revises: add_content_store
+Create Date: 2026-01-03
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "add_user_token_version"
+down_revision = "add_content_store"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # 令牌版本：修改密码、禁用、删除用户时递增，旧版本签发的Token/Session立即失效
+    op.add_column(
+        "users",
+        sa.Column("token_version", sa.Integer(), nullable=False, server_default="0"),
+    )
+
+
+def downgrade():
+    op.drop_column("users", "token_version")
@@ -0,0 +1,49 @@
+"""make (session_id, version_no) unique on analysis_session_versions
+
+Revision ID: unique_session_version_no
+Revises: add_user_token_version
+Create Date: 2026-01-04
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "unique_session_version_no"
+down_revision = "add_user_token_version"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # 并发保存版本可能产生重复的版本号：存在重复的会话按 (version_no, id) 重新编号，
+    # 与版本内容快照/增量链的读取顺序一致，链本身不受影响；其他会话（含删除版本留下的空号）保持不变
+    op.execute(
+        """
+        UPDATE analysis_session_versions AS v
+        SET version_no = r.new_no
+        FROM (
+            SELECT id, row_number() OVER (PARTITION BY session_id ORDER BY version_no, id) AS new_no
+            FROM analysis_session_versions
+            WHERE session_id IN (
+                SELECT session_id FROM analysis_session_versions
+                GROUP BY session_id, version_no HAVING count(*) > 1
+            )
+        ) AS r
+        WHERE v.id = r.id AND v.version_no <> r.new_no
+        """
+    )
+    op.drop_index("idx_session_versions_session_id_version_no", table_name="analysis_session_versions")
+    op.create_index(
+        "ux_session_versions_session_version_no",
+        "analysis_session_versions",
+        ["session_id", "version_no"],
+        unique=True,
+    )
+
+
+def downgrade():
+    op.drop_index("ux_session_versions_session_version_no", table_name="analysis_session_versions")
+    op.create_index(
+        "idx_session_versions_session_id_version_no",
+        "analysis_session_versions",
+        ["session_id", "version_no"],
+    )
@@ -0,0 +1,142 @@
+"""
+登录压测：集中登录（bcrypt验证密码）的同时模拟活跃的对话流
+
+对比两种模式：
+- inline：在事件循环中直接调用 verify_password（改造前的行为）
+- pool：交给 PasswordHashService 线程池计算
+
+对话流用协程模拟：每隔 --chunk-interval 秒产出一个chunk，记录相邻chunk的实际间隔，
+间隔被拉长说明事件循环被阻塞。
+--old-rounds 与 --rounds 不同时，密码哈希按旧cost生成，pool模式统计登录时重新生成哈希的次数。
+
+用法：
+    python scripts/bench_login.py --mode both --logins 40 --concurrency 20 --streams 10 --rounds 12
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List
+
+# 添加项目根目录到路径
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from loguru import logger
+from passlib.context import CryptContext
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def simulate_stream(stop: asyncio.Event, interval: float, gaps: List[float]) -> None:
+    """模拟一条SSE对话流，记录chunk间隔"""
+    last = time.perf_counter()
+    while not stop.is_set():
+        await asyncio.sleep(interval)
+        now = time.perf_counter()
+        gaps.append(now - last)
+        last = now
+
+
+async def run_mode(mode: str, password_hash: str, args) -> Dict:
+    from app.core.security import verify_password
+    from app.services.password_hash_service import PasswordHashService, PasswordHashBusyError
+
+    service = None
+    if mode == "pool":
+        service = PasswordHashService(
+            workers=args.workers,
+            max_pending=args.max_pending,
+            retry_after_seconds=1
+        )
+
+    stop = asyncio.Event()
+    gaps: List[float] = []
+    streams = [asyncio.create_task(simulate_stream(stop, args.chunk_interval, gaps)) for _ in range(args.streams)]
+
+    semaphore = asyncio.Semaphore(args.concurrency)
+    latencies: List[float] = []
+    rejected = 0
+
+    async def login():
+        nonlocal rejected, password_hash
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                if service is None:
+                    verified = verify_password(args.password, password_hash)
+                else:
+                    verified, new_hash = await service.verify_and_update(args.password, password_hash)
+                    # 与登录接口一致：保存按新cost生成的哈希
+                    if new_hash:
+                        password_hash = new_hash
+            except PasswordHashBusyError:
+                rejected += 1
+                return
+            assert verified, "密码验证失败"
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*[login() for _ in range(args.logins)])
+    elapsed = time.perf_counter() - started
+
+    stop.set()
+    await asyncio.gather(*streams)
+    result = {
+        "mode": mode,
+        "elapsed_seconds": round(elapsed, 2),
+        "logins_per_second": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "login_p50": round(percentile(latencies, 50), 3),
+        "login_p95": round(percentile(latencies, 95), 3),
+        "rejected": rejected,
+        "stream_gap_p50_ms": round(percentile(gaps, 50) * 1000, 1),
+        "stream_gap_p99_ms": round(percentile(gaps, 99) * 1000, 1),
+        "stream_gap_max_ms": round(max(gaps) * 1000, 1) if gaps else 0.0,
+    }
+    if service is not None:
+        snapshot = service.snapshot()
+        result.update({
+            "rehashed": snapshot["rehashed"],
+            "hash_avg_ms": snapshot["avg_hash_ms"],
+            "queue_wait_max_ms": snapshot["max_wait_ms"],
+        })
+        service.shutdown()
+    return result
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="登录压测")
+    parser.add_argument("--mode", choices=["inline", "pool", "both"], default="both")
+    parser.add_argument("--logins", type=int, default=40, help="登录总次数")
+    parser.add_argument("--concurrency", type=int, default=20, help="并发登录数")
+    parser.add_argument("--streams", type=int, default=10, help="模拟的活跃对话流数量")
+    parser.add_argument("--chunk-interval", type=float, default=0.02, help="对话流chunk间隔（秒）")
+    parser.add_argument("--rounds", type=int, default=12, help="配置的bcrypt cost（PASSWORD_BCRYPT_ROUNDS）")
+    parser.add_argument("--old-rounds", type=int, default=None, help="存量密码哈希的cost（默认与 --rounds 相同）")
+    parser.add_argument("--workers", type=int, default=2, help="pool模式的线程数")
+    parser.add_argument("--max-pending", type=int, default=64, help="pool模式的队列上限")
+    parser.add_argument("--password", default="bench-password-123")
+    args = parser.parse_args()
+
+    # 在导入 app（加载配置和密码上下文）之前设置cost
+    os.environ["PASSWORD_BCRYPT_ROUNDS"] = str(args.rounds)
+
+    old_rounds = args.old_rounds or args.rounds
+    password_hash = CryptContext(schemes=["bcrypt"], bcrypt__rounds=old_rounds).hash(args.password)
+    logger.info(f"[登录压测] rounds={args.rounds}, old_rounds={old_rounds}")
+
+    modes = ["inline", "pool"] if args.mode == "both" else [args.mode]
+    for mode in modes:
+        result = await run_mode(mode, password_hash, args)
+        logger.info(f"[登录压测] {result}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
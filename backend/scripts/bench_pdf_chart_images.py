@@ -0,0 +1,114 @@
+"""
+PDF图表图片压测：前端高分屏截图嵌入PDF的体积和耗时
+
+对比两种方式：
+- legacy：改造前的做法（原图直接交给 reportlab Image，图片流做ASCII85编码）
+- pipeline：ChartImagePipeline（按目标DPI缩小、合成白底、按内容去重并复用XObject）
+
+图表图片用 echarts_renderer 按 --scale 倍尺寸渲染，模拟浏览器 devicePixelRatio；
+--duplicates 张图片与前面的图片内容相同（同一图表在多个章节出现）。
+
+用法：
+    python scripts/bench_pdf_chart_images.py --charts 8 --duplicates 4 --scale 3
+"""
+import argparse
+import base64
+import io
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List
+
+# 添加项目根目录到路径
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from loguru import logger
+
+
+def build_chart_images(charts: int, duplicates: int, scale: int) -> List[Dict]:
+    """渲染图表PNG（带透明背景，与前端导出一致）"""
+    from PIL import Image
+
+    from app.utils.echarts_renderer import render_chart_png
+
+    images = []
+    unique = max(1, charts - duplicates)
+    for i in range(charts):
+        n = i % unique
+        chart = {
+            "title": f"图表{n + 1}",
+            "config": {
+                "xAxis": {"type": "category", "data": [f"{m}月" for m in range(1, 13)]},
+                "yAxis": {"type": "value"},
+                "series": [{"type": "bar" if n % 2 else "line", "data": [(m * (n + 3)) % 17 + 5 for m in range(12)]}],
+            },
+        }
+        png = render_chart_png(chart, width=550 * scale, height=350 * scale)
+        with Image.open(io.BytesIO(png)) as img:
+            rgba = img.convert("RGBA")
+        buffer = io.BytesIO()
+        rgba.save(buffer, format="PNG")
+        images.append({"index": i, "title": chart["title"], "image_data": base64.b64encode(buffer.getvalue()).decode()})
+    return images
+
+
+def render_legacy(title: str, report_content: Dict, chart_images: List[Dict]) -> bytes:
+    """改造前：reportlab Image 直接读取原图，开启ASCII85"""
+    from reportlab import rl_config
+    from reportlab.lib.units import inch
+    from reportlab.platypus import Image as RLImage
+
+    from app.utils import pdf_generator
+
+    original = pdf_generator.create_chart_image_from_base64
+
+    def legacy_image(image_base64, width=5.5 * inch, height=3.5 * inch, pipeline=None):
+        return RLImage(io.BytesIO(base64.b64decode(image_base64)), width=width, height=height)
+
+    pdf_generator.create_chart_image_from_base64 = legacy_image
+    rl_config.useA85 = 1
+    try:
+        return pdf_generator.generate_report_pdf(title, report_content, 0, chart_images)
+    finally:
+        pdf_generator.create_chart_image_from_base64 = original
+        rl_config.useA85 = 0
+
+
+def render_pipeline(title: str, report_content: Dict, chart_images: List[Dict]) -> bytes:
+    from app.utils.pdf_generator import generate_report_pdf
+
+    return generate_report_pdf(title, report_content, 0, chart_images)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="PDF图表图片压测")
+    parser.add_argument("--charts", type=int, default=8, help="图表图片数量")
+    parser.add_argument("--duplicates", type=int, default=4, help="其中重复的图片数量")
+    parser.add_argument("--scale", type=int, default=3, help="截图倍率（devicePixelRatio）")
+    parser.add_argument("--repeat", type=int, default=3, help="重复次数（取中位数）")
+    args = parser.parse_args()
+
+    from app.utils.pdf_generator import register_chinese_font
+
+    register_chinese_font()
+    chart_images = build_chart_images(args.charts, args.duplicates, args.scale)
+    input_kb = sum(len(img["image_data"]) * 3 / 4 for img in chart_images) / 1024
+    logger.info(f"[图片压测] 图片数={len(chart_images)}, 重复={args.duplicates}, 倍率={args.scale}, 原图总大小={input_kb:.0f}KB")
+
+    report_content = {"text": "# 图表图片压测\n\n正文", "charts": [], "tables": [], "metrics": {}}
+    for name, render in (("legacy", render_legacy), ("pipeline", render_pipeline)):
+        durations = []
+        pdf_bytes = b""
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            pdf_bytes = render("图表图片压测", report_content, chart_images)
+            durations.append(time.perf_counter() - started)
+        logger.info(
+            f"[图片压测] {name}: median_ms={statistics.median(durations) * 1000:.1f}, "
+            f"pdf_kb={len(pdf_bytes) / 1024:.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+"""
+PDF渲染压测：并发下载PDF的同时模拟活跃的对话流
+
+对比两种模式：
+- inline：在事件循环中直接调用 generate_report_pdf（改造前的行为）
+- pool：交给 PDFRenderService 进程池渲染
+
+对话流用协程模拟：每隔 --chunk-interval 秒产出一个chunk，记录相邻chunk的实际间隔，
+间隔被拉长说明事件循环被阻塞。
+
+用法：
+    python scripts/bench_pdf_render.py --mode both --downloads 20 --concurrency 4 --streams 10
+"""
+import argparse
+import asyncio
+import base64
+import io
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+from pathlib import Path
+from typing import Dict, List
+
+# 添加项目根目录到路径
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from loguru import logger
+
+
+def build_report(paragraphs: int, charts: int) -> Dict:
+    """构造一份长报告和若干张图表图片"""
+    from PIL import Image, ImageDraw
+
+    lines = ["# 运营数据分析报告", ""]
+    for i in range(paragraphs):
+        if i % 10 == 0:
+            lines.append(f"## 第{i // 10 + 1}部分 核心指标分析")
+        lines.append(
+            f"第{i + 1}段：本周期活跃用户数环比增长12.5%，付费转化率提升至3.8%，"
+            f"客单价稳定在256元左右，渠道A贡献了约42%的新增用户，建议持续加大投放。"
+        )
+        lines.append("")
+
+    chart_images = []
+    for i in range(charts):
+        image = Image.new("RGB", (1200, 800), "white")
+        draw = ImageDraw.Draw(image)
+        for x in range(0, 1200, 40):
+            draw.rectangle([x, 800 - (x * 7 + i * 53) % 700, x + 30, 800], fill=(52, 152, 219))
+        buffer = io.BytesIO()
+        image.save(buffer, format="PNG")
+        chart_images.append({
+            "index": i,
+            "title": f"图表{i + 1}",
+            "image_data": base64.b64encode(buffer.getvalue()).decode("ascii")
+        })
+
+    return {
+        "title": "压测报告",
+        "report_content": {"text": "\n".join(lines), "charts": [], "tables": [], "metrics": {}},
+        "session_id": 0,
+        "chart_images": chart_images,
+    }
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def simulate_stream(stop: asyncio.Event, interval: float, gaps: List[float]) -> None:
+    """模拟一条SSE对话流，记录chunk间隔"""
+    last = time.perf_counter()
+    while not stop.is_set():
+        await asyncio.sleep(interval)
+        now = time.perf_counter()
+        gaps.append(now - last)
+        last = now
+
+
+async def run_mode(mode: str, render_kwargs: Dict, args) -> Dict:
+    from app.services.pdf_render_service import PDFRenderService, RenderBusyError
+    from app.utils.pdf_generator import generate_report_pdf
+
+    service = None
+    if mode == "pool":
+        service = PDFRenderService(
+            workers=args.workers,
+            max_pending=args.max_pending,
+            timeout_seconds=args.timeout,
+            retry_after_seconds=1
+        )
+        await asyncio.to_thread(service.start)
+
+    stop = asyncio.Event()
+    gaps: List[float] = []
+    streams = [asyncio.create_task(simulate_stream(stop, args.chunk_interval, gaps)) for _ in range(args.streams)]
+
+    output_dir = tempfile.mkdtemp(prefix="bench-pdf-")
+    semaphore = asyncio.Semaphore(args.concurrency)
+    latencies: List[float] = []
+    rejected = 0
+    sizes: List[int] = []
+
+    async def download():
+        nonlocal rejected
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                if service is None:
+                    pdf_size = len(generate_report_pdf(**render_kwargs))
+                else:
+                    output_path = os.path.join(output_dir, f"{uuid.uuid4().hex}.pdf")
+                    pdf_size = await service.render_pdf(output_path, **render_kwargs)
+            except RenderBusyError:
+                rejected += 1
+                return
+            latencies.append(time.perf_counter() - started)
+            sizes.append(pdf_size)
+
+    started = time.perf_counter()
+    await asyncio.gather(*[download() for _ in range(args.downloads)])
+    elapsed = time.perf_counter() - started
+
+    stop.set()
+    await asyncio.gather(*streams)
+    if service is not None:
+        service.shutdown()
+    shutil.rmtree(output_dir, ignore_errors=True)
+
+    return {
+        "mode": mode,
+        "elapsed_seconds": round(elapsed, 2),
+        "downloads_per_second": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "download_p50": round(percentile(latencies, 50), 3),
+        "download_p95": round(percentile(latencies, 95), 3),
+        "rejected": rejected,
+        "pdf_kb": round(statistics.mean(sizes) / 1024, 1) if sizes else 0.0,
+        "stream_gap_p50_ms": round(percentile(gaps, 50) * 1000, 1),
+        "stream_gap_p99_ms": round(percentile(gaps, 99) * 1000, 1),
+        "stream_gap_max_ms": round(max(gaps) * 1000, 1) if gaps else 0.0,
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="PDF渲染压测")
+    parser.add_argument("--mode", choices=["inline", "pool", "both"], default="both")
+    parser.add_argument("--downloads", type=int, default=20, help="PDF下载总次数")
+    parser.add_argument("--concurrency", type=int, default=4, help="并发下载数")
+    parser.add_argument("--streams", type=int, default=10, help="模拟的活跃对话流数量")
+    parser.add_argument("--chunk-interval", type=float, default=0.02, help="对话流chunk间隔（秒）")
+    parser.add_argument("--paragraphs", type=int, default=300, help="报告段落数")
+    parser.add_argument("--charts", type=int, default=6, help="图表图片数")
+    parser.add_argument("--workers", type=int, default=2, help="pool模式的渲染进程数")
+    parser.add_argument("--max-pending", type=int, default=8, help="pool模式的队列上限")
+    parser.add_argument("--timeout", type=float, default=120, help="pool模式的单任务超时（秒）")
+    args = parser.parse_args()
+
+    render_kwargs = build_report(args.paragraphs, args.charts)
+    modes = ["inline", "pool"] if args.mode == "both" else [args.mode]
+
+    for mode in modes:
+        result = await run_mode(mode, render_kwargs, args)
+        logger.info(f"[PDF渲染压测] {result}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
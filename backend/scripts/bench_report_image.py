@@ -0,0 +1,139 @@
+"""
+报告图片排版压测：长中文报告的换行耗时
+
+对比三种换行方式（每种都对整份报告的所有段落换行）：
+- legacy：改造前的 wrap_text（按空格分词，每次追加单词都对整行调用 font.getbbox；
+  中文段落没有空格，整段不会被断开）。改造前生成图片时估算高度和绘制各换行一次，这里同样执行两遍
+- per_char：逐字追加并测量整行宽度的中文换行（不缓存字形宽度时正确断行的做法）
+- layout：text_layout.wrap_line（字形宽度LRU缓存 + 前缀和二分查找），只执行一遍
+
+最后输出完整 generate_report_image 的耗时和字形缓存命中情况。
+
+用法：
+    python scripts/bench_report_image.py --chars 20000 --repeat 3
+    python scripts/bench_report_image.py --font /usr/share/fonts/truetype/dejavu/DejaVuSans.ttf
+"""
+import argparse
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Callable, List
+
+# 添加项目根目录到路径
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from loguru import logger
+
+
+PARAGRAPH = (
+    "本周期活跃用户数环比增长12.5%，付费转化率提升至3.8%，客单价稳定在256元左右。"
+    "渠道A贡献了约42%的新增用户，建议持续加大投放；渠道B的留存率偏低，需要排查落地页体验。"
+    "Top SKU的库存周转天数为18天，低于行业均值，可适当提高备货量以应对大促需求。"
+)
+
+
+def build_report_text(chars: int) -> str:
+    """构造指定字数的Markdown报告"""
+    lines: List[str] = ["# 运营数据分析报告", ""]
+    total = 0
+    section = 0
+    while total < chars:
+        if section % 5 == 0:
+            lines.append(f"## 第{section // 5 + 1}部分 核心指标分析")
+        lines.append(PARAGRAPH)
+        lines.append("")
+        total += len(PARAGRAPH)
+        section += 1
+    return "\n".join(lines)
+
+
+def legacy_wrap_text(text: str, font, max_width: int) -> List[str]:
+    """改造前的 wrap_text"""
+    lines = []
+    words = text.split()
+    current_line = []
+    for word in words:
+        test_line = ' '.join(current_line + [word]) if current_line else word
+        bbox = font.getbbox(test_line)
+        if bbox[2] - bbox[0] > max_width and current_line:
+            lines.append(' '.join(current_line))
+            current_line = [word]
+        else:
+            current_line.append(word)
+    if current_line:
+        lines.append(' '.join(current_line))
+    return lines if lines else [text]
+
+
+def per_char_wrap_text(text: str, font, max_width: int) -> List[str]:
+    """逐字测量整行宽度的换行"""
+    lines = []
+    current = ""
+    for ch in text:
+        if current and font.getlength(current + ch) > max_width:
+            lines.append(current)
+            current = ch
+        else:
+            current += ch
+    lines.append(current)
+    return lines
+
+
+def time_wrap(wrap: Callable, paragraphs: List[str], font, max_width: int, passes: int, repeat: int) -> dict:
+    durations = []
+    line_count = 0
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(passes):
+            line_count = sum(len(wrap(p, font, max_width)) for p in paragraphs)
+        durations.append(time.perf_counter() - started)
+    return {
+        "median_ms": round(statistics.median(durations) * 1000, 1),
+        "lines": line_count,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="报告图片排版压测")
+    parser.add_argument("--chars", type=int, default=20000, help="报告正文字数")
+    parser.add_argument("--repeat", type=int, default=3, help="每种方式的重复次数（取中位数）")
+    parser.add_argument("--width", type=int, default=1200, help="图片宽度")
+    parser.add_argument("--font", default=None, help="换行对比使用的字体文件（默认使用字体注册表中的中文字体）")
+    args = parser.parse_args()
+
+    from app.utils import text_layout
+    from app.utils.image_generator import generate_report_image, get_chinese_font, parse_markdown_to_lines
+
+    text = build_report_text(args.chars)
+    paragraphs = [line["content"] for line in parse_markdown_to_lines(text) if line["type"] != "blank"]
+    if args.font:
+        from PIL import ImageFont
+        font = ImageFont.truetype(args.font, 18)
+    else:
+        font = get_chinese_font(18)
+    max_width = args.width - 2 * 40
+    logger.info(f"[排版压测] 字数={len(text)}, 段落数={len(paragraphs)}, 字体={getattr(font, 'path', font)}")
+
+    results = {
+        "legacy": time_wrap(legacy_wrap_text, paragraphs, font, max_width, passes=2, repeat=args.repeat),
+        "per_char": time_wrap(per_char_wrap_text, paragraphs, font, max_width, passes=1, repeat=args.repeat),
+        "layout": time_wrap(text_layout.wrap_line, paragraphs, font, max_width, passes=1, repeat=args.repeat),
+    }
+    for name, result in results.items():
+        logger.info(f"[排版压测] {name}: {result}")
+
+    report_content = {"text": text, "charts": [], "tables": [], "metrics": {}}
+    durations = []
+    for _ in range(args.repeat):
+        started = time.perf_counter()
+        image_bytes = generate_report_image("排版压测报告", report_content, session_id=0, width=args.width)
+        durations.append(time.perf_counter() - started)
+    logger.info(
+        f"[排版压测] generate_report_image: median_ms={round(statistics.median(durations) * 1000, 1)}, "
+        f"png_kb={round(len(image_bytes) / 1024, 1)}, glyph_cache={text_layout.cache_stats()}"
+    )
+
+
+if __name__ == "__main__":
+    main()
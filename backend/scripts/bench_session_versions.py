@@ -0,0 +1,134 @@
+"""
+会话版本存储压测：全量存储 vs 定期快照 + 增量
+
+模拟一份报告被对话编辑多次（每次改动一两句话或一个图表数据），
+对比两种方式的存储字节数，以及还原任意版本的耗时（与 SessionVersionService 的规则一致）。
+
+用法：
+    python scripts/bench_session_versions.py --versions 200 --report-kb 300 --interval 10
+"""
+import argparse
+import json
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+# 添加项目根目录到路径
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from loguru import logger
+
+from app.utils.version_delta import (
+    apply_blob,
+    content_size,
+    decode_content,
+    encode_delta,
+    encode_snapshot,
+    normalize_content,
+)
+
+
+def build_report(report_kb: int, rng: random.Random) -> Dict:
+    """生成初始报告：Markdown正文、压缩成一行的HTML图表和ECharts配置"""
+    paragraphs = []
+    size = 0
+    n = 0
+    while size < report_kb * 1024 * 0.6:
+        line = f"## 章节{n}\n\n本月第{n}项指标环比上涨{rng.randint(1, 99)}%，主要由渠道{rng.randint(1, 9)}贡献。" * 3 + "\n\n"
+        paragraphs.append(line)
+        size += len(line.encode("utf-8"))
+        n += 1
+    html = "".join(
+        f"<div class=\"chart\" id=\"c{i}\"><span>{rng.random():.6f}</span></div>" for i in range(report_kb * 5)
+    )
+    charts = [
+        {"title": f"图表{i}", "config": {"series": [{"type": "bar", "data": [rng.randint(0, 999) for _ in range(24)]}]}}
+        for i in range(12)
+    ]
+    return {"report_text": "".join(paragraphs), "report_html_charts": html, "report_charts_json": charts}
+
+
+def edit_report(content: Dict, rng: random.Random) -> Dict:
+    """一次对话编辑：改一句话，偶尔改一个图表数据或HTML片段"""
+    content = json.loads(json.dumps(content))
+    text = content["report_text"]
+    pos = rng.randrange(len(text))
+    content["report_text"] = text[:pos] + f"（补充说明{rng.randint(0, 9999)}）" + text[pos:]
+    if rng.random() < 0.3:
+        chart = rng.choice(content["report_charts_json"])
+        chart["config"]["series"][0]["data"][rng.randrange(24)] = rng.randint(0, 999)
+    if rng.random() < 0.2:
+        html = content["report_html_charts"]
+        pos = html.find("<span>", rng.randrange(len(html)))
+        if pos >= 0:
+            content["report_html_charts"] = html[:pos] + f"<span>{rng.random():.6f}</span>" + html[pos + 22:]
+    return content
+
+
+def main():
+    parser = argparse.ArgumentParser(description="会话版本存储压测")
+    parser.add_argument("--versions", type=int, default=200, help="版本数")
+    parser.add_argument("--report-kb", type=int, default=300, help="报告大小（KB）")
+    parser.add_argument("--interval", type=int, default=10, help="快照间隔")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    contents: List[Dict] = [build_report(args.report_kb, rng)]
+    for _ in range(args.versions - 1):
+        contents.append(edit_report(contents[-1], rng))
+
+    # 按 SessionVersionService.create_version 的规则编码
+    blobs: List[bytes] = []
+    snapshots: List[bool] = []
+    full_bytes = 0
+    previous: Optional[Dict] = None
+    last_snapshot = 0
+    encode_started = time.perf_counter()
+    for index, content in enumerate(contents):
+        texts = normalize_content(content)
+        size = content_size(texts)
+        full_bytes += size
+        blob = None
+        if previous is not None and index - last_snapshot < args.interval:
+            blob, is_snapshot = encode_delta(previous, texts), False
+        if blob is None or len(blob) * 4 > size:
+            snapshot_blob = encode_snapshot(texts)
+            if blob is None or len(snapshot_blob) <= len(blob):
+                blob, is_snapshot = snapshot_blob, True
+        if is_snapshot:
+            last_snapshot = index
+        blobs.append(blob)
+        snapshots.append(is_snapshot)
+        previous = texts
+    encode_ms = (time.perf_counter() - encode_started) * 1000 / len(contents)
+
+    # 还原随机版本并校验
+    durations = []
+    for target in rng.sample(range(len(contents)), min(30, len(contents))):
+        started = time.perf_counter()
+        start = max(i for i in range(target + 1) if snapshots[i])
+        texts = None
+        for blob in blobs[start:target + 1]:
+            texts = apply_blob(texts, blob)
+        restored = decode_content(texts)
+        durations.append(time.perf_counter() - started)
+        assert restored == contents[target], f"版本 {target + 1} 还原结果不一致"
+
+    stored_bytes = sum(len(blob) for blob in blobs)
+    logger.info(
+        f"[版本压测] versions={len(contents)}, snapshots={sum(snapshots)}, "
+        f"full_mb={full_bytes / 1048576:.1f}, stored_mb={stored_bytes / 1048576:.2f}, "
+        f"ratio={full_bytes / stored_bytes:.1f}x"
+    )
+    logger.info(
+        f"[版本压测] encode_ms_per_version={encode_ms:.1f}, "
+        f"restore_median_ms={statistics.median(durations) * 1000:.1f}, restore_max_ms={max(durations) * 1000:.1f}"
+    )
+
+
+if __name__ == "__main__":
+    main()
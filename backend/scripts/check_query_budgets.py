@@ -0,0 +1,99 @@
+"""
+接口查询预算检查
+
+通过 TestClient 调用列表接口，用 assert_query_budget 校验每次请求执行的SQL条数，并检查是否出现N+1：
+- GET /api/v1/admin/functions：功能、绑定和工作流批量加载，命中缓存后不再查询功能表
+- GET /api/v1/operation/sessions：只查询会话表的投影列，不读取消息表
+
+每个接口先在清空当前用户缓存后调用一次（冷），再调用一次（热），分别对照预算。
+脚本不进入应用的 lifespan，Redis未连接，功能配置等读穿透缓存每次都回源数据库，预算按最坏情况设置。
+使用 .env 中配置的数据库，需要 SQL_STATS_ENABLED=true；用户默认取第一个管理员。
+
+用法：
+    python scripts/check_query_budgets.py
+    python scripts/check_query_budgets.py --username admin
+"""
+import argparse
+import asyncio
+import sys
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+# 添加项目根目录到路径
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from fastapi.testclient import TestClient
+from loguru import logger
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.core.query_stats import assert_query_budget
+from app.core.security import create_api_token
+from app.models.user import User
+from app.services.principal_cache_service import principal_cache
+
+
+# (接口, 冷缓存预算, 热缓存预算)
+# 冷：当前用户1条 + 接口自身的查询；热：当前用户命中进程内缓存
+QUERY_BUDGETS: List[Tuple[str, int, int]] = [
+    # 功能1条 + 绑定及工作流1条（selectinload + joinedload），与功能数量无关
+    ("/api/v1/admin/functions", 3, 2),
+    # 总数1条 + 当前页1条
+    ("/api/v1/operation/sessions?page=1&page_size=20", 3, 2),
+]
+
+
+def check_budgets(client: TestClient, headers: Dict[str, str], user_id: int) -> bool:
+    """逐个接口检查查询预算，返回是否全部通过"""
+    ok = True
+    for path, cold_budget, warm_budget in QUERY_BUDGETS:
+        asyncio.run(principal_cache.invalidate(user_id))
+        for phase, budget in (("cold", cold_budget), ("warm", warm_budget)):
+            try:
+                with assert_query_budget(budget, f"GET {path} ({phase})") as statements:
+                    response = client.get(path, headers=headers)
+            except AssertionError as e:
+                logger.error(str(e))
+                ok = False
+                continue
+            if response.status_code != 200:
+                logger.error(f"[查询预算] GET {path} ({phase}) 返回 {response.status_code}: {response.text[:200]}")
+                ok = False
+                continue
+            logger.info(f"[查询预算] GET {path} ({phase}) - queries={len(statements)}, budget={budget}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="接口查询预算检查")
+    parser.add_argument("--username", default=None, help="发起请求的管理员用户名，默认取第一个管理员")
+    args = parser.parse_args()
+
+    if not settings.SQL_STATS_ENABLED:
+        logger.error("[查询预算] SQL_STATS_ENABLED=false，无法统计查询")
+        sys.exit(1)
+
+    db = SessionLocal()
+    try:
+        query = db.query(User).filter(User.is_admin.is_(True), User.is_active.is_(True))
+        if args.username:
+            query = query.filter(User.username == args.username)
+        user = query.order_by(User.id).first()
+        if user is None:
+            logger.error("[查询预算] 未找到可用的管理员用户")
+            sys.exit(1)
+        user_id = user.id
+        token = create_api_token(user.id, purpose="query_budget", token_version=user.token_version or 0)
+    finally:
+        db.close()
+
+    from main import app
+
+    # 不进入 lifespan：不连接Redis，不启动渲染进程池等后台资源
+    client = TestClient(app)
+    ok = check_budgets(client, {"Authorization": f"Bearer {token}"}, user_id)
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+只读副本检查脚本
+
+1. 确认 DATABASE_REPLICA_URL 指向的是热备副本（pg_is_in_recovery），并输出回放延迟
+2. 测量副本追上主库当前WAL位置所需的时间（读己之写窗口 DB_READ_YOUR_WRITES_SECONDS 应大于该值）
+3. （可选）并发执行只读查询，确认读请求经 db_router 路由到副本
+
+用法：
+    python scripts/check_read_replica.py
+    python scripts/check_read_replica.py --reads 200 --concurrency 20
+"""
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+# 添加项目根目录到路径
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from loguru import logger
+from sqlalchemy import text
+
+from app.core.config import settings
+from app.core.database import db_router, engine, replica_engine
+
+
+def check_replication(timeout_seconds: float) -> bool:
+    with replica_engine.connect() as replica:
+        in_recovery = replica.execute(text("SELECT pg_is_in_recovery()")).scalar()
+        if not in_recovery:
+            logger.warning("[读写分离] DATABASE_REPLICA_URL 不是热备副本（pg_is_in_recovery=false），只验证路由逻辑")
+            return True
+        replay_lag = replica.execute(text(
+            "SELECT EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())"
+        )).scalar()
+        logger.info(f"[读写分离] 副本最近一次回放距今: {replay_lag if replay_lag is None else round(float(replay_lag), 2)}s")
+
+    with engine.connect() as primary:
+        target_lsn = primary.execute(text("SELECT pg_current_wal_lsn()")).scalar()
+
+    started = time.perf_counter()
+    with replica_engine.connect() as replica:
+        while True:
+            caught_up = replica.execute(
+                text("SELECT pg_wal_lsn_diff(pg_last_wal_replay_lsn(), :lsn) >= 0"),
+                {"lsn": target_lsn}
+            ).scalar()
+            elapsed = time.perf_counter() - started
+            if caught_up:
+                logger.info(
+                    f"[读写分离] 副本已追上主库 - lsn={target_lsn}, elapsed_ms={elapsed * 1000:.1f}, "
+                    f"read_your_writes_seconds={settings.DB_READ_YOUR_WRITES_SECONDS}"
+                )
+                return elapsed < settings.DB_READ_YOUR_WRITES_SECONDS
+            if elapsed > timeout_seconds:
+                logger.error(f"[读写分离] 副本 {timeout_seconds}s 内未追上主库 - lsn={target_lsn}")
+                return False
+            time.sleep(0.05)
+
+
+async def run_reads(reads: int, concurrency: int) -> None:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def read_once():
+        async with semaphore:
+            db = await db_router.read_session(None)
+            try:
+                await asyncio.to_thread(lambda: db.execute(text("SELECT pg_is_in_recovery()")).scalar())
+            finally:
+                db.close()
+
+    started = time.perf_counter()
+    await asyncio.gather(*[read_once() for _ in range(reads)])
+    elapsed = time.perf_counter() - started
+    logger.info(f"[读写分离] 只读查询 {reads} 次，耗时 {elapsed:.2f}s - {db_router.snapshot()}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="只读副本检查")
+    parser.add_argument("--timeout", type=float, default=10, help="等待副本追上主库的最长时间（秒）")
+    parser.add_argument("--reads", type=int, default=0, help="经路由执行的只读查询次数，0为不执行")
+    parser.add_argument("--concurrency", type=int, default=10)
+    args = parser.parse_args()
+
+    if replica_engine is None:
+        logger.error("[读写分离] 未配置 DATABASE_REPLICA_URL")
+        sys.exit(1)
+
+    ok = check_replication(args.timeout)
+    if args.reads:
+        asyncio.run(run_reads(args.reads, args.concurrency))
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+内容存储清理脚本
+
+1. （可选）按业务数据中的实际引用重新计算引用计数，修正异常中断等导致的偏差
+2. 删除引用数归零超过保留期的对象和没有记录的孤儿文件
+
+用法（建议定时执行）：
+    python scripts/content_store_gc.py --reconcile
+    python scripts/content_store_gc.py --grace-seconds 3600
+"""
+import argparse
+import sys
+from datetime import datetime
+from pathlib import Path
+
+# 添加项目根目录到路径
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from loguru import logger
+from sqlalchemy import func, select, union_all
+from sqlalchemy.orm import Session
+
+from app.core.database import SessionLocal
+from app.models.batch_analysis import SheetReport
+from app.models.content_blob import ContentBlob
+from app.models.custom_batch_analysis import CustomSheetReport
+from app.models.session_message import AnalysisSessionMessage
+from app.models.session_version import AnalysisSessionVersion
+from app.services.content_store_service import content_store, ref_key
+
+
+def reconcile(db: Session) -> int:
+    """按消息、版本、Sheet报告中的引用重新计算 ref_count，返回修正的对象数"""
+    key = ref_key("html_charts")
+    refs = union_all(
+        select(AnalysisSessionMessage.extra[key].astext.label("sha256")).where(
+            AnalysisSessionMessage.extra.has_key(key)
+        ),
+        select(AnalysisSessionVersion.html_charts_ref.label("sha256")).where(
+            AnalysisSessionVersion.html_charts_ref.isnot(None)
+        ),
+        select(SheetReport.report_content[key].astext.label("sha256")).where(
+            SheetReport.report_content.has_key(key)
+        ),
+        select(CustomSheetReport.report_content[key].astext.label("sha256")).where(
+            CustomSheetReport.report_content.has_key(key)
+        ),
+    ).subquery()
+    counted = select(func.count()).select_from(refs).where(
+        refs.c.sha256 == ContentBlob.sha256
+    ).scalar_subquery()
+
+    fixed = db.query(ContentBlob).filter(ContentBlob.ref_count != counted).update(
+        {ContentBlob.ref_count: counted, ContentBlob.updated_at: datetime.utcnow()},
+        synchronize_session=False
+    )
+    db.commit()
+    logger.info(f"[内容存储] 引用计数校正完成 - fixed={fixed}")
+    return fixed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="内容存储清理")
+    parser.add_argument("--reconcile", action="store_true", help="清理前按实际引用重新计算引用计数")
+    parser.add_argument("--grace-seconds", type=int, default=None, help="引用归零后的保留时间，默认取配置")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        if args.reconcile:
+            reconcile(db)
+        content_store.collect_garbage(db, args.grace_seconds)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+迁移脚本：把存量的大段HTML图表移入内容存储
+
+- 会话消息：payload 中的 html_charts -> 消息 extra 中的 html_charts_ref，删除 payload 行
+- Sheet报告（批量/定制化批量）：report_content 中的 html_charts -> html_charts_ref
+版本内容中的HTML图表已按快照/增量压缩存储，保持不变。
+脚本可重复执行，每批单独提交。
+
+用法：
+    python scripts/migrate_content_store.py --batch-size 200
+"""
+import argparse
+import sys
+from pathlib import Path
+
+# 添加项目根目录到路径
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from loguru import logger
+from sqlalchemy.orm import Session, selectinload
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.models.batch_analysis import SheetReport
+from app.models.custom_batch_analysis import CustomSheetReport
+from app.models.session_message import AnalysisSessionMessage
+from app.services.content_store_service import content_store, ref_key
+
+
+def migrate_messages(db: Session, batch_size: int) -> int:
+    """迁移会话消息的 html_charts，返回迁移的消息数"""
+    migrated = 0
+    last_id = 0
+    while True:
+        rows = db.query(AnalysisSessionMessage).options(
+            selectinload(AnalysisSessionMessage.payload)
+        ).filter(
+            AnalysisSessionMessage.has_payload.is_(True),
+            AnalysisSessionMessage.id > last_id
+        ).order_by(AnalysisSessionMessage.id).limit(batch_size).all()
+        if not rows:
+            break
+        for row in rows:
+            data = dict(row.payload.data) if row.payload and row.payload.data else {}
+            externalized = content_store.externalize(db, data, "html_charts")
+            if externalized is data:
+                continue
+            extra = dict(row.extra or {})
+            extra[ref_key("html_charts")] = externalized.pop(ref_key("html_charts"))
+            row.extra = extra
+            if externalized:
+                row.payload.data = externalized
+            else:
+                row.payload = None
+                row.has_payload = False
+            migrated += 1
+        last_id = rows[-1].id
+        db.commit()
+        logger.info(f"[内容存储迁移] 会话消息 - last_id={last_id}, migrated={migrated}")
+    return migrated
+
+
+def migrate_sheet_reports(db: Session, sheet_model, batch_size: int) -> int:
+    """迁移Sheet报告的 html_charts，返回迁移的报告数"""
+    migrated = 0
+    last_id = 0
+    while True:
+        rows = db.query(sheet_model).filter(
+            sheet_model.report_content.has_key("html_charts"),
+            sheet_model.id > last_id
+        ).order_by(sheet_model.id).limit(batch_size).all()
+        if not rows:
+            break
+        for row in rows:
+            externalized = content_store.externalize(db, row.report_content, "html_charts")
+            if externalized is not row.report_content:
+                row.report_content = externalized
+                migrated += 1
+        last_id = rows[-1].id
+        db.commit()
+        logger.info(f"[内容存储迁移] {sheet_model.__tablename__} - last_id={last_id}, migrated={migrated}")
+    return migrated
+
+
+def main():
+    parser = argparse.ArgumentParser(description="存量HTML图表迁移到内容存储")
+    parser.add_argument("--batch-size", type=int, default=200, help="每批处理的行数")
+    args = parser.parse_args()
+
+    logger.info(
+        f"[内容存储迁移] 开始 - store_dir={settings.CONTENT_STORE_DIR}, min_bytes={settings.CONTENT_STORE_MIN_BYTES}"
+    )
+    db = SessionLocal()
+    try:
+        messages = migrate_messages(db, args.batch_size)
+        sheet_reports = migrate_sheet_reports(db, SheetReport, args.batch_size)
+        custom_sheet_reports = migrate_sheet_reports(db, CustomSheetReport, args.batch_size)
+        logger.info(
+            f"[内容存储迁移] 完成 - messages={messages}, sheet_reports={sheet_reports}, "
+            f"custom_sheet_reports={custom_sheet_reports}"
+        )
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
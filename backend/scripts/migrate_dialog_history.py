@@ -1,5 +1,5 @@
 """
-迁移脚本：将 AnalysisSession.messages 中的对话历史迁移到 DialogHistory 表
+迁移脚本：将会话消息（analysis_session_messages）中的对话历史迁移到 DialogHistory 表
 """
 import sys
 import os
@@ -25,7 +25,7 @@ def migrate_dialog_history():
         
         # 获取所有有消息的会话
         sessions = db.query(AnalysisSession).filter(
-            AnalysisSession.messages.isnot(None)
+            AnalysisSession.message_rows.any()
         ).all()
         
         logger.info(f"找到 {len(sessions)} 个会话需要迁移")
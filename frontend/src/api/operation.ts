@@ -16,6 +16,7 @@ export interface Session {
     file_name?: string
     charts?: any[]
     html_charts?: string  // 新增：HTML图表内容
+    html_charts_ref?: string  // HTML图表在内容存储中的哈希（较大的图表不内联返回）
     tables?: any[]
   }>
 }
@@ -35,6 +36,7 @@ export interface ReportContent {
     config?: any
   }>
   html_charts?: string  // 新增：HTML图表内容
+  html_charts_ref?: string  // HTML图表在内容存储中的哈希
   tables?: Array<{
     columns: Array<{ prop: string; label: string }>
     data: any[]
@@ -62,6 +64,7 @@ export interface SessionVersionDetail {
   summary?: string
   report_text?: string
   report_html_charts?: string
+  report_html_charts_ref?: string
   report_charts_json?: any
   created_at: string
 }
@@ -73,14 +76,22 @@ export interface BatchSheet {
   sheet_name: string
   sheet_index: number
   split_file_path: string
-  report_status: 'pending' | 'generating' | 'completed' | 'failed'
+  report_status: 'pending' | 'generating' | 'completed' | 'failed' | 'cancelled'
 }
 
 export interface BatchSession {
   id: number
   original_file_name: string
   sheet_count: number
-  status: 'processing' | 'completed' | 'failed' | 'partial_failed'
+  status: 'processing' | 'completed' | 'failed' | 'partial_failed' | 'cancelled'
+  progress?: {
+    total_sheets: number
+    pending_sheets: number
+    generating_sheets: number
+    completed_sheets: number
+    failed_sheets: number
+    cancelled_sheets: number
+  }
   created_at: string
   updated_at: string
 }
@@ -100,6 +111,7 @@ export interface BatchStatusResponse {
   failed_sheets: number
   generating_sheets: number
   pending_sheets: number
+  cancelled_sheets?: number
   reports: Array<{
     id: number
     sheet_name: string
@@ -121,20 +133,99 @@ export interface SheetReportDetail {
   updated_at?: string
 }
 
+// ==================== 内容存储 ====================
+
+// 进行中的请求（同一哈希并发请求只发一次；内容不可变，完成后由浏览器HTTP缓存负责复用）
+const pendingContent = new Map<string, Promise<string | undefined>>()
+
+/**
+ * 按哈希获取内容存储中的对象（HTML图表等），获取失败时返回 undefined
+ */
+export function fetchContent(digest: string): Promise<string | undefined> {
+  let pending = pendingContent.get(digest)
+  if (!pending) {
+    pending = (request.get(`/operation/content/${digest}`, { responseType: 'arraybuffer' }) as Promise<any>)
+      .then((response) => new TextDecoder('utf-8').decode(response.data as ArrayBuffer))
+      .catch((error) => {
+        console.warn('[内容存储] 获取内容失败:', digest, error)
+        return undefined
+      })
+      .finally(() => pendingContent.delete(digest))
+    pendingContent.set(digest, pending)
+  }
+  return pending
+}
+
+/**
+ * 把对象中的 `${key}_ref` 并行解析为 `${key}` 的内容（已有内联内容时跳过）
+ */
+export async function resolveContentRefs(
+  items: Array<Record<string, any> | null | undefined>,
+  key: string = 'html_charts'
+): Promise<void> {
+  const refKey = `${key}_ref`
+  await Promise.all(items.map(async (item) => {
+    if (item && item[refKey] && !item[key]) {
+      const content = await fetchContent(item[refKey])
+      if (content !== undefined) {
+        item[key] = content
+      }
+    }
+  }))
+}
+
 /**
  * 获取会话列表（简化版，移除project_id参数）
+ * 传入上一页返回的 next_cursor 加载下一页；next_cursor 为 null 表示没有更多
  */
 export function getSessions(params?: {
   page?: number
   page_size?: number
   search?: string
+  cursor?: string
 }) {
-  return request.get<ApiResponse<{ items: Session[], total: number }>>(
+  return request.get<ApiResponse<{ items: Session[], total: number | null, next_cursor: string | null }>>(
     `/operation/sessions`,
     { params }
   )
 }
 
+export type SearchType = 'session' | 'session_report' | 'batch_file' | 'sheet' | 'sheet_report'
+
+export interface SearchHit {
+  type: SearchType
+  id: number
+  title: string
+  snippet: string
+  highlights: Array<[number, number]>  // snippet 中命中位置 [start, end)
+  score: number
+  updated_at?: string
+  session_id?: number
+  batch_kind?: 'batch' | 'custom_batch'
+  batch_session_id?: number
+  sheet_index?: number
+}
+
+/**
+ * 搜索会话标题、批量分析文件名、Sheet名称和报告正文（按相似度排序）
+ */
+export function searchSessions(params: {
+  q: string
+  types?: SearchType[]
+  limit?: number
+}) {
+  return request.get<ApiResponse<{ query: string, items: SearchHit[] }>>(
+    `/operation/search`,
+    {
+      params: {
+        q: params.q,
+        types: params.types?.join(','),
+        limit: params.limit
+      }
+    }
+  )
+}
+
 /**
  * 创建新会话（简化版，移除project_id参数）
  */
@@ -151,9 +242,15 @@ export function createSession(title?: string) {
 
 /**
  * 获取会话详情
+ * 只解析页面展示用到的最后一条消息和最后一条assistant消息的HTML图表，其余消息保留 html_charts_ref，
+ * 需要时调用 resolveContentRefs 获取
  */
-export function getSessionDetail(sessionId: number) {
-  return request.get<ApiResponse<Session>>(`/operation/sessions/${sessionId}`)
+export async function getSessionDetail(sessionId: number) {
+  const response = await request.get<ApiResponse<Session>>(`/operation/sessions/${sessionId}`) as ApiResponse<Session>
+  const messages = response.data?.messages || []
+  const lastAssistant = [...messages].reverse().find((msg) => msg.role === 'assistant')
+  await resolveContentRefs([messages[messages.length - 1], lastAssistant])
+  return response
 }
 
 /**
@@ -172,10 +269,12 @@ export function getSessionVersions(sessionId: number) {
   )
 }
 
-export function getSessionVersionDetail(sessionId: number, versionId: number) {
-  return request.get<ApiResponse<SessionVersionDetail>>(
+export async function getSessionVersionDetail(sessionId: number, versionId: number) {
+  const response = await request.get<ApiResponse<SessionVersionDetail>>(
     `/operation/sessions/${sessionId}/versions/${versionId}`
-  )
+  ) as ApiResponse<SessionVersionDetail>
+  await resolveContentRefs([response.data], 'report_html_charts')
+  return response
 }
 
 export function createSessionVersion(sessionId: number, payload: {
@@ -285,16 +384,19 @@ export function downloadReportPDF(
 
 /**
  * 下载报告图片（PNG格式，避免PDF中文乱码）（简化版，移除project_id参数）
+ * layout: long 为一张长图，pages 为按页拆分的PNG（ZIP）
  */
 export function downloadReportImage(
   reportId: string,
-  sessionId: number
+  sessionId: number,
+  layout: 'long' | 'pages' = 'long'
 ) {
   return request.get(
     `/operation/reports/${reportId}/download-image`,
     {
       params: {
-        session_id: sessionId
+        session_id: sessionId,
+        layout
       },
       responseType: 'blob'
     }
@@ -377,6 +479,48 @@ export function startBatchAnalysis(
   )
 }
 
+/**
+ * 重试批量分析中失败或中断的Sheet（已完成的Sheet不会重新生成）
+ */
+export function retryBatchAnalysis(batchSessionId: number, analysisRequest?: string) {
+  const formData = new FormData()
+  if (analysisRequest) {
+    formData.append('analysis_request', analysisRequest)
+  }
+  
+  return request.post<ApiResponse<{
+    batch_session_id: number
+    status: string
+    retry_sheets: number
+    requeued_failed: number
+    reclaimed_stale: number
+    completed_sheets: number
+  }>>(
+    `/operation/batch/${batchSessionId}/retry`,
+    formData,
+    {
+      headers: {
+        'Content-Type': 'multipart/form-data'
+      }
+    }
+  )
+}
+
+/**
+ * 取消批量分析（未完成的Sheet标记为已取消，可通过重试继续）
+ */
+export function cancelBatchAnalysis(batchSessionId: number) {
+  return request.post<ApiResponse<{
+    batch_session_id: number
+    status: string
+    cancelled_sheets: number
+    completed_sheets: number
+    failed_sheets: number
+  }>>(
+    `/operation/batch/${batchSessionId}/cancel`
+  )
+}
+
 /**
  * 获取批量分析状态（用于轮询）（简化版，移除project_id参数）
  */
@@ -389,10 +533,12 @@ export function getBatchAnalysisStatus(batchSessionId: number) {
 /**
  * 获取单个Sheet报告详情（批量分析）（简化版，移除project_id参数）
  */
-export function getSheetReport(reportId: number) {
-  return request.get<ApiResponse<SheetReportDetail>>(
+export async function getSheetReport(reportId: number) {
+  const response = await request.get<ApiResponse<SheetReportDetail>>(
     `/operation/batch/reports/${reportId}`
-  )
+  ) as ApiResponse<SheetReportDetail>
+  await resolveContentRefs([response.data?.report_content])
+  return response
 }
 
 /**
@@ -459,6 +605,22 @@ export function downloadBatchReportPDF(
   )
 }
 
+/**
+ * 导出批量分析的全部已完成报告（zip：每个Sheet一个PDF；pdf：带目录的合并文档）
+ */
+export function exportBatchReports(
+  batchSessionId: number,
+  format: 'zip' | 'pdf' = 'zip'
+) {
+  return request.get(
+    `/operation/batch/${batchSessionId}/export`,
+    {
+      params: { format },
+      responseType: 'blob'
+    }
+  )
+}
+
 // ==================== 定制化批量分析相关API ====================
 
 /**
@@ -514,6 +676,48 @@ export function startCustomBatchAnalysis(batchSessionId: number, analysisRequest
   )
 }
 
+/**
+ * 重试定制化批量分析中失败或中断的Sheet
+ */
+export function retryCustomBatchAnalysis(batchSessionId: number, analysisRequest?: string) {
+  const formData = new FormData()
+  if (analysisRequest) {
+    formData.append('analysis_request', analysisRequest)
+  }
+  
+  return request.post<ApiResponse<{
+    batch_session_id: number
+    status: string
+    retry_sheets: number
+    requeued_failed: number
+    reclaimed_stale: number
+    completed_sheets: number
+  }>>(
+    `/operation/custom-batch/${batchSessionId}/retry`,
+    formData,
+    {
+      headers: {
+        'Content-Type': 'multipart/form-data'
+      }
+    }
+  )
+}
+
+/**
+ * 取消定制化批量分析（未完成的Sheet标记为已取消，可通过重试继续）
+ */
+export function cancelCustomBatchAnalysis(batchSessionId: number) {
+  return request.post<ApiResponse<{
+    batch_session_id: number
+    status: string
+    cancelled_sheets: number
+    completed_sheets: number
+    failed_sheets: number
+  }>>(
+    `/operation/custom-batch/${batchSessionId}/cancel`
+  )
+}
+
 /**
  * 获取定制化批量分析状态（用于轮询）
  */
@@ -526,10 +730,12 @@ export function getCustomBatchAnalysisStatus(batchSessionId: number) {
 /**
  * 获取单个Sheet报告详情（定制化批量分析）
  */
-export function getCustomSheetReport(reportId: number) {
-  return request.get<ApiResponse<SheetReportDetail>>(
+export async function getCustomSheetReport(reportId: number) {
+  const response = await request.get<ApiResponse<SheetReportDetail>>(
     `/operation/custom-batch/reports/${reportId}`
-  )
+  ) as ApiResponse<SheetReportDetail>
+  await resolveContentRefs([response.data?.report_content])
+  return response
 }
 
 /**
@@ -596,6 +802,22 @@ export function downloadCustomBatchReportPDF(
   )
 }
 
+/**
+ * 导出定制化批量分析的全部已完成报告（zip：每个Sheet一个PDF；pdf：带目录的合并文档）
+ */
+export function exportCustomBatchReports(
+  batchSessionId: number,
+  format: 'zip' | 'pdf' = 'zip'
+) {
+  return request.get(
+    `/operation/custom-batch/${batchSessionId}/export`,
+    {
+      params: { format },
+      responseType: 'blob'
+    }
+  )
+}
+
 // ==================== AI对话相关接口 ====================
 
 export interface DialogMessage {
@@ -0,0 +1,10 @@
+#!/bin/sh
+# 主库初始化：创建流复制用户并允许其连接（仅在数据目录首次初始化时执行）
+# 由 docker-compose.replica.yml 挂载到 /docker-entrypoint-initdb.d/
+set -e
+
+psql -v ON_ERROR_STOP=1 --username "$POSTGRES_USER" --dbname "$POSTGRES_DB" <<-EOSQL
+    CREATE ROLE ${POSTGRES_REPLICATION_USER:-replicator} WITH REPLICATION LOGIN PASSWORD '${POSTGRES_REPLICATION_PASSWORD:-replicator}';
+EOSQL
+
+echo "host replication ${POSTGRES_REPLICATION_USER:-replicator} all scram-sha-256" >> "$PGDATA/pg_hba.conf"